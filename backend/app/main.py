@@ -1,10 +1,21 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from .routers import audio, score, accomp
+from .routers import audio, score, accomp, analysis, recordings, history
+from .services.warmup import WARMUP_ENABLED, warmup
+
+# Ciężkie moduły (scipy.signal, aubio, PortAudio, music21) ładują się leniwie;
+# rozgrzewka w tle przygotowuje je zaraz po starcie, gdy /health już odpowiada.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP_ENABLED:
+        warmup.start()
+    yield
 
-app = FastAPI(title="Violin AI Backend")
+app = FastAPI(title="Violin AI Backend", lifespan=lifespan)
 
 # CORS – dopasuj origin frontendu (Vite domyślnie 5173)
 app.add_middleware(
@@ -19,10 +30,13 @@ app.add_middleware(
 app.include_router(audio.router, prefix="/api/audio", tags=["audio"])
 app.include_router(score.router, prefix="/api/score", tags=["score"])
 app.include_router(accomp.router, prefix="/api/accompaniment", tags=["accompaniment"])
+app.include_router(analysis.router, prefix="/api/analysis", tags=["analysis"])
+app.include_router(recordings.router, prefix="/api/recordings", tags=["recordings"])
+app.include_router(history.router, prefix="/api/history", tags=["history"])
 
 # Serwowanie plików (uploady + wygenerowane)
 app.mount("/media", StaticFiles(directory="backend/data"), name="media")
 
 @app.get("/health")
 def health():
-    return {"ok": True}
+    return {"ok": True, "warmup": warmup.status()}
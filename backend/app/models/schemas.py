@@ -4,6 +4,8 @@ from typing import List, Optional
 class AudioDevice(BaseModel):
     id: int
     name: str
+    default_samplerate: float | None = None
+    max_input_channels: int | None = None
 
 class StartAudioRequest(BaseModel):
     device_id: Optional[int] = None
@@ -11,6 +13,46 @@ class StartAudioRequest(BaseModel):
     blocksize: Optional[int] = 1024
     channels: Optional[int] = 1
 
+class NoiseConfig(BaseModel):
+    enabled: bool = True
+    gate_db: float = -50.0
+    hp_enabled: bool = True
+    hp_cut_hz: float = 70.0
+    notch_enabled: bool = False
+    notch_hz: float = 50.0
+    notch_q: float = 30.0
+    lp_enabled: bool = False
+    lp_cut_hz: float = 8000.0
+    preemph_enabled: bool = False
+    preemph_coef: float = 0.97
+    margin_db: float = 6.0
+    adaptive: bool = True
+    noise_floor_db: float = -60.0
+    # odejmowanie widmowe profilu szumu (profil z kalibracji; wymaga noise_calibrate)
+    spectral_enabled: bool = False
+    spectral_reduction: float = 1.5
+    spectral_floor_db: float = -20.0
+
+class AudioStatus(BaseModel):
+    running: bool
+    session_id: Optional[str] = None
+    device_id: Optional[int] = None
+    device_name: Optional[str] = None
+    samplerate: Optional[int] = None
+    hop: Optional[int] = None
+    analysis_samplerate: Optional[int] = None
+    analysis_hop: Optional[int] = None
+    pitch_window: Optional[int] = None
+    latency_ms: Optional[float] = None
+    channels: Optional[int] = None
+    clients: int = 0
+    overruns: int = 0
+    underruns: int = 0
+    dropped_frames: int = 0
+    input_overflows: int = 0
+    backlog_frames: int = 0
+    error: Optional[str] = None
+
 class PitchFrame(BaseModel):
     t: float
     pitch_hz: float
@@ -1,61 +1,97 @@
-from fastapi import APIRouter
-import numpy as np
-import wave
-import uuid
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 import os
+from typing import Optional
+
+from ..services import synth
+from ..services.disk_cache import DiskLRU
+from ..services.metronome import iter_wav
+from ..services.score_cache import score_cache
+from .score import score_path
 
 router = APIRouter()
 
 ACCOMP_DIR = "backend/data/accomp"  # katalog do zapisu wygenerowanych podkładów/metronomu
 os.makedirs(ACCOMP_DIR, exist_ok=True)
 
+# Wygenerowane kliknięcia: jeden plik na (tempo, takty, metrum, sr), najdawniej używane usuwane
+METRONOME_CACHE_MB = float(os.environ.get("VIOLIN_METRONOME_CACHE_MB", "128"))
+_metronome_cache = DiskLRU(ACCOMP_DIR, int(METRONOME_CACHE_MB * 1024 * 1024),
+                           pattern=lambda name: name.startswith("metronome_") and name.endswith(".wav"))
+
+# Podkłady z partytury: jeden plik na (hash treści, tempo, transpozycja, partie, sr)
+ACCOMP_CACHE_MB = float(os.environ.get("VIOLIN_ACCOMP_CACHE_MB", "512"))
+_render_cache = DiskLRU(ACCOMP_DIR, int(ACCOMP_CACHE_MB * 1024 * 1024),
+                        pattern=lambda name: name.startswith("score_") and name.endswith(".wav"))
+
 @router.get("/metronome")
-def generate_metronome(tempo: int = 120, bars: int = 4, beats_per_bar: int = 4):
+def generate_metronome(tempo: int = Query(120, ge=20, le=400), bars: int = Query(4, ge=1, le=2000),
+                       beats_per_bar: int = Query(4, ge=1, le=32), sr: int = Query(44100, ge=8000, le=96000)):
     """
     Generuje plik WAV z dźwiękiem metronomu o zadanym tempie, liczbie taktów i bitach na takt.
-    Zwraca URL wygenerowanego pliku.
+    Zwraca URL wygenerowanego pliku. Te same parametry -> ten sam plik z cache na dysku.
     """
-    sr = 44100  # częstotliwość próbkowania
-    # Ustawienia dźwięków metronomu
-    accent_freq = 1000.0   # Hz (akcentowany takt)
-    normal_freq = 1000.0   # Hz (normalne uderzenie - tu używamy tej samej częstotliwości, można zmienić)
-    accent_vol = 1.0
-    normal_vol = 0.5
-    tick_duration = 0.1    # czas trwania kliknięcia w sekundach
-
-    total_beats = bars * beats_per_bar
-    beat_interval = 60.0 / tempo  # odstęp między uderzeniami (sekundy)
-    total_duration = total_beats * beat_interval + tick_duration  # całkowity czas trwania nagrania
-    total_samples = int(total_duration * sr)
-
-    # Przygotuj tablicę na próbki audio (mono, 16-bit)
-    audio = np.zeros(total_samples, dtype=np.int16)
-
-    # Przygotuj próbkę dźwięku kliknięcia dla akcentu i normalnego uderzenia
-    t = np.linspace(0, tick_duration, int(tick_duration * sr), endpoint=False)
-    accent_wave = (np.sin(2 * np.pi * accent_freq * t) * (32767 * accent_vol)).astype(np.int16)
-    normal_wave = (np.sin(2 * np.pi * normal_freq * t) * (32767 * normal_vol)).astype(np.int16)
-
-    # Wstaw dźwięki do tablicy audio na odpowiednich pozycjach czasowych
-    for beat in range(total_beats):
-        start_index = int(round(beat * beat_interval * sr))
-        if start_index >= total_samples:
-            break
-        wave_data = accent_wave if (beat % beats_per_bar == 0) else normal_wave
-        end_index = start_index + len(wave_data)
-        if end_index > total_samples:
-            end_index = total_samples
-            wave_data = wave_data[:(end_index - start_index)]
-        audio[start_index:end_index] = wave_data
-
-    # Zapisz dane do pliku WAV
-    filename = f"metronome_{tempo}bpm_{beats_per_bar}beat_{bars}bars_{uuid.uuid4().hex[:8]}.wav"
-    filepath = os.path.join(ACCOMP_DIR, filename)
-    with wave.open(filepath, 'w') as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)  # 16-bit
-        wf.setframerate(sr)
-        wf.writeframes(audio.tobytes())
-
+    filename = f"metronome_{tempo}bpm_{beats_per_bar}beat_{bars}bars_{sr}.wav"
+    _, cached = _metronome_cache.get_or_create(filename, lambda: iter_wav(tempo, beats_per_bar, sr, bars))
     url = f"/media/accomp/{filename}"
-    return {"url": url}
+    return {"url": url, "cached": cached}
+
+@router.get("/metronome/stream")
+def stream_metronome(tempo: int = Query(120, ge=20, le=400), bars: Optional[int] = Query(None, ge=1),
+                     beats_per_bar: int = Query(4, ge=1, le=32), sr: int = Query(44100, ge=8000, le=96000)):
+    """
+    WAV generowany w locie (kawałki ~1 s). Bez bars – klikanie bez końca,
+    dopóki klient nie zamknie połączenia.
+    """
+    return StreamingResponse(iter_wav(tempo, beats_per_bar, sr, bars), media_type="audio/wav")
+
+@router.get("/metronome/cache")
+def metronome_cache_stats():
+    return _metronome_cache.stats()
+
+def _parse_parts(parts: Optional[str]):
+    if not parts:
+        return None
+    try:
+        return sorted({int(p) for p in parts.split(",") if p.strip()})
+    except ValueError:
+        raise HTTPException(status_code=422, detail="parts: lista indeksów partii, np. 1,2")
+
+@router.get("/render")
+def render_accompaniment(url: str, parts: Optional[str] = None, tempo: Optional[float] = Query(None, ge=20, le=400),
+                         transpose: int = Query(0, ge=-24, le=24), sr: int = Query(44100, ge=8000, le=96000)):
+    """
+    Renderuje partie akompaniamentu partytury (url z /api/score/upload) do WAV.
+    parts: indeksy partii po przecinku (domyślnie wszystkie poza skrzypcami),
+    tempo: bpm ćwierćnuty na początku utworu (domyślnie jak w partyturze),
+    transpose: półtony. Te same parametry i ta sama treść -> plik z cache na dysku.
+    """
+    path = score_path(url)
+    try:
+        table = score_cache.get(path)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Nie udało się sparsować partytury: {e}")
+    selected = _parse_parts(parts)
+    if selected is not None and not all(0 <= p < len(table.parts) for p in selected):
+        raise HTTPException(status_code=404, detail="Brak partii")
+    try:
+        plan = synth.plan_render(table, selected, tempo, transpose, sr)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    used = "-".join(str(p["index"]) for p in plan.parts)
+    bpm = "orig" if tempo is None else format(tempo, "g")
+    filename = f"score_{table.hash[:16]}_{bpm}bpm_{transpose:+d}st_p{used}_{sr}.wav"
+    _, cached = _render_cache.get_or_create(filename, lambda: synth.iter_wav(plan))
+    return {
+        "url": f"/media/accomp/{filename}",
+        "cached": cached,
+        "duration_s": round(plan.duration_s, 3),
+        "parts": plan.parts,
+        "tempo": tempo or float(table.tempo_map[0, 1]),
+        "transpose": transpose,
+    }
+
+@router.get("/render/cache")
+def render_cache_stats():
+    return _render_cache.stats()
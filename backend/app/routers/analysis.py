@@ -0,0 +1,121 @@
+from fastapi import APIRouter, File, Query, UploadFile, HTTPException
+from starlette.concurrency import run_in_threadpool
+import os
+import tempfile
+import numpy as np
+import soundfile as sf
+from typing import Optional
+
+from ..services.align import align_track
+from ..services.disk_cache import DiskLRU
+from ..services.offline import analyse_file
+from ..services.pitch import PITCH_ENGINES
+from ..services.recorder import RECORDINGS_DIR, RecordingNotFoundError, RecordingStore
+from ..services.score_cache import score_cache
+from .score import score_path
+
+router = APIRouter()
+
+ANALYSIS_DIR = "backend/data/analysis"
+os.makedirs(ANALYSIS_DIR, exist_ok=True)
+
+ALLOWED_EXT = (".wav", ".flac")
+CHUNK = 1 << 20
+UPLOAD_MAX_BYTES = int(float(os.environ.get("VIOLIN_ANALYSIS_MAX_MB", "512")) * 1024 * 1024)
+
+# Ścieżki pitch/onset (.npz) z POST /recording: najdawniej używane usuwane ponad limit
+ANALYSIS_CACHE_MB = float(os.environ.get("VIOLIN_ANALYSIS_CACHE_MB", "512"))
+_tracks = DiskLRU(ANALYSIS_DIR, int(ANALYSIS_CACHE_MB * 1024 * 1024), pattern=lambda name: name.endswith(".npz"))
+
+@router.post("/recording")
+async def analyse_recording(file: UploadFile = File(...), hop: int = 1024, segment_seconds: float = 60.0,
+                            pitch: Optional[str] = None):
+    """
+    Analiza nagrania (WAV/FLAC) tym samym łańcuchem co na żywo: filtr + bramka + pitch/onset/tempo.
+    Upload zapisywany strumieniowo do pliku tymczasowego, analiza blokami w puli procesów.
+    Zwraca podsumowanie JSON + URL do ścieżki pitch/onset (.npz).
+    pitch=aubio|yin|mpm wybiera detektor wysokości (yin/mpm liczą segment wsadowo).
+    """
+    if pitch is not None and pitch not in PITCH_ENGINES:
+        raise HTTPException(status_code=422, detail=f"nieznany silnik wysokości: {pitch}")
+    filename = file.filename or "recording.wav"
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in ALLOWED_EXT:
+        raise HTTPException(status_code=415, detail="obsługiwane formaty: WAV, FLAC")
+
+    fd, tmp_path = tempfile.mkstemp(suffix=ext)
+    try:
+        size = 0
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await file.read(CHUNK)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise HTTPException(status_code=413,
+                                        detail=f"plik większy niż {UPLOAD_MAX_BYTES / (1024 * 1024):g} MB")
+                # zapis na dysk (do limitu) w puli wątków – pętla zdarzeń obsługuje w tym czasie WS na żywo
+                await run_in_threadpool(f.write, chunk)
+        try:
+            await run_in_threadpool(sf.info, tmp_path)
+        except RuntimeError as e:
+            raise HTTPException(status_code=400, detail=f"nie udało się odczytać pliku audio: {e}")
+        summary = await run_in_threadpool(
+            analyse_file, tmp_path, ANALYSIS_DIR, max(128, min(8192, hop)), max(5.0, segment_seconds),
+            None, True, filename, pitch
+        )
+    finally:
+        os.unlink(tmp_path)
+    await run_in_threadpool(_tracks.trim, summary["track_file"])
+
+    summary["filename"] = filename
+    summary["track_url"] = f"/media/analysis/{summary.pop('track_file')}"
+    return summary
+
+# =============================
+# Dopasowanie nagrania do partytury po fakcie (DTW w pasie, wieloskalowo):
+# źródłem ścieżki jest nagranie sesji (/api/recordings) albo plik .npz z POST /recording
+# =============================
+_recordings = RecordingStore(RECORDINGS_DIR)
+
+def _load_track(recording: Optional[str], track: Optional[str]):
+    if (recording is None) == (track is None):
+        raise HTTPException(status_code=422, detail="podaj dokładnie jedno: recording albo track")
+    if recording is not None:
+        try:
+            meta, cols = _recordings.frame_columns(recording)
+        except RecordingNotFoundError:
+            raise HTTPException(status_code=404, detail="Brak nagrania")
+        return cols["pitch_hz"], cols["onset"], cols["gated"], meta["hop"] / float(meta["samplerate"])
+    name = os.path.basename(track.split("?", 1)[0])
+    path = _tracks.lookup(name) if name.endswith(".npz") else None
+    if path is None or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Brak ścieżki analizy")
+    with np.load(path) as z:
+        return z["pitch_hz"], z["onset"], z["gated"], int(z["hop"]) / float(z["samplerate"])
+
+@router.post("/align")
+async def align_recording(url: str, part: int = 0, recording: Optional[str] = None, track: Optional[str] = None,
+                          radius: int = Query(2, ge=1, le=32)):
+    """
+    Dopasowanie nagrania do melodii partii partytury (url z /api/score/upload).
+    Zwraca dla każdej nuty początek/koniec w nagraniu, odchylenie w centach (mediana)
+    i odchylenie rytmu w ms względem dopasowanego tempa całego wykonania.
+    """
+    path = score_path(url)
+    # odczyt ścieżki i kompilacja partytury (music21 przy braku w cache) poza pętlą zdarzeń
+    pitch_hz, onset, gated, frame_s = await run_in_threadpool(_load_track, recording, track)
+    try:
+        table = await run_in_threadpool(score_cache.get, path)
+        part_table = table.part(part)
+    except (IndexError, KeyError):
+        raise HTTPException(status_code=404, detail=f"Brak partii {part}")
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Nie udało się sparsować partytury: {e}")
+    try:
+        result = await run_in_threadpool(align_track, part_table, pitch_hz, onset, frame_s, gated, radius)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    result["summary"].update({"part": part_table.name, "recording": recording, "track": track})
+    return result
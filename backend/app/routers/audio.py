@@ -1,400 +1,493 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Body
-from pydantic import BaseModel
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 import asyncio
-import threading
-import numpy as np
-import aubio
-import sounddevice as sd
-import math
-from typing import List, Optional, Dict
+import json
+import os
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Optional
+
+from ..models.schemas import AudioDevice, AudioStatus, NoiseConfig
+from ..services import devices
+from ..services.engine import AudioEngine, SessionRegistry, SessionBusyError
+from ..services.frame_codec import FrameEncoder, SUBPROTOCOL
+from ..services.history import HistoryStore
+from ..services.live_accomp import BLOCK_MS, LOOKAHEAD_MS, LiveAccompanist, LiveControl, LiveMetrics, stream_blocks
+from ..services.metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus
+from ..services.recorder import FORMATS, RECORDINGS_DIR
+from ..services.score_cache import score_cache
+from ..services.ws_hub import HubClient, parse_subscriptions
+from .score import score_path
 
 router = APIRouter()
 
 # =============================
-# Modele odpowiedzi
+# Sesje audio – każda ma własny strumień, analizatory, filtr i klientów WS.
+# Stare endpointy bez {session_id} działają na sesji "default".
+# VIOLIN_ENGINE=process: analiza działa w osobnym procesie
+# (python -m app.services.engine_server), a ten worker tylko rozsyła ramki.
 # =============================
-class AudioDevice(BaseModel):
-    id: int
-    name: str
-    default_samplerate: float | None = None
-    max_input_channels: int | None = None
-
-class NoiseConfig(BaseModel):
-    enabled: bool = True
-    gate_db: float = -50.0
-    hp_enabled: bool = True
-    hp_cut_hz: float = 70.0
-    margin_db: float = 6.0
-    adaptive: bool = True
-    noise_floor_db: float = -60.0
-
-class AudioStatus(BaseModel):
-    running: bool
-    device_id: Optional[int] = None
-    device_name: Optional[str] = None
-    samplerate: Optional[int] = None
-    hop: Optional[int] = None
-
-# =============================
-# Stan globalny audio/WS
-# =============================
-_audio_stream: Optional[sd.RawInputStream] = None
-_audio_thread: Optional[threading.Thread] = None
-_run_audio: bool = False
-
-_current_device: Optional[int] = None
-_current_sr: Optional[int] = None
-_current_hop: Optional[int] = None
-
-_ws_connections: List[WebSocket] = []
-_ws_lock = threading.Lock()
-_main_loop: Optional[asyncio.AbstractEventLoop] = None  # ustawiany przy pierwszym WS
-
-# Parametry analizy (inicjalne – zostaną ustawione przy starcie)
-BUFFER_SIZE = 2048
-HOP_SIZE = 1024
-SAMPLERATE = 44100
-
-_pitch_o: Optional[aubio.pitch] = None
-_onset_o: Optional[aubio.onset] = None
-_tempo_o: Optional[aubio.tempo] = None
-
-def _init_aubio(samplerate: int, hop: int):
-    global _pitch_o, _onset_o, _tempo_o
-    _pitch_o = aubio.pitch("yin", 2048, hop, samplerate)
-    _pitch_o.set_unit("Hz")
-    _pitch_o.set_silence(-40)
-    _onset_o = aubio.onset("default", 1024, hop, samplerate)
-    _tempo_o = aubio.tempo("default", 1024, hop, samplerate)
-
-# =============================
-# Noise Reduction – stan + IIR HPF + bramka + kalibracja
-# =============================
-_noise_cfg = NoiseConfig()
-_cfg_lock = threading.Lock()
-
-# HPF state
-_hpf_x1: float = 0.0
-_hpf_y1: float = 0.0
-_hpf_alpha: float = 0.0
-
-def _update_hpf_alpha(samplerate: int):
-    global _hpf_alpha
-    with _cfg_lock:
-        if not _noise_cfg.hp_enabled:
-            _hpf_alpha = 0.0
-            return
-        fc = max(1.0, float(_noise_cfg.hp_cut_hz))
-    rc = 1.0 / (2.0 * math.pi * fc)
-    dt = 1.0 / float(samplerate)
-    _hpf_alpha = rc / (rc + dt)
-
-def _hpf_process(frame: np.ndarray) -> np.ndarray:
-    global _hpf_x1, _hpf_y1, _hpf_alpha
-    if _hpf_alpha == 0.0:
-        return frame
-    out = np.empty_like(frame)
-    x1 = _hpf_x1
-    y1 = _hpf_y1
-    a = _hpf_alpha
-    for i in range(frame.size):
-        x = float(frame[i])
-        y = a * (y1 + x - x1)
-        out[i] = y
-        x1 = x
-        y1 = y
-    _hpf_x1, _hpf_y1 = x1, y1
-    return out
-
-_calib_frames_left: int = 0
-_calib_db_values: List[float] = []
-
-def _start_calibration(seconds: float):
-    global _calib_frames_left, _calib_db_values
-    frames = int((seconds * SAMPLERATE) / HOP_SIZE) if HOP_SIZE > 0 else 0
-    _calib_frames_left = max(1, frames)
-    _calib_db_values = []
-
-def _apply_noise_processing(samples: np.ndarray) -> Dict[str, float]:
-    eps = 1e-12
-    rms_pre = float(np.sqrt(np.mean(samples**2) + eps))
-    db_pre = 20.0 * math.log10(rms_pre + eps)
-
-    with _cfg_lock:
-        cfg = _noise_cfg
-
-    proc = samples
-    if cfg.enabled and cfg.hp_enabled:
-        proc = _hpf_process(proc)
-
-    rms = float(np.sqrt(np.mean(proc**2) + eps))
-    db = 20.0 * math.log10(rms + eps)
-
-    global _calib_frames_left, _calib_db_values
-    if _calib_frames_left > 0:
-        _calib_db_values.append(db)
-        _calib_frames_left -= 1
-        if _calib_frames_left == 0 and len(_calib_db_values) > 0:
-            floor = float(np.median(_calib_db_values))
-            with _cfg_lock:
-                _noise_cfg.noise_floor_db = floor
-                if _noise_cfg.adaptive:
-                    _noise_cfg.gate_db = floor + _noise_cfg.margin_db
-
-    gated = False
-    with _cfg_lock:
-        gate_db = cfg.gate_db if not cfg.adaptive else (cfg.noise_floor_db + cfg.margin_db)
-        use_gate = cfg.enabled
-
-    if use_gate and db < gate_db:
-        gated = True
-
-    return {
-        "rms": rms,
-        "db": db,
-        "db_pre": db_pre,
-        "level": max(0.0, min(1.0, (db + 60.0) / 60.0)),
-        "gated": 1.0 if gated else 0.0,
-        "gate_db": gate_db
-    }
-
-# =============================
-# Pomocnicze
-# =============================
-def _hz_to_note_and_cents(freq: float, a4: float = 440.0):
-    if freq <= 0:
-        return None, None
-    midi = 69 + 12 * math.log2(freq / a4)
-    midi_round = int(round(midi))
-    cents = int(round((midi - midi_round) * 100.0))
-    names = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
-    name = f"{names[midi_round % 12]}{(midi_round // 12) - 1}"
-    return name, cents
-
-def _preview_wave(samples: np.ndarray, points: int = 128) -> List[float]:
-    if samples.size == 0:
-        return []
-    step = max(1, samples.size // points)
-    return samples[::step][:points].astype(float).tolist()
-
-def _ws_broadcast_json(payload: dict):
-    global _main_loop
-    _ws_lock.acquire()
-    conns = list(_ws_connections)
-    _ws_lock.release()
-    if not conns or _main_loop is None:
-        return
-    for ws in conns:
-        try:
-            asyncio.run_coroutine_threadsafe(ws.send_json(payload), _main_loop)
-        except Exception:
-            _ws_lock.acquire()
-            if ws in _ws_connections:
-                _ws_connections.remove(ws)
-            _ws_lock.release()
-
-# =============================
-# Główny wątek przechwytywania audio
-# =============================
-def _audio_capture_thread(device: Optional[int], samplerate: int, hop: int):
-    global _audio_stream, _run_audio, _current_device, _current_sr, _current_hop
-    try:
-        _init_aubio(samplerate, hop)
-        _update_hpf_alpha(samplerate)
-        _audio_stream = sd.RawInputStream(
-            device=device,
-            samplerate=samplerate,
-            channels=1,
-            dtype="float32",
-            blocksize=hop
-        )
-        _audio_stream.start()
-        _current_device, _current_sr, _current_hop = device, samplerate, hop
-    except Exception as e:
-        print(f"[audio] Błąd otwarcia strumienia: {e}")
-        _run_audio = False
-        _current_device = None
-        return
-
-    preview_tick = 0
-    while _run_audio:
-        try:
-            data, _ = _audio_stream.read(hop)
-            samples = np.frombuffer(data, dtype=np.float32)
-        except Exception as e:
-            print(f"[audio] Błąd czytania: {e}")
-            break
-
-        nr = _apply_noise_processing(samples)
-
-        pitch_hz = 0.0
-        onset_flag = False
-        bpm = 0.0
-
-        if nr["gated"] < 0.5:
-            pitch_hz = float(_pitch_o(samples)[0]) if _pitch_o else 0.0
-            _ = _tempo_o(samples) if _tempo_o else False
-            bpm = float(_tempo_o.get_bpm()) if _tempo_o else 0.0
-            onset_flag = bool(_onset_o(samples)) if _onset_o else False
-
-        note, cents = _hz_to_note_and_cents(pitch_hz)
-
-        payload = {
-            "pitch_hz": pitch_hz,
-            "note": note,
-            "cents": cents,
-            "onset": onset_flag,
-            "bpm": bpm,
-            "rms": nr["rms"],
-            "db": nr["db"],
-            "level": nr["level"],
-            "gated": bool(nr["gated"]),
-            "gate_db": nr["gate_db"]
-        }
-        preview_tick = (preview_tick + 1) % 4
-        if preview_tick == 0:
-            payload["wave"] = _preview_wave(samples, 128)
-
-        _ws_broadcast_json(payload)
-
-    try:
-        if _audio_stream:
-            _audio_stream.stop()
-            _audio_stream.close()
-    except:
-        pass
-    _audio_stream = None
+DEFAULT_SESSION = "default"
+MAX_SESSIONS = int(os.environ.get("VIOLIN_MAX_SESSIONS", "8"))
+MAX_CHANNELS = 32
+PROCESS_ENGINE = os.environ.get("VIOLIN_ENGINE") == "process"
+
+if PROCESS_ENGINE:
+    from ..services.engine_proxy import RemoteSessionRegistry
+    _sessions = RemoteSessionRegistry()
+else:
+    _sessions = SessionRegistry(MAX_SESSIONS)
+
+def _engine(session_id: str) -> AudioEngine:
+    """Sesja do startu / konfiguracji – tworzona, jeśli jej nie ma."""
+    return _sessions.get_or_create(session_id)
+
+def _existing(session_id: str) -> AudioEngine:
+    """
+    Sesja dla tras tylko do odczytu i zatrzymujących – nie tworzy nowej (404).
+    Sesja domyślna jest zawsze dostępna (jedna, frontend czyta jej status przed startem).
+    """
+    if session_id == DEFAULT_SESSION:
+        return _sessions.get_or_create(session_id)
+    eng = _sessions.get(session_id)
+    if eng is None and PROCESS_ENGINE:
+        # sesję mógł założyć inny worker – proces silnika zna wszystkie
+        eng = next((e for e in _sessions.sessions() if e.session_id == session_id), None)
+    if eng is None:
+        raise HTTPException(status_code=404, detail=f"Nie ma sesji {session_id}")
+    return eng
 
 # =============================
 # REST: urządzenia / start / stop / status
 # =============================
 @router.get("/devices", response_model=list[AudioDevice])
-def list_audio_devices():
-    devices = []
-    for idx, dev in enumerate(sd.query_devices()):
+def list_audio_devices(refresh: bool = False):
+    """Wejścia audio; lista jest zapamiętana po pierwszej enumeracji (refresh=true – od nowa)."""
+    out = []
+    for idx, dev in enumerate(devices.query_devices(refresh)):
         if dev.get("max_input_channels", 0) > 0:
-            devices.append(AudioDevice(
+            out.append(AudioDevice(
                 id=idx,
                 name=dev["name"],
                 default_samplerate=dev.get("default_samplerate"),
                 max_input_channels=dev.get("max_input_channels")
             ))
-    return devices
+    return out
 
 def _resolve_default_sr(device_id: Optional[int]) -> int:
     try:
-        info = sd.query_devices(device_id) if device_id is not None else sd.query_devices(sd.default.device[0])
-        return int(info.get("default_samplerate", 48000))
+        return devices.default_samplerate(device_id)
     except Exception:
-        return 48000
+        return devices.DEFAULT_SAMPLERATE
+
+def _device_name(device_id: Optional[int]) -> Optional[str]:
+    try:
+        return devices.device_name(device_id)
+    except Exception:
+        return None
+
+def _session_status(session_id: str) -> AudioStatus:
+    eng = _existing(session_id)
+    return eng.status(_device_name(eng.device))
+
+def _session_start(session_id: str, device_id: int | None, samplerate: int | None, hop: int | None,
+                   decimate: int | None = None, window: int | None = None,
+                   channels: int | None = None) -> AudioStatus:
+    """
+    Startuje lub PRZEŁĄCZA aktywne urządzenie sesji, jeśli już działa.
+    decimate (np. 16000): analiza o niskim opóźnieniu na strumieniu zdecymowanym;
+    window: okno wysokości w próbkach analizy (domyślnie 2048, a po decymacji 512);
+    channels: liczba kanałów wejścia analizowanych osobno (ramki w polu "channels").
+    """
+    dev = device_id if device_id is not None else devices.default_input()
+    sr = samplerate or _resolve_default_sr(dev)
+    h = hop or (384 if decimate else 1024)
+    if decimate is not None and not 4000 <= decimate <= sr:
+        raise HTTPException(status_code=422, detail=f"decimate poza zakresem 4000..{sr}")
+    if window is not None and not 64 <= window <= 8192:
+        raise HTTPException(status_code=422, detail="window poza zakresem 64..8192")
+    ch = 1 if channels is None else channels
+    if not 1 <= ch <= MAX_CHANNELS:
+        raise HTTPException(status_code=422, detail=f"channels poza zakresem 1..{MAX_CHANNELS}")
+    if ch > 1 and PROCESS_ENGINE:
+        raise HTTPException(status_code=422, detail="wejście wielokanałowe działa tylko z silnikiem w procesie API")
+
+    eng = _engine(session_id)
+    # jeśli już działa i konfiguracja jest ta sama -> nic nie rób
+    if eng.matches(dev, sr, h, decimate, window, ch):
+        return _session_status(session_id)
+
+    try:
+        _sessions.start(session_id, dev, sr, h, decimate, window, ch)
+    except SessionBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return _session_status(session_id)
+
+def _session_stop(session_id: str) -> AudioStatus:
+    _existing(session_id)
+    _sessions.stop(session_id)
+    return _session_status(session_id)
 
 @router.get("/status", response_model=AudioStatus)
 def audio_status():
-    name = None
-    if _current_device is not None:
-        try:
-            name = sd.query_devices(_current_device)["name"]
-        except Exception:
-            name = None
-    return AudioStatus(
-        running=_run_audio,
-        device_id=_current_device,
-        device_name=name,
-        samplerate=_current_sr,
-        hop=_current_hop
-    )
+    return _session_status(DEFAULT_SESSION)
 
 @router.post("/start", response_model=AudioStatus)
-def start_audio(device_id: int | None = None, samplerate: int | None = None, hop: int | None = None):
-    """Startuje lub PRZEŁĄCZA aktywne urządzenie, jeśli już działa."""
-    global _audio_thread, _run_audio, SAMPLERATE, HOP_SIZE, _current_device, _current_sr, _current_hop
-    dev = device_id if device_id is not None else (sd.default.device[0] if sd.default.device else None)
-    sr = samplerate or _resolve_default_sr(dev)
-    h = hop or 1024
-
-    # jeśli już działa i konfiguracja jest ta sama -> nic nie rób
-    if _run_audio and _current_device == dev and _current_sr == sr and _current_hop == h:
-        return audio_status()
-
-    # jeśli działa, zatrzymaj przed restartem
-    if _run_audio:
-        _run_audio = False
-        if _audio_thread:
-            _audio_thread.join(timeout=1.0)
-        _audio_thread = None
-
-    SAMPLERATE = sr
-    HOP_SIZE = h
-    _run_audio = True
-    _audio_thread = threading.Thread(target=_audio_capture_thread, args=(dev, sr, h), daemon=True)
-    _audio_thread.start()
-    return audio_status()
+def start_audio(device_id: int | None = None, samplerate: int | None = None, hop: int | None = None,
+                decimate: int | None = None, window: int | None = None, channels: int | None = None):
+    return _session_start(DEFAULT_SESSION, device_id, samplerate, hop, decimate, window, channels)
 
 @router.post("/stop", response_model=AudioStatus)
 def stop_audio():
-    global _run_audio, _audio_thread, _current_device, _current_sr, _current_hop
-    _run_audio = False
-    if _audio_thread:
-        _audio_thread.join(timeout=1.0)
-    _audio_thread = None
-    _current_device = None
-    _current_sr = None
-    _current_hop = None
-    return audio_status()
+    return _session_stop(DEFAULT_SESSION)
+
+@router.get("/sessions", response_model=list[AudioStatus])
+def list_sessions():
+    return [e.status(_device_name(e.device)) for e in _sessions.sessions()]
+
+@router.get("/sessions/{session_id}/status", response_model=AudioStatus)
+def session_status(session_id: str):
+    return _session_status(session_id)
+
+@router.post("/sessions/{session_id}/start", response_model=AudioStatus)
+def session_start(session_id: str, device_id: int | None = None, samplerate: int | None = None, hop: int | None = None,
+                  decimate: int | None = None, window: int | None = None, channels: int | None = None):
+    return _session_start(session_id, device_id, samplerate, hop, decimate, window, channels)
+
+@router.post("/sessions/{session_id}/stop", response_model=AudioStatus)
+def session_stop(session_id: str):
+    return _session_stop(session_id)
+
+@router.delete("/sessions/{session_id}")
+def session_delete(session_id: str):
+    _sessions.remove(session_id)
+    return {"ok": True}
 
 # =============================
 # WebSocket: analiza
 #  - nadal autostartuje, ale /start może przełączyć urządzenie w locie
+#  - protokół binarny: subprotocol "violin.bin.v1" albo ?proto=bin
+#    (&batch=N łączy N hopów w jedną wiadomość, &wave=int16|float32)
+#  - subskrypcje: ?subscribe=pitch:20,level:30,wave:10,onset:events
+#    albo w trakcie wiadomością {"subscribe": {"pitch": 20, "wave": false}}
+#  - pozycja w partyturze (po POST /score_follow): strumień "score", domyślnie "events"
 # =============================
-@router.websocket("/ws/analyze")
-async def analyze_audio_ws(websocket: WebSocket):
-    global _main_loop
-    await websocket.accept()
-    try:
-        _main_loop = asyncio.get_running_loop()
-    except RuntimeError:
-        _main_loop = None
-
-    _ws_lock.acquire()
-    _ws_connections.append(websocket)
-    _ws_lock.release()
+async def _serve_analyze_ws(session_id: str, websocket: WebSocket, proto: str, batch: int, wave: str,
+                            subscribe: Optional[str], queue: int):
+    requested = websocket.scope.get("subprotocols") or []
+    use_sub = SUBPROTOCOL in requested
+    await websocket.accept(subprotocol=SUBPROTOCOL if use_sub else None)
+
+    eng = _engine(session_id)
+    encoder = None
+    if use_sub or proto == "bin":
+        encoder = FrameEncoder(max(1, min(32, batch)), "float32" if wave == "float32" else "int16")
+    client = HubClient(
+        websocket,
+        asyncio.get_running_loop(),
+        encoder=encoder,
+        queue_size=max(1, min(256, queue)),
+        subscriptions=parse_subscriptions(subscribe)
+    )
+    eng.hub.add(client)
+    sender = asyncio.create_task(client.run())
 
     # Autostart, jeśli nic nie działa — wystartuje na domyślnym,
     # ALE wybranie urządzenia przez /start przełączy strumień.
-    if not _run_audio:
+    # stan i start w puli wątków: w trybie procesu to zapytania IPC, które nie mogą blokować pętli zdarzeń
+    if not await run_in_threadpool(lambda: eng.running):
         try:
-            start_audio(None, None, None)
+            await run_in_threadpool(_session_start, session_id, None, None, None)
         except Exception as e:
-            print(f"[audio] autostart fail: {e}")
+            print(f"[audio:{session_id}] autostart fail: {e}")
 
     try:
         while True:
-            await websocket.receive_text()
+            msg = await websocket.receive_text()
+            if not msg.startswith("{"):
+                continue  # keepalive "ping"
+            try:
+                data = json.loads(msg)
+            except ValueError:
+                continue
+            if isinstance(data, dict) and "subscribe" in data:
+                client.subscribe(parse_subscriptions(data["subscribe"]))
     except WebSocketDisconnect:
         pass
     finally:
-        _ws_lock.acquire()
-        if websocket in _ws_connections:
-            _ws_connections.remove(websocket)
-        _ws_lock.release()
+        eng.hub.remove(client)
+        sender.cancel()
+
+@router.websocket("/ws/analyze")
+async def analyze_audio_ws(websocket: WebSocket, proto: str = "json", batch: int = 1, wave: str = "int16",
+                           subscribe: Optional[str] = None, queue: int = 32):
+    await _serve_analyze_ws(DEFAULT_SESSION, websocket, proto, batch, wave, subscribe, queue)
+
+@router.websocket("/sessions/{session_id}/ws/analyze")
+async def session_analyze_ws(websocket: WebSocket, session_id: str, proto: str = "json", batch: int = 1,
+                             wave: str = "int16", subscribe: Optional[str] = None, queue: int = 32):
+    await _serve_analyze_ws(session_id, websocket, proto, batch, wave, subscribe, queue)
+
+# =============================
+# WebSocket: akompaniament na żywo (partie akompaniamentu partytury w tempie ucznia)
+#  - pierwsza wiadomość: JSON z formatem (s16le mono, samplerate, block, lookahead),
+#    potem bloki PCM binarnie, co ~1 s JSON {"status": ...}, na końcu {"done": true}
+#  - klient może wysłać {"seek": ćwierćnuty}; sterowanie idzie z ramek analizy sesji
+#    (tempo, aktywność, pozycja ze śledzenia partytury – POST /score_follow)
+# =============================
+_live_metrics: Dict[str, LiveMetrics] = {}
+
+async def _serve_accompaniment_ws(session_id: str, websocket: WebSocket, url: str, parts: Optional[str],
+                                  transpose: int, sr: int, block_ms: int, lookahead_ms: int, start: float,
+                                  wait: bool):
+    await websocket.accept()
+    try:
+        if not 10 <= block_ms <= 100 or not block_ms <= lookahead_ms <= 1000 or not 8000 <= sr <= 96000:
+            raise ValueError("block_ms 10..100, lookahead_ms block_ms..1000, sr 8000..96000")
+        selected = [int(p) for p in parts.split(",") if p.strip()] if parts else None
+        table = await run_in_threadpool(score_cache.get, score_path(url))
+        block = int(sr * block_ms / 1000)
+        eng = _engine(session_id)
+        await run_in_threadpool(eng.status)   # świeży status (RemoteEngine: IPC poza pętlą zdarzeń)
+        control = LiveControl(eng.analysis_latency or 0.0)
+        acc = LiveAccompanist(table, selected, max(-24, min(24, transpose)), sr, block, start, control, wait)
+    except HTTPException as e:
+        await websocket.send_text(json.dumps({"error": e.detail}))
+        await websocket.close(code=1008)
+        return
+    except Exception as e:   # zły parametr, partia poza zakresem, nieczytelna partytura
+        await websocket.send_text(json.dumps({"error": str(e)}))
+        await websocket.close(code=1008)
+        return
+
+    lookahead = max(1, round(lookahead_ms / block_ms))
+    metrics = _live_metrics.setdefault(session_id, LiveMetrics())
+    await websocket.send_text(json.dumps({
+        "format": "s16le", "channels": 1, "samplerate": sr, "block": block, "lookahead_blocks": lookahead,
+        "parts": acc.parts, "start_beat": acc.beat,
+    }))
+
+    async def receive():
+        while True:
+            msg = await websocket.receive_text()
+            if not msg.startswith("{"):
+                continue  # keepalive "ping"
+            try:
+                data = json.loads(msg)
+            except ValueError:
+                continue
+            if isinstance(data, dict) and "seek" in data:
+                acc.seek(float(data["seek"]))
+
+    eng.add_sink(control)
+    metrics.streams += 1
+    producer = asyncio.create_task(stream_blocks(acc, websocket.send_bytes, websocket.send_text, metrics, lookahead))
+    receiver = asyncio.create_task(receive())
+    try:
+        done, _ = await asyncio.wait({producer, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        if producer in done and producer.exception() is None:
+            await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        eng.remove_sink(control)
+        metrics.streams -= 1
+        producer.cancel()
+        receiver.cancel()
+
+@router.websocket("/ws/accompaniment")
+async def accompaniment_ws(websocket: WebSocket, url: str, parts: Optional[str] = None, transpose: int = 0,
+                           sr: int = 44100, block_ms: int = BLOCK_MS, lookahead_ms: int = LOOKAHEAD_MS,
+                           start: float = 0.0, wait: bool = True):
+    await _serve_accompaniment_ws(DEFAULT_SESSION, websocket, url, parts, transpose, sr, block_ms, lookahead_ms,
+                                  start, wait)
+
+@router.websocket("/sessions/{session_id}/ws/accompaniment")
+async def session_accompaniment_ws(websocket: WebSocket, session_id: str, url: str, parts: Optional[str] = None,
+                                   transpose: int = 0, sr: int = 44100, block_ms: int = BLOCK_MS,
+                                   lookahead_ms: int = LOOKAHEAD_MS, start: float = 0.0, wait: bool = True):
+    await _serve_accompaniment_ws(session_id, websocket, url, parts, transpose, sr, block_ms, lookahead_ms,
+                                  start, wait)
+
+@router.get("/clients")
+def ws_clients():
+    """Podgląd klientów WS: subskrypcje, głębokość kolejki (lag), wysłane/odrzucone ramki."""
+    return _existing(DEFAULT_SESSION).hub.stats()
+
+@router.get("/sessions/{session_id}/clients")
+def session_clients(session_id: str):
+    return _existing(session_id).hub.stats()
+
+# =============================
+# Metryki pipeline'u w formacie Prometheusa: histogramy etapów hopa i opóźnienia
+# przechwycenie -> wysyłka, liczniki bufora wejścia, kolejki i ramki WS
+# =============================
+@router.get("/metrics", response_class=PlainTextResponse)
+def audio_metrics():
+    snaps = [(sid, dict(snap, accomp=_live_metrics[sid].snapshot()) if sid in _live_metrics else snap)
+             for sid, snap in _sessions.metrics()]
+    return PlainTextResponse(render_prometheus(snaps), media_type=PROMETHEUS_CONTENT_TYPE)
+
+# =============================
+# REST: śledzenie partytury (pozycje idą strumieniem "score" WS analizy).
+# Przy wejściu wielokanałowym channel wybiera kanał, który śledzi daną partię
+# (np. skrzypce na kanale 0 -> partia 0, kontrabas na kanale 1 -> partia 1).
+# =============================
+def _follow(session_id: str, url: str, part: int, position: int, channel: int = 0) -> dict:
+    path = score_path(url)
+    eng = _engine(session_id)
+    if not 0 <= channel < eng.channels:
+        raise HTTPException(status_code=404, detail=f"Brak kanału {channel}")
+    try:
+        return eng.follow_score(path, part, position, channel)
+    except (IndexError, KeyError):
+        raise HTTPException(status_code=404, detail=f"Brak partii {part}")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except (HTTPException, SessionBusyError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Nie udało się przygotować partytury: {e}")
+
+def _unfollow(session_id: str, channel: Optional[int]) -> dict:
+    eng = _existing(session_id)
+    if channel is not None and not 0 <= channel < eng.channels:
+        raise HTTPException(status_code=404, detail=f"Brak kanału {channel}")
+    return eng.stop_following(channel)
+
+@router.get("/score_follow")
+def score_follow_status():
+    return _existing(DEFAULT_SESSION).follow_status()
+
+@router.post("/score_follow")
+def score_follow(url: str, part: int = 0, position: int = Query(0, ge=0), channel: int = 0):
+    return _follow(DEFAULT_SESSION, url, part, position, channel)
+
+@router.delete("/score_follow")
+def score_unfollow(channel: Optional[int] = None):
+    return _unfollow(DEFAULT_SESSION, channel)
+
+@router.get("/sessions/{session_id}/score_follow")
+def session_score_follow_status(session_id: str):
+    return _existing(session_id).follow_status()
+
+@router.post("/sessions/{session_id}/score_follow")
+def session_score_follow(session_id: str, url: str, part: int = 0, position: int = Query(0, ge=0),
+                         channel: int = 0):
+    return _follow(session_id, url, part, position, channel)
+
+@router.delete("/sessions/{session_id}/score_follow")
+def session_score_unfollow(session_id: str, channel: Optional[int] = None):
+    return _unfollow(session_id, channel)
+
+# =============================
+# REST: nagrywanie sesji (audio + ramki analizy; odczyt: /api/recordings)
+# =============================
+def _record(session_id: str, fmt: str) -> dict:
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=422, detail=f"format: {', '.join(FORMATS)}")
+    try:
+        return _engine(session_id).start_recording(RECORDINGS_DIR, fmt)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/record")
+def record_status():
+    return _existing(DEFAULT_SESSION).recording_status()
+
+@router.post("/record")
+def record_start(format: str = "flac"):
+    return _record(DEFAULT_SESSION, format)
+
+@router.delete("/record")
+def record_stop():
+    return _existing(DEFAULT_SESSION).stop_recording()
+
+@router.get("/sessions/{session_id}/record")
+def session_record_status(session_id: str):
+    return _existing(session_id).recording_status()
+
+@router.post("/sessions/{session_id}/record")
+def session_record_start(session_id: str, format: str = "flac"):
+    return _record(session_id, format)
+
+@router.delete("/sessions/{session_id}/record")
+def session_record_stop(session_id: str):
+    return _existing(session_id).stop_recording()
+
+# =============================
+# REST: zasilanie historii ćwiczeń (zapytania: /api/history)
+# =============================
+_history_store: Optional[HistoryStore] = None
+
+def _history(session_id: str, student: Optional[str], piece: Optional[str]) -> dict:
+    global _history_store
+    if _history_store is None:
+        _history_store = HistoryStore()
+    try:
+        return _engine(session_id).start_history(_history_store, student, piece)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.get("/history")
+def history_status():
+    return _existing(DEFAULT_SESSION).history_status()
+
+@router.post("/history")
+def history_start(student: Optional[str] = None, piece: Optional[str] = None):
+    return _history(DEFAULT_SESSION, student, piece)
+
+@router.delete("/history")
+def history_stop():
+    return _existing(DEFAULT_SESSION).stop_history()
+
+@router.get("/sessions/{session_id}/history")
+def session_history_status(session_id: str):
+    return _existing(session_id).history_status()
+
+@router.post("/sessions/{session_id}/history")
+def session_history_start(session_id: str, student: Optional[str] = None, piece: Optional[str] = None):
+    return _history(session_id, student, piece)
+
+@router.delete("/sessions/{session_id}/history")
+def session_history_stop(session_id: str):
+    return _existing(session_id).stop_history()
 
 # =============================
 # REST: konfiguracja redukcji szumów
 # =============================
 @router.get("/noise_config", response_model=NoiseConfig)
 def get_noise_config():
-    with _cfg_lock:
-        return _noise_cfg
+    return _existing(DEFAULT_SESSION).noise_config
 
 @router.post("/noise_config", response_model=NoiseConfig)
 def set_noise_config(cfg: NoiseConfig):
-    global _noise_cfg
-    with _cfg_lock:
-        _noise_cfg = cfg
-    _update_hpf_alpha(SAMPLERATE)
-    return _noise_cfg
+    return _engine(DEFAULT_SESSION).set_noise_config(cfg)
 
 @router.post("/noise_calibrate")
 def noise_calibrate(seconds: float = 1.0):
-    _start_calibration(max(0.25, min(5.0, seconds)))
+    _engine(DEFAULT_SESSION).start_calibration(max(0.25, min(5.0, seconds)))
     return {"status": "calibrating", "seconds": seconds}
+
+@router.get("/noise_profile")
+def noise_profile():
+    """Profil szumu (dBFS na prążek) z ostatniej kalibracji – używany przez odejmowanie widmowe."""
+    return _existing(DEFAULT_SESSION).noise_profile()
+
+@router.get("/sessions/{session_id}/noise_config", response_model=NoiseConfig)
+def session_get_noise_config(session_id: str):
+    return _existing(session_id).noise_config
+
+@router.post("/sessions/{session_id}/noise_config", response_model=NoiseConfig)
+def session_set_noise_config(session_id: str, cfg: NoiseConfig):
+    return _engine(session_id).set_noise_config(cfg)
+
+@router.post("/sessions/{session_id}/noise_calibrate")
+def session_noise_calibrate(session_id: str, seconds: float = 1.0):
+    _engine(session_id).start_calibration(max(0.25, min(5.0, seconds)))
+    return {"status": "calibrating", "seconds": seconds}
+
+@router.get("/sessions/{session_id}/noise_profile")
+def session_noise_profile(session_id: str):
+    return _existing(session_id).noise_profile()
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Query
+from typing import Literal, Optional
+
+from ..services.history import HISTORY_DIR, HistoryStore
+
+router = APIRouter()
+
+# =============================
+# Historia ćwiczeń (POST /api/audio/history): partycje i agregaty
+# liczone wektorowo po kolumnach mapowanych w pamięci.
+# Filtry: since/until (YYYY-MM-DD, UTC, włącznie), session, student, piece.
+# =============================
+_store = HistoryStore(HISTORY_DIR)
+DAY = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$")
+
+@router.get("/partitions")
+def partitions(since: Optional[str] = DAY, until: Optional[str] = DAY):
+    return _store.partitions(since, until)
+
+@router.get("/intonation")
+def intonation(since: Optional[str] = DAY, until: Optional[str] = DAY, session: Optional[str] = None,
+               student: Optional[str] = None, piece: Optional[str] = None,
+               by: Optional[Literal["note", "piece", "student", "day", "session"]] = None,
+               bin_cents: float = Query(5.0, ge=0.5, le=25.0), tolerance: float = Query(10.0, ge=0.0, le=50.0)):
+    """Histogram odchyleń w centach i odsetek czasu w stroju (|c| <= tolerance)."""
+    return _store.intonation(since, until, session, student, piece, by, bin_cents, tolerance)
+
+@router.get("/tempo")
+def tempo(since: Optional[str] = DAY, until: Optional[str] = DAY, session: Optional[str] = None,
+          student: Optional[str] = None, piece: Optional[str] = None,
+          by: Optional[Literal["piece", "student", "day", "session"]] = None):
+    """Stabilność tempa: średnie bpm, odchylenie i współczynnik zmienności."""
+    return _store.tempo(since, until, session, student, piece, by)
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import Response
+from typing import Optional
+
+from ..services.recorder import RECORDINGS_DIR, RecordingNotFoundError, RecordingStore
+
+router = APIRouter()
+
+# =============================
+# Nagrania sesji (POST /api/audio/record): lista, metadane i odczyt fragmentu
+# po czasie – z pliku czytany jest tylko żądany zakres (seek / memmap)
+# =============================
+_store = RecordingStore(RECORDINGS_DIR)
+MAX_RANGE_S = 600.0
+
+def _range(start: float, end: Optional[float]) -> Optional[float]:
+    if end is not None and end < start:
+        raise HTTPException(status_code=422, detail="end < start")
+    return min(end, start + MAX_RANGE_S) if end is not None else start + MAX_RANGE_S
+
+@router.get("")
+def list_recordings():
+    return _store.list()
+
+@router.get("/{rec_id}")
+def recording_meta(rec_id: str):
+    try:
+        return _store.meta(rec_id)
+    except RecordingNotFoundError:
+        raise HTTPException(status_code=404, detail="Brak nagrania")
+
+@router.get("/{rec_id}/frames")
+def recording_frames(rec_id: str, start: float = Query(0.0, ge=0.0), end: Optional[float] = Query(None, ge=0.0)):
+    """Ramki analizy (t, pitch_hz, cents, db, onset, gated) z przedziału [start, end) sekund."""
+    try:
+        return _store.read_frames(rec_id, start, _range(start, end))
+    except RecordingNotFoundError:
+        raise HTTPException(status_code=404, detail="Brak nagrania")
+
+@router.get("/{rec_id}/audio")
+def recording_audio(rec_id: str, start: float = Query(0.0, ge=0.0), end: Optional[float] = Query(None, ge=0.0)):
+    """Fragment audio [start, end) jako WAV 16 bit (najwyżej MAX_RANGE_S sekund)."""
+    try:
+        data = _store.read_audio_wav(rec_id, start, _range(start, end))
+    except RecordingNotFoundError:
+        raise HTTPException(status_code=404, detail="Brak nagrania")
+    return Response(content=data, media_type="audio/wav")
@@ -1,24 +1,174 @@
-from fastapi import APIRouter, File, UploadFile
+from fastapi import APIRouter, File, HTTPException, Query, UploadFile
+from typing import Optional
 import os
-import uuid
+import tempfile
+import zipfile
+
+from ..services.score_cache import score_cache
+from ..services.score_catalog import ScoreCatalog, SORT_KEYS, directory_files, ingest_files, scan_store, zip_files
+from ..services.score_store import CHUNK_SIZE, ScoreStore, ScoreTooLargeError
 
 router = APIRouter()
 
 UPLOAD_DIR = "backend/data/scores"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+_store = ScoreStore(UPLOAD_DIR)
+_catalog = ScoreCatalog(_store)
+IMPORT_MAX_BYTES = int(float(os.environ.get("VIOLIN_IMPORT_MAX_MB", "512")) * 1024 * 1024)
+# import z katalogu serwera tylko spod tego katalogu; bez niego import katalogów jest wyłączony
+# (inaczej każdy plik .xml/.mid na serwerze dałoby się pobrać przez /media/scores)
+IMPORT_ROOT = os.environ.get("VIOLIN_IMPORT_ROOT", "")
 
 @router.post("/upload")
 async def upload_score(file: UploadFile = File(...)):
     """
     Odbiera plik MusicXML lub MXL, zapisuje go i zwraca URL do pobrania.
     OSMD potrafi wczytać zarówno .xml/.musicxml, jak i .mxl (Compressed MusicXML).
+    Zapis strumieniowy i adresowany treścią: ta sama treść -> ten sam URL
+    (duplicate=true) i gotowa tabela nut (cached=true). Nowa treść trafia do katalogu
+    w tle – pierwszy upload uruchamia pulę procesów importu (VIOLIN_IMPORT_WORKERS).
+    """
+    incoming = _store.begin(file.filename or "score.musicxml")
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            incoming.write(chunk)
+        name, digest, duplicate = incoming.commit()
+    except ScoreTooLargeError as e:
+        incoming.abort()
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        incoming.abort()
+        raise
+
+    save_path = os.path.join(UPLOAD_DIR, name)
+    score_cache.remember(save_path, digest)
+    _catalog.index_async(name, digest, file.filename or name)
+    url = f"/media/scores/{name}"
+    return {"url": url, "hash": digest, "size": incoming.size, "duplicate": duplicate,
+            "cached": score_cache.cached(save_path)}
+
+def score_path(url: str) -> str:
+    """URL z /upload (/media/scores/<plik>) -> ścieżka na dysku; tylko katalog uploadów."""
+    name = os.path.basename(url.split("?", 1)[0])
+    path = os.path.join(UPLOAD_DIR, name)
+    if not name or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Nie znaleziono partytury")
+    return path
+
+@router.get("/timeline")
+def score_timeline(url: str, timeline: bool = True):
+    """
+    Metadane partytury + kolumnowa tabela nut każdej partii
+    (onset w ćwierćnutach i sekundach, długość, MIDI, takt, ligatury).
+    Pierwsze wywołanie dla danej treści kompiluje partyturę, kolejne idą z cache.
+    Kody ligatur: 0 brak, 1 start, 2 continue, 3 stop.
+    """
+    path = score_path(url)
+    try:
+        table = score_cache.get(path)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Nie udało się sparsować partytury: {e}")
+    out = {"hash": table.hash, **table.meta}
+    if timeline:
+        out.update(table.timeline())
+    return out
+
+@router.get("/cache")
+def score_cache_stats():
+    return score_cache.stats()
+
+# =============================
+# Katalog biblioteki: import hurtowy (zip / katalog) w tle + wyszukiwanie po indeksie
+# =============================
+@router.post("/import")
+async def import_library(file: Optional[UploadFile] = File(None), directory: Optional[str] = None,
+                         reindex: bool = False):
+    """
+    Import wielu partytur: archiwum zip (multipart `file`) albo katalog na serwerze (`directory`,
+    rekurencyjnie; względny albo bezwzględny, zawsze wewnątrz VIOLIN_IMPORT_ROOT). Pliki trafiają
+    do magazynu (duplikaty treści = jeden plik), nowe treści są parsowane w puli procesów.
+    Zwraca zadanie – postęp w GET /import/{id}.
     """
-    filename = file.filename or "score.musicxml"
-    name, ext = os.path.splitext(filename)
-    unique_name = f"{name}_{uuid.uuid4().hex}{ext}"
-    save_path = os.path.join(UPLOAD_DIR, unique_name)
-    with open(save_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
-    url = f"/media/scores/{unique_name}"
-    return {"url": url}
+    if (file is None) == (directory is None):
+        raise HTTPException(status_code=422, detail="Podaj plik zip albo katalog")
+    if directory is not None:
+        if not IMPORT_ROOT:
+            raise HTTPException(status_code=403, detail="Import katalogu wyłączony (ustaw VIOLIN_IMPORT_ROOT)")
+        allowed = os.path.realpath(IMPORT_ROOT)
+        root = os.path.realpath(os.path.join(allowed, directory))
+        if os.path.commonpath([root, allowed]) != allowed:
+            raise HTTPException(status_code=403, detail="Katalog poza VIOLIN_IMPORT_ROOT")
+        if not os.path.isdir(root):
+            raise HTTPException(status_code=404, detail="Nie znaleziono katalogu")
+        job = _catalog.start_import(ingest_files(_store, directory_files(root)), directory, reindex)
+        return job.status()
+
+    fd, tmp = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".import-", suffix=".zip")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > IMPORT_MAX_BYTES:
+                    raise HTTPException(status_code=413,
+                                        detail=f"archiwum większe niż {IMPORT_MAX_BYTES / (1024 * 1024):g} MB")
+                f.write(chunk)
+        if not zipfile.is_zipfile(tmp):
+            raise HTTPException(status_code=422, detail="To nie jest archiwum zip")
+    except BaseException:
+        os.remove(tmp)
+        raise
+    job = _catalog.start_import(ingest_files(_store, zip_files(tmp)), file.filename or "import.zip", reindex,
+                                cleanup=lambda: os.remove(tmp))
+    return job.status()
+
+@router.get("/import")
+def import_jobs():
+    return {"jobs": [job.status() for job in reversed(_catalog.jobs.values())]}
+
+@router.get("/import/{job_id}")
+def import_status(job_id: str):
+    job = _catalog.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Nie ma takiego importu")
+    return job.status()
+
+@router.post("/catalog/rebuild")
+def catalog_rebuild(reindex: bool = False):
+    """Indeksuje pliki już obecne w katalogu uploadów (np. sprzed katalogu)."""
+    return _catalog.start_import(scan_store(_store), UPLOAD_DIR, reindex).status()
+
+@router.get("/catalog")
+def catalog_search(q: Optional[str] = None, composer: Optional[str] = None, key: Optional[str] = None,
+                   time: Optional[str] = None, kind: Optional[str] = None,
+                   min_level: int = Query(1, ge=1, le=5), max_level: int = Query(5, ge=1, le=5),
+                   min_pitch: Optional[int] = Query(None, ge=0, le=127),
+                   max_pitch: Optional[int] = Query(None, ge=0, le=127),
+                   max_duration: Optional[float] = None, sort: str = "title",
+                   limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    """
+    Wyszukiwanie w indeksie katalogu (bez parsowania plików). q – słowa z tytułu, kompozytora,
+    nazwy pliku i partii; key np. "D major"; time np. "3/4"; min_pitch/max_pitch – skala partii
+    ucznia w MIDI (max_pitch=83: bez wychodzenia ponad I pozycję); sort: title|composer|duration|level|imported.
+    """
+    if sort not in SORT_KEYS:
+        raise HTTPException(status_code=422, detail=f"sort: {'|'.join(SORT_KEYS)}")
+    return _catalog.search(q, composer, key, time, kind, min_level, max_level, min_pitch, max_pitch,
+                           max_duration, sort, limit, offset)
+
+@router.get("/catalog/stats")
+def catalog_stats():
+    return _catalog.stats()
+
+@router.get("/catalog/{digest}")
+def catalog_entry(digest: str):
+    entry = _catalog.get(digest)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Brak partytury w katalogu")
+    return entry
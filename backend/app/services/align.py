@@ -0,0 +1,289 @@
+import math
+import warnings
+import numpy as np
+from typing import List, Optional, Tuple
+
+from .score_cache import PartTable
+from .score_follow import melody_events
+
+# =============================
+# Dopasowanie offline nagrania do partytury (po fakcie, do raportów intonacji i rytmu).
+# Wiersze: hopy ścieżki wysokości/onsetów nagrania (N), kolumny: nuty melodii partytury (M).
+#   - DTW w pasie: komórki (i, j) tylko dla j w [lo_i, lo_i + W) – pamięć O(N·W),
+#   - liczenie po antyprzekątnych: wszystkie komórki i + j = k naraz (NumPy), bo zależą
+#     tylko od przekątnych k-1 i k-2,
+#   - wieloskalowo: ścieżka z poziomu zgrubnego (hopy uśrednione 2^L razy, ok. 2 hopy
+#     na nutę; pas wokół przekątnej, gdy pełna macierz byłaby za duża) wyznacza pas poziomu
+#     2x dokładniejszego (jak FastDTW, skalowane są tylko hopy – nut jest mało).
+# Kroki: zostań na nucie (i-1, j), następna nuta (i-1, j-1; taniej przy onsecie),
+# pominięta nuta (i, j-1; kara `skip_cost`).
+# =============================
+STAY, ADVANCE, SKIP = 0, 1, 2
+MAX_COARSE_CELLS = 4_000_000   # limit komórek poziomu zgrubnego (powyżej: pas wokół przekątnej)
+COARSE_HOPS_PER_NOTE = 2       # poziom zgrubny ma co najmniej tyle hopów na nutę partytury
+
+def track_midi(pitch_hz: np.ndarray, gated: Optional[np.ndarray] = None, a4: float = 440.0) -> np.ndarray:
+    """Wysokość ścieżki jako ułamkowe MIDI; NaN = cisza/bramka."""
+    hz = np.asarray(pitch_hz, dtype=np.float64)
+    voiced = hz > 0
+    if gated is not None:
+        voiced &= ~np.asarray(gated, dtype=bool)
+    out = np.full(hz.shape, np.nan)
+    out[voiced] = 69.0 + 12.0 * np.log2(hz[voiced] / a4)
+    return out
+
+def downsample(midi: np.ndarray, onset: np.ndarray, factor: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Poziom zgrubny: mediana wysokości w blokach `factor` hopów (NaN, gdy blok w większości cichy)."""
+    if factor == 1:
+        return midi, onset
+    n = -(-midi.size // factor)
+    pad = n * factor - midi.size
+    m = np.concatenate([midi, np.full(pad, np.nan)]).reshape(n, factor)
+    o = np.concatenate([onset, np.zeros(pad, dtype=bool)]).reshape(n, factor)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # bloki bez wysokości
+        med = np.nanmedian(m, axis=1)
+    med[np.isnan(m).sum(axis=1) * 2 > factor] = np.nan
+    return med, o.any(axis=1)
+
+class BandedDTW:
+    """
+    DTW hopy × nuty w pasie o stałej szerokości W. lo (niemalejące, lo[0] = 0,
+    lo[-1] + W = M) to pierwsza nuta pasa w każdym wierszu. Koszt lokalny: odległość
+    w półtonach (błąd oktawy tańszy), przycięta do 3 i przeskalowana do [0, 1];
+    hop bez wysokości kosztuje `unvoiced_cost` przy każdej nucie.
+    """
+    def __init__(self, advance_cost: float = 0.3, onset_advance_cost: float = 0.05, skip_cost: float = 2.0,
+                 octave_cost: float = 0.5, unvoiced_cost: float = 0.3):
+        self.advance_cost = advance_cost
+        self.onset_advance_cost = onset_advance_cost
+        self.skip_cost = skip_cost
+        self.octave_cost = octave_cost
+        self.unvoiced_cost = unvoiced_cost
+
+    def local_cost(self, midi: np.ndarray, notes: np.ndarray) -> np.ndarray:
+        d = np.abs(notes - midi)
+        np.minimum(d, np.abs(d - 12.0) + self.octave_cost, out=d)
+        np.minimum(d, 3.0, out=d)
+        d *= 1.0 / 3.0
+        np.copyto(d, self.unvoiced_cost, where=np.isnan(midi))
+        return d
+
+    def run(self, midi: np.ndarray, onset: np.ndarray, notes: np.ndarray, lo: np.ndarray,
+            width: int, factor: int = 1) -> Tuple[np.ndarray, float]:
+        """
+        Zwraca ścieżkę (K, 2) par (hop, nuta) od (0, 0) do (N-1, M-1) i jej koszt.
+        Na poziomie zgrubnym (`factor` hopów w jednym) nuta krótsza od hopu jest normalna,
+        więc kara za pominięcie maleje proporcjonalnie.
+        """
+        n, m, w = midi.size, notes.size, int(width)
+        skip_cost = np.float32(self.skip_cost / factor)
+        lo = np.asarray(lo, dtype=np.int64)
+        rows = np.arange(n, dtype=np.int64)
+        # koszt lokalny całego pasa naraz: (N, W) jak D, bez macierzy N·M
+        C = self.local_cost(midi[:, None], notes[lo[:, None] + np.arange(w)]).astype(np.float32).reshape(-1)
+        # D z ramką: wiersz 0 = wirtualny wiersz -1, kolumny 0 i W+1 = poza pasem (inf)
+        stride = w + 2
+        D = np.full((n + 1, stride), np.inf, dtype=np.float32)
+        flat = D.reshape(-1)
+        step = np.zeros(n * w, dtype=np.uint8)
+        adv = np.where(onset, self.onset_advance_cost, self.advance_cost).astype(np.float32)
+
+        # komórka (i, j) na przekątnej k = i + j leży w kolumnie pasa k - s_i, s_i = i + lo_i
+        # (rośnie ściśle), więc wiersze przekątnej to spójny zakres, a indeksy płaskie to stała + k
+        s = rows + lo
+        s_prev = rows + np.r_[lo[0], lo[:-1]]
+        cur_base = (rows + 1) * stride + 1 - s         # D[i, j]
+        up_base = rows * stride + 1 - s_prev           # D[i-1, j]
+        up_cap = rows * stride + w + 1                 # kolumna W+1 wiersza i-1 (inf)
+        cell_base = rows * w - s                       # C i step
+        ks = np.arange(n + m - 1)
+        first = np.searchsorted(s + (w - 1), ks, side="left")
+        last = np.searchsorted(s, ks, side="right")
+        for k in range(n + m - 1):
+            a, b = first[k], last[k]
+            if b <= a:
+                continue
+            cur = cur_base[a:b] + k
+            up_i = up_base[a:b] + k
+            cap = up_cap[a:b]
+            up = flat[np.minimum(up_i, cap)]
+            diag = flat[np.minimum(up_i - 1, cap)]
+            diag += adv[a:b]
+            left = flat[cur - 1]
+            left += skip_cost
+            if k == 0:
+                up[0] = 0.0
+            best = np.minimum(up, diag)
+            choice = (diag < up).view(np.uint8)
+            skip = left < best
+            choice[skip] = SKIP
+            np.minimum(best, left, out=best)
+            cell = cell_base[a:b] + k
+            best += C[cell]
+            flat[cur] = best
+            step[cell] = choice
+
+        # powrót po zapisanych krokach od (N-1, M-1)
+        i, j = n - 1, m - 1
+        cost = float(D[n, j - lo[i] + 1])
+        path = []
+        while True:
+            path.append((i, j))
+            if i == 0 and j == 0:
+                break
+            st = step[i * w + j - lo[i]]
+            if st == STAY:
+                i -= 1
+            elif st == ADVANCE:
+                i -= 1
+                j -= 1
+            else:
+                j -= 1
+        return np.array(path[::-1], dtype=np.int64), cost
+
+def band_from_path(path: np.ndarray, n: int, m: int, factor: int, radius: int) -> Tuple[np.ndarray, int]:
+    """Pas dla poziomu o `factor` razy więcej hopów: zakres nut ścieżki zgrubnej ± radius (i sąsiednie wiersze)."""
+    nc = int(path[:, 0].max()) + 1
+    jmin = np.full(nc, m, dtype=np.int64)
+    jmax = np.zeros(nc, dtype=np.int64)
+    np.minimum.at(jmin, path[:, 0], path[:, 1])
+    np.maximum.at(jmax, path[:, 0], path[:, 1])
+    jmin = np.minimum(jmin, np.r_[jmin[1:], jmin[-1]])
+    jmin = np.minimum(jmin, np.r_[jmin[0], jmin[:-1]])
+    jmax = np.maximum(jmax, np.r_[jmax[1:], jmax[-1]])
+    jmax = np.maximum(jmax, np.r_[jmax[0], jmax[:-1]])
+    rows = np.minimum(np.arange(n) // factor, nc - 1)
+    lo = np.maximum(jmin[rows] - radius, 0)
+    hi = np.minimum(jmax[rows] + radius, m - 1)
+    # pas monotoniczny: lo niemalejące, hi niemalejące (tylko poszerzanie)
+    lo = np.minimum.accumulate(lo[::-1])[::-1]
+    hi = np.maximum.accumulate(hi)
+    width = int(min(m, (hi - lo).max() + 1))
+    lo = np.clip(lo, 0, m - width)
+    lo[0] = 0
+    return lo, width
+
+def diagonal_band(n: int, m: int, width: int) -> Tuple[np.ndarray, int]:
+    """Pas o szerokości `width` nut wokół prostej (0, 0) -> (N-1, M-1); oba końce zawsze w pasie."""
+    width = int(m if n == 1 else min(m, max(2, width)))
+    centre = np.arange(n) * ((m - 1) / max(1, n - 1))
+    lo = np.clip(np.round(centre - width / 2.0).astype(np.int64), 0, m - width)
+    lo[0] = 0
+    lo[-1] = m - width
+    return lo, width
+
+def multiscale_dtw(midi: np.ndarray, onset: np.ndarray, notes: np.ndarray, dtw: Optional[BandedDTW] = None,
+                   radius: int = 2, max_coarse_cells: int = MAX_COARSE_CELLS) -> Tuple[np.ndarray, float, dict]:
+    """Ścieżka DTW od poziomu zgrubnego do hopów (pas wokół ścieżki z poziomu wyżej)."""
+    dtw = dtw or BandedDTW()
+    n, m = midi.size, notes.size
+    factor = 1
+    while n // (2 * factor) >= COARSE_HOPS_PER_NOTE * m:
+        factor *= 2
+    levels = []
+    path = None
+    while True:
+        lm, lo_on = downsample(midi, onset, factor)
+        if path is None:
+            lo, width = diagonal_band(lm.size, m, max_coarse_cells // lm.size)
+        else:
+            lo, width = band_from_path(path, lm.size, m, 2, radius)
+        path, cost = dtw.run(lm, lo_on, notes, lo, width, factor)
+        levels.append({"factor": factor, "hops": int(lm.size), "width": int(width), "cells": int(lm.size * width)})
+        if factor == 1:
+            break
+        factor //= 2
+    return path, cost, {"levels": levels, "full_cells": int(n * m)}
+
+# =============================
+# Raport per nuta
+# =============================
+def note_report(path: np.ndarray, midi: np.ndarray, onset: np.ndarray, frame_s: float, events: dict,
+                in_tune_cents: float = 50.0) -> Tuple[List[dict], dict]:
+    """
+    Hop należy do ostatniej nuty, na którą ścieżka weszła w jego wierszu. Początek nuty:
+    pierwszy hop z wysokością (albo pierwszy hop nuty), koniec: ostatni hop + hop.
+    Odchylenie w centach: mediana hopów w promieniu pół tonu od nuty. Odchylenie rytmu:
+    początek względem prostej dopasowanej do (czas w partyturze -> czas w nagraniu),
+    czyli po odjęciu tempa i przesunięcia całego wykonania.
+    """
+    m = events["midi"].size
+    n = midi.size
+    owner = np.full(n, -1, dtype=np.int64)
+    owner[path[:, 0]] = path[:, 1]           # ostatni wpis wiersza wygrywa (ścieżka rosnąca)
+    starts = np.full(m, np.nan)
+    ends = np.full(m, np.nan)
+    cents = np.full(m, np.nan)
+    spread = np.full(m, np.nan)
+    voiced_frac = np.zeros(m)
+    order = np.argsort(owner, kind="stable")
+    bounds = np.searchsorted(owner[order], np.arange(m + 1))
+    for j in range(m):
+        hops = order[bounds[j]:bounds[j + 1]]
+        if hops.size == 0:
+            continue
+        vals = midi[hops]
+        voiced = ~np.isnan(vals)
+        voiced_frac[j] = voiced.mean()
+        first = hops[voiced][0] if voiced.any() else hops[0]
+        starts[j] = first * frame_s
+        ends[j] = (hops[-1] + 1) * frame_s
+        dev = (vals[voiced] - events["midi"][j]) * 100.0
+        dev = dev[np.abs(dev) <= in_tune_cents]
+        if dev.size:
+            cents[j] = float(np.median(dev))
+            spread[j] = float(np.std(dev))
+
+    score_s = events["onset_s"].astype(np.float64)
+    played = ~np.isnan(starts)
+    tempo_ratio, offset = 1.0, 0.0
+    if played.sum() >= 2 and np.ptp(score_s[played]) > 0:
+        tempo_ratio, offset = np.polyfit(score_s[played], starts[played], 1)
+    timing = starts - (tempo_ratio * score_s + offset)
+
+    def _r(v, nd):
+        return None if v is None or not math.isfinite(v) else round(float(v), nd)
+
+    notes = []
+    for j in range(m):
+        notes.append({
+            "index": j,
+            "midi": int(events["midi"][j]),
+            "measure": int(events["measure"][j]),
+            "beats": _r(events["onset_beats"][j], 3),
+            "score_s": _r(score_s[j], 3),
+            "start": _r(starts[j], 3),
+            "end": _r(ends[j], 3),
+            "cents": _r(cents[j], 1),
+            "cents_std": _r(spread[j], 1),
+            "timing_ms": _r(timing[j] * 1e3, 1),
+            "voiced": round(float(voiced_frac[j]), 2),
+            "missed": bool(not played[j] or voiced_frac[j] == 0.0),
+        })
+    ok = played & ~np.isnan(cents)
+    summary = {
+        "notes": m,
+        "missed": int(sum(n["missed"] for n in notes)),
+        "tempo_ratio": round(float(tempo_ratio), 4),
+        "offset_s": round(float(offset), 3),
+        "mean_abs_cents": _r(np.mean(np.abs(cents[ok])), 2) if ok.any() else None,
+        "mean_abs_timing_ms": _r(np.mean(np.abs(timing[played])) * 1e3, 1) if played.any() else None,
+    }
+    return notes, summary
+
+def align_track(part: PartTable, pitch_hz: np.ndarray, onset: np.ndarray, frame_s: float,
+                gated: Optional[np.ndarray] = None, radius: int = 2, dtw: Optional[BandedDTW] = None) -> dict:
+    """Dopasowuje ścieżkę nagrania (pitch/onset co hop) do melodii partii. Zwraca nuty + podsumowanie."""
+    events = melody_events(part)
+    notes_midi = events["midi"].astype(np.float64)
+    if notes_midi.size == 0:
+        raise ValueError("partia nie ma nut")
+    midi = track_midi(pitch_hz, gated)
+    if midi.size == 0:
+        raise ValueError("pusta ścieżka nagrania")
+    onset = np.asarray(onset, dtype=bool)
+    path, cost, info = multiscale_dtw(midi, onset, notes_midi, dtw, radius)
+    notes, summary = note_report(path, midi, onset, frame_s, events)
+    summary.update({"hops": int(midi.size), "frame_s": frame_s, "cost": round(cost, 3), **info})
+    return {"summary": summary, "notes": notes}
@@ -1,29 +1,27 @@
-import threading, time
 import numpy as np
-import sounddevice as sd
-from typing import Callable, Optional
-from .pitch import AubioAnalyser
+from typing import Optional
+from .lazy import lazy_import
+from .ringbuffer import AudioRingBuffer
+
+sd = lazy_import("sounddevice")  # import inicjuje PortAudio – dopiero przy pierwszym strumieniu
 
 class AudioStream:
     """
-    Prosty strumień wejścia audio z analizą na żywo.
-    Dostarcza callback(frame_info_dict) ~ co hop_size/samplerate sek.
+    Strumień wejścia audio: callback PortAudio tylko kopiuje próbki do bufora
+    kołowego, a analiza (osobny wątek) pobiera z niego okna przez read().
     """
-    def __init__(self, device: Optional[int], samplerate: int = 44100, blocksize: int = 1024, channels: int = 1):
+    def __init__(self, device: Optional[int], samplerate: int = 44100, blocksize: int = 1024,
+                 channels: int = 1, ring_seconds: float = 2.0):
         self.device = device
         self.samplerate = samplerate
         self.blocksize = blocksize
         self.channels = channels
-        self._stream = None
-        self._thread = None
-        self._stop = threading.Event()
-        self._analyser = AubioAnalyser(samplerate, blocksize)
-        self._callback: Optional[Callable[[dict], None]] = None
-        self._t0 = time.time()
-
-    def start(self, callback: Callable[[dict], None]):
-        self._callback = callback
-        self._stop.clear()
+        self.ring = AudioRingBuffer(max(blocksize * 4, int(ring_seconds * samplerate)), samplerate,
+                                    channels=channels)
+        self._stream: Optional[sd.InputStream] = None
+
+    def start(self):
+        self.ring.reset()
         self._stream = sd.InputStream(
             device=self.device,
             channels=self.channels,
@@ -35,23 +33,26 @@ class AudioStream:
         self._stream.start()
 
     def _audio_callback(self, indata, frames, time_info, status):
-        if self._stop.is_set():
-            return
-        # mono: bierz kanał 0
-        mono = indata[:, 0] if indata.ndim > 1 else indata
-        pitch_hz, note, cents, onset, bpm = self._analyser.process(mono)
-        if self._callback:
-            self._callback({
-                "t": time.time() - self._t0,
-                "pitch_hz": pitch_hz,
-                "note": note,
-                "cents": cents,
-                "onset": onset,
-                "bpm": bpm
-            })
+        # callback PortAudio: tylko kopia do bufora kołowego, żadnej analizy ani I/O
+        if status and status.input_overflow:
+            self.ring.input_overflows += 1
+        # mono: bierz kanał 0; wiele kanałów: cały blok z przeplotem (ramki × kanały)
+        if self.channels > 1:
+            self.ring.write(indata)
+        else:
+            self.ring.write(indata[:, 0] if indata.ndim > 1 else indata)
+
+    def read(self, out: np.ndarray, timeout: float = 1.0) -> bool:
+        return self.ring.read(out, timeout)
+
+    @property
+    def active(self) -> bool:
+        return self._stream is not None and bool(self._stream.active)
+
+    def stats(self) -> dict:
+        return self.ring.stats()
 
     def stop(self):
-        self._stop.set()
         try:
             if self._stream:
                 self._stream.stop()
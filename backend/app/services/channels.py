@@ -0,0 +1,139 @@
+import math
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from .dsp import PolyphaseDecimator
+from .engine import note_fields
+from .metrics import FOLLOW, ONSET, PITCH, SEGMENT, TEMPO, StageClock
+from .pitch import AubioAnalyser
+from .score_follow import OnlineDTWFollower
+from .segmenter import NoteSegmenter
+
+# =============================
+# Wejście wielokanałowe (duety, próby zespołu z jednego interfejsu):
+# filtry, poziomy i bramka liczone są w AudioEngine wektorowo na całym bloku
+# (kanały × hop), a tu każdy kanał ma własny analizator wysokości/onsetu,
+# segmentację nut i – opcjonalnie – śledzenie wybranej partii partytury.
+# Analiza kanałów może iść w puli wątków (VIOLIN_CHANNEL_WORKERS, 0 = po kolei).
+# =============================
+CHANNEL_WORKERS = int(os.environ.get("VIOLIN_CHANNEL_WORKERS", "0"))
+
+class Channel:
+    """Stan analizy jednego kanału wejścia."""
+    def __init__(self, index: int, analyser: AubioAnalyser, segmenter: NoteSegmenter,
+                 decimator: Optional[PolyphaseDecimator] = None):
+        self.index = index
+        self.analyser = analyser
+        self.segmenter = segmenter
+        self.decimator = decimator
+        self.follower: Optional[OnlineDTWFollower] = None
+        self.follow_info: Optional[dict] = None
+
+    def analyse(self, signal: np.ndarray, gated: bool):
+        # decymacja na każdym hopie (także bramkowanym) – ciągły stan filtru
+        frame = signal if self.decimator is None else self.decimator.process(signal)
+        if gated:
+            return 0.0, False, 0.0
+        pitch_hz, _, _, onset, bpm = self.analyser.process(frame)
+        return pitch_hz, onset, bpm
+
+class ChannelBank:
+    def __init__(self, channels: int, samplerate: int, hop: int, analysis_samplerate: int, analysis_hop: int,
+                 factor: int = 1, pitch_engine: Optional[str] = None, pitch_buf: int = 2048,
+                 onset_buf: int = 1024, workers: int = CHANNEL_WORKERS):
+        self.items: List[Channel] = [
+            Channel(
+                c,
+                AubioAnalyser(analysis_samplerate, analysis_hop, pitch_engine, pitch_buf=pitch_buf,
+                              onset_buf=onset_buf),
+                NoteSegmenter(hop / float(samplerate)),
+                PolyphaseDecimator(factor, blocksize=hop) if factor > 1 else None,
+            )
+            for c in range(channels)
+        ]
+        self.workers = max(0, min(int(workers), channels))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="channel") \
+            if self.workers > 1 else None
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    # ---------- routing kanał -> partia ----------
+    def follow(self, channel: int, follower: OnlineDTWFollower, info: dict):
+        ch = self.items[channel]
+        ch.follow_info = info
+        ch.follower = follower
+
+    def unfollow(self, channel: Optional[int] = None):
+        for ch in self.items if channel is None else [self.items[channel]]:
+            ch.follower = None
+            ch.follow_info = None
+
+    def routes(self) -> List[dict]:
+        return [
+            {"channel": ch.index, **ch.follow_info, "position": ch.follower.event()}
+            for ch in self.items if ch.follower is not None and ch.follow_info is not None
+        ]
+
+    # ---------- hop ----------
+    def process(self, signal: np.ndarray, gated: np.ndarray, levels: dict,
+                clock: Optional[StageClock] = None) -> List[dict]:
+        """
+        signal: (kanały × hop) po filtrach; gated: bramka każdego kanału.
+        levels: rms/db/level/gate_db jako tablice po kanałach. Zwraca ramkę każdego kanału.
+        """
+        chans = self.items
+        if self._pool is not None:
+            results = list(self._pool.map(lambda ch: ch.analyse(signal[ch.index], bool(gated[ch.index])), chans))
+        else:
+            results = [ch.analyse(signal[ch.index], bool(gated[ch.index])) for ch in chans]
+        # przy wielu kanałach cała analiza wysokości/onsetu/tempa idzie do etapu "pitch"
+        if clock is not None:
+            clock.lap(PITCH)
+            clock.lap(ONSET)
+            clock.lap(TEMPO)
+
+        notes = [ch.segmenter.update(r[0], r[1]) for ch, r in zip(chans, results)]
+        if clock is not None:
+            clock.lap(SEGMENT)
+
+        scores = []
+        for ch, (pitch_hz, onset, _) in zip(chans, results):
+            follower = ch.follower
+            if follower is None:
+                scores.append(None)
+                continue
+            midi = 69 + 12 * math.log2(pitch_hz / 440.0) if pitch_hz > 0 else 0.0
+            scores.append(follower.update(midi, onset))
+        if clock is not None:
+            clock.lap(FOLLOW)
+
+        rms, db, level, gate_db = levels["rms"], levels["db"], levels["level"], levels["gate_db"]
+        out = []
+        for ch, (pitch_hz, onset, bpm), ev, score in zip(chans, results, notes, scores):
+            c = ch.index
+            note, cents = note_fields(pitch_hz)
+            out.append({
+                "channel": c,
+                "part": ch.follow_info["part_name"] if ch.follow_info else None,
+                "pitch_hz": pitch_hz,
+                "note": note,
+                "cents": cents,
+                "onset": onset,
+                "bpm": bpm,
+                "rms": float(rms[c]),
+                "db": float(db[c]),
+                "level": float(level[c]),
+                "gated": bool(gated[c]),
+                "gate_db": float(gate_db[c]),
+                "score": score,
+                "notes": ev,
+            })
+        return out
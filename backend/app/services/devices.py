@@ -0,0 +1,53 @@
+import threading
+from typing import List, Optional
+
+from .lazy import lazy_import
+
+# =============================
+# Urządzenia wejściowe PortAudio: enumeracja odłożona do pierwszego użycia
+# i zapamiętana (query_devices potrafi trwać setki ms przy wielu interfejsach).
+# refresh=True wylicza listę ponownie (np. po podłączeniu interfejsu).
+# =============================
+sd = lazy_import("sounddevice")
+DEFAULT_SAMPLERATE = 48000
+
+_lock = threading.Lock()
+_devices: Optional[List[dict]] = None
+_default_input: Optional[int] = None
+
+def query_devices(refresh: bool = False) -> List[dict]:
+    global _devices, _default_input
+    with _lock:
+        if _devices is None or refresh:
+            _devices = [dict(dev) for dev in sd.query_devices()]
+            try:
+                idx = sd.default.device[0]
+            except (TypeError, IndexError):
+                idx = sd.default.device
+            _default_input = idx if isinstance(idx, int) and idx >= 0 else None
+        return _devices
+
+def default_input() -> Optional[int]:
+    query_devices()
+    return _default_input
+
+def device_info(device_id: Optional[int]) -> Optional[dict]:
+    """Opis urządzenia (domyślnego wejścia dla None) albo None, gdy go nie ma."""
+    devices = query_devices()
+    idx = default_input() if device_id is None else device_id
+    if idx is None or not 0 <= idx < len(devices):
+        return None
+    return devices[idx]
+
+def device_name(device_id: Optional[int]) -> Optional[str]:
+    if device_id is None:
+        return None
+    info = device_info(device_id)
+    return info["name"] if info else None
+
+def default_samplerate(device_id: Optional[int]) -> int:
+    info = device_info(device_id)
+    try:
+        return int(info.get("default_samplerate", DEFAULT_SAMPLERATE)) if info else DEFAULT_SAMPLERATE
+    except (TypeError, ValueError):
+        return DEFAULT_SAMPLERATE
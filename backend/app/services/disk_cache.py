@@ -0,0 +1,91 @@
+import os
+import threading
+import uuid
+from typing import Callable, Iterable, Optional, Tuple
+
+# =============================
+# Ograniczony cache plików na dysku (LRU po czasie ostatniego użycia).
+# Trafienie "dotyka" mtime pliku, a po każdym zapisie najdawniej używane
+# pliki są usuwane, aż suma rozmiarów zmieści się w limicie.
+# =============================
+class DiskLRU:
+    def __init__(self, root: str, max_bytes: int, pattern: Optional[Callable[[str], bool]] = None):
+        self.root = root
+        self.max_bytes = max_bytes
+        # które pliki katalogu należą do cache (domyślnie wszystkie poza tymczasowymi)
+        self._owns = pattern or (lambda name: True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def lookup(self, name: str) -> Optional[str]:
+        path = self.path(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get_or_create(self, name: str, chunks: Callable[[], Iterable[bytes]]) -> Tuple[str, bool]:
+        """
+        Zwraca (ścieżka, czy_trafienie). Przy braku zapisuje plik kawałkami
+        z generatora (pamięć nie rośnie z rozmiarem pliku) i przycina cache.
+        """
+        path = self.lookup(name)
+        if path is not None:
+            self.hits += 1
+            return path, True
+        self.misses += 1
+        path = self.path(name)
+        tmp = os.path.join(self.root, f".{name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in chunks():
+                    f.write(chunk)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.trim(keep=name)
+        return path, False
+
+    def _entries(self):
+        out = []
+        for entry in os.scandir(self.root):
+            if entry.is_file() and not entry.name.startswith(".") and self._owns(entry.name):
+                st = entry.stat()
+                out.append((st.st_mtime, st.st_size, entry.name))
+        return out
+
+    def trim(self, keep: Optional[str] = None):
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if name == keep:
+                    continue
+                try:
+                    os.remove(self.path(name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self.evicted += 1
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
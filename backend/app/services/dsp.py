@@ -0,0 +1,296 @@
+import math
+import numpy as np
+from typing import List, Optional
+
+from .lazy import lazy_import
+
+signal = lazy_import("scipy.signal")
+
+# =============================
+# Sekcje IIR w formie SOS (b0, b1, b2, a0, a1, a2)
+# =============================
+def one_pole_highpass_sos(cut_hz: float, samplerate: int) -> np.ndarray:
+    """
+    Jednobiegunowy HPF RC – ta sama charakterystyka co dawna pętla w routers/audio.py:
+    y[n] = a * (y[n-1] + x[n] - x[n-1]).
+    """
+    fc = max(1.0, float(cut_hz))
+    rc = 1.0 / (2.0 * math.pi * fc)
+    dt = 1.0 / float(samplerate)
+    a = rc / (rc + dt)
+    return np.array([[a, -a, 0.0, 1.0, -a, 0.0]], dtype=np.float64)
+
+def notch_sos(freq_hz: float, q: float, samplerate: int) -> np.ndarray:
+    """Wąski filtr wycinający (np. przydźwięk sieci 50/60 Hz)."""
+    nyq = samplerate / 2.0
+    f0 = min(max(1.0, float(freq_hz)), nyq * 0.99)
+    b, a = signal.iirnotch(f0, max(0.1, float(q)), fs=samplerate)
+    return signal.tf2sos(b, a)
+
+def lowpass_sos(cut_hz: float, samplerate: int, order: int = 2) -> np.ndarray:
+    """Butterworth LPF (domyślnie 2. rzędu = jedna sekcja)."""
+    nyq = samplerate / 2.0
+    fc = min(max(10.0, float(cut_hz)), nyq * 0.99)
+    return signal.butter(order, fc, btype="low", fs=samplerate, output="sos")
+
+def preemphasis_sos(coef: float) -> np.ndarray:
+    """Preemfaza FIR y[n] = x[n] - coef * x[n-1] zapisana jako sekcja SOS."""
+    return np.array([[1.0, -float(coef), 0.0, 1.0, 0.0, 0.0]], dtype=np.float64)
+
+# =============================
+# Łańcuch filtrów z własnym stanem
+# =============================
+class FilterChain:
+    """
+    Blokowy łańcuch sekcji IIR: każda sekcja liczona wektorowo (lfilter) na całym hopie.
+    Każdy łańcuch trzyma własny stan (zi) i prealokowane bufory, więc kilka
+    strumieni może filtrować niezależnie. Wynik process() to widok na bufor
+    wewnętrzny – ważny do następnego wywołania.
+    channels > 1: hop to tablica (kanały × próbki), filtrowana jednym lfilter na sekcję
+    (stan zi osobno dla każdego kanału).
+    """
+    def __init__(self, sections: Optional[np.ndarray], blocksize: int = 1024, channels: int = 1):
+        if sections is None or len(sections) == 0:
+            self.sos = np.zeros((0, 6), dtype=np.float64)
+        else:
+            self.sos = np.ascontiguousarray(sections, dtype=np.float64).reshape(-1, 6)
+        # lfilter na sekcję jest wyraźnie tańszy niż sosfilt (walidacja wejścia ~50 µs/wywołanie)
+        self._ba = [(sec[:3].copy(), sec[3:].copy()) for sec in self.sos]
+        self.channels = max(1, int(channels))
+        self._lead = () if self.channels == 1 else (self.channels,)
+        self._zi = [np.zeros(self._lead + (2,), dtype=np.float64) for _ in self._ba]
+        # scipy.signal ładuje się leniwie: tutaj (przy konfiguracji), a nie w pierwszym hopie analizy
+        self._lfilter = signal.lfilter if self._ba else None
+        self._work = np.zeros(self._lead + (blocksize,), dtype=np.float64)
+        self._out = np.zeros(self._lead + (blocksize,), dtype=np.float32)
+
+    @classmethod
+    def from_noise_config(cls, cfg, samplerate: int, blocksize: int = 1024, channels: int = 1) -> "FilterChain":
+        """Buduje łańcuch z NoiseConfig (kolejność: HPF -> notch -> LPF -> preemfaza)."""
+        sections: List[np.ndarray] = []
+        if cfg.enabled:
+            if cfg.hp_enabled:
+                sections.append(one_pole_highpass_sos(cfg.hp_cut_hz, samplerate))
+            if cfg.notch_enabled:
+                sections.append(notch_sos(cfg.notch_hz, cfg.notch_q, samplerate))
+            if cfg.lp_enabled:
+                sections.append(lowpass_sos(cfg.lp_cut_hz, samplerate))
+            if cfg.preemph_enabled:
+                sections.append(preemphasis_sos(cfg.preemph_coef))
+        sos = np.vstack(sections) if sections else None
+        return cls(sos, blocksize, channels)
+
+    @property
+    def enabled(self) -> bool:
+        return self.sos.shape[0] > 0
+
+    def reset(self):
+        for zi in self._zi:
+            zi.fill(0.0)
+
+    def _ensure_capacity(self, n: int):
+        if n > self._work.shape[-1]:
+            self._work = np.zeros(self._lead + (n,), dtype=np.float64)
+            self._out = np.zeros(self._lead + (n,), dtype=np.float32)
+
+    def process(self, frame: np.ndarray) -> np.ndarray:
+        if not self.enabled:
+            return frame
+        n = frame.shape[-1]
+        self._ensure_capacity(n)
+        work = self._work[..., :n]
+        np.copyto(work, frame)
+        y = work
+        for i, (b, a) in enumerate(self._ba):
+            y, self._zi[i] = self._lfilter(b, a, y, zi=self._zi[i])
+        out = self._out[..., :n]
+        np.copyto(out, y, casting="same_kind")
+        return out
+
+# =============================
+# Decymacja z filtrem antyaliasingowym (tryb analizy o niskim opóźnieniu)
+# =============================
+def decimation_factor(samplerate: int, target: int) -> int:
+    """Całkowity współczynnik dający częstotliwość najbliższą docelowej, ale nie niższą (48k->16k: 3, 44.1k->14.7k: 3)."""
+    return max(1, int(samplerate // max(1, int(target))))
+
+class PolyphaseDecimator:
+    """
+    Decymator FIR o współczynniku `factor` ze stanem między blokami (dowolna długość bloku).
+    Liczone są tylko zachowywane próbki wyjścia: każde wyjście to iloczyn skalarny
+    okna wejścia z filtrem, czyli suma `factor` faz po `taps_per_phase` współczynników –
+    koszt jak w strukturze polifazowej (taps_per_phase mnożeń na próbkę wejścia).
+    Okna są widokiem z krokiem `factor` na bufor (bez kopii), a całość jednym gemv.
+    Wynik process() to widok na bufor wewnętrzny – ważny do następnego wywołania.
+    """
+    def __init__(self, factor: int, taps_per_phase: int = 16, cutoff: float = 0.8, blocksize: int = 1024):
+        self.factor = max(1, int(factor))
+        n_taps = self.factor * max(1, int(taps_per_phase))
+        if self.factor > 1:
+            h = signal.firwin(n_taps, cutoff / self.factor, window=("kaiser", 8.0))
+        else:
+            h = np.zeros(n_taps)
+            h[0] = 1.0
+        # okno wejścia jest czytane od najstarszej próbki -> filtr odwrócony
+        self._h_rev = np.ascontiguousarray(h[::-1], dtype=np.float64)
+        self.n_taps = n_taps
+        self._hist = n_taps - 1
+        self._buf = np.zeros(self._hist + blocksize, dtype=np.float64)
+        self._out = np.zeros(blocksize // self.factor + 1, dtype=np.float32)
+        self._work = np.zeros(self._out.size, dtype=np.float64)
+        self._next = self._hist  # pozycja (w buforze) próbki, dla której liczymy następne wyjście
+
+    @property
+    def delay(self) -> float:
+        """Opóźnienie grupowe filtru w próbkach wejścia."""
+        return (self.n_taps - 1) / 2.0
+
+    def reset(self):
+        self._buf[:self._hist] = 0.0
+        self._next = self._hist
+
+    def _ensure_capacity(self, n: int):
+        if self._hist + n > self._buf.size:
+            buf = np.zeros(self._hist + n, dtype=np.float64)
+            buf[:self._hist] = self._buf[:self._hist]
+            self._buf = buf
+            self._out = np.zeros(n // self.factor + 1, dtype=np.float32)
+            self._work = np.zeros(self._out.size, dtype=np.float64)
+
+    def process(self, frame: np.ndarray) -> np.ndarray:
+        n = frame.shape[-1]
+        self._ensure_capacity(n)
+        H, D = self._hist, self.factor
+        end = H + n
+        data = self._buf[:end]
+        data[H:] = frame
+        first = self._next
+        count = 0 if first >= end else (end - 1 - first) // D + 1
+        out = self._out[:count]
+        if count:
+            s = data.strides[0]
+            windows = np.lib.stride_tricks.as_strided(data[first - H:], shape=(count, self.n_taps), strides=(D * s, s))
+            y = self._work[:count]
+            np.dot(windows, self._h_rev, out=y)
+            np.copyto(out, y, casting="same_kind")
+        # historia na następny blok: ostatnie n_taps-1 próbek
+        self._next = first + count * D - n
+        data[:H] = data[end - H:end]  # numpy sam buforuje nakładające się zakresy
+        return out
+
+# =============================
+# Bramkowanie widmowe (odejmowanie profilu szumu) z nakładaniem i dodawaniem
+# =============================
+class SpectralGate:
+    """
+    Odejmowanie widmowe na ramkach 2*hop z 50% nakładaniem: okno sqrt-Hanna przy
+    analizie i syntezie (suma kwadratów = 1, więc przy wzmocnieniu 1 sygnał wraca
+    bez zmian, opóźniony o jeden hop). Wzmocnienie na prążek:
+        g = max(floor, 1 - reduction * N / |X|),
+    z wolnym opadaniem (release) między ramkami, żeby ograniczyć „muzyczny szum”.
+    Profil N to średnie |X| ramek samego tła (learn_begin/learn_end przy kalibracji).
+    Wszystkie bufory, okno i widmo są prealokowane – process() nie alokuje.
+    Wynik process() to widok na bufor wewnętrzny – ważny do następnego wywołania.
+    """
+    EPS = 1e-12
+
+    def __init__(self, hop: int, reduction: float = 1.5, floor_db: float = -20.0, release: float = 0.5,
+                 profile: Optional[np.ndarray] = None):
+        self.hop = int(hop)
+        self.n_fft = 2 * self.hop
+        self.bins = self.n_fft // 2 + 1
+        self.reduction = float(reduction)
+        self.floor = 10.0 ** (float(floor_db) / 20.0)
+        self.release = float(release)
+        n = np.arange(self.n_fft)
+        self._win = np.sqrt(0.5 - 0.5 * np.cos(2.0 * np.pi * n / self.n_fft))  # sqrt okresowego Hanna
+        self._frame = np.zeros(self.n_fft, dtype=np.float64)
+        self._tmp = np.zeros(self.n_fft, dtype=np.float64)
+        self._spec = np.zeros(self.bins, dtype=np.complex128)
+        self._mag = np.zeros(self.bins, dtype=np.float64)
+        self._gain = np.zeros(self.bins, dtype=np.float64)
+        # części re/im widma jako widoki float64: mnożenie przez rzeczywiste wzmocnienie
+        # bez rzutowania na complex i bez buforów pośrednich ufunc
+        ri = self._spec.view(np.float64).reshape(self.bins, 2)
+        self._re, self._im = ri[:, 0], ri[:, 1]
+        self._g_prev = np.zeros(self.bins, dtype=np.float64)
+        self._noise = np.zeros(self.bins, dtype=np.float64)
+        self._noise_scaled = np.zeros(self.bins, dtype=np.float64)
+        self._tail = np.zeros(self.hop, dtype=np.float64)
+        self._sum = np.zeros(self.hop, dtype=np.float64)
+        self._out = np.zeros(self.hop, dtype=np.float32)
+        self._acc = np.zeros(self.bins, dtype=np.float64)
+        self._count = 0
+        self._learning = False
+        self.ready = False
+        if profile is not None and profile.shape == (self.bins,):
+            self.set_profile(profile)
+
+    @property
+    def delay(self) -> int:
+        """Opóźnienie wyjścia w próbkach (jeden hop)."""
+        return self.hop
+
+    @property
+    def full_scale(self) -> float:
+        """|X| prążka sinusoidy o amplitudzie 1 (odniesienie 0 dBFS dla profilu)."""
+        return float(self._win.sum()) / 2.0
+
+    @property
+    def profile(self) -> np.ndarray:
+        return self._noise.copy()
+
+    def set_profile(self, magnitude: np.ndarray):
+        np.copyto(self._noise, magnitude)
+        np.multiply(self._noise, self.reduction, out=self._noise_scaled)
+        self.ready = bool(np.any(self._noise > 0.0))
+
+    # ---------- profil szumu ----------
+    def learn_begin(self):
+        self._acc.fill(0.0)
+        self._count = 0
+        self._learning = True
+
+    def learn_end(self) -> Optional[np.ndarray]:
+        """Kończy zbieranie; ustawia i zwraca profil (None, jeśli nie było ramek)."""
+        self._learning = False
+        if self._count == 0:
+            return None
+        self.set_profile(self._acc / self._count)
+        return self.profile
+
+    # ---------- przetwarzanie ----------
+    def analyse(self, x: np.ndarray) -> np.ndarray:
+        """Przesuwa ramkę o hop, liczy |X| (i dolicza do profilu w trakcie nauki); zwraca widok |X|."""
+        h = self.hop
+        fr = self._frame
+        fr[:h] = fr[h:]
+        fr[h:] = x
+        np.multiply(fr, self._win, out=self._tmp)
+        np.fft.rfft(self._tmp, out=self._spec)
+        np.abs(self._spec, out=self._mag)
+        if self._learning:
+            self._acc += self._mag
+            self._count += 1
+        return self._mag
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        self.analyse(x)
+        g = self._gain
+        np.add(self._mag, self.EPS, out=g)
+        np.divide(self._noise_scaled, g, out=g)
+        np.subtract(1.0, g, out=g)
+        np.maximum(g, self.floor, out=g)
+        # szybki wzrost, wolne opadanie wzmocnienia
+        self._g_prev *= self.release
+        np.maximum(g, self._g_prev, out=g)
+        np.copyto(self._g_prev, g)
+        np.multiply(self._re, g, out=self._re)
+        np.multiply(self._im, g, out=self._im)
+        np.fft.irfft(self._spec, n=self.n_fft, out=self._tmp)
+        self._tmp *= self._win
+        h = self.hop
+        np.add(self._tail, self._tmp[:h], out=self._sum)
+        np.copyto(self._tail, self._tmp[h:])
+        np.copyto(self._out, self._sum, casting="same_kind")
+        return self._out
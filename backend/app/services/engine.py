@@ -0,0 +1,704 @@
+import math
+import os
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from ..models.schemas import AudioStatus, NoiseConfig
+from .audio_stream import AudioStream
+from .dsp import FilterChain, PolyphaseDecimator, SpectralGate, decimation_factor
+from .frame_codec import WAVE_POINTS
+from .metrics import (BROADCAST, FOLLOW, GATE, HPF, ONSET, PITCH, SEGMENT, SPECTRAL, TEMPO, PipelineMetrics,
+                      StageClock)
+from .pitch import PITCH_BUF, AubioAnalyser
+from .history import HistoryStore, HistoryWriter
+from .recorder import SessionRecorder
+from .score_cache import score_cache
+from .score_follow import OnlineDTWFollower
+from .segmenter import NoteSegmenter
+from .ws_hub import WsHub
+
+if TYPE_CHECKING:
+    from .channels import ChannelBank
+
+def note_fields(freq: float, a4: float = 440.0):
+    """Nazwa nuty i centy w formacie ramek WS (None dla ciszy, centy całkowite)."""
+    if freq <= 0:
+        return None, None
+    midi = 69 + 12 * math.log2(freq / a4)
+    midi_round = int(round(midi))
+    cents = int(round((midi - midi_round) * 100.0))
+    names = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+    name = f"{names[midi_round % 12]}{(midi_round // 12) - 1}"
+    return name, cents
+
+def preview_wave(samples: np.ndarray, points: int = WAVE_POINTS) -> List[float]:
+    if samples.size == 0:
+        return []
+    step = max(1, samples.size // points)
+    return samples[::step][:points].astype(float).tolist()
+
+# Tryb o niskim opóźnieniu: analiza na strumieniu zdecymowanym do ~16 kHz
+# (podstawy skrzypiec < 3.5 kHz), mniejsze okno wysokości i krótszy hop.
+DECIMATED_PITCH_BUF = 512
+
+# VIOLIN_METRICS=0 wyłącza pomiar etapów hopa (GET /api/audio/metrics zwraca wtedy tylko liczniki)
+METRICS_ENABLED = os.environ.get("VIOLIN_METRICS", "1") != "0"
+
+class SessionBusyError(RuntimeError):
+    """Brak wolnego wątku w puli sesji."""
+
+class _Calibration:
+    """
+    Kalibracja w toku: bufor poziomów i licznik ramek. start_calibration (wątek żądania)
+    podmienia cały obiekt naraz, więc pętla analizy nigdy nie widzi nowego bufora ze starym licznikiem.
+    Bufor ma kształt poziomu z pierwszego hopa (skalar albo wektor kanałów), więc liczba kanałów
+    nie musi być znana przy żądaniu kalibracji.
+    """
+    def __init__(self, frames: int):
+        self.frames = frames
+        self.db: Optional[np.ndarray] = None
+        self.n = 0
+
+    @property
+    def active(self) -> bool:
+        return self.n < self.frames
+
+    def add(self, db) -> bool:
+        """Dopisuje poziom hopa; True, gdy to była ostatnia ramka kalibracji."""
+        shape = np.shape(db)
+        if self.db is None or self.db.shape[1:] != shape:
+            # pierwszy hop albo zmiana liczby kanałów w trakcie – kalibracja od nowa
+            self.db = np.zeros((self.frames,) + shape, dtype=np.float64)
+            self.n = 0
+        self.db[self.n] = db
+        self.n += 1
+        return not self.active
+
+class AudioEngine:
+    """
+    Jedna sesja analizy: własny strumień wejścia, analizatory aubio, łańcuch
+    filtrów, konfiguracja szumów, kalibracja i zbiór subskrybentów WS.
+    Pętla analizy działa na wątku z puli SessionRegistry.
+    """
+    def __init__(self, session_id: str, noise_cfg: Optional[NoiseConfig] = None,
+                 pitch_engine: Optional[str] = None):
+        self.session_id = session_id
+        self.pitch_engine = pitch_engine  # None -> VIOLIN_PITCH_ENGINE (domyślnie aubio)
+        self.hub = WsHub()
+        # dodatkowi odbiorcy ramek (np. pierścień w pamięci współdzielonej)
+        self.sinks: List[Callable[[dict, np.ndarray], None]] = []
+        self.device: Optional[int] = None
+        self.samplerate: Optional[int] = None
+        self.hop: Optional[int] = None
+        # analiza: decimate = docelowa częstotliwość (None = pełne pasmo), window = okno wysokości
+        self.decimate: Optional[int] = None
+        self.pitch_window: Optional[int] = None
+        self.analysis_samplerate: Optional[int] = None
+        self.analysis_hop: Optional[int] = None
+        # liczba kanałów wejścia; > 1: analiza każdego kanału osobno (ChannelBank)
+        self.channels = 1
+        self.error: Optional[str] = None
+        # źródło próbek (podmieniane np. na wirtualne wejście w benchmarkach)
+        self.stream_factory: Callable[[Optional[int], int, int, int], AudioStream] = AudioStream
+        # pomiar czasu etapów hopa -> histogramy w self.metrics
+        self.metrics = PipelineMetrics()
+        self.clock: Optional[StageClock] = None
+        if METRICS_ENABLED:
+            self.clock = StageClock()
+            self.clock.observers.append(self.metrics.observe)
+
+        self._noise_cfg = noise_cfg or NoiseConfig()
+        self._cfg_lock = threading.Lock()
+        self._chain: Optional[FilterChain] = None
+        self._spectral: Optional[SpectralGate] = None
+        self._noise_profile: Optional[np.ndarray] = None  # |X| tła na prążek (z kalibracji)
+        self._analyser: Optional[AubioAnalyser] = None
+        self._decimator: Optional[PolyphaseDecimator] = None
+        self._segmenter: Optional[NoteSegmenter] = None
+        self._bank: Optional["ChannelBank"] = None
+        self._channel_floor_db: Optional[np.ndarray] = None  # tło każdego kanału z kalibracji
+        self._stream: Optional[AudioStream] = None
+
+        self._follower: Optional[OnlineDTWFollower] = None
+        self._follow_info: Optional[dict] = None
+        self._recorder: Optional[SessionRecorder] = None
+        self._history: Optional[HistoryWriter] = None
+
+        self._calib = _Calibration(0)
+
+        self._stop = threading.Event()
+        self._future: Optional[Future] = None
+        # start/stop z wielu wątków (autostart WS vs /start): jeden strumień przechwytywania naraz
+        self._run_lock = threading.RLock()
+
+    # ---------- cykl życia ----------
+    @property
+    def running(self) -> bool:
+        return self._future is not None and not self._future.done()
+
+    def prepare(self, samplerate: int, hop: int, decimate: Optional[int] = None, window: Optional[int] = None,
+                channels: int = 1):
+        """
+        Analizatory + filtr bez strumienia wejścia (np. analiza plików offline).
+        decimate: analiza na strumieniu zdecymowanym (hop zaokrąglany w górę do
+        wielokrotności współczynnika); window: okno wysokości w próbkach analizy.
+        channels > 1: process() dostaje blok (kanały × hop), każdy kanał ma własne analizatory.
+        """
+        factor = decimation_factor(samplerate, decimate) if decimate else 1
+        if factor > 1:
+            hop = -(-hop // factor) * factor
+        self.samplerate, self.hop = samplerate, hop
+        self.decimate = decimate
+        self.analysis_samplerate = int(round(samplerate / factor))
+        self.analysis_hop = hop // factor
+        self.metrics.budget = hop / float(samplerate)
+        self._decimator = PolyphaseDecimator(factor, blocksize=hop) if factor > 1 else None
+
+        pitch_buf = max(window or (PITCH_BUF if factor == 1 else DECIMATED_PITCH_BUF), self.analysis_hop)
+        # okno onsetu/tempa: ~1024 próbek pełnego pasma (potęga dwójki, co najmniej 2 hopy)
+        onset_buf = max(1 << int(round(math.log2(1024 / factor))), 2 * self.analysis_hop)
+        self._analyser = AubioAnalyser(self.analysis_samplerate, self.analysis_hop, self.pitch_engine,
+                                       pitch_buf=pitch_buf, onset_buf=onset_buf)
+        self.pitch_window = pitch_buf
+        self._segmenter = NoteSegmenter(hop / float(samplerate))
+        self.channels = max(1, int(channels))
+        self._channel_floor_db = None
+        if self._calib.active:
+            # kalibracja zamówiona przed startem / zmianą układu kanałów zbiera poziomy od nowa
+            self._calib = _Calibration(self._calib.frames)
+        if self._bank is not None:
+            self._bank.close()
+            self._bank = None
+        if self.channels > 1:
+            from .channels import ChannelBank
+            self._bank = ChannelBank(self.channels, samplerate, hop, self.analysis_samplerate, self.analysis_hop,
+                                     factor, self.pitch_engine, pitch_buf, onset_buf)
+            self._follower = None
+            self._follow_info = None
+        self._rebuild_chain()
+
+    def matches(self, device: Optional[int], samplerate: int, hop: int,
+                decimate: Optional[int] = None, window: Optional[int] = None, channels: int = 1) -> bool:
+        """Czy sesja już działa z taką konfiguracją (hop po zaokrągleniu jak w prepare)."""
+        if not self.running or self.device != device or self.samplerate != samplerate or self.decimate != decimate:
+            return False
+        if self.channels != channels:
+            return False
+        factor = decimation_factor(samplerate, decimate) if decimate else 1
+        if self.hop != -(-hop // factor) * factor:
+            return False
+        return window is None or self.pitch_window == window
+
+    def configure(self, device: Optional[int], samplerate: int, hop: int,
+                  decimate: Optional[int] = None, window: Optional[int] = None, channels: int = 1):
+        self.device = device
+        self.prepare(samplerate, hop, decimate, window, channels)
+        self._stream = self.stream_factory(device, samplerate, self.hop, self.channels)
+
+    def start(self, pool: ThreadPoolExecutor, device: Optional[int], samplerate: int, hop: int,
+              decimate: Optional[int] = None, window: Optional[int] = None, channels: int = 1):
+        with self._run_lock:
+            self.stop()
+            self.configure(device, samplerate, hop, decimate, window, channels)
+            self.error = None
+            self._stop.clear()
+            self._future = pool.submit(self._run)
+
+    def stop(self, timeout: float = 1.0):
+        with self._run_lock:
+            self.stop_recording()
+            self.stop_history()
+            self._stop.set()
+            fut = self._future
+            if fut is not None:
+                try:
+                    fut.result(timeout=timeout)
+                except Exception:
+                    pass
+            self._future = None
+
+    def _run(self):
+        stream = self._stream
+        try:
+            stream.start()
+        except Exception as e:
+            print(f"[audio:{self.session_id}] Błąd otwarcia strumienia: {e}")
+            self.error = str(e)
+            return
+
+        multi = self.channels > 1
+        # wiele kanałów: ramki × kanały jak w buforze kołowym; analiza dostaje widok (kanały × hop)
+        samples = np.zeros((self.hop, self.channels) if multi else self.hop, dtype=np.float32)
+        block = samples.T
+        ring = stream.ring
+        sr = float(self.samplerate)
+        try:
+            while not self._stop.is_set():
+                if not stream.read(samples, timeout=0.5):
+                    if not stream.active:
+                        print(f"[audio:{self.session_id}] Strumień wejściowy przestał dostarczać dane")
+                        break
+                    continue
+                # koniec hopa nagrany mniej więcej tyle temu, ile próbek czeka za nim w buforze
+                captured = time.perf_counter() - ring.backlog / sr
+                payload = self.process(block)
+                # podgląd fali, nagrywanie i historia: kanał 0 (jak ramka najwyższego poziomu)
+                mono = block[0] if multi else samples
+                self.hub.publish(payload, mono, preview_wave, captured)
+                for sink in self.sinks:
+                    sink(payload, mono)
+                clock = self.clock
+                if clock is not None:
+                    clock.lap(BROADCAST)
+                    clock.finish()
+        except Exception as e:
+            # błąd analizy kończy sesję – widoczny w statusie zamiast cichej śmierci wątku
+            print(f"[audio:{self.session_id}] Błąd pętli analizy: {e!r}")
+            self.error = str(e) or repr(e)
+        finally:
+            stream.stop()
+
+    # ---------- przetwarzanie jednego hopa ----------
+    def process(self, samples: np.ndarray) -> dict:
+        if samples.ndim == 2:
+            return self._process_channels(samples)
+        clock = self.clock
+        if clock is not None:
+            clock.start()
+        nr = self._apply_noise_processing(samples, clock)
+        # po odejmowaniu widmowym analiza dostaje sygnał odszumiony (opóźniony o hop)
+        source = samples if nr["signal"] is None else nr["signal"]
+
+        # decymacja na każdym hopie (także bramkowanym), żeby stan filtru był ciągły;
+        # jej koszt wchodzi do etapu "pitch"
+        frame = source if self._decimator is None else self._decimator.process(source)
+
+        pitch_hz = 0.0
+        onset_flag = False
+        bpm = 0.0
+        if nr["gated"] < 0.5 and self._analyser is not None:
+            pitch_hz, _, _, onset_flag, bpm = self._analyser.process(frame, clock)
+        elif clock is not None:
+            clock.lap(PITCH)
+            clock.lap(ONSET)
+            clock.lap(TEMPO)
+
+        # zdarzenia nut (note_on/note_off) – zwykle None, lista tylko przy zmianie
+        notes = self._segmenter.update(pitch_hz, onset_flag) if self._segmenter is not None else None
+        if clock is not None:
+            clock.lap(SEGMENT)
+
+        score = None
+        follower = self._follower
+        if follower is not None:
+            midi = 69 + 12 * math.log2(pitch_hz / 440.0) if pitch_hz > 0 else 0.0
+            score = follower.update(midi, onset_flag)
+        if clock is not None:
+            clock.lap(FOLLOW)
+
+        note, cents = note_fields(pitch_hz)
+        return {
+            "pitch_hz": pitch_hz,
+            "note": note,
+            "cents": cents,
+            "onset": onset_flag,
+            "bpm": bpm,
+            "rms": nr["rms"],
+            "db": nr["db"],
+            "level": nr["level"],
+            "gated": bool(nr["gated"]),
+            "gate_db": nr["gate_db"],
+            "score": score,
+            "notes": notes,
+        }
+
+    def _process_channels(self, block: np.ndarray) -> dict:
+        """Hop wielokanałowy: ramka każdego kanału w "channels", pola najwyższego poziomu z kanału 0."""
+        clock = self.clock
+        if clock is not None:
+            clock.start()
+        nr = self._apply_noise_processing_channels(block, clock)
+        frames = self._bank.process(nr["signal"], nr["gated"], nr, clock)
+        payload = {k: v for k, v in frames[0].items() if k not in ("channel", "part")}
+        payload["channels"] = frames
+        return payload
+
+    # ---------- śledzenie partytury ----------
+    def follow_score(self, path: str, part: int = 0, position: int = 0, channel: int = 0) -> dict:
+        """Śledzi partię `part`; przy wejściu wielokanałowym – na kanale `channel` (routing kanał -> partia)."""
+        if not 0 <= channel < self.channels:
+            raise IndexError(f"brak kanału {channel}")
+        table = score_cache.get(path)
+        follower = OnlineDTWFollower.from_part(table.part(part))
+        if follower.n == 0:
+            raise ValueError(f"partia {part} nie ma nut do śledzenia")
+        if position >= follower.n:
+            raise ValueError(f"pozycja {position} poza partią ({follower.n} nut)")
+        follower.reset(position)
+        info = {
+            "hash": table.hash,
+            "title": table.meta["title"],
+            "part": part,
+            "part_name": table.parts[part].name,
+            "events": follower.n,
+        }
+        if self._bank is not None:
+            self._bank.follow(channel, follower, info)
+        else:
+            self._follow_info = info
+            self._follower = follower
+        return self.follow_status()
+
+    def stop_following(self, channel: Optional[int] = None) -> dict:
+        if self._bank is not None:
+            self._bank.unfollow(channel)
+        else:
+            self._follower = None
+            self._follow_info = None
+        return self.follow_status()
+
+    def follow_status(self) -> dict:
+        if self._bank is not None:
+            routes = self._bank.routes()
+            first = next((r for r in routes if r["channel"] == 0), None)
+            out = {"following": bool(routes), "channels": routes}
+            if first is not None:
+                out.update({k: v for k, v in first.items() if k != "channel"})
+            return out
+        follower = self._follower
+        if follower is None:
+            return {"following": False}
+        return {"following": True, **(self._follow_info or {}), "position": follower.event()}
+
+    # ---------- nagrywanie ----------
+    def start_recording(self, root: str, fmt: str = "flac") -> dict:
+        """Podpina rejestrator do działającego strumienia (audio + ramki analizy na dysk)."""
+        if self._recorder is not None:
+            return self._recorder.meta()
+        if not self.running:
+            raise RuntimeError("sesja nie przechwytuje audio")
+        rec = SessionRecorder(root, self.samplerate, self.hop, fmt, self.session_id)
+        rec.start()
+        self._recorder = rec
+        self.add_sink(rec.sink)
+        return rec.meta()
+
+    def stop_recording(self) -> dict:
+        rec = self._recorder
+        if rec is None:
+            return {"recording": False}
+        self._recorder = None
+        self.remove_sink(rec.sink)
+        return rec.stop()
+
+    def recording_status(self) -> dict:
+        rec = self._recorder
+        return rec.meta() if rec is not None else {"recording": False}
+
+    def add_sink(self, sink: Callable[[dict, np.ndarray], None]):
+        # nowa lista zamiast append: pętla _run iteruje bez zamka po poprzedniej
+        self.sinks = self.sinks + [sink]
+
+    def remove_sink(self, sink: Callable[[dict, np.ndarray], None]):
+        self.sinks = [s for s in self.sinks if s != sink]
+
+    # ---------- historia ćwiczeń ----------
+    def start_history(self, store: HistoryStore, student: Optional[str] = None, piece: Optional[str] = None) -> dict:
+        """Zasila kolumnowy magazyn historii ramkami tej sesji (uczeń/utwór jako etykiety)."""
+        if not self.running:
+            raise RuntimeError("sesja nie przechwytuje audio")
+        self.stop_history()
+        writer = store.writer(self.session_id, self.samplerate, self.hop, student, piece)
+        writer.start()
+        self._history = writer
+        self.add_sink(writer.sink)
+        return writer.status()
+
+    def stop_history(self) -> dict:
+        writer = self._history
+        if writer is None:
+            return {"feeding": False}
+        self._history = None
+        self.remove_sink(writer.sink)
+        return writer.stop()
+
+    def history_status(self) -> dict:
+        writer = self._history
+        return writer.status() if writer is not None else {"feeding": False}
+
+    # ---------- redukcja szumów ----------
+    @property
+    def noise_config(self) -> NoiseConfig:
+        with self._cfg_lock:
+            return self._noise_cfg
+
+    def set_noise_config(self, cfg: NoiseConfig) -> NoiseConfig:
+        with self._cfg_lock:
+            self._noise_cfg = cfg
+        self._rebuild_chain()
+        return cfg
+
+    def _rebuild_chain(self):
+        if self.samplerate is None:
+            return
+        with self._cfg_lock:
+            cfg = self._noise_cfg.model_copy()
+        self._chain = FilterChain.from_noise_config(cfg, self.samplerate, self.hop or 1024, self.channels)
+        # profil szumu przeżywa przebudowę, o ile nie zmienił się hop (liczba prążków)
+        self._spectral = SpectralGate(self.hop or 1024, cfg.spectral_reduction, cfg.spectral_floor_db,
+                                      profile=self._noise_profile)
+
+    def start_calibration(self, seconds: float):
+        sr = self.samplerate or 44100
+        hop = self.hop or 1024
+        frames = max(1, int((seconds * sr) / hop))
+        calib = _Calibration(frames)
+        spectral = self._spectral
+        if spectral is not None and self.channels == 1:
+            spectral.learn_begin()
+        self._calib = calib
+
+    def noise_profile(self) -> dict:
+        """Profil szumu z ostatniej kalibracji: |X| tła na prążek w dBFS."""
+        profile, spectral = self._noise_profile, self._spectral
+        if profile is None or spectral is None or self.samplerate is None:
+            return {"calibrated": False}
+        db = 20.0 * np.log10(profile / spectral.full_scale + 1e-12)
+        return {
+            "calibrated": True,
+            "n_fft": spectral.n_fft,
+            "bin_hz": self.samplerate / float(spectral.n_fft),
+            "magnitude_db": np.round(db, 2).tolist(),
+        }
+
+    def _apply_noise_processing(self, samples: np.ndarray, clock: Optional[StageClock] = None) -> dict:
+        eps = 1e-12
+        rms_pre = float(np.sqrt(np.mean(samples**2) + eps))
+        db_pre = 20.0 * math.log10(rms_pre + eps)
+
+        t_lock = time.perf_counter()
+        with self._cfg_lock:
+            cfg = self._noise_cfg
+        if clock is not None:
+            self.metrics.cfg_lock_wait.observe(time.perf_counter() - t_lock)
+
+        proc = samples
+        chain = self._chain
+        if chain is not None:
+            proc = chain.process(proc)
+        if clock is not None:
+            clock.lap(HPF)
+
+        # odejmowanie widmowe: poza kalibracją tylko z profilem i gdy włączone
+        calib = self._calib
+        calibrating = calib.active
+        spectral = self._spectral
+        denoised = None
+        if spectral is not None:
+            if cfg.enabled and cfg.spectral_enabled and spectral.ready:
+                denoised = spectral.process(proc)
+            elif calibrating:
+                spectral.analyse(proc)
+        if clock is not None:
+            clock.lap(SPECTRAL)
+
+        # poziom i kalibracja progu – na sygnale po filtrach, przed odejmowaniem widmowym
+        rms = float(np.sqrt(np.mean(proc**2) + eps))
+        db = 20.0 * math.log10(rms + eps)
+
+        if calibrating and calib.add(db):
+            floor = float(np.median(calib.db))
+            profile = spectral.learn_end() if spectral is not None else None
+            if profile is not None:
+                self._noise_profile = profile
+            with self._cfg_lock:
+                self._noise_cfg.noise_floor_db = floor
+                if self._noise_cfg.adaptive:
+                    self._noise_cfg.gate_db = floor + self._noise_cfg.margin_db
+
+        with self._cfg_lock:
+            gate_db = cfg.gate_db if not cfg.adaptive else (cfg.noise_floor_db + cfg.margin_db)
+            use_gate = cfg.enabled
+
+        level_db = db
+        threshold = gate_db
+        if denoised is not None:
+            # po odjęciu szum tła spada o ~spectral_floor_db: próg przesuwa się tak samo,
+            # więc cicha gra w prążkach ponad profilem przechodzi, a przydźwięk nie
+            level_db = 20.0 * math.log10(math.sqrt(float(np.dot(denoised, denoised)) / denoised.size + eps) + eps)
+            threshold = gate_db + cfg.spectral_floor_db
+        gated = use_gate and level_db < threshold
+        if clock is not None:
+            clock.lap(GATE)
+        return {
+            "signal": denoised,
+            "rms": rms,
+            "db": db,
+            "db_pre": db_pre,
+            "level": max(0.0, min(1.0, (db + 60.0) / 60.0)),
+            "gated": 1.0 if gated else 0.0,
+            "gate_db": gate_db
+        }
+
+    def _apply_noise_processing_channels(self, block: np.ndarray, clock: Optional[StageClock] = None) -> dict:
+        """
+        Filtry, poziomy i bramka wszystkich kanałów naraz na bloku (kanały × hop).
+        Odejmowanie widmowe działa tylko dla jednego kanału (profil szumu jest jeden).
+        Kalibracja zapisuje tło każdego kanału; próg adaptacyjny jest wtedy osobny na kanał.
+        """
+        eps = 1e-12
+        t_lock = time.perf_counter()
+        with self._cfg_lock:
+            cfg = self._noise_cfg
+        if clock is not None:
+            self.metrics.cfg_lock_wait.observe(time.perf_counter() - t_lock)
+
+        proc = block
+        chain = self._chain
+        if chain is not None:
+            proc = chain.process(proc)
+        if clock is not None:
+            clock.lap(HPF)
+            clock.lap(SPECTRAL)
+
+        n = proc.shape[-1]
+        rms = np.sqrt(np.einsum("ij,ij->i", proc, proc, dtype=np.float64) / n + eps)
+        db = 20.0 * np.log10(rms + eps)
+
+        calib = self._calib
+        if calib.active and calib.add(db):
+            floors = np.median(calib.db, axis=0)
+            self._channel_floor_db = floors
+            with self._cfg_lock:
+                self._noise_cfg.noise_floor_db = float(np.median(floors))
+                if self._noise_cfg.adaptive:
+                    self._noise_cfg.gate_db = self._noise_cfg.noise_floor_db + self._noise_cfg.margin_db
+
+        with self._cfg_lock:
+            floors = self._channel_floor_db
+            if not cfg.adaptive:
+                gate_db = np.full(db.shape, cfg.gate_db)
+            elif floors is not None:
+                gate_db = floors + cfg.margin_db
+            else:
+                gate_db = np.full(db.shape, cfg.noise_floor_db + cfg.margin_db)
+            use_gate = cfg.enabled
+
+        gated = (db < gate_db) if use_gate else np.zeros(db.shape, dtype=bool)
+        if clock is not None:
+            clock.lap(GATE)
+        return {
+            "signal": proc,
+            "rms": rms,
+            "db": db,
+            "level": np.clip((db + 60.0) / 60.0, 0.0, 1.0),
+            "gated": gated,
+            "gate_db": gate_db,
+        }
+
+    @property
+    def analysis_latency(self) -> Optional[float]:
+        """Opóźnienie algorytmiczne wysokości [s]: hop + połowa okna + opóźnienie filtru decymacji."""
+        if self.samplerate is None or self.hop is None:
+            return None
+        lat = self.hop / float(self.samplerate) + (self.pitch_window or PITCH_BUF) / 2.0 / self.analysis_samplerate
+        if self._decimator is not None:
+            lat += self._decimator.delay / float(self.samplerate)
+        spectral, cfg = self._spectral, self._noise_cfg
+        if spectral is not None and spectral.ready and cfg.enabled and cfg.spectral_enabled and self.channels == 1:
+            lat += spectral.delay / float(self.samplerate)
+        return lat
+
+    # ---------- metryki ----------
+    def metrics_snapshot(self) -> dict:
+        return {
+            "running": self.running,
+            "pipeline": self.metrics.snapshot() if self.clock is not None else None,
+            "ring": self._stream.stats() if self._stream is not None else {},
+            "ws": self.hub.metrics(),
+        }
+
+    # ---------- status ----------
+    def status(self, device_name: Optional[str] = None) -> AudioStatus:
+        running = self.running
+        stats = self._stream.stats() if self._stream is not None else {}
+        return AudioStatus(
+            running=running,
+            session_id=self.session_id,
+            device_id=self.device if running else None,
+            device_name=device_name if running else None,
+            samplerate=self.samplerate if running else None,
+            hop=self.hop if running else None,
+            analysis_samplerate=self.analysis_samplerate if running else None,
+            analysis_hop=self.analysis_hop if running else None,
+            pitch_window=self.pitch_window if running else None,
+            latency_ms=round(self.analysis_latency * 1000.0, 2) if running and self.analysis_latency else None,
+            channels=self.channels if running else None,
+            clients=len(self.hub.clients),
+            error=self.error,
+            **stats
+        )
+
+class SessionRegistry:
+    """
+    Rejestr sesji audio (np. jedna na salę ćwiczeń / urządzenie wejściowe).
+    Pętle analizy działają na wspólnej puli wątków; każda sesja zajmuje
+    jeden wątek, dopóki działa.
+    """
+    def __init__(self, max_sessions: int = 8):
+        self.max_sessions = max_sessions
+        self._pool = ThreadPoolExecutor(max_workers=max_sessions, thread_name_prefix="audio-session")
+        self._sessions: Dict[str, AudioEngine] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[AudioEngine]:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def get_or_create(self, session_id: str) -> AudioEngine:
+        with self._lock:
+            eng = self._sessions.get(session_id)
+            if eng is None:
+                eng = AudioEngine(session_id)
+                self._sessions[session_id] = eng
+            return eng
+
+    def sessions(self) -> List[AudioEngine]:
+        with self._lock:
+            return list(self._sessions.values())
+
+    def metrics(self) -> List[tuple]:
+        return [(e.session_id, e.metrics_snapshot()) for e in self.sessions()]
+
+    def start(self, session_id: str, device: Optional[int], samplerate: int, hop: int,
+              decimate: Optional[int] = None, window: Optional[int] = None, channels: int = 1) -> AudioEngine:
+        # sprawdzenie limitu i start pod jednym zamkiem – równoległe starty nie przekroczą max_sessions,
+        # a wyścig autostartu z /start z tą samą konfiguracją nie restartuje strumienia drugi raz
+        with self._lock:
+            eng = self._sessions.get(session_id)
+            if eng is None:
+                eng = AudioEngine(session_id)
+                self._sessions[session_id] = eng
+            if eng.matches(device, samplerate, hop, decimate, window, channels):
+                return eng
+            if not eng.running:
+                busy = sum(1 for e in self._sessions.values() if e.running)
+                if busy >= self.max_sessions:
+                    raise SessionBusyError(f"limit aktywnych sesji ({self.max_sessions}) osiągnięty")
+            eng.start(self._pool, device, samplerate, hop, decimate, window, channels)
+        return eng
+
+    def stop(self, session_id: str) -> Optional[AudioEngine]:
+        eng = self.get(session_id)
+        if eng is not None:
+            eng.stop()
+        return eng
+
+    def remove(self, session_id: str):
+        with self._lock:
+            eng = self._sessions.pop(session_id, None)
+        if eng is not None:
+            eng.stop()
@@ -0,0 +1,274 @@
+import threading
+import time
+import numpy as np
+from multiprocessing.connection import Client
+from typing import Callable, Dict, List, Optional
+
+from ..models.schemas import AudioStatus, NoiseConfig
+from .engine import SessionBusyError
+from .engine_server import engine_address, engine_authkey
+from .segmenter import NoteSegmenter
+from .shm_frames import FRAME_DTYPE, FrameRing, record_to_payload
+from .ws_hub import WsHub
+
+class EngineUnavailableError(RuntimeError):
+    """Proces silnika audio nie odpowiada."""
+
+class _Control:
+    """Kanał sterowania do procesu silnika (jedno połączenie na worker, z ponowieniem)."""
+    def __init__(self, address: tuple, authkey: Optional[bytes] = None):
+        self.address = address
+        self.authkey = authkey
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def call(self, **msg) -> dict:
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._conn is None:
+                        # klucz czytany przy każdym łączeniu: silnik po restarcie mógł wylosować nowy
+                        self._conn = Client(self.address, authkey=self.authkey or engine_authkey())
+                    self._conn.send(msg)
+                    return self._conn.recv()
+                except (OSError, EOFError, RuntimeError) as e:
+                    self._conn = None
+                    if attempt == 1:
+                        raise EngineUnavailableError(f"silnik audio niedostępny: {e}")
+        return {"ok": False}
+
+class RemoteEngine:
+    """
+    Pełnomocnik sesji działającej w procesie silnika. Ma ten sam interfejs co
+    AudioEngine, którego używa router; ramki czyta z pierścienia w pamięci
+    współdzielonej i rozsyła lokalnym klientom przez własny WsHub.
+    """
+    POLL_S = 0.005
+
+    def __init__(self, session_id: str, control: _Control):
+        self.session_id = session_id
+        self.hub = WsHub()
+        # odbiorcy ramek w tym workerze (np. akompaniament na żywo) – jak AudioEngine.sinks
+        self.sinks: List[Callable[[dict, np.ndarray], None]] = []
+        self._control = control
+        self._status: Optional[dict] = None
+        self._ring: Optional[FrameRing] = None
+        self._pump: Optional[threading.Thread] = None
+        self._closed = False
+        self.lost_frames = 0
+
+    # ---------- stan z procesu silnika ----------
+    def _apply(self, reply: dict) -> dict:
+        if not reply.get("ok"):
+            if reply.get("busy"):
+                raise SessionBusyError(reply.get("error"))
+            raise RuntimeError(reply.get("error") or "błąd silnika audio")
+        if "status" in reply:
+            self._status = reply["status"]
+            self._ensure_pump()
+        return reply
+
+    def refresh(self) -> dict:
+        return self._apply(self._control.call(cmd="status", session=self.session_id))["status"]
+
+    @property
+    def running(self) -> bool:
+        return bool(self.refresh().get("running"))
+
+    @property
+    def analysis_latency(self) -> Optional[float]:
+        """Opóźnienie analizy [s] z ostatniego statusu procesu silnika (bez zapytania IPC)."""
+        ms = (self._status or {}).get("latency_ms")
+        return ms / 1000.0 if ms else None
+
+    @property
+    def device(self) -> Optional[int]:
+        return (self._status or {}).get("device_id")
+
+    @property
+    def samplerate(self) -> Optional[int]:
+        return (self._status or {}).get("samplerate")
+
+    @property
+    def hop(self) -> Optional[int]:
+        return (self._status or {}).get("hop")
+
+    def status(self, device_name: Optional[str] = None) -> AudioStatus:
+        st = dict(self.refresh())
+        st.pop("ring", None)
+        st["clients"] = len(self.hub.clients)
+        return AudioStatus(**st)
+
+    # pierścień ramek w pamięci współdzielonej ma układ jednego kanału
+    channels = 1
+
+    def matches(self, device: Optional[int], samplerate: int, hop: int,
+                decimate: Optional[int] = None, window: Optional[int] = None, channels: int = 1) -> bool:
+        return False  # porównanie konfiguracji robi proces silnika przy "start"
+
+    def start(self, device: Optional[int], samplerate: int, hop: int,
+              decimate: Optional[int] = None, window: Optional[int] = None, channels: int = 1):
+        if channels != 1:
+            raise ValueError("silnik w osobnym procesie obsługuje jeden kanał")
+        self._apply(self._control.call(cmd="start", session=self.session_id, device=device,
+                                       samplerate=samplerate, hop=hop, decimate=decimate, window=window))
+
+    def stop(self):
+        self._apply(self._control.call(cmd="stop", session=self.session_id))
+
+    @property
+    def noise_config(self) -> NoiseConfig:
+        reply = self._apply(self._control.call(cmd="get_noise_config", session=self.session_id))
+        return NoiseConfig(**reply["noise_config"])
+
+    def set_noise_config(self, cfg: NoiseConfig) -> NoiseConfig:
+        reply = self._apply(self._control.call(cmd="set_noise_config", session=self.session_id,
+                                               noise_config=cfg.model_dump()))
+        return NoiseConfig(**reply["noise_config"])
+
+    def start_calibration(self, seconds: float):
+        self._apply(self._control.call(cmd="calibrate", session=self.session_id, seconds=seconds))
+
+    def noise_profile(self) -> dict:
+        return self._apply(self._control.call(cmd="noise_profile", session=self.session_id))["noise_profile"]
+
+    def follow_score(self, path: str, part: int = 0, position: int = 0, channel: int = 0) -> dict:
+        # ścieżka względem katalogu roboczego – silnik uruchamiany z tego samego backend/
+        return self._apply(self._control.call(cmd="follow", session=self.session_id,
+                                              path=path, part=part, position=position))["follow"]
+
+    def stop_following(self, channel: Optional[int] = None) -> dict:
+        return self._apply(self._control.call(cmd="unfollow", session=self.session_id))["follow"]
+
+    def follow_status(self) -> dict:
+        return self._apply(self._control.call(cmd="follow_status", session=self.session_id))["follow"]
+
+    def start_recording(self, root: str, fmt: str = "flac") -> dict:
+        # katalog nagrań ustala proces silnika (ten sam backend/, więc ta sama ścieżka)
+        return self._apply(self._control.call(cmd="record", session=self.session_id, format=fmt))["recording"]
+
+    def stop_recording(self) -> dict:
+        return self._apply(self._control.call(cmd="record_stop", session=self.session_id))["recording"]
+
+    def recording_status(self) -> dict:
+        return self._apply(self._control.call(cmd="record_status", session=self.session_id))["recording"]
+
+    def start_history(self, store, student: Optional[str] = None, piece: Optional[str] = None) -> dict:
+        # zapis robi proces silnika do swojego HistoryStore (ten sam katalog)
+        return self._apply(self._control.call(cmd="history", session=self.session_id,
+                                              student=student, piece=piece))["history"]
+
+    def stop_history(self) -> dict:
+        return self._apply(self._control.call(cmd="history_stop", session=self.session_id))["history"]
+
+    def history_status(self) -> dict:
+        return self._apply(self._control.call(cmd="history_status", session=self.session_id))["history"]
+
+    def metrics_snapshot(self, remote: Optional[dict] = None) -> dict:
+        """Etapy hopa i bufor wejścia z procesu silnika, kolejki WS lokalne dla tego workera."""
+        if remote is None:
+            remote = self._apply(self._control.call(cmd="metrics")).get("sessions", {}).get(self.session_id, {})
+        snap = dict(remote)
+        snap["ws"] = self.hub.metrics()
+        snap["shm_lost_frames"] = self.lost_frames
+        return snap
+
+    def add_sink(self, sink: Callable[[dict, np.ndarray], None]):
+        self.sinks = self.sinks + [sink]
+        self._ensure_pump()
+
+    def remove_sink(self, sink: Callable[[dict, np.ndarray], None]):
+        self.sinks = [s for s in self.sinks if s != sink]
+
+    # ---------- fan-out ramek z pamięci współdzielonej ----------
+    def _ensure_pump(self):
+        if self._pump is not None or self._closed or not self._status:
+            return
+        self._ring = FrameRing.attach(self._status["ring"])
+        self._pump = threading.Thread(target=self._pump_loop, name=f"shm-pump-{self.session_id}", daemon=True)
+        self._pump.start()
+
+    def _pump_loop(self):
+        ring = self._ring
+        batch = np.zeros(32, dtype=FRAME_DTYPE)
+        cursor = ring.write_seq
+        # zdarzenia nut nie mieszczą się w rekordzie pierścienia – segmentacja po stronie workera
+        segmenter: Optional[NoteSegmenter] = None
+        while not self._closed:
+            got, cursor, lost = ring.read_since(cursor, batch)
+            self.lost_frames += lost
+            if got == 0:
+                time.sleep(self.POLL_S)
+                continue
+            sinks = self.sinks
+            if not self.hub.clients and not sinks:
+                segmenter = None
+                continue
+            if segmenter is None or lost:
+                sr, hop = ring.stream_info()
+                segmenter = NoteSegmenter((hop or 1024) / float(sr or 48000))
+            # czas zapisu ramki w procesie silnika (zegar ścienny) -> skala perf_counter
+            offset = time.perf_counter() - time.time()
+            for i in range(got):
+                rec = batch[i]
+                payload = record_to_payload(rec)
+                pitch_hz = 0.0 if payload["gated"] else payload["pitch_hz"]
+                payload["notes"] = segmenter.update(pitch_hz, payload["onset"])
+                self.hub.publish(payload, rec["wave"], captured=float(rec["t"]) + offset)
+                for sink in sinks:
+                    sink(payload, rec["wave"])
+
+    def close(self):
+        self._closed = True
+        if self._pump is not None:
+            self._pump.join(timeout=1.0)
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+
+class RemoteSessionRegistry:
+    """Odpowiednik SessionRegistry dla trybu VIOLIN_ENGINE=process."""
+    def __init__(self, address: Optional[tuple] = None, authkey: Optional[bytes] = None):
+        self._control = _Control(address or engine_address(), authkey)
+        self._sessions: Dict[str, RemoteEngine] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[RemoteEngine]:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def get_or_create(self, session_id: str) -> RemoteEngine:
+        with self._lock:
+            eng = self._sessions.get(session_id)
+            if eng is None:
+                eng = RemoteEngine(session_id, self._control)
+                self._sessions[session_id] = eng
+            return eng
+
+    def sessions(self) -> List[RemoteEngine]:
+        reply = self._control.call(cmd="list")
+        return [self.get_or_create(st["session_id"]) for st in reply.get("sessions", [])]
+
+    def metrics(self) -> List[tuple]:
+        """Jedno zapytanie do silnika o metryki wszystkich sesji."""
+        reply = self._control.call(cmd="metrics")
+        return [(sid, self.get_or_create(sid).metrics_snapshot(snap))
+                for sid, snap in reply.get("sessions", {}).items()]
+
+    def start(self, session_id: str, device: Optional[int], samplerate: int, hop: int,
+              decimate: Optional[int] = None, window: Optional[int] = None, channels: int = 1) -> RemoteEngine:
+        eng = self.get_or_create(session_id)
+        eng.start(device, samplerate, hop, decimate, window, channels)
+        return eng
+
+    def stop(self, session_id: str) -> Optional[RemoteEngine]:
+        eng = self.get_or_create(session_id)
+        eng.stop()
+        return eng
+
+    def remove(self, session_id: str):
+        with self._lock:
+            eng = self._sessions.pop(session_id, None)
+        if eng is not None:
+            eng.close()
+        self._control.call(cmd="remove", session=session_id)
@@ -0,0 +1,222 @@
+"""
+Osobny proces silnika audio: przechwytywanie + analiza dla wszystkich sesji.
+Ramki trafiają do pierścieni w pamięci współdzielonej (po jednym na sesję),
+a sterowanie (start/stop/status/szumy) idzie małym kanałem
+multiprocessing.connection. Dowolna liczba workerów uvicorn może się
+podłączyć i rozsyłać ramki swoim klientom WS.
+
+Uruchomienie (z katalogu backend/):
+    python -m app.services.engine_server
+    VIOLIN_ENGINE=process uvicorn app.main:app --workers 4
+"""
+import hashlib
+import os
+import re
+import secrets
+import signal
+import sys
+import threading
+from multiprocessing.connection import Listener
+from typing import Dict, Optional
+
+from ..models.schemas import NoiseConfig
+from . import devices
+from .engine import AudioEngine, SessionBusyError, SessionRegistry
+from .history import HistoryStore
+from .recorder import RECORDINGS_DIR
+from .shm_frames import FrameRing
+from .warmup import STEPS, WARMUP_ENABLED, WarmUp
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+RING_CAPACITY = 256  # ~5 s ramek przy hop 1024 @ 48 kHz
+
+def engine_address() -> tuple:
+    host, _, port = os.environ.get("VIOLIN_ENGINE_ADDR", DEFAULT_ADDRESS).rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+# Kanał sterowania (multiprocessing.connection) odpakowuje pickle – klucz nie może mieć
+# publicznej wartości domyślnej. Bez VIOLIN_ENGINE_KEY proces silnika losuje klucz i zapisuje
+# go w pliku tylko dla właściciela, a workery API czytają go przy łączeniu.
+KEY_FILE = os.environ.get("VIOLIN_ENGINE_KEY_FILE", os.path.expanduser("~/.violin-engine.key"))
+
+def engine_authkey() -> bytes:
+    """Klucz dla workerów API: VIOLIN_ENGINE_KEY albo plik zapisany przez proces silnika."""
+    key = os.environ.get("VIOLIN_ENGINE_KEY", "").encode()
+    if not key:
+        try:
+            with open(KEY_FILE, "rb") as f:
+                key = f.read().strip()
+        except OSError:
+            key = b""
+    if not key:
+        raise RuntimeError(f"brak klucza silnika audio: ustaw VIOLIN_ENGINE_KEY albo uruchom "
+                           f"app.services.engine_server (zapisuje {KEY_FILE})")
+    return key
+
+def server_authkey() -> bytes:
+    """Klucz procesu silnika: VIOLIN_ENGINE_KEY albo nowy losowy, zapisany do KEY_FILE z prawami 0600."""
+    key = os.environ.get("VIOLIN_ENGINE_KEY", "").encode()
+    if key:
+        return key
+    key = secrets.token_hex(32).encode()
+    tmp = f"{KEY_FILE}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    os.replace(tmp, KEY_FILE)
+    return key
+
+def ring_name(session_id: str) -> str:
+    # skrót surowego id: "a-b" i "a_b" po oczyszczeniu to różne pierścienie
+    safe = re.sub(r"[^A-Za-z0-9_]", "_", session_id)[:32]
+    digest = hashlib.sha1(session_id.encode()).hexdigest()[:10]
+    return f"violin_{safe}_{digest}"
+
+class EngineServer:
+    def __init__(self, max_sessions: int = 8):
+        self.registry = SessionRegistry(max_sessions)
+        self._rings: Dict[str, FrameRing] = {}
+        self._lock = threading.Lock()
+        self._history: Optional[HistoryStore] = None
+
+    def _engine(self, session_id: str) -> AudioEngine:
+        eng = self.registry.get_or_create(session_id)
+        with self._lock:
+            if session_id not in self._rings:
+                self._rings[session_id] = FrameRing.create(ring_name(session_id), RING_CAPACITY)
+        return eng
+
+    def _status(self, eng: AudioEngine) -> dict:
+        name = None
+        if eng.device is not None:
+            try:
+                name = devices.device_name(eng.device)
+            except Exception:
+                name = None
+        st = eng.status(name).model_dump()
+        st["ring"] = self._rings[eng.session_id].name
+        return st
+
+    # ---------- obsługa komend ----------
+    def handle(self, msg: dict) -> dict:
+        cmd = msg.get("cmd")
+        sid = msg.get("session") or "default"
+        if cmd == "list":
+            return {"ok": True, "sessions": [self._status(self._engine(e.session_id)) for e in self.registry.sessions()]}
+        if cmd == "metrics":
+            return {"ok": True, "sessions": {e.session_id: e.metrics_snapshot() for e in self.registry.sessions()}}
+        if cmd == "remove":
+            eng = self.registry.get(sid)
+            with self._lock:
+                ring = self._rings.pop(sid, None)
+            if eng is not None and ring is not None:
+                eng.remove_sink(ring.publish)
+            self.registry.remove(sid)
+            if ring is not None:
+                ring.close()
+            return {"ok": True}
+
+        eng = self._engine(sid)
+        if cmd == "status":
+            pass
+        elif cmd == "start":
+            dev, sr, hop = msg.get("device"), int(msg["samplerate"]), int(msg["hop"])
+            decimate, window = msg.get("decimate"), msg.get("window")
+            if not eng.matches(dev, sr, hop, decimate, window):
+                try:
+                    self.registry.start(sid, dev, sr, hop, decimate, window)
+                except SessionBusyError as e:
+                    return {"ok": False, "busy": True, "error": str(e)}
+                self._rings[sid].set_stream_info(sr, eng.hop)
+            # pierścień jest odbiorcą ramek tylko w trakcie przechwytywania
+            ring = self._rings[sid]
+            eng.remove_sink(ring.publish)
+            eng.add_sink(ring.publish)
+        elif cmd == "stop":
+            self.registry.stop(sid)
+            eng.remove_sink(self._rings[sid].publish)
+        elif cmd == "get_noise_config":
+            return {"ok": True, "noise_config": eng.noise_config.model_dump()}
+        elif cmd == "set_noise_config":
+            cfg = eng.set_noise_config(NoiseConfig(**msg["noise_config"]))
+            return {"ok": True, "noise_config": cfg.model_dump()}
+        elif cmd == "calibrate":
+            eng.start_calibration(float(msg.get("seconds", 1.0)))
+        elif cmd == "follow":
+            return {"ok": True, "follow": eng.follow_score(msg["path"], int(msg.get("part", 0)), int(msg.get("position", 0)))}
+        elif cmd == "unfollow":
+            return {"ok": True, "follow": eng.stop_following()}
+        elif cmd == "follow_status":
+            return {"ok": True, "follow": eng.follow_status()}
+        elif cmd == "record":
+            try:
+                return {"ok": True, "recording": eng.start_recording(RECORDINGS_DIR, msg.get("format", "flac"))}
+            except (RuntimeError, ValueError) as e:
+                return {"ok": False, "error": str(e)}
+        elif cmd == "record_stop":
+            return {"ok": True, "recording": eng.stop_recording()}
+        elif cmd == "record_status":
+            return {"ok": True, "recording": eng.recording_status()}
+        elif cmd == "noise_profile":
+            return {"ok": True, "noise_profile": eng.noise_profile()}
+        elif cmd == "history":
+            if self._history is None:
+                self._history = HistoryStore()
+            try:
+                return {"ok": True, "history": eng.start_history(self._history, msg.get("student"), msg.get("piece"))}
+            except (RuntimeError, ValueError) as e:
+                return {"ok": False, "error": str(e)}
+        elif cmd == "history_stop":
+            return {"ok": True, "history": eng.stop_history()}
+        elif cmd == "history_status":
+            return {"ok": True, "history": eng.history_status()}
+        else:
+            return {"ok": False, "error": f"nieznana komenda: {cmd}"}
+        return {"ok": True, "status": self._status(eng)}
+
+    def _serve_conn(self, conn):
+        try:
+            while True:
+                msg = conn.recv()
+                try:
+                    reply = self.handle(msg)
+                except Exception as e:
+                    reply = {"ok": False, "error": str(e)}
+                conn.send(reply)
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def serve_forever(self, address: Optional[tuple] = None, authkey: Optional[bytes] = None):
+        address = address or engine_address()
+        with Listener(address, authkey=authkey or server_authkey()) as listener:
+            print(f"[engine] nasłuch sterowania na {address[0]}:{address[1]}")
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._serve_conn, args=(conn,), daemon=True).start()
+
+    def shutdown(self):
+        for eng in self.registry.sessions():
+            eng.stop()
+        with self._lock:
+            for ring in self._rings.values():
+                ring.close()
+            self._rings.clear()
+
+def main():
+    server = EngineServer(int(os.environ.get("VIOLIN_MAX_SESSIONS", "8")))
+    # SIGTERM -> normalne wyjście, żeby zwolnić bloki pamięci współdzielonej
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if WARMUP_ENABLED:
+        # proces silnika nie parsuje partytur – bez kroku music21
+        WarmUp([s for s in STEPS if s[0] != "music21"]).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import math
+import struct
+import numpy as np
+from typing import Optional
+
+# =============================
+# Binarny protokół ramek analizy (opcjonalny, domyślnie nadal JSON)
+#
+# Wiadomość = nagłówek + N rekordów ramek + bloki waveformu (little-endian):
+#   nagłówek  <2sBBHHI  magic b"VF", wersja, flagi, n_ramek, punkty_wave, seq
+#   rekord    <7fhBx    pitch_hz, cents, bpm, rms, db, level, gate_db,
+#                       midi (-1 = brak), bity (onset|gated|has_wave), pad
+#   wave      punkty_wave * int16 (skala 1/32767) albo float32 – tylko dla
+#             ramek z bitem has_wave, w kolejności ramek
+# =============================
+MAGIC = b"VF"
+VERSION = 1
+SUBPROTOCOL = "violin.bin.v1"
+
+HEADER = struct.Struct("<2sBBHHI")
+RECORD = struct.Struct("<7fhBx")
+
+HDR_WAVE_F32 = 0x01        # flaga nagłówka: wave jako float32 zamiast int16
+
+FRAME_ONSET = 0x01
+FRAME_GATED = 0x02
+FRAME_HAS_WAVE = 0x04
+
+WAVE_POINTS = 128
+
+def hz_to_midi(freq: float, a4: float = 440.0) -> int:
+    if freq <= 0:
+        return -1
+    return int(round(69 + 12 * math.log2(freq / a4)))
+
+class FrameEncoder:
+    """
+    Składa kolejne hopy w jedną binarną wiadomość (batch ramek).
+    Bufor jest prealokowany na pełny batch z waveformem w każdej ramce,
+    więc add() nie tworzy obiektów poza samym pakowaniem struktur.
+    """
+    def __init__(self, batch: int = 1, wave_format: str = "int16", wave_points: int = WAVE_POINTS):
+        self.batch = max(1, int(batch))
+        self.wave_f32 = wave_format == "float32"
+        self.wave_points = int(wave_points)
+        self._wave_bytes = self.wave_points * (4 if self.wave_f32 else 2)
+        self._buf = bytearray(HEADER.size + self.batch * (RECORD.size + self._wave_bytes))
+        self._wave_tmp = np.zeros(self.wave_points, dtype=np.float32)
+        self._n = 0
+        self._n_wave = 0
+        self._seq = 0
+
+    @property
+    def pending(self) -> int:
+        return self._n
+
+    def _records_end(self) -> int:
+        return HEADER.size + self.batch * RECORD.size
+
+    def add(self, payload: dict, wave: Optional[np.ndarray] = None) -> Optional[bytes]:
+        """Dodaje ramkę; zwraca gotową wiadomość, gdy batch jest pełny."""
+        bits = 0
+        if payload.get("onset"):
+            bits |= FRAME_ONSET
+        if payload.get("gated"):
+            bits |= FRAME_GATED
+        if wave is not None and wave.size > 0:
+            bits |= FRAME_HAS_WAVE
+            self._pack_wave(wave)
+        cents = payload.get("cents")
+        RECORD.pack_into(
+            self._buf, HEADER.size + self._n * RECORD.size,
+            float(payload.get("pitch_hz") or 0.0),
+            float(cents) if cents is not None else float("nan"),
+            float(payload.get("bpm") or 0.0),
+            float(payload.get("rms") or 0.0),
+            float(payload.get("db") or 0.0),
+            float(payload.get("level") or 0.0),
+            float(payload.get("gate_db") or 0.0),
+            hz_to_midi(float(payload.get("pitch_hz") or 0.0)),
+            bits,
+        )
+        self._n += 1
+        if self._n >= self.batch:
+            return self.flush()
+        return None
+
+    def _pack_wave(self, samples: np.ndarray):
+        # decymacja jak w _preview_wave, ale wprost do bufora wiadomości
+        step = max(1, samples.size // self.wave_points)
+        src = samples[::step][:self.wave_points]
+        tmp = self._wave_tmp
+        tmp.fill(0.0)
+        tmp[:src.size] = src
+        # bloki wave trafiają za rekordy; przy flush() są dosuwane do ostatniego rekordu
+        off = self._records_end() + self._n_wave * self._wave_bytes
+        if self.wave_f32:
+            dst = np.frombuffer(self._buf, dtype=np.float32, count=self.wave_points, offset=off)
+            dst[:] = tmp
+        else:
+            dst = np.frombuffer(self._buf, dtype=np.int16, count=self.wave_points, offset=off)
+            np.clip(tmp, -1.0, 1.0, out=tmp)
+            np.multiply(tmp, 32767.0, out=tmp)
+            dst[:] = tmp
+        self._n_wave += 1
+
+    def flush(self) -> Optional[bytes]:
+        if self._n == 0:
+            return None
+        flags = HDR_WAVE_F32 if self.wave_f32 else 0
+        HEADER.pack_into(self._buf, 0, MAGIC, VERSION, flags, self._n, self.wave_points, self._seq & 0xFFFFFFFF)
+        rec_end = HEADER.size + self._n * RECORD.size
+        wave_start = self._records_end()
+        wave_len = self._n_wave * self._wave_bytes
+        mv = memoryview(self._buf)
+        msg = bytes(mv[:rec_end]) + bytes(mv[wave_start:wave_start + wave_len])
+        self._seq += 1
+        self._n = 0
+        self._n_wave = 0
+        return msg
+
+def decode_frames(msg: bytes) -> list:
+    """Dekoder referencyjny (testy/narzędzia) – odpowiednik parsera we frontendzie."""
+    magic, version, flags, n, points, seq = HEADER.unpack_from(msg, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("nieznany format ramki")
+    wave_dtype = np.float32 if flags & HDR_WAVE_F32 else np.int16
+    wave_off = HEADER.size + n * RECORD.size
+    frames = []
+    for i in range(n):
+        pitch_hz, cents, bpm, rms, db, level, gate_db, midi, bits = RECORD.unpack_from(msg, HEADER.size + i * RECORD.size)
+        f = {
+            "seq": seq, "pitch_hz": pitch_hz, "cents": None if math.isnan(cents) else cents,
+            "bpm": bpm, "rms": rms, "db": db, "level": level, "gate_db": gate_db,
+            "midi": midi, "onset": bool(bits & FRAME_ONSET), "gated": bool(bits & FRAME_GATED),
+        }
+        if bits & FRAME_HAS_WAVE:
+            w = np.frombuffer(msg, dtype=wave_dtype, count=points, offset=wave_off)
+            wave_off += w.nbytes
+            f["wave"] = (w / 32767.0 if wave_dtype == np.int16 else w).astype(float).tolist()
+        frames.append(f)
+    return frames
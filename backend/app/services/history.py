@@ -0,0 +1,434 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+import uuid
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .frame_codec import hz_to_midi
+
+# =============================
+# Historia ćwiczeń: kolumnowy magazyn ramek analizy (tylko dopisywanie)
+#
+#   root/<dzień UTC>/<sesja>/<część>/<kolumna>.bin + meta.json
+#   root/dictionary.json – kody uczniów i utworów (0 = brak)
+#
+# Część = jeden okres zasilania z jednej sesji (stały hop/sr); kolumny to
+# surowe tablice w zwartych typach (16 B na ramkę), dopisywane blokami przez
+# wątek zapisu. Zapytania mapują kolumny w pamięci i liczą agregaty
+# wektorowo kawałkami po QUERY_CHUNK wierszy – pamięć nie rośnie z liczbą ramek.
+# =============================
+HISTORY_DIR = os.environ.get("VIOLIN_HISTORY_DIR", "backend/data/history")
+COLUMNS = (
+    ("t_ms", "<u4"),      # ms od północy UTC dnia partycji
+    ("cents", "<f2"),     # odchylenie od najbliższego półtonu; NaN bez wysokości
+    ("midi", "u1"),       # najbliższa nuta MIDI; 0 = brak
+    ("db", "<f2"),
+    ("bpm", "<f2"),
+    ("flags", "u1"),      # FLAG_ONSET | FLAG_GATED
+    ("student", "<u2"),   # kod ze słownika
+    ("piece", "<u2"),
+)
+FLAG_ONSET = 0x01
+FLAG_GATED = 0x02
+FLUSH_S = 1.0
+QUEUE_SECONDS = 60.0
+QUERY_CHUNK = 1 << 22
+_DAY_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+def day_of(t: float) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(t))
+
+def day_start(day: str) -> float:
+    return float(np.datetime64(day, "s").astype(np.int64))
+
+def _safe(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)[:64] or "_"
+
+class Dictionary:
+    """Kody uczniów i utworów (uint16 w kolumnach) – plik JSON, zapis atomowy."""
+    KINDS = ("student", "piece")
+
+    def __init__(self, root: str):
+        self.path = os.path.join(root, "dictionary.json")
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, List[str]]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        return {k: data.get(k) or [""] for k in self.KINDS}
+
+    def names(self, kind: str) -> List[str]:
+        return self._load()[kind]
+
+    def lookup(self, kind: str, name: Optional[str]) -> Optional[int]:
+        """Kod istniejącej nazwy (None, jeśli nie występuje – zapytanie nic nie znajdzie)."""
+        names = self.names(kind)
+        return names.index(name or "") if (name or "") in names else None
+
+    def code(self, kind: str, name: Optional[str]) -> int:
+        name = name or ""
+        with self._lock:
+            data = self._load()
+            names = data[kind]
+            if name in names:
+                return names.index(name)
+            if len(names) >= 0xFFFF:
+                raise ValueError(f"słownik {kind} jest pełny")
+            names.append(name)
+            tmp = f"{self.path}.{uuid.uuid4().hex[:6]}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+            return len(names) - 1
+
+class HistoryPart:
+    """Jedna część partycji: pliki kolumn otwarte do dopisywania."""
+    def __init__(self, root: str, day: str, session_id: str, part_id: str, meta: dict):
+        self.dir = os.path.join(root, day, _safe(session_id), part_id)
+        self.day = day
+        self.base = day_start(day)
+        os.makedirs(self.dir, exist_ok=True)
+        with open(os.path.join(self.dir, "meta.json"), "w") as f:
+            json.dump(dict(meta, day=day, session_id=session_id), f)
+        self._files = {name: open(os.path.join(self.dir, f"{name}.bin"), "ab") for name, _ in COLUMNS}
+        self.rows = 0
+
+    def append(self, cols: Dict[str, np.ndarray]):
+        for name, dt in COLUMNS:
+            self._files[name].write(np.ascontiguousarray(cols[name], dtype=dt).tobytes())
+        self.rows += len(cols["t_ms"])
+
+    def flush(self):
+        for f in self._files.values():
+            f.flush()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+class HistoryWriter:
+    """
+    Zasilanie historii z jednej sesji. sink(payload, samples) (AudioEngine.sinks)
+    tylko wpisuje pola do prealokowanych kolumn kolejki; wątek zapisu co FLUSH_S
+    dzieli zebrane ramki po dniach i dopisuje je do plików.
+    """
+    def __init__(self, store: "HistoryStore", session_id: str, samplerate: int, hop: int,
+                 student: Optional[str] = None, piece: Optional[str] = None):
+        self.store = store
+        self.session_id = session_id
+        self.student, self.piece = student or "", piece or ""
+        self._student = store.dictionary.code("student", self.student)
+        self._piece = store.dictionary.code("piece", self.piece)
+        self.frame_s = hop / float(samplerate)
+        self._meta = {"samplerate": samplerate, "hop": hop, "frame_s": self.frame_s,
+                      "student": self.student, "piece": self.piece}
+        self.part_id = time.strftime("%H%M%S-", time.gmtime()) + uuid.uuid4().hex[:6]
+        cap = max(256, int(QUEUE_SECONDS / self.frame_s))
+        self._cap = cap
+        self._t = np.zeros(cap, dtype=np.float64)
+        self._cents = np.zeros(cap, dtype=np.float16)
+        self._midi = np.zeros(cap, dtype=np.uint8)
+        self._db = np.zeros(cap, dtype=np.float16)
+        self._bpm = np.zeros(cap, dtype=np.float16)
+        self._flags = np.zeros(cap, dtype=np.uint8)
+        self._w = 0
+        self._r = 0
+        self.rows = 0
+        self.lost = 0
+        self._parts: Dict[str, HistoryPart] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- wątek analizy ----------
+    def sink(self, payload: dict, samples: np.ndarray):
+        i = self._w % self._cap
+        cents = payload.get("cents")
+        midi = hz_to_midi(payload.get("pitch_hz") or 0.0)
+        self._t[i] = time.time()
+        self._cents[i] = math.nan if cents is None else cents
+        self._midi[i] = midi if 0 < midi < 128 else 0
+        self._db[i] = payload.get("db") or 0.0
+        self._bpm[i] = payload.get("bpm") or 0.0
+        self._flags[i] = (FLAG_ONSET if payload.get("onset") else 0) | (FLAG_GATED if payload.get("gated") else 0)
+        self._w += 1
+
+    # ---------- cykl życia ----------
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name=f"history-{self.session_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self.status()
+
+    def status(self) -> dict:
+        return {"feeding": self._thread is not None, "session_id": self.session_id, "student": self.student,
+                "piece": self.piece, "rows": self.rows, "lost": self.lost}
+
+    def _loop(self):
+        try:
+            while not self._stop.wait(FLUSH_S):
+                self._drain()
+            self._drain()
+        except Exception as e:
+            print(f"[history:{self.session_id}] błąd zapisu: {e}")
+        finally:
+            for part in self._parts.values():
+                part.close()
+
+    def _part(self, day: str) -> HistoryPart:
+        part = self._parts.get(day)
+        if part is None:
+            part = HistoryPart(self.store.root, day, self.session_id, self.part_id, self._meta)
+            self._parts[day] = part
+        return part
+
+    def _drain(self):
+        w = self._w
+        if w - self._r > self._cap:
+            self.lost += w - self._cap - self._r
+            self._r = w - self._cap
+        if self._r == w:
+            return
+        idx = np.arange(self._r, w) % self._cap
+        t = self._t[idx]
+        first, last = day_of(t[0]), day_of(t[-1])
+        bounds = [(0, t.size, first)]
+        if first != last:
+            # przejście przez północ: podział na dwie partycje
+            cut = int(np.searchsorted(t, day_start(last)))
+            bounds = [(0, cut, first), (cut, t.size, last)]
+        for a, b, day in bounds:
+            if b <= a:
+                continue
+            part = self._part(day)
+            sel = idx[a:b]
+            part.append({
+                "t_ms": np.round((t[a:b] - part.base) * 1000.0),
+                "cents": self._cents[sel],
+                "midi": self._midi[sel],
+                "db": self._db[sel],
+                "bpm": self._bpm[sel],
+                "flags": self._flags[sel],
+                "student": np.full(b - a, self._student, dtype=np.uint16),
+                "piece": np.full(b - a, self._piece, dtype=np.uint16),
+            })
+            part.flush()
+        self.rows += w - self._r
+        self._r = w
+
+# =============================
+# Zapytania: agregaty wektorowe po częściach mapowanych w pamięci
+# =============================
+class HistoryStore:
+    def __init__(self, root: str = HISTORY_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.dictionary = Dictionary(root)
+
+    def writer(self, session_id: str, samplerate: int, hop: int,
+               student: Optional[str] = None, piece: Optional[str] = None) -> HistoryWriter:
+        return HistoryWriter(self, session_id, samplerate, hop, student, piece)
+
+    # ---------- przegląd partycji ----------
+    def parts(self, since: Optional[str] = None, until: Optional[str] = None,
+              session: Optional[str] = None) -> Iterator[Tuple[str, dict]]:
+        """(katalog części, meta) dla dni [since, until] (daty YYYY-MM-DD, włącznie)."""
+        for day in sorted(os.listdir(self.root)):
+            if not _DAY_RE.match(day) or (since and day < since) or (until and day > until):
+                continue
+            day_dir = os.path.join(self.root, day)
+            for sess in sorted(os.listdir(day_dir)):
+                if session is not None and sess != _safe(session):
+                    continue
+                sess_dir = os.path.join(day_dir, sess)
+                for part in sorted(os.listdir(sess_dir)):
+                    path = os.path.join(sess_dir, part)
+                    try:
+                        with open(os.path.join(path, "meta.json")) as f:
+                            yield path, json.load(f)
+                    except (OSError, ValueError):
+                        continue
+
+    @staticmethod
+    def open_part(path: str) -> Dict[str, np.ndarray]:
+        """Kolumny części jako memmapy tylko do odczytu, przycięte do najkrótszej (zapis w toku)."""
+        sizes = {name: os.path.getsize(os.path.join(path, f"{name}.bin")) // np.dtype(dt).itemsize
+                 for name, dt in COLUMNS}
+        n = min(sizes.values())
+        if n == 0:
+            return {name: np.zeros(0, dtype=dt) for name, dt in COLUMNS}
+        return {name: np.memmap(os.path.join(path, f"{name}.bin"), dtype=dt, mode="r", shape=(n,))
+                for name, dt in COLUMNS}
+
+    def partitions(self, since: Optional[str] = None, until: Optional[str] = None) -> List[dict]:
+        out = []
+        for path, meta in self.parts(since, until):
+            rows = min(os.path.getsize(os.path.join(path, f"{n}.bin")) // np.dtype(dt).itemsize for n, dt in COLUMNS)
+            out.append({"path": os.path.relpath(path, self.root), "rows": rows,
+                        "seconds": round(rows * meta.get("frame_s", 0.0), 1), **meta})
+        return out
+
+    def _chunks(self, since, until, session, student, piece) -> Iterator[Tuple[dict, Dict[str, np.ndarray]]]:
+        """Kawałki wierszy spełniających filtry ucznia/utworu (filtr po dniu i sesji – po katalogach)."""
+        s_code = None if student is None else self.dictionary.lookup("student", student)
+        p_code = None if piece is None else self.dictionary.lookup("piece", piece)
+        if (student is not None and s_code is None) or (piece is not None and p_code is None):
+            return
+        for path, meta in self.parts(since, until, session):
+            cols = self.open_part(path)
+            n = cols["t_ms"].shape[0]
+            for a in range(0, n, QUERY_CHUNK):
+                b = min(n, a + QUERY_CHUNK)
+                chunk = {k: v[a:b] for k, v in cols.items()}
+                mask = None
+                if s_code is not None:
+                    mask = chunk["student"] == s_code
+                if p_code is not None:
+                    m = chunk["piece"] == p_code
+                    mask = m if mask is None else mask & m
+                if mask is not None:
+                    if not mask.any():
+                        continue
+                    chunk = {k: v[mask] for k, v in chunk.items()}
+                yield meta, chunk
+
+    def _group_keys(self, by: Optional[str], meta: dict, chunk: Dict[str, np.ndarray]):
+        """Klucz grupy dla każdego wiersza (tablica) albo jeden klucz dla całego kawałka."""
+        if by == "note":
+            return chunk["midi"]
+        if by == "piece":
+            return chunk["piece"]
+        if by == "student":
+            return chunk["student"]
+        if by == "day":
+            return meta["day"]
+        if by == "session":
+            return meta["session_id"]
+        return None
+
+    def _label(self, by: Optional[str], key) -> str:
+        if by == "note":
+            names = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+            k = int(key)
+            return f"{names[k % 12]}{k // 12 - 1}"
+        if by in ("piece", "student"):
+            names = self.dictionary.names(by)
+            return names[int(key)] if int(key) < len(names) else str(key)
+        return str(key)
+
+    def intonation(self, since: Optional[str] = None, until: Optional[str] = None, session: Optional[str] = None,
+                   student: Optional[str] = None, piece: Optional[str] = None, by: Optional[str] = None,
+                   bin_cents: float = 5.0, tolerance: float = 10.0) -> dict:
+        """
+        Histogram odchyleń w centach, czas gry i odsetek czasu „w stroju” (|c| <= tolerance)
+        dla ramek z wysokością i bez bramki; opcjonalnie w grupach (note/piece/student/day/session).
+        """
+        edges = np.arange(-50.0, 50.0 + bin_cents / 2, bin_cents)
+        nb = edges.size - 1
+        acc: Dict[object, np.ndarray] = {}      # klucz -> [kubełki..., ramki, w stroju, sekundy gry, suma |c|]
+        total_rows = 0
+        for meta, ch in self._chunks(since, until, session, student, piece):
+            total_rows += ch["t_ms"].shape[0]
+            voiced = (ch["midi"] > 0) & ((ch["flags"] & FLAG_GATED) == 0)
+            cents = ch["cents"][voiced].astype(np.float32)
+            ok = np.isfinite(cents)
+            cents = cents[ok]
+            if cents.size == 0:
+                continue
+            bins = np.clip(((cents + 50.0) / bin_cents).astype(np.int64), 0, nb - 1)
+            tune = np.abs(cents) <= tolerance
+            frame_s = float(meta.get("frame_s", 0.0))
+            keys = self._group_keys(by, meta, ch)
+            if keys is None or np.isscalar(keys) or isinstance(keys, str):
+                row = acc.setdefault(keys, np.zeros(nb + 4))
+                row[:nb] += np.bincount(bins, minlength=nb)
+                row[nb] += cents.size
+                row[nb + 1] += tune.sum()
+                row[nb + 2] += cents.size * frame_s
+                row[nb + 3] += np.abs(cents).sum()
+                continue
+            # klucze to małe kody (uint8/uint16) – bincount bez sortowania (np.unique)
+            inv = keys[voiced][ok].astype(np.intp)
+            g = int(inv.max()) + 1
+            hist = np.bincount(inv * nb + bins, minlength=g * nb).reshape(g, nb)
+            cnt = np.bincount(inv, minlength=g)
+            tun = np.bincount(inv, weights=tune, minlength=g)
+            absc = np.bincount(inv, weights=np.abs(cents), minlength=g)
+            for key in np.nonzero(cnt)[0].tolist():
+                row = acc.setdefault(key, np.zeros(nb + 4))
+                row[:nb] += hist[key]
+                row[nb] += cnt[key]
+                row[nb + 1] += tun[key]
+                row[nb + 2] += cnt[key] * frame_s
+                row[nb + 3] += absc[key]
+
+        def summary(row: np.ndarray) -> dict:
+            n = row[nb]
+            return {
+                "frames": int(n),
+                "played_s": round(float(row[nb + 2]), 2),
+                "in_tune_ratio": round(float(row[nb + 1] / n), 4) if n else None,
+                "mean_abs_cents": round(float(row[nb + 3] / n), 2) if n else None,
+                "histogram": row[:nb].astype(np.int64).tolist(),
+            }
+
+        total = np.sum(list(acc.values()), axis=0) if acc else np.zeros(nb + 4)
+        out = {"rows": total_rows, "bin_edges": edges.tolist(), "tolerance": tolerance, **summary(total)}
+        if by:
+            out["by"] = by
+            out["groups"] = {self._label(by, k): summary(v) for k, v in sorted(acc.items(), key=lambda kv: kv[0])}
+        return out
+
+    def tempo(self, since: Optional[str] = None, until: Optional[str] = None, session: Optional[str] = None,
+              student: Optional[str] = None, piece: Optional[str] = None, by: Optional[str] = None) -> dict:
+        """Stabilność tempa: średnia, odchylenie i współczynnik zmienności bpm (ramki z bpm > 0, bez bramki)."""
+        if by == "note":
+            raise ValueError("tempo nie jest grupowane po nutach")
+        acc: Dict[object, np.ndarray] = {}  # klucz -> [n, suma, suma kwadratów, onsety]
+        for meta, ch in self._chunks(since, until, session, student, piece):
+            bpm = ch["bpm"].astype(np.float64)
+            valid = (bpm > 0) & ((ch["flags"] & FLAG_GATED) == 0)
+            onsets = (ch["flags"] & FLAG_ONSET) > 0
+            keys = self._group_keys(by, meta, ch)
+            if keys is None or isinstance(keys, str):
+                row = acc.setdefault(keys, np.zeros(4))
+                v = bpm[valid]
+                row += (v.size, v.sum(), (v * v).sum(), onsets.sum())
+                continue
+            inv = keys.astype(np.intp)
+            g = int(inv.max()) + 1 if inv.size else 0
+            w = valid.astype(np.float64)
+            stats = np.stack([np.bincount(inv, weights=w, minlength=g),
+                              np.bincount(inv, weights=bpm * w, minlength=g),
+                              np.bincount(inv, weights=bpm * bpm * w, minlength=g),
+                              np.bincount(inv, weights=onsets, minlength=g)], axis=1)
+            for key in np.nonzero(stats[:, 0] + stats[:, 3])[0].tolist():
+                acc.setdefault(key, np.zeros(4))
+                acc[key] += stats[key]
+
+        def summary(row: np.ndarray) -> dict:
+            n, s, s2, on = (float(x) for x in row)
+            if n == 0:
+                return {"frames": 0, "mean_bpm": None, "std_bpm": None, "cv": None, "onsets": int(on)}
+            mean = s / n
+            std = math.sqrt(max(0.0, s2 / n - mean * mean))
+            return {"frames": int(n), "mean_bpm": round(mean, 2), "std_bpm": round(std, 2),
+                    "cv": round(std / mean, 4) if mean > 0 else None, "onsets": int(on)}
+
+        total = np.sum(list(acc.values()), axis=0) if acc else np.zeros(4)
+        out = summary(total)
+        if by:
+            out["by"] = by
+            out["groups"] = {self._label(by, k): summary(v) for k, v in sorted(acc.items(), key=lambda kv: kv[0])}
+        return out
@@ -0,0 +1,33 @@
+import importlib
+import threading
+from types import ModuleType
+
+# =============================
+# Leniwe importy ciężkich modułów (scipy.signal, aubio, sounddevice).
+# lazy_import zwraca pośrednika: pierwszy dostęp do atrybutu importuje moduł
+# i kopiuje jego słownik do pośrednika, więc kolejne odwołania (też w gorącej
+# ścieżce) to zwykły odczyt atrybutu. Ładowanie warto wymusić poza wątkiem
+# analizy (np. FilterChain wiąże signal.lfilter przy konstrukcji).
+# sounddevice przy imporcie inicjuje PortAudio, scipy.signal ładuje się ~1 s.
+# =============================
+_lock = threading.Lock()
+
+class LazyModule(ModuleType):
+    def __getattr__(self, attr: str):
+        # wołane tylko, gdy atrybutu jeszcze nie ma (przed załadowaniem albo naprawdę brak)
+        module = self._load()
+        return getattr(module, attr)
+
+    def _load(self) -> ModuleType:
+        with _lock:
+            module = importlib.import_module(self.__name__)
+            if "__file__" not in self.__dict__:
+                self.__dict__.update(module.__dict__)
+            return module
+
+    @property
+    def loaded(self) -> bool:
+        return "__file__" in self.__dict__
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
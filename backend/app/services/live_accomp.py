@@ -0,0 +1,353 @@
+import asyncio
+import json
+import time
+import numpy as np
+from typing import Awaitable, Callable, Optional, Sequence, Tuple
+
+from .metrics import STAGE_BUCKETS, Histogram
+from .score_cache import ScoreTable
+from .synth import (INSTRUMENT_NAMES, INSTRUMENTS, SAMPLERATE, TABLE_SIZE, accompaniment_parts, instrument_for,
+                    merge_ties, mix_gain, note_bank)
+
+# =============================
+# Akompaniament na żywo: partie akompaniamentu syntezowane blokami (20–50 ms)
+# w tempie ucznia i wysyłane przez WS jako PCM int16 ze stałym zapasem (lookahead).
+# Sterowanie przychodzi z ramek analizy sesji (sink): tempo z aubio (wygładzone
+# i sprowadzone do oktawy tempa partytury), aktywność (pauza, gdy uczeń milknie)
+# i pozycja ze śledzenia partytury – akompaniament dogania ucznia zmianą tempa
+# (najwyżej ±25%), a przy dużym rozjeździe przeskakuje.
+# Koszt bloku jest ograniczony: najwyżej MAX_VOICES głosów liczonych wektorowo
+# na macierzy (głosy × blok) z tablic okresów synth.NoteBank; wszystkie bufory
+# alokowane raz, w bloku nie ma renderu całych nut.
+# =============================
+BLOCK_MS = 40
+LOOKAHEAD_MS = 120
+MAX_VOICES = 32
+TEMPO_SMOOTHING = 0.05     # EMA tempa z aubio (na hop)
+MIN_CONFIDENCE = 0.5       # pozycje śledzenia o mniejszej pewności nie sterują akompaniamentem
+CATCHUP_PER_BEAT = 0.5     # korekta tempa na każdą ćwierćnutę rozjazdu
+MAX_TEMPO_ADJUST = 0.25
+JUMP_BEATS = 2.0           # większy rozjazd -> przeskok do pozycji ucznia
+HOLD_S = 2.0               # uczeń milczy dłużej -> pauza (tylko wait=True)
+STATUS_INTERVAL_S = 1.0
+
+class LiveControl:
+    """
+    Sink sesji analizy (wołany w wątku analizy po każdym hopie): zapamiętuje
+    tempo, czas ostatniego dźwięku i pozycję ucznia. Pola są podmieniane w całości,
+    więc pętla zdarzeń czyta je bez zamka.
+    """
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency     # opóźnienie analizy: zdarzenie dotyczy dźwięku sprzed tylu sekund
+        self.nominal = 0.0         # tempo partytury w bieżącym miejscu (ustawia akompaniament)
+        self.bpm = 0.0             # wygładzone tempo ucznia (0 = jeszcze nieznane)
+        self.active_t: Optional[float] = None
+        self.anchor: Optional[Tuple[float, float]] = None  # (ćwierćnuty, monotonic początku nuty)
+
+    def fold(self, bpm: float) -> float:
+        """Tracker tempa bywa o oktawę obok – sprowadza wynik do [2/3, 3/2] tempa partytury."""
+        nominal = self.nominal
+        if nominal <= 0.0:
+            return bpm
+        while bpm < nominal / 1.5:
+            bpm *= 2.0
+        while bpm > nominal * 1.5:
+            bpm *= 0.5
+        return bpm
+
+    def __call__(self, payload: dict, wave: np.ndarray):
+        now = time.monotonic()
+        bpm = payload.get("bpm") or 0.0
+        if bpm > 0.0:
+            bpm = self.fold(bpm)
+            self.bpm = bpm if self.bpm <= 0.0 else self.bpm + TEMPO_SMOOTHING * (bpm - self.bpm)
+        if payload.get("pitch_hz", 0.0) > 0.0 and not payload.get("gated"):
+            self.active_t = now
+        score = payload.get("score")
+        if score and score.get("confidence", 0.0) >= MIN_CONFIDENCE:
+            self.anchor = (float(score["beats"]), now - self.latency)
+
+class LiveAccompanist:
+    def __init__(self, table: ScoreTable, parts: Optional[Sequence[int]] = None, transpose: int = 0,
+                 samplerate: int = SAMPLERATE, block: int = 1764, start_beat: float = 0.0,
+                 control: Optional[LiveControl] = None, wait: bool = True):
+        self.samplerate = int(samplerate)
+        self.block = int(block)
+        self.control = control or LiveControl()
+        self.wait = wait
+        self.tempo_map = table.tempo_map
+
+        onset, dur, midi, inst, self.parts = [], [], [], [], []
+        for pi in accompaniment_parts(table, parts):
+            part = table.part(int(pi))
+            name = instrument_for(part.name)
+            beats = part["onset_beats"].astype(np.float64)
+            d, keep = merge_ties(beats, part["dur_beats"], part["midi"], part["tie"])
+            onset.append(beats[keep])
+            dur.append(d[keep])
+            midi.append(part["midi"][keep].astype(np.int16))
+            inst.append(np.full(int(keep.sum()), INSTRUMENT_NAMES.index(name), dtype=np.int8))
+            self.parts.append({"index": int(pi), "name": part.name, "instrument": name, "notes": int(keep.sum())})
+        onset, dur = np.concatenate(onset), np.concatenate(dur)
+        midi = np.clip(np.concatenate(midi) + int(transpose), 0, 127)
+        inst = np.concatenate(inst)
+        order = np.argsort(onset, kind="stable")
+        self.onset, self.dur, midi, inst = onset[order], dur[order], midi[order], inst[order]
+        self.gain = np.float32(mix_gain(self.onset, self.onset + self.dur))
+
+        # tablice okresów wszystkich (instrument, wysokość) partii w jednej płaskiej tablicy
+        bank = note_bank(self.samplerate)
+        keys, row = np.unique(inst.astype(np.int32) * 128 + midi, return_inverse=True)
+        # (+1 zero na końcu: odczyt idx + 1 przy fazie zaokrąglonej do TABLE_SIZE nie wychodzi poza tablicę)
+        self._flat = np.concatenate([bank.table(INSTRUMENT_NAMES[k // 128], int(k % 128)) for k in keys.tolist()]
+                                    + [np.zeros(1, dtype=np.float32)])
+        self._note_base = (row * (TABLE_SIZE + 1)).astype(np.intp)
+        self._note_inc = 440.0 * 2.0 ** ((midi - 69) / 12.0) * TABLE_SIZE / self.samplerate
+        self._note_inst = inst
+        specs = [INSTRUMENTS[name] for name in INSTRUMENT_NAMES]
+        self._attack = np.array([max(s.attack, 1e-4) for s in specs])
+        self._decay = np.array([max(s.decay, 1e-4) for s in specs])
+        self._drop = np.array([1.0 - s.sustain for s in specs])
+        self._inv_tau = np.array([1.0 / s.tau if s.tau > 0 else 0.0 for s in specs])
+        self._release = np.array([max(s.release, 1e-3) for s in specs])
+
+        # głosy (pojemność MAX_VOICES) i bufory bloku
+        v, n = MAX_VOICES, self.block
+        self._nv = 0
+        self._phase = np.zeros(v)
+        self._inc = np.zeros(v)
+        self._age = np.zeros(v)       # [s] na początku bloku (ujemny: nuta startuje w środku bloku)
+        self._off = np.zeros(v)       # [s] wiek zwolnienia nuty
+        self._base = np.zeros(v, dtype=np.intp)
+        self._inv_a = np.zeros(v)
+        self._atk = np.zeros(v)
+        self._inv_d = np.zeros(v)
+        self._drop_v = np.zeros(v)
+        self._tau_v = np.zeros(v)
+        self._inv_r = np.zeros(v)
+        self._rel = np.zeros(v)
+        self._ramp = np.arange(n, dtype=np.float64)
+        self._ramp_s = self._ramp / self.samplerate
+        self._ph = np.zeros((v, n))
+        self._t = np.zeros((v, n))
+        self._idx = np.zeros((v, n), dtype=np.intp)
+        self._a = np.zeros((v, n), dtype=np.float32)
+        self._b = np.zeros((v, n), dtype=np.float32)
+        self._mix = np.zeros(n, dtype=np.float32)
+        self._pcm = np.zeros(n, dtype=np.int16)
+
+        self.beat = 0.0
+        self.bpm = float(self.tempo_map[0, 1])
+        self.paused = wait
+        self._next = 0
+        self.seek(start_beat)
+
+    # ---------- pozycja i tempo ----------
+    @property
+    def finished(self) -> bool:
+        return self._next >= self.onset.size and self._nv == 0
+
+    def nominal_bpm(self, beat: float) -> float:
+        i = int(np.searchsorted(self.tempo_map[:, 0], beat, side="right")) - 1
+        return float(self.tempo_map[max(0, i), 1])
+
+    def seek(self, beat: float):
+        """Przeskok: brzmiące nuty przechodzą w wybrzmienie, następna nuta od `beat`."""
+        self.beat = max(0.0, float(beat))
+        self._next = int(np.searchsorted(self.onset, self.beat, side="left"))
+        k = self._nv
+        np.minimum(self._off[:k], np.maximum(self._age[:k], 0.0), out=self._off[:k])
+
+    def _steer(self, play_t: float) -> float:
+        c = self.control
+        c.nominal = self.nominal_bpm(self.beat)
+        bpm = c.bpm or c.nominal
+        anchor = c.anchor
+        if anchor is not None:
+            beats, t = anchor
+            err = beats + (play_t - t) * bpm / 60.0 - self.beat
+            if abs(err) > JUMP_BEATS:
+                self.seek(self.beat + err)
+            else:
+                bpm *= 1.0 + min(MAX_TEMPO_ADJUST, max(-MAX_TEMPO_ADJUST, CATCHUP_PER_BEAT * err))
+        return bpm
+
+    def _hold(self, play_t: float) -> bool:
+        if not self.wait:
+            return False
+        active = self.control.active_t
+        return active is None or play_t - active > HOLD_S + self.control.latency
+
+    # ---------- głosy ----------
+    def _trigger(self, i: int, offset: int, bpm: float):
+        k = self._nv
+        if k == MAX_VOICES:
+            v = int(np.argmax(self._age))   # kradzież najstarszego głosu
+        else:
+            v = k
+            self._nv = k + 1
+        sr = self.samplerate
+        inc = self._note_inc[i]
+        s = int(self._note_inst[i])
+        self._inc[v] = inc
+        self._phase[v] = (-offset * inc) % TABLE_SIZE
+        self._age[v] = -offset / sr
+        self._off[v] = self.dur[i] * 60.0 / bpm
+        self._base[v] = self._note_base[i]
+        self._inv_a[v] = 1.0 / self._attack[s]
+        self._atk[v] = self._attack[s]
+        self._inv_d[v] = 1.0 / self._decay[s]
+        self._drop_v[v] = self._drop[s]
+        self._tau_v[v] = self._inv_tau[s]
+        self._inv_r[v] = 1.0 / self._release[s]
+        self._rel[v] = self._release[s]
+
+    def _render(self):
+        k, n = self._nv, self.block
+        mix = self._mix
+        if k == 0:
+            mix.fill(0.0)
+        else:
+            ph, t, idx, a, b = self._ph[:k], self._t[:k], self._idx[:k], self._a[:k], self._b[:k]
+            # odczyt tablicy okresu z interpolacją liniową
+            np.multiply(self._inc[:k, None], self._ramp, out=ph)
+            ph += self._phase[:k, None]
+            np.mod(ph, TABLE_SIZE, out=ph)
+            np.copyto(idx, ph, casting="unsafe")
+            np.subtract(ph, idx, out=ph)
+            idx += self._base[:k, None]
+            np.take(self._flat, idx, out=a)
+            idx += 1
+            np.take(self._flat, idx, out=b)
+            b -= a
+            np.multiply(b, ph, out=b, casting="same_kind")
+            a += b
+            # obwiednia: atak * opadanie do sustain * wybrzmiewanie wykładnicze * release
+            np.add(self._age[:k, None], self._ramp_s, out=t)
+            np.multiply(t, self._inv_a[:k, None], out=b, casting="same_kind")
+            np.clip(b, 0.0, 1.0, out=b)
+            a *= b
+            np.subtract(t, self._atk[:k, None], out=b, casting="same_kind")
+            np.multiply(b, self._inv_d[:k, None], out=b, casting="same_kind")
+            np.clip(b, 0.0, 1.0, out=b)
+            np.multiply(b, self._drop_v[:k, None], out=b, casting="same_kind")
+            np.subtract(1.0, b, out=b)
+            a *= b
+            np.multiply(t, -self._tau_v[:k, None], out=b, casting="same_kind")
+            np.exp(b, out=b)
+            a *= b
+            np.subtract(t, self._off[:k, None], out=b, casting="same_kind")
+            np.multiply(b, self._inv_r[:k, None], out=b, casting="same_kind")
+            np.subtract(1.0, b, out=b)
+            np.clip(b, 0.0, 1.0, out=b)
+            a *= b
+            np.sum(a, axis=0, out=mix)
+            mix *= self.gain
+            np.tanh(mix, out=mix)
+            # przesunięcie głosów o blok, zwolnienie wybrzmiałych
+            self._phase[:k] += self._inc[:k] * n
+            np.mod(self._phase[:k], TABLE_SIZE, out=self._phase[:k])
+            self._age[:k] += n / self.samplerate
+            done = self._age[:k] > self._off[:k] + self._rel[:k]
+            if done.any():
+                keep = np.flatnonzero(~done)
+                m = keep.size
+                for arr in (self._phase, self._inc, self._age, self._off, self._base, self._inv_a, self._atk,
+                            self._inv_d, self._drop_v, self._tau_v, self._inv_r, self._rel):
+                    arr[:m] = arr[keep]
+                self._nv = m
+        mix *= np.float32(32767.0)
+        np.copyto(self._pcm, mix, casting="unsafe")
+
+    # ---------- blok ----------
+    def next_block(self, play_t: float) -> np.ndarray:
+        """Kolejny blok PCM int16 (bufor wielokrotnego użytku); play_t: monotonic początku odtwarzania bloku."""
+        if self._hold(play_t):
+            if not self.paused:
+                self.paused = True
+                self.seek(self.beat)   # wybrzmienie, pozycja bez zmian
+        else:
+            self.paused = False
+            bpm = self._steer(play_t)
+            self.bpm = bpm
+            n = self.block
+            db = bpm / 60.0 * n / self.samplerate
+            b0 = self.beat
+            hi = int(np.searchsorted(self.onset, b0 + db, side="left"))
+            for i in range(self._next, hi):
+                self._trigger(i, int((self.onset[i] - b0) / db * n), bpm)
+            self._next = max(self._next, hi)
+            self.beat = b0 + db
+        self._render()
+        return self._pcm
+
+    def status(self) -> dict:
+        return {
+            "beat": round(self.beat, 3),
+            "bpm": round(self.bpm, 2),
+            "paused": self.paused,
+            "voices": self._nv,
+            "next_note": self._next,
+            "notes": int(self.onset.size),
+        }
+
+# =============================
+# Strumień bloków z zegarem odtwarzania i metryki
+# =============================
+class LiveMetrics:
+    """Metryki akompaniamentu jednej sesji (sumy po połączeniach)."""
+    def __init__(self):
+        self.block_time = Histogram(STAGE_BUCKETS)   # czas generowania bloku
+        self.blocks = 0
+        self.over_budget = 0     # generowanie dłuższe niż blok audio
+        self.underruns = 0       # blok dotarł po czasie odtwarzania (klient miał przerwę)
+        self.streams = 0
+
+    def observe(self, seconds: float, budget: float):
+        self.block_time.observe(seconds)
+        self.blocks += 1
+        if seconds > budget:
+            self.over_budget += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "block": self.block_time.snapshot(),
+            "blocks": self.blocks,
+            "over_budget": self.over_budget,
+            "underruns": self.underruns,
+            "streams": self.streams,
+        }
+
+async def stream_blocks(acc: LiveAccompanist, send_bytes: Callable[[bytes], Awaitable[None]],
+                        send_text: Callable[[str], Awaitable[None]], metrics: LiveMetrics, lookahead: int):
+    """
+    Klient zaczyna odtwarzać po pierwszym bloku (t0): blok i gra w t0 + i·blok. Pierwsze
+    `lookahead` bloków idzie od razu (zapas), każdy następny tuż przed czasem
+    „lookahead bloków przed odtworzeniem”. Blok wysłany po swoim czasie odtwarzania
+    to underrun – zegar przesuwa się, a zapas odbudowuje.
+    """
+    block_s = acc.block / float(acc.samplerate)
+    t0 = time.monotonic()
+    last_status = t0
+    i = 0
+    while not acc.finished:
+        due = t0 + (i - lookahead) * block_s
+        now = time.monotonic()
+        if due > now:
+            await asyncio.sleep(due - now)
+        play_t = t0 + i * block_s
+        start = time.perf_counter()
+        pcm = acc.next_block(play_t)
+        metrics.observe(time.perf_counter() - start, block_s)
+        await send_bytes(pcm.tobytes())
+        sent = time.monotonic()
+        if i == 0:
+            t0 = sent   # zegar odtwarzania rusza z pierwszym blokiem
+        elif sent > play_t:
+            metrics.underruns += 1
+            t0 = sent - i * block_s
+        i += 1
+        if sent - last_status >= STATUS_INTERVAL_S:
+            last_status = sent
+            await send_text(json.dumps({"status": acc.status(), "underruns": metrics.underruns}))
+    await send_text(json.dumps({"done": True, "status": acc.status()}))
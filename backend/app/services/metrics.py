@@ -0,0 +1,205 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+# =============================
+# Pomiar czasu etapów jednego hopa analizy.
+# Etapy to stałe indeksy (bez słowników i alokacji w gorącej ścieżce);
+# po zakończeniu hopa lista czasów trafia do obserwatorów.
+# =============================
+STAGES = ("hpf", "spectral", "gate", "pitch", "onset", "tempo", "segment", "follow", "broadcast")
+HPF, SPECTRAL, GATE, PITCH, ONSET, TEMPO, SEGMENT, FOLLOW, BROADCAST = range(len(STAGES))
+
+class StageClock:
+    def __init__(self):
+        self.durations: List[float] = [0.0] * len(STAGES)
+        self.observers: List[Callable[[List[float]], None]] = []
+        self._t = 0.0
+
+    def start(self):
+        self._t = time.perf_counter()
+
+    def lap(self, stage: int):
+        now = time.perf_counter()
+        self.durations[stage] = now - self._t
+        self._t = now
+
+    def finish(self):
+        for obs in self.observers:
+            obs(self.durations)
+
+# =============================
+# Histogramy o stałych kubełkach i liczniki pipeline'u
+# (eksport w formacie tekstowym Prometheusa: GET /api/audio/metrics).
+# Każdy histogram ma jednego zapisującego (wątek analizy albo pętlę
+# zdarzeń), więc obywa się bez zamków; odczyt to tylko kopia list.
+# =============================
+STAGE_BUCKETS = (10e-6, 25e-6, 50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 2.5e-3, 5e-3, 10e-3, 25e-3, 50e-3)
+LOCK_BUCKETS = (1e-6, 5e-6, 25e-6, 100e-6, 500e-6, 2.5e-3, 10e-3)
+LATENCY_BUCKETS = (1e-3, 2.5e-3, 5e-3, 10e-3, 25e-3, 50e-3, 100e-3, 250e-3, 500e-3, 1.0, 2.5)
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # ostatni kubełek: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        return {"bounds": list(self.bounds), "counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+class PipelineMetrics:
+    """Obserwator StageClock jednej sesji: histogram każdego etapu, całego hopa i liczniki."""
+    def __init__(self):
+        self.stages = [Histogram(STAGE_BUCKETS) for _ in STAGES]
+        self.hop = Histogram(STAGE_BUCKETS)
+        self.cfg_lock_wait = Histogram(LOCK_BUCKETS)
+        self.hops = 0
+        self.over_budget = 0
+        self.budget = 0.0  # czas trwania hopa audio [s]; 0 = nieznany
+
+    def observe(self, durations: List[float]):
+        total = 0.0
+        stages = self.stages
+        for i in range(len(stages)):
+            d = durations[i]
+            stages[i].observe(d)
+            total += d
+        self.hop.observe(total)
+        self.hops += 1
+        if 0.0 < self.budget < total:
+            self.over_budget += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "stages": {name: h.snapshot() for name, h in zip(STAGES, self.stages)},
+            "hop": self.hop.snapshot(),
+            "cfg_lock_wait": self.cfg_lock_wait.snapshot(),
+            "hops": self.hops,
+            "over_budget": self.over_budget,
+            "budget_s": self.budget,
+        }
+
+# =============================
+# Format tekstowy Prometheusa
+# =============================
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels)
+    return "{" + inner + "}"
+
+def _fmt(v: float) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+class PrometheusWriter:
+    """Zbiera próbki metryk i składa je w tekst z jednym nagłówkiem HELP/TYPE na metrykę."""
+    def __init__(self, prefix: str = "violin_"):
+        self.prefix = prefix
+        self._order: List[str] = []
+        self._meta = {}
+        self._lines = {}
+
+    def _family(self, name: str, kind: str, help_text: str) -> List[str]:
+        name = self.prefix + name
+        if name not in self._meta:
+            self._order.append(name)
+            self._meta[name] = (kind, help_text)
+            self._lines[name] = []
+        return self._lines[name]
+
+    def sample(self, name: str, kind: str, help_text: str, value: float, **labels):
+        lines = self._family(name, kind, help_text)
+        lines.append(f"{self.prefix}{name}{_labels(tuple(labels.items()))} {_fmt(value)}")
+
+    def histogram(self, name: str, help_text: str, snap: Optional[dict], **labels):
+        if not snap:
+            return
+        lines = self._family(name, "histogram", help_text)
+        full = self.prefix + name
+        base = tuple(labels.items())
+        acc = 0
+        for bound, c in zip(list(snap["bounds"]) + ["+Inf"], snap["counts"]):
+            acc += c
+            le = bound if bound == "+Inf" else format(bound, "g")
+            lines.append(f"{full}_bucket{_labels(base + (('le', le),))} {acc}")
+        lines.append(f"{full}_sum{_labels(base)} {_fmt(float(snap['sum']))}")
+        lines.append(f"{full}_count{_labels(base)} {snap['count']}")
+
+    def render(self) -> str:
+        out: List[str] = []
+        for name in self._order:
+            kind, help_text = self._meta[name]
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(self._lines[name])
+        return "\n".join(out) + "\n" if out else ""
+
+def render_prometheus(sessions: Iterable[Tuple[str, dict]]) -> str:
+    """sessions: pary (session_id, AudioEngine.metrics_snapshot())."""
+    w = PrometheusWriter()
+    for sid, snap in sessions:
+        w.sample("session_running", "gauge", "Czy pętla analizy sesji działa", int(bool(snap.get("running"))),
+                 session=sid)
+        pipe = snap.get("pipeline") or {}
+        for stage, h in (pipe.get("stages") or {}).items():
+            w.histogram("stage_seconds", "Czas etapu hopa analizy", h, session=sid, stage=stage)
+        w.histogram("hop_seconds", "Czas przetworzenia całego hopa (wszystkie etapy)", pipe.get("hop"), session=sid)
+        w.histogram("cfg_lock_wait_seconds", "Oczekiwanie na zamek konfiguracji szumów w hopie",
+                    pipe.get("cfg_lock_wait"), session=sid)
+        if pipe:
+            w.sample("hops_total", "counter", "Przetworzone hopy", pipe.get("hops", 0), session=sid)
+            w.sample("hops_over_budget_total", "counter", "Hopy przetwarzane dłużej niż trwa hop audio",
+                     pipe.get("over_budget", 0), session=sid)
+
+        ring = snap.get("ring") or {}
+        if ring:
+            w.sample("input_overflows_total", "counter", "Przepełnienia wejścia zgłoszone przez PortAudio",
+                     ring.get("input_overflows", 0), session=sid)
+            w.sample("ring_overruns_total", "counter", "Overruny bufora kołowego (analiza nie nadąża)",
+                     ring.get("overruns", 0), session=sid)
+            w.sample("ring_underruns_total", "counter", "Odczyty bufora kołowego bez danych",
+                     ring.get("underruns", 0), session=sid)
+            w.sample("ring_dropped_samples_total", "counter", "Próbki utracone przez overruny",
+                     ring.get("dropped_frames", 0), session=sid)
+            w.sample("ring_backlog_samples", "gauge", "Próbki czekające w buforze kołowym",
+                     ring.get("backlog_frames", 0), session=sid)
+        if "shm_lost_frames" in snap:
+            w.sample("shm_lost_frames_total", "counter", "Ramki nadpisane w pamięci współdzielonej przed odczytem",
+                     snap["shm_lost_frames"], session=sid)
+
+        accomp = snap.get("accomp") or {}
+        if accomp:
+            w.histogram("accomp_block_seconds", "Czas generowania bloku akompaniamentu na żywo",
+                        accomp.get("block"), session=sid)
+            w.sample("accomp_blocks_total", "counter", "Wysłane bloki akompaniamentu na żywo",
+                     accomp.get("blocks", 0), session=sid)
+            w.sample("accomp_over_budget_total", "counter", "Bloki akompaniamentu generowane dłużej niż trwają",
+                     accomp.get("over_budget", 0), session=sid)
+            w.sample("accomp_underruns_total", "counter", "Bloki akompaniamentu wysłane po czasie odtwarzania",
+                     accomp.get("underruns", 0), session=sid)
+            w.sample("accomp_streams", "gauge", "Aktywne strumienie akompaniamentu na żywo",
+                     accomp.get("streams", 0), session=sid)
+
+        ws = snap.get("ws") or {}
+        w.sample("ws_clients", "gauge", "Podłączeni klienci WS", ws.get("clients", 0), session=sid)
+        w.sample("ws_queue_depth", "gauge", "Wiadomości w kolejkach wysyłki (suma po klientach)",
+                 ws.get("queue_depth", 0), session=sid)
+        w.sample("ws_queue_max_depth", "gauge", "Największa głębokość kolejki wysyłki wśród klientów",
+                 ws.get("queue_max_depth", 0), session=sid)
+        w.sample("ws_frames_sent_total", "counter", "Wiadomości wysłane do klientów WS",
+                 ws.get("sent", 0), session=sid)
+        w.sample("ws_frames_dropped_total", "counter", "Wiadomości odrzucone z pełnych kolejek",
+                 ws.get("dropped", 0), session=sid)
+        w.histogram("capture_to_send_seconds", "Opóźnienie od przechwycenia hopa do wysłania przez WS",
+                    ws.get("latency"), session=sid)
+    return w.render()
@@ -0,0 +1,80 @@
+import struct
+import numpy as np
+from typing import Iterator, Optional
+
+# =============================
+# Metronom: jeden takt liczony raz i powielany (kafelkowanie), PCM 16-bit mono
+# generowany kawałkami – pamięć nie zależy od długości nagrania.
+# =============================
+ACCENT_FREQ = 1000.0   # Hz (akcentowany takt)
+NORMAL_FREQ = 1000.0   # Hz (normalne uderzenie - tu używamy tej samej częstotliwości, można zmienić)
+ACCENT_VOL = 1.0
+NORMAL_VOL = 0.5
+TICK_DURATION = 0.1    # czas trwania kliknięcia w sekundach
+
+STREAM_DATA_SIZE = 0xFFFFFFFF  # nagłówek WAV strumienia o nieznanej długości
+
+def bar_buffer(tempo: float, beats_per_bar: int, sr: int) -> np.ndarray:
+    """Jeden takt (z zapasem jednej próbki na zaokrąglenia) jako int16."""
+    beat_interval = 60.0 / tempo
+    bar_len = int(np.ceil(beats_per_bar * beat_interval * sr)) + 1
+    bar = np.zeros(bar_len, dtype=np.int16)
+
+    t = np.linspace(0, TICK_DURATION, int(TICK_DURATION * sr), endpoint=False)
+    accent = (np.sin(2 * np.pi * ACCENT_FREQ * t) * (32767 * ACCENT_VOL)).astype(np.int16)
+    normal = (np.sin(2 * np.pi * NORMAL_FREQ * t) * (32767 * NORMAL_VOL)).astype(np.int16)
+    for beat in range(beats_per_bar):
+        start = int(round(beat * beat_interval * sr))
+        click = accent if beat == 0 else normal
+        end = min(bar_len, start + click.size)
+        bar[start:end] = click[:end - start]
+    return bar
+
+def total_samples(tempo: float, bars: int, beats_per_bar: int, sr: int) -> int:
+    """Długość nagrania jak w dawnym generatorze: wszystkie uderzenia + czas kliknięcia."""
+    return int((bars * beats_per_bar * 60.0 / tempo + TICK_DURATION) * sr)
+
+def wav_header(sr: int, n_samples: Optional[int]) -> bytes:
+    """Nagłówek RIFF/WAVE PCM 16-bit mono; n_samples=None -> strumień bez znanej długości."""
+    data_size = STREAM_DATA_SIZE if n_samples is None else n_samples * 2
+    riff_size = STREAM_DATA_SIZE if n_samples is None else 36 + data_size
+    return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", riff_size, b"WAVE", b"fmt ", 16, 1, 1,
+                       sr, sr * 2, 2, 16, b"data", data_size)
+
+def iter_pcm(tempo: float, beats_per_bar: int, sr: int, bars: Optional[int] = None,
+             chunk_seconds: float = 1.0) -> Iterator[bytes]:
+    """
+    Kolejne kawałki PCM. Takt k zaczyna się w round(k * długość_taktu), więc
+    ułamkowa długość taktu nie powoduje dryfu. bars=None -> bez końca.
+    """
+    bar = bar_buffer(tempo, beats_per_bar, sr)
+    bar_exact = beats_per_bar * 60.0 / tempo * sr
+    total = total_samples(tempo, bars, beats_per_bar, sr) if bars is not None else None
+    bars_per_chunk = max(1, int(chunk_seconds * sr / bar_exact))
+    out = np.zeros(int(np.ceil(bars_per_chunk * bar_exact)) + bar.size, dtype=np.int16)
+
+    written = 0  # próbek już wysłanych
+    k = 0
+    while total is None or written < total:
+        # składanie kilku taktów w buforze (nachodzą na siebie tylko ciszą na końcu taktu)
+        base = int(round(k * bar_exact))
+        out.fill(0)
+        for i in range(bars_per_chunk):
+            if bars is not None and k + i >= bars:
+                break
+            off = int(round((k + i) * bar_exact)) - base
+            out[off:off + bar.size] += bar
+        k += bars_per_chunk
+        end = int(round(k * bar_exact)) - base
+        if total is not None:
+            end = min(end, total - written)
+        if end <= 0:
+            break
+        yield out[:end].tobytes()
+        written += end
+
+def iter_wav(tempo: float, beats_per_bar: int, sr: int, bars: Optional[int] = None,
+             chunk_seconds: float = 1.0) -> Iterator[bytes]:
+    n = total_samples(tempo, bars, beats_per_bar, sr) if bars is not None else None
+    yield wav_header(sr, n)
+    yield from iter_pcm(tempo, beats_per_bar, sr, bars, chunk_seconds)
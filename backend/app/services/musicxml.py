@@ -1,15 +1,12 @@
-from music21 import converter
+from .score_cache import score_cache
 
 def parse_file(path: str):
     """
     Zwraca podstawowe metadane partytury do wyświetlenia w UI.
+    music21 działa tylko przy pierwszym odczycie danej treści – potem tabela nut
+    przychodzi z cache (LRU w pamięci albo .npz obok pliku).
     """
-    score = converter.parse(path)
-    title = (score.metadata and score.metadata.title) or path.split("/")[-1]
-    parts = len(score.parts)
-    # proste liczenie taktów (może być niedokładne w złożonych partyturach)
-    measures = sum(len(p.getElementsByClass('Measure')) for p in score.parts)
-    kind = "musicxml" if path.lower().endswith((".musicxml", ".xml", ".mxl")) else "midi"
+    meta = score_cache.get(path).meta
     return {
-        "title": title, "parts": parts, "measures": measures, "kind": kind
+        "title": meta["title"], "parts": meta["parts"], "measures": meta["measures"], "kind": meta["kind"]
     }
@@ -0,0 +1,161 @@
+import math
+import os
+import time
+import uuid
+import numpy as np
+import soundfile as sf
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Dict, List, Optional
+
+from ..models.schemas import NoiseConfig
+from .pitch import DEFAULT_PITCH_ENGINE
+
+# =============================
+# Analiza nagrań offline: ten sam łańcuch co na żywo (filtr + bramka + pitch/onset/tempo),
+# plik czytany blokami, długie pliki dzielone na segmenty liczone w puli procesów.
+# =============================
+SEGMENT_SECONDS = 60.0
+WARMUP_SECONDS = 2.0   # zakładka: rozgrzanie filtrów/onset/tempo przed początkiem segmentu
+
+TRACK_FIELDS = ("t", "pitch_hz", "cents", "db", "bpm", "onset", "gated")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: fork procesu z wątkami audio/uvicorn bywa niebezpieczny
+        _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 2, mp_context=get_context("spawn"))
+    return _pool
+
+def _empty_track(n: int) -> Dict[str, np.ndarray]:
+    return {
+        "t": np.zeros(n, dtype=np.float32),
+        "pitch_hz": np.zeros(n, dtype=np.float32),
+        "cents": np.zeros(n, dtype=np.float32),
+        "db": np.zeros(n, dtype=np.float32),
+        "bpm": np.zeros(n, dtype=np.float32),
+        "onset": np.zeros(n, dtype=bool),
+        "gated": np.zeros(n, dtype=bool),
+    }
+
+def analyse_segment(path: str, start_hop: int, stop_hop: int, hop: int, noise_cfg: Optional[dict] = None,
+                    pitch_engine: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    Liczy hopy [start_hop, stop_hop) pliku. Zaczyna czytać WARMUP_SECONDS wcześniej,
+    a wyniki z zakładki odrzuca. Funkcja modułu – uruchamiana w procesach puli.
+    Silnik wsadowy (yin/mpm) liczy wysokość całego segmentu jednym process_batch.
+    """
+    from .engine import AudioEngine
+    from .pitch import PITCH_BUF, make_pitch_engine
+
+    info = sf.info(path)
+    sr = info.samplerate
+    warm_hops = int(math.ceil(WARMUP_SECONDS * sr / hop))
+    first_hop = max(0, start_hop - warm_hops)
+
+    pitch = make_pitch_engine(pitch_engine, sr, hop)
+    batched = pitch.batched
+    eng = AudioEngine("offline", NoiseConfig(**(noise_cfg or {})), pitch_engine="none" if batched else pitch_engine)
+    eng.prepare(sr, hop)
+
+    track = _empty_track(stop_hop - start_hop)
+    mono = np.zeros(hop, dtype=np.float32)
+    # surowy sygnał segmentu (z zapasem na pierwsze okno) do detekcji wsadowej
+    ctx = max(0, PITCH_BUF - hop)
+    raw = np.zeros(ctx + (stop_hop - first_hop) * hop, dtype=np.float32) if batched else None
+    idx = first_hop
+    for block in sf.blocks(path, blocksize=hop, start=first_hop * hop, stop=stop_hop * hop,
+                           dtype="float32", always_2d=True, fill_value=0.0):
+        if idx >= stop_hop:
+            break
+        if block.shape[1] > 1:
+            np.mean(block, axis=1, out=mono)
+        else:
+            np.copyto(mono, block[:, 0])
+        payload = eng.process(mono)
+        if raw is not None:
+            off = ctx + (idx - first_hop) * hop
+            raw[off:off + hop] = mono
+        if idx >= start_hop:
+            i = idx - start_hop
+            track["t"][i] = idx * hop / sr
+            track["pitch_hz"][i] = payload["pitch_hz"]
+            track["cents"][i] = payload["cents"] if payload["cents"] is not None else np.nan
+            track["db"][i] = payload["db"]
+            track["bpm"][i] = payload["bpm"]
+            track["onset"][i] = payload["onset"]
+            track["gated"][i] = payload["gated"]
+        idx += 1
+
+    if raw is not None:
+        # okna kończące się na końcu hopów [start_hop, stop_hop) – jak w trybie strumieniowym
+        base = ctx + (start_hop - first_hop + 1) * hop - PITCH_BUF
+        windows = np.lib.stride_tricks.sliding_window_view(raw[base:], PITCH_BUF)[::hop][:stop_hop - start_hop]
+        hz, _ = pitch.process_batch(windows)
+        hz = np.where(track["gated"][:hz.size], 0.0, hz).astype(np.float32)
+        track["pitch_hz"][:hz.size] = hz
+        with np.errstate(divide="ignore", invalid="ignore"):
+            midi = 69 + 12 * np.log2(hz / 440.0)
+            track["cents"][:hz.size] = np.where(hz > 0, np.round((midi - np.round(midi)) * 100.0), np.nan)
+    return track
+
+def _summary(track: Dict[str, np.ndarray], duration: float, elapsed: float, sr: int, hop: int, segments: int) -> dict:
+    voiced = (track["pitch_hz"] > 0) & ~track["gated"]
+    pitches = track["pitch_hz"][voiced]
+    cents = track["cents"][voiced]
+    bpm = track["bpm"][track["bpm"] > 0]
+    midi = 69 + 12 * np.log2(pitches / 440.0) if pitches.size else pitches
+    return {
+        "duration_s": round(duration, 3),
+        "samplerate": sr,
+        "hop": hop,
+        "hops": int(track["t"].size),
+        "segments": segments,
+        "voiced_ratio": round(float(voiced.mean()) if voiced.size else 0.0, 4),
+        "onsets": int(track["onset"].sum()),
+        "median_pitch_hz": round(float(np.median(pitches)), 2) if pitches.size else None,
+        "pitch_range_midi": [int(np.floor(midi.min())), int(np.ceil(midi.max()))] if pitches.size else None,
+        "mean_abs_cents": round(float(np.nanmean(np.abs(cents))), 2) if cents.size else None,
+        "median_bpm": round(float(np.median(bpm)), 1) if bpm.size else None,
+        "elapsed_s": round(elapsed, 3),
+        "realtime_factor": round(duration / elapsed, 1) if elapsed > 0 else None,
+    }
+
+def analyse_file(path: str, out_dir: str, hop: int = 1024, segment_seconds: float = SEGMENT_SECONDS,
+                 noise_cfg: Optional[dict] = None, parallel: bool = True, label: Optional[str] = None,
+                 pitch_engine: Optional[str] = None) -> dict:
+    """Analizuje cały plik i zapisuje ścieżkę pitch/onset jako .npz. Zwraca podsumowanie JSON."""
+    t0 = time.perf_counter()
+    info = sf.info(path)
+    sr = info.samplerate
+    total_hops = int(math.ceil(info.frames / hop))
+    seg_hops = max(1, int(segment_seconds * sr / hop))
+    bounds = [(s, min(total_hops, s + seg_hops)) for s in range(0, total_hops, seg_hops)]
+
+    global _pool
+    if parallel and len(bounds) > 1:
+        pool = _get_pool()
+        try:
+            futures = [pool.submit(analyse_segment, path, a, b, hop, noise_cfg, pitch_engine) for a, b in bounds]
+            parts: List[Dict[str, np.ndarray]] = [f.result() for f in futures]
+        except BrokenProcessPool:
+            _pool = None  # następne żądanie utworzy pulę od nowa
+            raise
+    else:
+        parts = [analyse_segment(path, a, b, hop, noise_cfg, pitch_engine) for a, b in bounds]
+
+    track = {k: np.concatenate([p[k] for p in parts]) if parts else np.zeros(0) for k in TRACK_FIELDS}
+    elapsed = time.perf_counter() - t0
+
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(label or path))[0]
+    name = f"{stem}_{uuid.uuid4().hex[:8]}.npz"
+    np.savez_compressed(os.path.join(out_dir, name), samplerate=sr, hop=hop, **track)
+
+    summary = _summary(track, info.frames / float(sr), elapsed, sr, hop, len(bounds))
+    summary["track_file"] = name
+    summary["pitch_engine"] = pitch_engine or DEFAULT_PITCH_ENGINE
+    return summary
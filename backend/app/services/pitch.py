@@ -1,9 +1,19 @@
 import numpy as np
-import aubio
 import math
+import os
+from typing import Optional, Tuple
+
+from .lazy import lazy_import
+from .metrics import ONSET, PITCH, TEMPO, StageClock
+
+aubio = lazy_import("aubio")
 
 NOTE_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
 
+PITCH_BUF = 2048       # okno detekcji wysokości (jak dotąd w aubio)
+SILENCE_DB = -40.0     # poniżej: brak wysokości (aubio set_silence)
+DEFAULT_PITCH_ENGINE = os.environ.get("VIOLIN_PITCH_ENGINE", "aubio")
+
 def hz_to_note_and_cents(freq: float, a4: float = 440.0):
     if freq <= 0:
         return ("-", 0.0)
@@ -13,19 +23,211 @@ def hz_to_note_and_cents(freq: float, a4: float = 440.0):
     name = NOTE_NAMES[midi_round % 12] + str(midi_round // 12 - 1)
     return name, cents
 
-class AubioAnalyser:
-    def __init__(self, samplerate: int, hop_size: int):
-        self.pitch_o = aubio.pitch("yin", 2048, hop_size, samplerate)
+# =============================
+# Silniki detekcji wysokości
+#   process(hop)          – tryb strumieniowy (jeden hop, wewnętrzny bufor okna)
+#   process_batch(frames) – wiele okien naraz, frames: (n, buf) -> (hz[n], pewność[n])
+# =============================
+class PitchEngine:
+    name = "base"
+    batched = False
+
+    def __init__(self, samplerate: int, hop: int, buf: int = PITCH_BUF):
+        self.samplerate = samplerate
+        self.hop = hop
+        self.buf = buf
+
+    def process(self, frame: np.ndarray) -> Tuple[float, float]:
+        raise NotImplementedError
+
+    def process_batch(self, frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        hz = np.zeros(frames.shape[0], dtype=np.float32)
+        conf = np.zeros(frames.shape[0], dtype=np.float32)
+        for i, fr in enumerate(frames):
+            # okno kończy się na ostatnim hopie – podajemy tylko ten hop (bufor wewnętrzny)
+            hz[i], conf[i] = self.process(fr[-self.hop:])
+        return hz, conf
+
+class AubioPitch(PitchEngine):
+    name = "aubio"
+
+    def __init__(self, samplerate: int, hop: int, buf: int = PITCH_BUF, method: str = "yin"):
+        super().__init__(samplerate, hop, buf)
+        self.pitch_o = aubio.pitch(method, buf, hop, samplerate)
         self.pitch_o.set_unit("Hz")
-        self.pitch_o.set_silence(-40)  # dB
-        self.onset_o = aubio.onset("default", 1024, hop_size, samplerate)
-        self.tempo_o = aubio.tempo("default", 1024, hop_size, samplerate)
-
-    def process(self, frame: np.ndarray):
-        # aubio oczekuje kolumny float32
-        vec = frame.astype(np.float32)
-        pitch_hz = float(self.pitch_o(vec)[0])
+        self.pitch_o.set_silence(SILENCE_DB)  # dB
+
+    def process(self, frame: np.ndarray) -> Tuple[float, float]:
+        vec = np.ascontiguousarray(frame, dtype=np.float32)
+        hz = float(self.pitch_o(vec)[0])
+        return hz, float(self.pitch_o.get_confidence())
+
+class NumpyPitch(PitchEngine):
+    """
+    YIN / MPM w NumPy, wektorowo po wielu oknach: autokorelacja przez rFFT,
+    energia przez sumy skumulowane, wybór minimum/maksimum maskami bez pętli
+    po oknach. method="yin" (CMNDF, próg `threshold`) albo "mpm" (NSDF, próg `k`).
+    """
+    batched = True
+    BATCH_CHUNK = 256  # okien na jedno FFT (ogranicza pamięć przy długich plikach)
+
+    def __init__(self, samplerate: int, hop: int, buf: int = PITCH_BUF, method: str = "yin",
+                 fmin: float = 150.0, fmax: float = 4000.0, threshold: float = 0.15, k: float = 0.9):
+        super().__init__(samplerate, hop, buf)
+        self.method = method
+        self.name = method
+        self.threshold = threshold
+        self.k = k
+        self.tau_min = max(2, int(samplerate / fmax))
+        self.tau_max = min(buf // 2, int(np.ceil(samplerate / fmin)) + 1)
+        self.nfft = 1 << int(np.ceil(np.log2(2 * buf)))
+        self._window = np.zeros(buf, dtype=np.float64)
+        self._silence = 10.0 ** (SILENCE_DB / 20.0)
+
+    def process(self, frame: np.ndarray) -> Tuple[float, float]:
+        n = min(frame.size, self.buf)
+        w = self._window
+        w[:-n] = w[n:]
+        w[-n:] = frame[-n:]
+        hz, conf = self.process_batch(w[None, :])
+        return float(hz[0]), float(conf[0])
+
+    def _acf_terms(self, x: np.ndarray):
+        """r(τ) = Σ x_j x_{j+τ} oraz m(τ) = Σ (x_j² + x_{j+τ}²) po wspólnej części okna."""
+        W = x.shape[1]
+        T = self.tau_max + 2
+        spec = np.fft.rfft(x, self.nfft, axis=1)
+        r = np.fft.irfft(spec * spec.conj(), self.nfft, axis=1)[:, :T]
+        cs = np.cumsum(x * x, axis=1)
+        tau = np.arange(T)
+        head = cs[:, W - 1 - tau]                                       # Σ_{j < W-τ} x_j²
+        tail = cs[:, W - 1:W] - np.where(tau > 0, cs[:, np.maximum(tau - 1, 0)], 0.0)  # Σ_{j >= τ} x_j²
+        return r, head + tail
+
+    def process_batch(self, frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if frames.ndim == 1:
+            frames = frames[None, :]
+        n = frames.shape[0]
+        hz = np.zeros(n, dtype=np.float32)
+        conf = np.zeros(n, dtype=np.float32)
+        for a in range(0, n, self.BATCH_CHUNK):
+            b = min(n, a + self.BATCH_CHUNK)
+            hz[a:b], conf[a:b] = self._batch(frames[a:b])
+        return hz, conf
+
+    def _batch(self, frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        x = np.asarray(frames, dtype=np.float64)
+        n = x.shape[0]
+        hz = np.zeros(n, dtype=np.float32)
+        conf = np.zeros(n, dtype=np.float32)
+        rms = np.sqrt(np.mean(x * x, axis=1))
+        loud = rms >= self._silence
+        if not loud.any():
+            return hz, conf
+        x = x[loud]
+        r, m = self._acf_terms(x)
+        if self.method == "mpm":
+            tau, value = self._pick_mpm(r, m)
+        else:
+            tau, value = self._pick_yin(r, m)
+        ok = tau > 0
+        out_hz = np.where(ok, self.samplerate / np.where(ok, tau, 1.0), 0.0)
+        hz[loud] = out_hz
+        conf[loud] = np.where(ok, value, 0.0)
+        return hz, conf
+
+    # ---------- YIN ----------
+    def _pick_yin(self, r: np.ndarray, m: np.ndarray):
+        d = np.maximum(m - 2.0 * r, 0.0)
+        d[:, 0] = 0.0
+        cum = np.cumsum(d[:, 1:], axis=1)
+        cmnd = np.ones_like(d)
+        cmnd[:, 1:] = d[:, 1:] * np.arange(1, d.shape[1]) / np.maximum(cum, 1e-12)
+
+        lo, hi = self.tau_min, self.tau_max
+        seg = cmnd[:, lo:hi + 1]
+        below = seg[:, :-1] < self.threshold
+        # pierwsze minimum lokalne w pierwszym dołku poniżej progu
+        cand = below & (seg[:, :-1] <= seg[:, 1:])
+        has = cand.any(axis=1)
+        idx = np.where(has, np.argmax(cand, axis=1), np.argmin(seg[:, :-1], axis=1))
+        rows = np.arange(seg.shape[0])
+        t = idx + lo
+        shift = self._parabolic(cmnd, rows, t)
+        value = 1.0 - cmnd[rows, t]
+        # bez dołka poniżej progu: wynik tylko, gdy minimum jest wyraźne (jak aubio: pewność niska)
+        good = has | (cmnd[rows, t] < 2 * self.threshold)
+        return np.where(good, t + shift, 0.0), np.clip(value, 0.0, 1.0)
+
+    # ---------- MPM ----------
+    def _pick_mpm(self, r: np.ndarray, m: np.ndarray):
+        nsdf = 2.0 * r / np.maximum(m, 1e-12)
+        lo, hi = self.tau_min, self.tau_max
+        seg = nsdf[:, lo - 1:hi + 1]
+        mid = seg[:, 1:-1]
+        peak = (mid > seg[:, :-2]) & (mid >= seg[:, 2:]) & (mid > 0)
+        # tylko maksima po pierwszym przejściu przez zero (odcina maksimum w τ≈0)
+        neg = nsdf[:, :hi + 1] < 0
+        first_zero = np.where(neg.any(axis=1), np.argmax(neg, axis=1), hi)
+        peak &= (np.arange(lo, hi)[None, :] > first_zero[:, None])
+        vals = np.where(peak, mid, -np.inf)
+        best = vals.max(axis=1)
+        has = np.isfinite(best)
+        key = peak & (mid >= self.k * best[:, None])
+        idx = np.argmax(key, axis=1)
+        rows = np.arange(seg.shape[0])
+        t = idx + lo
+        shift = self._parabolic(nsdf, rows, t)
+        return np.where(has, t + shift, 0.0), np.clip(np.where(has, nsdf[rows, t], 0.0), 0.0, 1.0)
+
+    @staticmethod
+    def _parabolic(y: np.ndarray, rows: np.ndarray, t: np.ndarray) -> np.ndarray:
+        t = np.clip(t, 1, y.shape[1] - 2)
+        a, b, c = y[rows, t - 1], y[rows, t], y[rows, t + 1]
+        den = a - 2.0 * b + c
+        return np.where(np.abs(den) > 1e-12, 0.5 * (a - c) / np.where(np.abs(den) > 1e-12, den, 1.0), 0.0)
+
+PITCH_ENGINES = {
+    "aubio": lambda sr, hop, **kw: AubioPitch(sr, hop, **kw),
+    "yin": lambda sr, hop, **kw: NumpyPitch(sr, hop, method="yin", **kw),
+    "mpm": lambda sr, hop, **kw: NumpyPitch(sr, hop, method="mpm", **kw),
+}
+
+def make_pitch_engine(name: Optional[str], samplerate: int, hop: int, **kwargs) -> PitchEngine:
+    name = name or DEFAULT_PITCH_ENGINE
+    if name not in PITCH_ENGINES:
+        raise ValueError(f"nieznany silnik wysokości: {name} (dostępne: {', '.join(PITCH_ENGINES)})")
+    return PITCH_ENGINES[name](samplerate, hop, **kwargs)
+
+def frame_windows(signal: np.ndarray, hop: int, buf: int = PITCH_BUF) -> np.ndarray:
+    """
+    Okna (n_hopów, buf) kończące się na końcu każdego hopa – te same, które widzi
+    detektor strumieniowy (początek sygnału dopełniony zerami). Widok bez kopii.
+    """
+    n = signal.size // hop
+    padded = np.concatenate([np.zeros(buf - hop, dtype=signal.dtype), signal[:n * hop]])
+    return np.lib.stride_tricks.sliding_window_view(padded, buf)[::hop][:n]
+
+class AubioAnalyser:
+    def __init__(self, samplerate: int, hop_size: int, pitch_engine: Optional[str] = None,
+                 pitch_buf: int = PITCH_BUF, onset_buf: int = 1024):
+        # pitch_engine="none": wysokość liczona osobno (np. wsadowo offline)
+        self.pitch_engine = None if pitch_engine == "none" else \
+            make_pitch_engine(pitch_engine, samplerate, hop_size, buf=pitch_buf)
+        self.onset_o = aubio.onset("default", onset_buf, hop_size, samplerate)
+        self.tempo_o = aubio.tempo("default", onset_buf, hop_size, samplerate)
+
+    def process(self, frame: np.ndarray, clock: Optional[StageClock] = None):
+        # aubio oczekuje kolumny float32 (bez kopii, jeśli już jest)
+        vec = np.ascontiguousarray(frame, dtype=np.float32)
+        pitch_hz = self.pitch_engine.process(vec)[0] if self.pitch_engine is not None else 0.0
+        if clock is not None:
+            clock.lap(PITCH)
         onset = bool(self.onset_o(vec))
+        if clock is not None:
+            clock.lap(ONSET)
         bpm = float(self.tempo_o.get_bpm()) if self.tempo_o(vec) else float(self.tempo_o.get_bpm())
+        if clock is not None:
+            clock.lap(TEMPO)
         note, cents = hz_to_note_and_cents(pitch_hz)
         return pitch_hz, note, cents, onset, bpm or 0.0
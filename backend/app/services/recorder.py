@@ -0,0 +1,334 @@
+import io
+import json
+import math
+import os
+import re
+import threading
+import time
+import uuid
+import numpy as np
+import soundfile as sf
+from typing import Dict, List, Optional, Tuple
+
+from .ringbuffer import AudioRingBuffer
+
+# =============================
+# Nagrywanie sesji: surowe audio + ramki analizy
+#
+# Wątek analizy (sink AudioEngine) tylko kopiuje hop do prealokowanego
+# bufora kołowego audio i wpisuje pola ramki do prealokowanych kolumn
+# kolejki – żadnego I/O ani alokacji. Osobny wątek zapisu co FLUSH_S
+# opróżnia oba bufory: audio do pliku FLAC/WAV (kawałkami), ramki do
+# kolumn w plikach mapowanych w pamięci, powiększanych o CHUNK_FRAMES.
+#
+# Układ katalogu nagrania (root/<id>/):
+#   audio.flac | audio.wav
+#   <kolumna>.bin – surowe tablice (dtype w meta.json), ramka k = próbki [k*hop, (k+1)*hop);
+#                   ramki zgubione przy przepełnieniu kolejki to wiersze-zaślepki (GAP_ROW)
+#   meta.json     – parametry i liczniki (odświeżane w trakcie nagrywania)
+# =============================
+RECORDINGS_DIR = os.environ.get("VIOLIN_RECORDINGS_DIR", "backend/data/recordings")
+FORMATS = {"flac": ("FLAC", "PCM_24"), "wav": ("WAV", "FLOAT")}
+FRAME_COLUMNS = (("pitch_hz", "<f4"), ("cents", "<f4"), ("db", "<f4"), ("onset", "u1"), ("gated", "u1"))
+GAP_ROW = {"pitch_hz": math.nan, "cents": math.nan, "db": math.nan, "onset": 0, "gated": 1}
+CHUNK_FRAMES = 4096            # przyrost kolumn na dysku (~87 s przy 48 kHz / hop 1024)
+FLUSH_S = 0.1                  # okres pracy wątku zapisu
+META_EVERY_S = 1.0             # jak często odświeżać meta.json i nagłówek pliku audio
+RING_SECONDS = 10.0            # zapas, gdy dysk chwilowo nie nadąża
+_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+class RecordingNotFoundError(KeyError):
+    """Brak nagrania o podanym identyfikatorze."""
+
+class _FrameQueue:
+    """Kolejka SPSC ramek analizy w prealokowanych kolumnach (jak AudioRingBuffer, tylko pola ramki)."""
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.cols = {name: np.zeros(capacity, dtype=dt) for name, dt in FRAME_COLUMNS}
+        self._pitch, self._cents, self._db = self.cols["pitch_hz"], self.cols["cents"], self.cols["db"]
+        self._onset, self._gated = self.cols["onset"], self.cols["gated"]
+        self.write_pos = 0
+        self.read_pos = 0
+
+    def push(self, payload: dict):
+        i = self.write_pos % self.capacity
+        cents = payload.get("cents")
+        self._pitch[i] = payload.get("pitch_hz") or 0.0
+        self._cents[i] = math.nan if cents is None else cents
+        self._db[i] = payload.get("db") or 0.0
+        self._onset[i] = 1 if payload.get("onset") else 0
+        self._gated[i] = 1 if payload.get("gated") else 0
+        self.write_pos += 1
+
+class MappedColumn:
+    """Kolumna w pliku mapowanym w pamięci, powiększana o `chunk` elementów."""
+    def __init__(self, path: str, dtype: str, chunk: int = CHUNK_FRAMES):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.chunk = chunk
+        self.n = 0
+        self._map: Optional[np.memmap] = None
+        self._capacity = 0
+        open(path, "wb").close()
+        self._grow(chunk)
+
+    def _grow(self, capacity: int):
+        if self._map is not None:
+            self._map.flush()
+            self._map = None
+        with open(self.path, "r+b") as f:
+            f.truncate(capacity * self.dtype.itemsize)
+        self._map = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=(capacity,))
+        self._capacity = capacity
+
+    def extend(self, values: np.ndarray):
+        k = values.shape[0]
+        if self.n + k > self._capacity:
+            need = self.n + k
+            self._grow(-(-need // self.chunk) * self.chunk)
+        self._map[self.n:self.n + k] = values
+        self.n += k
+
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map = None
+        with open(self.path, "r+b") as f:
+            f.truncate(self.n * self.dtype.itemsize)
+
+class SessionRecorder:
+    """
+    Jedno nagranie strumienia sesji. sink(payload, samples) podpina się do
+    AudioEngine.sinks; start()/stop() zarządzają wątkiem zapisu.
+    Gdy zapis nie nadąża, bufory gubią najstarsze dane (liczone w meta),
+    a luki w audio są wypełniane ciszą, żeby oś czasu zgadzała się z ramkami.
+    """
+    def __init__(self, root: str, samplerate: int, hop: int, fmt: str = "flac",
+                 session_id: str = "default", rec_id: Optional[str] = None):
+        if fmt not in FORMATS:
+            raise ValueError(f"nieznany format: {fmt} (dostępne: {', '.join(FORMATS)})")
+        self.id = rec_id or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        self.dir = os.path.join(root, self.id)
+        self.samplerate = int(samplerate)
+        self.hop = int(hop)
+        self.format = fmt
+        self.session_id = session_id
+        ring_len = max(self.hop * 8, int(RING_SECONDS * self.samplerate))
+        self.audio = AudioRingBuffer(ring_len, self.samplerate)
+        self.frames = _FrameQueue(max(64, ring_len // self.hop))
+        self.started = time.time()
+        self.stopped: Optional[float] = None
+        self.samples_written = 0
+        self.silence_inserted = 0   # próbki ciszy w miejsce zgubionych
+        self.lost_frames = 0
+        self.error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sf: Optional[sf.SoundFile] = None
+        self._cols: Dict[str, MappedColumn] = {}
+
+    # ---------- wątek analizy ----------
+    def sink(self, payload: dict, samples: np.ndarray):
+        if self._stop.is_set():
+            return
+        self.audio.write(samples)
+        self.frames.push(payload)
+
+    # ---------- cykl życia ----------
+    def start(self):
+        os.makedirs(self.dir, exist_ok=True)
+        major, subtype = FORMATS[self.format]
+        self._sf = sf.SoundFile(os.path.join(self.dir, f"audio.{self.format}"), mode="w",
+                                samplerate=self.samplerate, channels=1, format=major, subtype=subtype)
+        self._cols = {name: MappedColumn(os.path.join(self.dir, f"{name}.bin"), dt) for name, dt in FRAME_COLUMNS}
+        self._write_meta()
+        self._thread = threading.Thread(target=self._writer_loop, name=f"recorder-{self.id}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self.meta()
+
+    @property
+    def recording(self) -> bool:
+        return self._thread is not None and not self._stop.is_set()
+
+    # ---------- wątek zapisu ----------
+    def _writer_loop(self):
+        buf = np.zeros(self.hop, dtype=np.float32)
+        zeros = np.zeros(self.hop, dtype=np.float32)
+        last_meta = time.monotonic()
+        try:
+            while True:
+                stopping = self._stop.wait(FLUSH_S)
+                self._drain(buf, zeros)
+                now = time.monotonic()
+                if stopping:
+                    break
+                if now - last_meta >= META_EVERY_S:
+                    self._sf.flush()
+                    self._write_meta()
+                    last_meta = now
+        except Exception as e:
+            self.error = str(e)
+            print(f"[recorder:{self.id}] błąd zapisu: {e}")
+        finally:
+            self._close()
+
+    def _drain(self, buf: np.ndarray, zeros: np.ndarray):
+        ring = self.audio
+        while ring.backlog >= self.hop:
+            lost_before = ring.dropped_frames
+            if not ring.read(buf, timeout=0.0):
+                break
+            gap = ring.dropped_frames - lost_before
+            while gap > 0:
+                k = min(gap, zeros.size)
+                self._sf.write(zeros[:k])
+                gap -= k
+                self.silence_inserted += k
+            self._sf.write(buf)
+            self.samples_written += buf.size
+        q = self.frames
+        w = q.write_pos
+        if w - q.read_pos > q.capacity:
+            # nadpisane ramki zastępują zaślepki, żeby ramka k dalej odpowiadała próbkom [k*hop, (k+1)*hop)
+            lost = w - q.capacity - q.read_pos
+            self.lost_frames += lost
+            while lost > 0:
+                k = min(lost, CHUNK_FRAMES)
+                for name, dt in FRAME_COLUMNS:
+                    self._cols[name].extend(np.full(k, GAP_ROW[name], dtype=dt))
+                lost -= k
+            q.read_pos = w - q.capacity
+        while q.read_pos < w:
+            i = q.read_pos % q.capacity
+            k = min(w - q.read_pos, q.capacity - i)
+            for name, col in self._cols.items():
+                col.extend(q.cols[name][i:i + k])
+            q.read_pos += k
+
+    def _close(self):
+        for col in self._cols.values():
+            col.close()
+        if self._sf is not None:
+            self._sf.close()
+            self._sf = None
+        self.stopped = time.time()
+        self._write_meta()
+
+    # ---------- metadane ----------
+    def meta(self) -> dict:
+        frames = next(iter(self._cols.values())).n if self._cols else 0
+        return {
+            "id": self.id,
+            "session_id": self.session_id,
+            "recording": self.recording,
+            "format": self.format,
+            "audio": f"audio.{self.format}",
+            "samplerate": self.samplerate,
+            "hop": self.hop,
+            "started": self.started,
+            "stopped": self.stopped,
+            "samples": self.samples_written + self.silence_inserted,
+            "duration_s": round((self.samples_written + self.silence_inserted) / self.samplerate, 3),
+            "frames": frames,
+            "columns": dict(FRAME_COLUMNS),
+            "silence_inserted": self.silence_inserted,
+            "lost_frames": self.lost_frames,
+            "error": self.error,
+        }
+
+    def _write_meta(self):
+        path = os.path.join(self.dir, "meta.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.meta(), f)
+        os.replace(tmp, path)
+
+# =============================
+# Odczyt nagrań (także w trakcie nagrywania: do ostatniego zapisu meta.json)
+# =============================
+class RecordingStore:
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, rec_id: str) -> str:
+        if not _ID_RE.match(rec_id):
+            raise RecordingNotFoundError(rec_id)
+        path = os.path.join(self.root, rec_id)
+        if not os.path.isfile(os.path.join(path, "meta.json")):
+            raise RecordingNotFoundError(rec_id)
+        return path
+
+    def meta(self, rec_id: str) -> dict:
+        with open(os.path.join(self._dir(rec_id), "meta.json")) as f:
+            return json.load(f)
+
+    def list(self) -> List[dict]:
+        out = []
+        for name in sorted(os.listdir(self.root)):
+            try:
+                out.append(self.meta(name))
+            except (RecordingNotFoundError, OSError, ValueError):
+                continue
+        return out
+
+    def _span(self, meta: dict, start: float, end: Optional[float]) -> Tuple[int, int]:
+        total = int(meta["samples"])
+        a = min(total, max(0, int(start * meta["samplerate"])))
+        b = total if end is None else min(total, max(a, int(end * meta["samplerate"])))
+        return a, b
+
+    def read_frames(self, rec_id: str, start: float = 0.0, end: Optional[float] = None) -> dict:
+        """Kolumny ramek z przedziału czasu – tylko potrzebny fragment plików (memmap)."""
+        meta = self.meta(rec_id)
+        path = self._dir(rec_id)
+        hop, sr = meta["hop"], meta["samplerate"]
+        a, b = self._span(meta, start, end)
+        n = int(meta["frames"])
+        i0, i1 = min(n, a // hop), min(n, -(-b // hop))
+        out = {"t": ((np.arange(i0, i1) * hop) / sr).round(4).tolist()}
+        for name, dt in meta["columns"].items():
+            fpath = os.path.join(path, f"{name}.bin")
+            if i1 <= i0:
+                out[name] = []
+                continue
+            col = np.memmap(fpath, dtype=np.dtype(dt), mode="r", shape=(i1 - i0,),
+                            offset=i0 * np.dtype(dt).itemsize)
+            vals = np.array(col)
+            if vals.dtype == np.uint8:
+                out[name] = vals.astype(bool).tolist()
+            else:
+                out[name] = [None if not math.isfinite(v) else round(v, 3) for v in vals.tolist()]
+        return out
+
+    def frame_columns(self, rec_id: str) -> Tuple[dict, Dict[str, np.ndarray]]:
+        """Metadane i pełne kolumny ramek jako tablice (do analizy po fakcie, np. dopasowania do partytury)."""
+        meta = self.meta(rec_id)
+        path = self._dir(rec_id)
+        n = int(meta["frames"])
+        cols = {}
+        for name, dt in meta["columns"].items():
+            cols[name] = (np.fromfile(os.path.join(path, f"{name}.bin"), dtype=np.dtype(dt), count=n)
+                          if n else np.zeros(0, dtype=dt))
+        return meta, cols
+
+    def read_audio(self, rec_id: str, start: float = 0.0, end: Optional[float] = None) -> Tuple[np.ndarray, int]:
+        """Próbki z przedziału czasu: seek w pliku i odczyt tylko tego fragmentu."""
+        meta = self.meta(rec_id)
+        a, b = self._span(meta, start, end)
+        with sf.SoundFile(os.path.join(self._dir(rec_id), meta["audio"])) as f:
+            f.seek(a)
+            data = f.read(b - a, dtype="float32")
+        return data, meta["samplerate"]
+
+    def read_audio_wav(self, rec_id: str, start: float = 0.0, end: Optional[float] = None) -> bytes:
+        data, sr = self.read_audio(rec_id, start, end)
+        bio = io.BytesIO()
+        sf.write(bio, data, sr, format="WAV", subtype="PCM_16")
+        return bio.getvalue()
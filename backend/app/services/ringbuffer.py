@@ -0,0 +1,103 @@
+import time
+import numpy as np
+
+class AudioRingBuffer:
+    """
+    Prealokowany bufor kołowy SPSC (jeden zapisujący, jeden czytający) bez blokad.
+    Zapis: callback PortAudio kopiuje indata prosto do bufora (bez pośrednich tablic).
+    Odczyt: wątek analizy pobiera okna stałej długości do własnego bufora.
+
+    Pozycje zapisu/odczytu to rosnące liczniki próbek; każdą modyfikuje tylko
+    jedna strona, więc pod GIL nie potrzeba żadnego zamka. Gdy analiza nie
+    nadąża i zapis ją zdubluje, czytelnik przeskakuje do najświeższego okna
+    i liczy utracone próbki.
+
+    channels > 1: bufor (próbki × kanały) w układzie z przeplotem jak indata PortAudio;
+    pozycje i liczniki są w ramkach (próbka wszystkich kanałów).
+    """
+    def __init__(self, capacity: int, samplerate: int = 44100, dtype=np.float32, channels: int = 1):
+        self.capacity = int(capacity)
+        self.samplerate = int(samplerate)
+        self.channels = max(1, int(channels))
+        self._buf = np.zeros(self.capacity if self.channels == 1 else (self.capacity, self.channels), dtype=dtype)
+        self._write_pos = 0
+        self._read_pos = 0
+        # liczniki diagnostyczne
+        self.overruns = 0          # ile razy zapis zdublował odczyt (analiza za wolna)
+        self.underruns = 0         # ile razy odczyt nie doczekał się danych (strumień stoi)
+        self.dropped_frames = 0    # próbki utracone przez overruny
+        self.input_overflows = 0   # przepełnienia zgłoszone przez PortAudio
+
+    # ---------- strona zapisu (callback audio) ----------
+    def write(self, data: np.ndarray):
+        n = data.shape[0]
+        cap = self.capacity
+        if n > cap:
+            data = data[n - cap:]
+            n = cap
+        w = self._write_pos
+        i = w % cap
+        first = min(n, cap - i)
+        self._buf[i:i + first] = data[:first]
+        if first < n:
+            self._buf[:n - first] = data[first:]
+        self._write_pos = w + n
+
+    # ---------- strona odczytu (wątek analizy) ----------
+    @property
+    def backlog(self) -> int:
+        """Liczba próbek zapisanych, a jeszcze nieprzeczytanych."""
+        return max(0, min(self._write_pos - self._read_pos, self.capacity))
+
+    def _skip_to_latest(self, w: int, n: int):
+        lost = (w - n) - self._read_pos
+        if lost > 0:
+            self.overruns += 1
+            self.dropped_frames += lost
+            self._read_pos = w - n
+
+    def read(self, out: np.ndarray, timeout: float = 1.0) -> bool:
+        """
+        Kopiuje kolejne len(out) próbek do out. Zwraca False, jeśli dane nie
+        nadeszły w czasie timeout (underrun).
+        """
+        n = out.shape[0]
+        cap = self.capacity
+        deadline = time.monotonic() + timeout
+        while True:
+            w = self._write_pos
+            avail = w - self._read_pos
+            if avail > cap:
+                self._skip_to_latest(w, n)
+                avail = n
+            if avail >= n:
+                r = self._read_pos
+                i = r % cap
+                first = min(n, cap - i)
+                out[:first] = self._buf[i:i + first]
+                if first < n:
+                    out[first:] = self._buf[:n - first]
+                # zapis mógł w trakcie kopiowania nadpisać czytany fragment
+                if self._write_pos - r > cap:
+                    self._skip_to_latest(self._write_pos, n)
+                    continue
+                self._read_pos = r + n
+                return True
+            if time.monotonic() >= deadline:
+                self.underruns += 1
+                return False
+            # czekamy mniej więcej tyle, ile brakuje do pełnego okna
+            time.sleep(max(0.0005, (n - avail) / float(self.samplerate)))
+
+    def reset(self):
+        self._write_pos = 0
+        self._read_pos = 0
+
+    def stats(self) -> dict:
+        return {
+            "overruns": self.overruns,
+            "underruns": self.underruns,
+            "dropped_frames": self.dropped_frames,
+            "input_overflows": self.input_overflows,
+            "backlog_frames": self.backlog,
+        }
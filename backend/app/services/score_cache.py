@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# =============================
+# Kompilacja partytury do kolumnowych tablic NumPy (raz na hash treści).
+# Wynik ląduje w .npz obok uploadu i w LRU w pamięci (limit w bajtach),
+# więc śledzenie partytury, akompaniament i statystyki nie dotykają music21.
+# =============================
+FORMAT_VERSION = 1
+CACHE_MAX_BYTES = int(float(os.environ.get("VIOLIN_SCORE_CACHE_MB", "64")) * 1024 * 1024)
+DEFAULT_BPM = 120.0
+HASH_MEMO_ENTRIES = 4096       # zapamiętane hashe plików (LRU), po jednym na (ścieżka, mtime, rozmiar)
+
+TIE_NONE, TIE_START, TIE_CONTINUE, TIE_STOP = 0, 1, 2, 3
+_TIE_CODES = {"start": TIE_START, "continue": TIE_CONTINUE, "stop": TIE_STOP}
+
+NOTE_COLUMNS = ("onset_beats", "onset_s", "dur_beats", "dur_s", "midi", "measure", "tie")
+
+def content_hash(path: str, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            buf = f.read(chunk)
+            if not buf:
+                break
+            h.update(buf)
+    return h.hexdigest()
+
+def table_path(path: str) -> str:
+    return path + ".notes.npz"
+
+class PartTable:
+    """Nuty jednej partii jako kolumny (jeden wiersz na dźwięk; akord = kilka wierszy)."""
+    def __init__(self, name: str, columns: Dict[str, np.ndarray]):
+        self.name = name
+        self.columns = columns
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self.columns[key]
+
+    def __len__(self) -> int:
+        return int(self.columns["midi"].size)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(int(a.nbytes) for a in self.columns.values())
+
+class ScoreTable:
+    def __init__(self, content_hash: str, meta: dict, parts: List[PartTable], tempo_map: np.ndarray):
+        self.hash = content_hash
+        self.meta = meta
+        self.parts = parts
+        self.tempo_map = tempo_map  # (n, 2): początek w ćwierćnutach, bpm ćwierćnuty
+
+    @property
+    def nbytes(self) -> int:
+        return sum(p.nbytes for p in self.parts) + int(self.tempo_map.nbytes)
+
+    def part(self, key) -> PartTable:
+        if isinstance(key, int):
+            return self.parts[key]
+        for p in self.parts:
+            if p.name == key:
+                return p
+        raise KeyError(key)
+
+    def beats_to_seconds(self, beats: np.ndarray) -> np.ndarray:
+        return beats_to_seconds(self.tempo_map, beats)
+
+    # ---------- zapis / odczyt .npz ----------
+    def save(self, path: str):
+        arrays = {"tempo_map": self.tempo_map}
+        for i, p in enumerate(self.parts):
+            for col, arr in p.columns.items():
+                arrays[f"p{i}_{col}"] = arr
+        meta = dict(self.meta, hash=self.hash, format=FORMAT_VERSION, part_names=[p.name for p in self.parts])
+        # osobny plik tymczasowy na pisarza: tę samą tabelę może zapisywać import katalogu i żądanie
+        tmp = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp.npz"
+        np.savez(tmp, meta_json=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ScoreTable":
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta_json"]))
+            if meta.get("format") != FORMAT_VERSION:
+                raise ValueError("nieaktualny format tabeli nut")
+            parts = [
+                PartTable(name, {col: z[f"p{i}_{col}"] for col in NOTE_COLUMNS})
+                for i, name in enumerate(meta.pop("part_names"))
+            ]
+            tempo_map = z["tempo_map"]
+        h = meta.pop("hash")
+        meta.pop("format", None)
+        return cls(h, meta, parts, tempo_map)
+
+    def timeline(self) -> dict:
+        return {
+            "parts": [
+                {"name": p.name, **{col: p[col].tolist() for col in NOTE_COLUMNS}}
+                for p in self.parts
+            ],
+            "tempo_map": self.tempo_map.tolist(),
+        }
+
+def beats_to_seconds(tempo_map: np.ndarray, beats: np.ndarray) -> np.ndarray:
+    """Przelicza pozycje w ćwierćnutach na sekundy wg odcinkowo stałej mapy tempa."""
+    starts = tempo_map[:, 0]
+    spq = 60.0 / tempo_map[:, 1]
+    # czas początku każdego odcinka tempa
+    seg_t = np.concatenate([[0.0], np.cumsum(np.diff(starts) * spq[:-1])])
+    idx = np.clip(np.searchsorted(starts, beats, side="right") - 1, 0, len(starts) - 1)
+    return seg_t[idx] + (beats - starts[idx]) * spq[idx]
+
+# =============================
+# Kompilacja (music21 – tylko tutaj)
+# =============================
+def compile_score(path: str, digest: Optional[str] = None) -> ScoreTable:
+    from music21 import converter
+
+    return compile_stream(converter.parse(path), path, digest)
+
+def compile_stream(score, path: str, digest: Optional[str] = None) -> ScoreTable:
+    """Tabela nut z już sparsowanej partytury music21 (import katalogu czyta z niej też tonację i metrum)."""
+    boundaries = score.metronomeMarkBoundaries()
+    tempo_rows = [(float(start), float(mm.getQuarterBPM() or DEFAULT_BPM)) for start, _, mm in boundaries]
+    tempo_map = np.array(tempo_rows or [(0.0, DEFAULT_BPM)], dtype=np.float64)
+
+    parts: List[PartTable] = []
+    for pi, part in enumerate(score.parts):
+        rows: List[Tuple[float, float, int, int, int]] = []
+        for el in part.flatten().notes:
+            onset = float(el.offset)
+            dur = float(el.quarterLength)
+            measure = int(el.measureNumber or 0)
+            tie = _TIE_CODES.get(el.tie.type, TIE_NONE) if el.tie is not None else TIE_NONE
+            for p in el.pitches:
+                rows.append((onset, dur, int(p.midi), measure, tie))
+        rows.sort(key=lambda r: (r[0], r[2]))
+        arr = np.array(rows, dtype=np.float64).reshape(-1, 5)
+        onset_beats = arr[:, 0]
+        dur_beats = arr[:, 1]
+        onset_s = beats_to_seconds(tempo_map, onset_beats)
+        end_s = beats_to_seconds(tempo_map, onset_beats + dur_beats)
+        parts.append(PartTable(part.partName or f"Part {pi + 1}", {
+            "onset_beats": onset_beats.astype(np.float32),
+            "onset_s": onset_s.astype(np.float32),
+            "dur_beats": dur_beats.astype(np.float32),
+            "dur_s": (end_s - onset_s).astype(np.float32),
+            "midi": arr[:, 2].astype(np.uint8),
+            "measure": arr[:, 3].astype(np.int32),
+            "tie": arr[:, 4].astype(np.uint8),
+        }))
+
+    md = score.metadata
+    total_beats = float(score.highestTime)
+    meta = {
+        "title": (md and md.title) or os.path.basename(path),
+        "composer": (md and md.composer) or None,
+        "parts": len(parts),
+        "measures": sum(len(p.getElementsByClass("Measure")) for p in score.parts),
+        "kind": "musicxml" if path.lower().endswith((".musicxml", ".xml", ".mxl")) else "midi",
+        "duration_beats": total_beats,
+        "duration_s": float(beats_to_seconds(tempo_map, np.array([total_beats]))[0]),
+        "notes": int(sum(len(p) for p in parts)),
+    }
+    return ScoreTable(digest or content_hash(path), meta, parts, tempo_map)
+
+# =============================
+# Cache: LRU w pamięci (limit bajtów) + .npz na dysku
+# =============================
+class ScoreCache:
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lru: "OrderedDict[str, ScoreTable]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._compile_locks: Dict[str, threading.Lock] = {}
+        # (ścieżka, mtime, rozmiar) -> hash, żeby nie haszować pliku przy każdym żądaniu
+        self._hash_memo: "OrderedDict[Tuple[str, float, int], str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _digest(self, path: str) -> str:
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_mtime, st.st_size)
+        with self._lock:
+            h = self._hash_memo.get(key)
+            if h is not None:
+                self._hash_memo.move_to_end(key)
+                return h
+        h = content_hash(path)
+        self._memo(key, h)
+        return h
+
+    def _memo(self, key: Tuple[str, float, int], digest: str):
+        with self._lock:
+            self._hash_memo[key] = digest
+            self._hash_memo.move_to_end(key)
+            while len(self._hash_memo) > HASH_MEMO_ENTRIES:
+                self._hash_memo.popitem(last=False)
+
+    def remember(self, path: str, digest: str):
+        """Hash policzony już przy zapisie (upload) – bez ponownego czytania pliku."""
+        st = os.stat(path)
+        self._memo((os.path.abspath(path), st.st_mtime, st.st_size), digest)
+
+    def cached(self, path: str) -> bool:
+        """Czy tabela nut jest gotowa (w pamięci albo jako .npz) – bez kompilacji."""
+        digest = self._digest(path)
+        return self.peek(digest) is not None or os.path.exists(table_path(path))
+
+    def _put(self, table: ScoreTable):
+        with self._lock:
+            old = self._lru.pop(table.hash, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._lru[table.hash] = table
+            self._bytes += table.nbytes
+            while self._bytes > self.max_bytes and len(self._lru) > 1:
+                _, evicted = self._lru.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def peek(self, digest: str) -> Optional[ScoreTable]:
+        with self._lock:
+            table = self._lru.get(digest)
+            if table is not None:
+                self._lru.move_to_end(digest)
+            return table
+
+    def get(self, path: str, digest: Optional[str] = None) -> ScoreTable:
+        digest = digest or self._digest(path)
+        table = self.peek(digest)
+        if table is not None:
+            self.hits += 1
+            return table
+
+        with self._lock:
+            lock = self._compile_locks.setdefault(digest, threading.Lock())
+        try:
+            with lock:
+                table = self.peek(digest)
+                if table is not None:
+                    self.hits += 1
+                    return table
+                self.misses += 1
+                npz = table_path(path)
+                table = None
+                if os.path.exists(npz):
+                    try:
+                        table = ScoreTable.load(npz)
+                        if table.hash != digest:
+                            table = None
+                    except (ValueError, KeyError, OSError):
+                        table = None
+                if table is None:
+                    table = compile_score(path, digest)
+                    table.save(npz)
+                self._put(table)
+        finally:
+            # także po błędzie kompilacji (np. uszkodzony upload) – inaczej zamek zostaje na zawsze
+            with self._lock:
+                self._compile_locks.pop(digest, None)
+        return table
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._lru), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+score_cache = ScoreCache()
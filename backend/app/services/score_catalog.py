@@ -0,0 +1,646 @@
+"""
+Katalog biblioteki partytur: indeks metadanych (tytuł, kompozytor, tonacja, metrum,
+skala partii skrzypiec, wskaźniki trudności, czas trwania) trwale zapisany w
+<katalog uploadów>/.catalog.json. Wyszukiwanie i listowanie czytają tylko indeks
+w pamięci – pliki nie są ponownie parsowane.
+
+Import hurtowy (katalog na dysku albo zip) zapisuje pliki do magazynu adresowanego
+treścią (duplikaty = jeden plik) i parsuje nowe treści w puli procesów:
+MusicXML/MXL przez music21 (przy okazji powstaje tabela nut .notes.npz, więc
+pierwsze śledzenie czy akompaniament nie kompilują partytury), MIDI przez mido
+(same komunikaty – kilkadziesiąt razy szybciej niż music21).
+
+Z katalogu backend/:
+    python -m app.services.score_catalog import <katalog|plik.zip> [--reindex] [--workers N]
+    python -m app.services.score_catalog search "bach" [--key "D major"] [--max-level 2]
+"""
+import argparse
+import json
+import math
+import os
+import threading
+import time
+import uuid
+import zipfile
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .score_cache import DEFAULT_BPM, beats_to_seconds, compile_stream, content_hash, table_path
+from .score_store import ScoreStore, ScoreTooLargeError
+from .synth import is_solo_part
+
+CATALOG_FILE = ".catalog.json"
+CATALOG_VERSION = 1
+SCORE_EXTENSIONS = (".musicxml", ".xml", ".mxl", ".mid", ".midi")
+MIDI_EXTENSIONS = (".mid", ".midi")
+IMPORT_WORKERS = int(os.environ.get("VIOLIN_IMPORT_WORKERS", "0")) or min(4, os.cpu_count() or 2)
+SAVE_EVERY = 50            # zapis indeksu co tyle nowych wpisów w trakcie importu
+MAX_JOB_ERRORS = 100
+MAX_JOBS = 20
+
+VIOLIN_LOWEST = 55         # G3 – pusta struna G
+FIRST_POSITION_TOP = 83    # B5 – 4. palec na strunie E w I pozycji
+E_STRING = 76              # E5 – pusta struna E
+
+_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+_TONICS = ["C", "C#", "D", "Eb", "E", "F", "F#", "G", "Ab", "A", "Bb", "B"]
+_LETTERS = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+_MAJOR_STEPS = (0, 2, 4, 5, 7, 9, 11)
+_MINOR_STEPS = (0, 2, 3, 5, 7, 8, 10, 11)    # naturalna + podwyższony 7. stopień
+# profile Krumhansla–Kesslera (tonacja bez znaków przykluczowych, np. MIDI bez key_signature)
+_MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+_MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+def midi_name(midi: int) -> str:
+    return f"{_NAMES[midi % 12]}{midi // 12 - 1}"
+
+# =============================
+# Tonacja i wskaźniki trudności (NumPy na kolumnach nut)
+# =============================
+def key_name(tonic: str, mode: str) -> str:
+    """'B-', 'minor' -> 'Bb minor' (zapis music21 i mido sprowadzony do jednego)."""
+    return f"{tonic.replace('-', 'b')} {mode}"
+
+def key_pitch_classes(key: Optional[str]) -> Optional[np.ndarray]:
+    if not key:
+        return None
+    tonic, _, mode = key.partition(" ")
+    pc = _LETTERS.get(tonic[:1].upper())
+    if pc is None:
+        return None
+    pc += sum(1 if a == "#" else -1 if a in "b-" else 0 for a in tonic[1:])
+    steps = _MINOR_STEPS if mode == "minor" else _MAJOR_STEPS
+    return np.array([(pc + s) % 12 for s in steps])
+
+def estimate_key(midi: np.ndarray, dur: np.ndarray) -> Optional[str]:
+    """Tonacja z histogramu klas wysokości (ważonego długością) – korelacja z 24 profilami."""
+    if midi.size == 0:
+        return None
+    hist = np.bincount(midi.astype(np.int64) % 12, weights=dur.astype(np.float64), minlength=12)
+    if not hist.any():
+        return None
+    best, name = -2.0, None
+    for profile, mode in ((_MAJOR_PROFILE, "major"), (_MINOR_PROFILE, "minor")):
+        for tonic in range(12):
+            r = np.corrcoef(hist, np.roll(profile, tonic))[0, 1]
+            if r > best:
+                best, name = r, key_name(_TONICS[tonic], mode)
+    return name
+
+def difficulty(onset_s: np.ndarray, dur_s: np.ndarray, midi: np.ndarray, key: Optional[str]) -> dict:
+    """
+    Wskaźniki trudności partii ucznia. `level` 1..5 to suma prostych progów:
+    wyjście ponad pustą E, ponad I pozycję, szybkie nuty (>3 dźwięki/s albo
+    10% odstępów < 150 ms), dwudźwięki / chromatyka / skoki ponad oktawę.
+    """
+    if midi.size == 0:
+        return {"level": 1, "notes_per_s": 0.0, "fast_ioi_s": None, "max_leap": 0, "double_stops": 0.0,
+                "accidentals": 0.0, "above_first_position": 0.0, "below_violin_range": 0}
+    order = np.lexsort((midi, onset_s))
+    onset_s, dur_s, midi = onset_s[order], dur_s[order], midi[order].astype(np.int64)
+    uniq, first, counts = np.unique(np.round(onset_s, 3), return_index=True, return_counts=True)
+    # melodia: najwyższy dźwięk każdego początku (akord posortowany rosnąco -> ostatni wiersz grupy)
+    top = midi[first + counts - 1]
+    span = float((onset_s + dur_s).max() - onset_s.min())
+    notes_per_s = uniq.size / span if span > 0 else 0.0
+    ioi = np.diff(uniq)
+    ioi = ioi[ioi > 0]
+    fast = float(np.percentile(ioi, 10)) if ioi.size else None
+    max_leap = int(np.abs(np.diff(top)).max()) if top.size > 1 else 0
+    double_stops = float(np.mean(counts > 1))
+    pcs = key_pitch_classes(key)
+    accidentals = float(np.mean(~np.isin(midi % 12, pcs))) if pcs is not None else 0.0
+    highest = int(midi.max())
+    level = (1 + (highest > E_STRING) + (highest > FIRST_POSITION_TOP)
+             + (notes_per_s > 3.0 or (fast is not None and fast < 0.15))
+             + (double_stops > 0.05 or accidentals > 0.15 or max_leap > 12))
+    return {
+        "level": int(level),
+        "notes_per_s": round(notes_per_s, 2),
+        "fast_ioi_s": None if fast is None else round(fast, 3),
+        "max_leap": max_leap,
+        "double_stops": round(double_stops, 3),
+        "accidentals": round(accidentals, 3),
+        "above_first_position": round(float(np.mean(midi > FIRST_POSITION_TOP)), 3),
+        "below_violin_range": int((midi < VIOLIN_LOWEST).sum()),
+    }
+
+def _pitch_range(midi: np.ndarray) -> Optional[dict]:
+    if midi.size == 0:
+        return None
+    lo, hi = int(midi.min()), int(midi.max())
+    return {"lowest": lo, "highest": hi, "lowest_name": midi_name(lo), "highest_name": midi_name(hi),
+            "span": hi - lo}
+
+def _summary(parts: Sequence[Tuple[str, np.ndarray, np.ndarray, np.ndarray]], key: Optional[str],
+             key_source: Optional[str]) -> dict:
+    """parts: (nazwa, onset_s, dur_s, midi). Partia ucznia: pierwsze skrzypce, inaczej pierwsza partia."""
+    solo = next((i for i, p in enumerate(parts) if is_solo_part(p[0])), 0)
+    if key is None and parts:
+        midi = np.concatenate([p[3] for p in parts])
+        key = estimate_key(midi, np.concatenate([p[2] for p in parts]))
+        key_source = "estimated" if key else None
+    _, onset, dur, midi = parts[solo] if parts else ("", np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64))
+    return {
+        "key": key,
+        "key_source": key_source,
+        "parts": [{"index": i, "name": name, "notes": int(m.size), **(_pitch_range(m) or {})}
+                  for i, (name, _, _, m) in enumerate(parts)],
+        "solo_part": solo if parts else None,
+        "range": _pitch_range(midi),
+        "difficulty": difficulty(onset, dur, midi, key),
+    }
+
+# =============================
+# Parsowanie jednego pliku (w procesie puli)
+# =============================
+def _musicxml_entry(path: str, digest: str) -> dict:
+    from music21 import converter, key as m21key
+
+    score = converter.parse(path)
+    table = compile_stream(score, path, digest)
+    npz = table_path(path)
+    if not os.path.exists(npz):
+        table.save(npz)
+    flat = score.flatten()
+    ks = next(iter(flat.getElementsByClass("KeySignature")), None)
+    ts = next(iter(flat.getElementsByClass("TimeSignature")), None)
+    key = None
+    if ks is not None:
+        k = ks if isinstance(ks, m21key.Key) else ks.asKey()
+        key = key_name(k.tonic.name, k.mode)
+    parts = [(p.name, p["onset_s"], p["dur_s"], p["midi"]) for p in table.parts]
+    return {
+        "title": table.meta["title"],
+        "composer": table.meta["composer"],
+        "time_signature": ts.ratioString if ts is not None else None,
+        "tempo_bpm": round(float(table.tempo_map[0, 1]), 2),
+        "duration_s": round(table.meta["duration_s"], 2),
+        "duration_beats": table.meta["duration_beats"],
+        "measures": table.meta["measures"],
+        "notes": table.meta["notes"],
+        **_summary(parts, key, "signature" if key else None),
+    }
+
+def _midi_entry(path: str) -> dict:
+    import mido
+
+    mid = mido.MidiFile(path)
+    tpb = float(mid.ticks_per_beat)
+    tempo_rows: List[Tuple[float, float]] = []
+    ts = key = title = None
+    voices: "OrderedDict[Tuple[int, int], List[Tuple[int, int, int]]]" = OrderedDict()
+    names: Dict[int, str] = {}
+    end_tick = 0
+    for ti, track in enumerate(mid.tracks):
+        tick = 0
+        sounding: Dict[Tuple[int, int], List[int]] = {}
+        has_notes = False
+        for msg in track:
+            tick += msg.time
+            kind = msg.type
+            if kind == "note_on" and msg.velocity > 0:
+                if msg.channel != 9:   # perkusja GM
+                    sounding.setdefault((msg.channel, msg.note), []).append(tick)
+            elif kind in ("note_off", "note_on"):
+                starts = sounding.get((msg.channel, msg.note))
+                if starts:
+                    voices.setdefault((ti, msg.channel), []).append((starts.pop(0), tick, msg.note))
+                    has_notes = True
+            elif kind == "set_tempo":
+                tempo_rows.append((tick / tpb, mido.tempo2bpm(msg.tempo)))
+            elif kind == "time_signature" and ts is None:
+                ts = f"{msg.numerator}/{msg.denominator}"
+            elif kind == "key_signature" and key is None:
+                minor = msg.key.endswith("m")
+                key = key_name(msg.key[:-1] if minor else msg.key, "minor" if minor else "major")
+            elif kind == "track_name" and msg.name.strip():
+                names.setdefault(ti, msg.name.strip())
+        end_tick = max(end_tick, tick)
+        if not has_notes and ti in names and title is None:
+            title = names[ti]   # ścieżka dyrygencka niesie zwykle tytuł
+
+    tempo_rows.sort()
+    if not tempo_rows or tempo_rows[0][0] > 0.0:
+        tempo_rows.insert(0, (0.0, DEFAULT_BPM))
+    tempo_map = np.array(tempo_rows, dtype=np.float64)
+    per_track: Dict[int, int] = {}
+    for ti, _ in voices:
+        per_track[ti] = per_track.get(ti, 0) + 1
+    parts = []
+    for (ti, ch), rows in voices.items():
+        arr = np.array(rows, dtype=np.float64)
+        on_b, off_b = arr[:, 0] / tpb, arr[:, 1] / tpb
+        on_s = beats_to_seconds(tempo_map, on_b)
+        name = names.get(ti, f"Track {ti + 1}")
+        if per_track[ti] > 1:
+            name = f"{name} (ch {ch + 1})"
+        parts.append((name, on_s, beats_to_seconds(tempo_map, off_b) - on_s, arr[:, 2].astype(np.int64)))
+
+    total_beats = end_tick / tpb
+    num, den = (int(x) for x in (ts or "4/4").split("/"))
+    return {
+        "title": title,
+        "composer": None,
+        "time_signature": ts,
+        "tempo_bpm": round(float(tempo_map[0, 1]), 2),
+        "duration_s": round(float(beats_to_seconds(tempo_map, np.array([total_beats]))[0]), 2),
+        "duration_beats": total_beats,
+        "measures": int(math.ceil(total_beats / (num * 4.0 / den))) if total_beats > 0 else 0,
+        "notes": int(sum(p[3].size for p in parts)),
+        **_summary(parts, key, "signature" if key else None),
+    }
+
+def catalog_entry(path: str, digest: str, filename: str) -> dict:
+    """Wpis katalogu dla pliku z magazynu (funkcja modułu – wołana w procesie puli)."""
+    name = os.path.basename(path)
+    ext = os.path.splitext(name)[1].lower()
+    entry = _midi_entry(path) if ext in MIDI_EXTENSIONS else _musicxml_entry(path, digest)
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    if not entry["title"] or entry["title"] == name:
+        entry["title"] = stem
+    entry.update(hash=digest, file=name, filename=filename,
+                 kind="midi" if ext in MIDI_EXTENSIONS else "musicxml", imported_at=time.time())
+    return entry
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: fork procesu z wątkami audio/uvicorn bywa niebezpieczny
+            _pool = ProcessPoolExecutor(max_workers=IMPORT_WORKERS, mp_context=get_context("spawn"))
+        return _pool
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None   # następne zadanie utworzy pulę od nowa
+
+# =============================
+# Indeks (w pamięci + .catalog.json)
+# =============================
+SORT_KEYS: Dict[str, Callable[[dict], object]] = {
+    "title": lambda e: (e.get("title") or "").lower(),
+    "composer": lambda e: ((e.get("composer") or "~").lower(), (e.get("title") or "").lower()),
+    "duration": lambda e: e.get("duration_s") or 0.0,
+    "level": lambda e: (e["difficulty"]["level"], (e.get("title") or "").lower()),
+    "imported": lambda e: -e.get("imported_at", 0.0),
+}
+
+def _search_text(entry: dict) -> str:
+    words = [entry.get("title"), entry.get("composer"), entry.get("filename"), entry.get("key"),
+             entry.get("time_signature"), *(p["name"] for p in entry.get("parts", []))]
+    return " ".join(w for w in words if w).lower()
+
+class ScoreCatalog:
+    def __init__(self, store: ScoreStore, url_prefix: str = "/media/scores/"):
+        self.store = store
+        self.root = store.root
+        self.path = os.path.join(store.root, CATALOG_FILE)
+        self.url_prefix = url_prefix
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        self._text: Dict[str, str] = {}
+        self._pending: Dict[str, Future] = {}
+        self.jobs: "OrderedDict[str, ImportJob]" = OrderedDict()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != CATALOG_VERSION:
+            return
+        for e in data.get("entries", []):
+            # plik usunięty (gc --prune) – wpis znika z katalogu
+            if os.path.isfile(os.path.join(self.root, e["file"])):
+                self._entries[e["hash"]] = e
+                self._text[e["hash"]] = _search_text(e)
+
+    def save(self):
+        with self._lock:
+            entries = list(self._entries.values())
+        with self._save_lock:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"version": CATALOG_VERSION, "entries": entries}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, digest: str) -> Optional[dict]:
+        e = self._entries.get(digest)
+        return None if e is None else self._public(e)
+
+    def has(self, digest: str) -> bool:
+        return digest in self._entries
+
+    def put(self, entry: dict):
+        with self._lock:
+            self._entries[entry["hash"]] = entry
+            self._text[entry["hash"]] = _search_text(entry)
+
+    def _public(self, e: dict) -> dict:
+        return dict(e, url=self.url_prefix + e["file"])
+
+    # ---------- wyszukiwanie ----------
+    def search(self, q: Optional[str] = None, composer: Optional[str] = None, key: Optional[str] = None,
+               time_signature: Optional[str] = None, kind: Optional[str] = None, min_level: int = 1,
+               max_level: int = 5, min_pitch: Optional[int] = None, max_pitch: Optional[int] = None,
+               max_duration: Optional[float] = None, sort: str = "title", limit: int = 50,
+               offset: int = 0) -> dict:
+        """
+        q: słowa (wszystkie muszą wystąpić w tytule/kompozytorze/nazwie pliku/partiach);
+        min_pitch/max_pitch: skala partii ucznia mieści się w [min, max] MIDI
+        (np. max_pitch=83 – bez wychodzenia ponad I pozycję).
+        """
+        terms = (q or "").lower().split()
+        composer = composer.lower() if composer else None
+        key = key.lower() if key else None
+        with self._lock:
+            items = list(self._entries.items())
+            text = self._text
+            hits = []
+            for digest, e in items:
+                if terms and not all(t in text[digest] for t in terms):
+                    continue
+                if composer and composer not in (e.get("composer") or "").lower():
+                    continue
+                if key and (e.get("key") or "").lower() != key:
+                    continue
+                if time_signature and e.get("time_signature") != time_signature:
+                    continue
+                if kind and e.get("kind") != kind:
+                    continue
+                if not min_level <= e["difficulty"]["level"] <= max_level:
+                    continue
+                rng = e.get("range")
+                if (min_pitch is not None or max_pitch is not None) and rng is None:
+                    continue
+                if min_pitch is not None and rng["lowest"] < min_pitch:
+                    continue
+                if max_pitch is not None and rng["highest"] > max_pitch:
+                    continue
+                if max_duration is not None and (e.get("duration_s") or 0.0) > max_duration:
+                    continue
+                hits.append(e)
+        hits.sort(key=SORT_KEYS.get(sort, SORT_KEYS["title"]))
+        return {"total": len(hits), "offset": offset,
+                "items": [self._public(e) for e in hits[offset:offset + limit]]}
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = list(self._entries.values())
+        levels = np.bincount([e["difficulty"]["level"] for e in entries], minlength=6)[1:] if entries \
+            else np.zeros(5, dtype=np.int64)
+        return {
+            "entries": len(entries),
+            "pending": len(self._pending),
+            "composers": sorted({e["composer"] for e in entries if e.get("composer")}),
+            "keys": sorted({e["key"] for e in entries if e.get("key")}),
+            "levels": {str(i + 1): int(n) for i, n in enumerate(levels)},
+        }
+
+    # ---------- pojedynczy upload ----------
+    def index_async(self, name: str, digest: str, filename: str):
+        """
+        Upload przez /upload: parsowanie w tle w puli, wpis i zapis indeksu po zakończeniu.
+        Pula (IMPORT_WORKERS procesów spawn z music21) powstaje przy pierwszym użyciu i zostaje na kolejne.
+        """
+        with self._lock:
+            if digest in self._entries or digest in self._pending:
+                return
+            try:
+                future = _get_pool().submit(catalog_entry, os.path.join(self.root, name), digest, filename)
+            except (BrokenProcessPool, RuntimeError):
+                _reset_pool()
+                return
+            self._pending[digest] = future
+
+        def done(f: Future):
+            with self._lock:
+                self._pending.pop(digest, None)
+            try:
+                entry = f.result()
+            except BrokenProcessPool:
+                _reset_pool()
+                return
+            except Exception:
+                return   # nieczytelny plik – /timeline zwróci 422 z opisem
+            self.put(entry)
+            self.save()
+        future.add_done_callback(done)
+
+    # ---------- import hurtowy ----------
+    def start_import(self, source: Iterator[tuple], label: str, reindex: bool = False,
+                     workers: int = IMPORT_WORKERS, cleanup: Optional[Callable[[], None]] = None) -> "ImportJob":
+        """source: (nazwa_w_magazynie, sha256, oryginalna_nazwa, duplikat) – zob. ingest_files / scan_store."""
+        job = ImportJob(label)
+        with self._lock:
+            self.jobs[job.id] = job
+            while len(self.jobs) > MAX_JOBS:
+                self.jobs.popitem(last=False)
+        job._thread = threading.Thread(target=self.run_import, args=(job, source, reindex, workers, cleanup),
+                                       name=f"score-import-{job.id}", daemon=True)
+        job._thread.start()
+        return job
+
+    def run_import(self, job: "ImportJob", source: Iterator[tuple], reindex: bool = False,
+                   workers: int = IMPORT_WORKERS, cleanup: Optional[Callable[[], None]] = None):
+        futures: Dict[Future, Tuple[str, str]] = {}
+        queued = set()
+        unsaved = 0
+        try:
+            pool = _get_pool() if workers > 0 else None
+            for item in source:
+                if isinstance(item, SourceError):
+                    job.fail(item.filename, item.message)
+                    continue
+                name, digest, filename, duplicate = item
+                job.files += 1
+                job.duplicates += int(duplicate)
+                if digest in queued or (not reindex and self.has(digest)):
+                    job.skipped += 1
+                    continue
+                queued.add(digest)
+                path = os.path.join(self.root, name)
+                if pool is None:
+                    futures[_run_now(catalog_entry, path, digest, filename)] = (filename, digest)
+                else:
+                    futures[pool.submit(catalog_entry, path, digest, filename)] = (filename, digest)
+                job.queued += 1
+            job.stored_all = True
+            for f in as_completed(futures):
+                filename, _ = futures[f]
+                try:
+                    entry = f.result()
+                except BrokenProcessPool:
+                    _reset_pool()
+                    job.fail(filename, "proces parsowania przerwany")
+                    continue
+                except Exception as e:
+                    job.fail(filename, f"{type(e).__name__}: {e}")
+                    continue
+                self.put(entry)
+                job.parsed += 1
+                unsaved += 1
+                if unsaved >= SAVE_EVERY:
+                    self.save()
+                    unsaved = 0
+            job.state = "done"
+        except Exception as e:
+            job.state = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            if unsaved:
+                self.save()
+            job.finished_at = time.time()
+            if cleanup is not None:
+                cleanup()
+        return job
+
+def _run_now(fn, *args) -> Future:
+    f: Future = Future()
+    try:
+        f.set_result(fn(*args))
+    except Exception as e:
+        f.set_exception(e)
+    return f
+
+class SourceError:
+    """Plik źródła, którego nie udało się zapisać (za duży, błąd odczytu)."""
+    __slots__ = ("filename", "message")
+
+    def __init__(self, filename: str, message: str):
+        self.filename = filename
+        self.message = message
+
+class ImportJob:
+    def __init__(self, label: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.state = "running"
+        self.error: Optional[str] = None
+        self.files = 0          # pliki partytur w źródle
+        self.duplicates = 0     # treść była już w magazynie
+        self.skipped = 0        # już w katalogu (albo powtórzona w źródle) – bez parsowania
+        self.queued = 0
+        self.parsed = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self.stored_all = False
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def fail(self, filename: str, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_JOB_ERRORS:
+            self.errors.append({"file": filename, "error": message})
+
+    def wait(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def status(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id, "source": self.label, "state": self.state, "error": self.error,
+            "files": self.files, "duplicates": self.duplicates, "skipped": self.skipped, "queued": self.queued,
+            "parsed": self.parsed, "failed": self.failed, "errors": self.errors,
+            "scanning": not self.stored_all, "elapsed_s": round(end - self.started_at, 2),
+        }
+
+# =============================
+# Źródła importu
+# =============================
+def is_score_file(name: str) -> bool:
+    base = os.path.basename(name)
+    return not base.startswith(".") and base.lower().endswith(SCORE_EXTENSIONS)
+
+def ingest_files(store: ScoreStore, files: Iterator[Tuple[Callable[[], object], str]]) -> Iterator[object]:
+    """(otwórz(), nazwa) -> zapis do magazynu; błędy pojedynczych plików nie przerywają importu."""
+    for opener, filename in files:
+        try:
+            with opener() as f:
+                name, digest, duplicate = store.ingest(f, os.path.basename(filename))
+        except (ScoreTooLargeError, OSError, zipfile.BadZipFile) as e:
+            yield SourceError(filename, str(e))
+            continue
+        yield name, digest, filename, duplicate
+
+def directory_files(root: str) -> Iterator[Tuple[Callable[[], object], str]]:
+    root = os.path.realpath(root)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for fn in sorted(filenames):
+            path = os.path.join(dirpath, fn)
+            # dowiązania prowadzące poza importowany katalog są pomijane
+            if is_score_file(fn) and os.path.commonpath([os.path.realpath(path), root]) == root:
+                yield (lambda p=path: open(p, "rb")), os.path.relpath(path, root)
+
+def zip_files(path: str) -> Iterator[Tuple[Callable[[], object], str]]:
+    """Elementy zip czytane strumieniowo (bez rozpakowywania na dysk; ścieżki z archiwum nie są używane)."""
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or info.filename.startswith("__MACOSX/") or not is_score_file(info.filename):
+                continue
+            yield (lambda i=info: zf.open(i)), info.filename
+
+def scan_store(store: ScoreStore) -> Iterator[tuple]:
+    """Pliki już w magazynie (np. uploady sprzed katalogu) – bez kopiowania."""
+    for name in sorted(os.listdir(store.root)):
+        path = os.path.join(store.root, name)
+        if is_score_file(name) and os.path.isfile(path):
+            yield name, content_hash(path), name, True
+
+def main():
+    ap = argparse.ArgumentParser(description="Katalog biblioteki partytur")
+    sub = ap.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="import katalogu albo pliku .zip")
+    imp.add_argument("source")
+    imp.add_argument("--reindex", action="store_true", help="parsuj ponownie treści już w katalogu")
+    imp.add_argument("--workers", type=int, default=IMPORT_WORKERS, help="0 = bez puli procesów")
+    srch = sub.add_parser("search")
+    srch.add_argument("q", nargs="?")
+    srch.add_argument("--composer")
+    srch.add_argument("--key")
+    srch.add_argument("--max-level", type=int, default=5)
+    srch.add_argument("--max-pitch", type=int)
+    srch.add_argument("--limit", type=int, default=20)
+    ap.add_argument("--root", default="backend/data/scores")
+    args = ap.parse_args()
+
+    catalog = ScoreCatalog(ScoreStore(args.root))
+    if args.command == "import":
+        files = zip_files(args.source) if zipfile.is_zipfile(args.source) else directory_files(args.source)
+        job = ImportJob(args.source)
+        catalog.run_import(job, ingest_files(catalog.store, files), args.reindex, args.workers)
+        for k, v in job.status().items():
+            if k != "errors":
+                print(f"{k:>11}: {v}")
+        for err in job.errors:
+            print(f"  {err['file']}: {err['error']}")
+    else:
+        res = catalog.search(args.q, composer=args.composer, key=args.key, max_level=args.max_level,
+                             max_pitch=args.max_pitch, limit=args.limit)
+        print(f"{res['total']} wyników")
+        for e in res["items"]:
+            rng = e["range"] or {}
+            print(f"  {e['title'][:40]:<40} {(e['composer'] or '')[:20]:<20} {e['key'] or '':<9} "
+                  f"{e['time_signature'] or '':<5} {rng.get('lowest_name', ''):>4}–{rng.get('highest_name', ''):<4} "
+                  f"poziom {e['difficulty']['level']}  {e['duration_s']:>6.0f} s")
+
+if __name__ == "__main__":
+    main()
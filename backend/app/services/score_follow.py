@@ -1,9 +1,12 @@
+import numpy as np
 from typing import List, Optional
 
+from .score_cache import TIE_CONTINUE, TIE_STOP, PartTable
+
 class SimpleFollower:
     """
     Bardzo uproszczony placeholder: idzie po nutach sekwencyjnie.
-    Docelowo: DTW/HMM + dopasowanie w czasie rzeczywistym.
+    Docelowo: DTW/HMM + dopasowanie w czasie rzeczywistym (OnlineDTWFollower).
     """
     def __init__(self, expected_notes: List[str]):
         self.expected = expected_notes
@@ -16,3 +19,163 @@ class SimpleFollower:
             if detected_note[0] == exp[0]:
                 self.idx += 1
         return self.idx  # indeks aktualnej nuty (do podświetlenia)
+
+def melody_events(part: PartTable) -> dict:
+    """
+    Sekwencja zdarzeń do śledzenia z tabeli nut partii: akord -> najwyższy dźwięk,
+    nuty kontynuowane ligaturą są doklejane do poprzedniej.
+    """
+    keep = (part["tie"] != TIE_CONTINUE) & (part["tie"] != TIE_STOP)
+    onset = part["onset_beats"][keep]
+    if onset.size == 0:
+        return {k: np.zeros(0, dtype=np.float32) for k in ("midi", "onset_beats", "onset_s", "measure")}
+    # wiersze są posortowane (onset, midi) -> ostatni w grupie to najwyższy dźwięk
+    last = np.r_[np.nonzero(np.diff(onset))[0], onset.size - 1]
+    return {
+        "midi": part["midi"][keep][last].astype(np.float32),
+        "onset_beats": onset[last],
+        "onset_s": part["onset_s"][keep][last],
+        "measure": part["measure"][keep][last],
+    }
+
+class OnlineDTWFollower:
+    """
+    Śledzenie pozycji w partyturze: online DTW (Viterbi na kosztach) po sekwencji
+    wysokości MIDI, liczony tylko w oknie `window` zdarzeń wokół bieżącej pozycji.
+    Koszt hopa zależy od okna, nie od długości utworu.
+
+    Przejścia z hopa na hop: zostań (0), następna nuta (advance, tańsze przy onsecie),
+    przeskok o 2/3 nuty (skip), cofnięcie o 1 (back – powtórzone nuty/fragmenty).
+    Skumulowany koszt jest obcinany do `cost_cap`, więc stare dopasowanie nie blokuje
+    ponownej lokalizacji w obrębie okna.
+    """
+    def __init__(self, midi: np.ndarray, onset_beats: Optional[np.ndarray] = None,
+                 onset_s: Optional[np.ndarray] = None, measure: Optional[np.ndarray] = None,
+                 window: int = 32, behind: int = 8,
+                 advance_cost: float = 0.3, onset_advance_cost: float = 0.05,
+                 skip_cost: float = 1.5, back_cost: float = 2.0,
+                 octave_cost: float = 0.5, cost_cap: float = 12.0):
+        self.midi = np.asarray(midi, dtype=np.float32)
+        n = self.midi.size
+        self.onset_beats = np.asarray(onset_beats if onset_beats is not None else np.arange(n), dtype=np.float32)
+        self.onset_s = np.asarray(onset_s if onset_s is not None else np.zeros(n), dtype=np.float32)
+        self.measure = np.asarray(measure if measure is not None else np.zeros(n), dtype=np.int32)
+        self.n = n
+        self.window = min(max(4, window), n)
+        self.behind = min(behind, self.window // 2)
+        self.advance_cost = advance_cost
+        self.onset_advance_cost = onset_advance_cost
+        self.skip_cost = skip_cost
+        self.back_cost = back_cost
+        self.octave_cost = octave_cost
+        self.cost_cap = cost_cap
+
+        w = self.window
+        # bufory na okno (bez alokacji w update)
+        self._D = np.empty(w, dtype=np.float64)
+        self._new = np.empty(w, dtype=np.float64)
+        self._c = np.empty(w, dtype=np.float64)
+        self._tmp = np.empty(w, dtype=np.float64)
+        self.reset()
+
+    @classmethod
+    def from_part(cls, part: PartTable, **kwargs) -> "OnlineDTWFollower":
+        ev = melody_events(part)
+        return cls(ev["midi"], ev["onset_beats"], ev["onset_s"], ev["measure"], **kwargs)
+
+    def reset(self, position: int = 0):
+        self.lo = 0
+        self.position = -1
+        self.confidence = 0.0
+        if self.n == 0:
+            return
+        position = max(0, min(position, self.n - 1))
+        self._recenter(position, init=True)
+        # start: koszt rośnie z odległością od pozycji początkowej
+        self._D[:] = np.abs(np.arange(self.lo, self.lo + self.window) - position) * self.skip_cost
+        self.position = position
+
+    def _recenter(self, pos: int, init: bool = False):
+        lo = max(0, min(pos - self.behind, self.n - self.window))
+        shift = lo - self.lo
+        if init:
+            self.lo = lo
+            return
+        if shift == 0:
+            return
+        D = self._D
+        if shift > 0:
+            D[:-shift] = D[shift:]
+            D[-shift:] = self.cost_cap
+        else:
+            D[-shift:] = D[:shift]
+            D[:-shift] = self.cost_cap
+        self.lo = lo
+
+    def update(self, midi: float, onset: bool = False) -> Optional[dict]:
+        """
+        Jeden hop: midi (ułamkowe, <= 0 = brak dźwięku) + flaga onsetu.
+        Zwraca zdarzenie pozycji, gdy nuta się zmieniła, inaczej None.
+        """
+        if self.n == 0:
+            return None
+        w = self.window
+        D, new, c, tmp = self._D, self._new, self._c, self._tmp
+        expected = self.midi[self.lo:self.lo + w]
+
+        # koszt lokalny: odległość w półtonach (z tolerancją błędu oktawy), w [0, 1]
+        if midi > 0:
+            np.subtract(expected, midi, out=c)
+            np.abs(c, out=c)
+            np.subtract(c, 12.0, out=tmp)
+            np.abs(tmp, out=tmp)
+            tmp += self.octave_cost
+            np.minimum(c, tmp, out=c)
+            np.minimum(c, 3.0, out=c)
+            c *= 1.0 / 3.0
+        else:
+            c.fill(0.0)
+
+        # zostań
+        new[:] = D
+        # następna nuta
+        adv = self.onset_advance_cost if onset else self.advance_cost
+        np.add(D[:-1], adv, out=tmp[1:])
+        np.minimum(new[1:], tmp[1:], out=new[1:])
+        # przeskoki o 2 i 3 nuty
+        np.add(D[:-2], self.skip_cost + adv, out=tmp[2:])
+        np.minimum(new[2:], tmp[2:], out=new[2:])
+        np.add(D[:-3], 2.0 * self.skip_cost + adv, out=tmp[3:])
+        np.minimum(new[3:], tmp[3:], out=new[3:])
+        # cofnięcie o 1
+        np.add(D[1:], self.back_cost, out=tmp[:-1])
+        np.minimum(new[:-1], tmp[:-1], out=new[:-1])
+
+        new += c
+        new -= new.min()
+        np.minimum(new, self.cost_cap, out=D)
+
+        j = int(np.argmin(D))
+        # pewność: średni niedawny koszt lokalny na wybranej ścieżce (EMA)
+        if midi > 0:
+            self.confidence = 0.8 * self.confidence + 0.2 * (1.0 - float(c[j]))
+        pos = self.lo + j
+        if pos == self.position:
+            return None
+        self.position = pos
+        self._recenter(pos)
+        return self.event(pos)
+
+    def event(self, pos: Optional[int] = None) -> Optional[dict]:
+        """Zdarzenie pozycji; None, dopóki pozycja nie jest znana (np. partia bez nut)."""
+        pos = self.position if pos is None else pos
+        if not 0 <= pos < self.n:
+            return None
+        return {
+            "index": int(pos),
+            "measure": int(self.measure[pos]),
+            "beats": float(self.onset_beats[pos]),
+            "time_s": float(self.onset_s[pos]),
+            "midi": int(self.midi[pos]),
+            "confidence": round(self.confidence, 3),
+        }
@@ -0,0 +1,182 @@
+"""
+Magazyn partytur adresowany treścią. Plik zapisuje się strumieniowo
+(hash liczony w locie, limit rozmiaru sprawdzany w trakcie), a nazwa
+zawiera skrót sha256 – ponowny upload tej samej treści zwraca istniejący URL
+i gotową tabelę nut z cache.
+
+Jednorazowa migracja / GC starych uploadów {nazwa}_{uuid} (z katalogu backend/):
+    python -m app.services.score_store gc [--dry-run] [--prune]
+Bez --prune duplikaty zamieniane są na twarde dowiązania do pliku kanonicznego
+(stare URL-e działają dalej), z --prune są usuwane.
+"""
+import argparse
+import glob
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from typing import Dict, List, Optional
+
+from .score_cache import content_hash
+
+DIGEST_CHARS = 32
+CHUNK_SIZE = 1 << 16
+MAX_BYTES = int(float(os.environ.get("VIOLIN_SCORE_MAX_MB", "20")) * 1024 * 1024)
+
+_CANONICAL = re.compile(r"__([0-9a-f]{%d})\.[^.]+$" % DIGEST_CHARS)
+_SIDE_FILES = (".notes.npz",)
+
+class ScoreTooLargeError(ValueError):
+    """Upload przekroczył limit rozmiaru."""
+
+def _safe_stem(filename: str) -> str:
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    stem = re.sub(r"[^A-Za-z0-9_\-]+", "_", stem).strip("_")
+    return stem[:80] or "score"
+
+def canonical_name(filename: str, digest: str) -> str:
+    ext = os.path.splitext(filename)[1].lower() or ".musicxml"
+    return f"{_safe_stem(filename)}__{digest[:DIGEST_CHARS]}{ext}"
+
+def digest_of_name(name: str) -> Optional[str]:
+    m = _CANONICAL.search(name)
+    return m.group(1) if m else None
+
+class ScoreStore:
+    def __init__(self, root: str, max_bytes: int = MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def find(self, digest: str, ext: str) -> Optional[str]:
+        """Istniejący plik o tej treści (i rozszerzeniu) albo None."""
+        hits = glob.glob(os.path.join(self.root, f"*__{digest[:DIGEST_CHARS]}{ext.lower()}"))
+        return os.path.basename(hits[0]) if hits else None
+
+    # ---------- zapis strumieniowy ----------
+    def begin(self, filename: str) -> "IncomingScore":
+        return IncomingScore(self, filename)
+
+    def ingest(self, fileobj, filename: str) -> tuple:
+        """Zapis z otwartego pliku (import katalogu, element zip); zwraca jak IncomingScore.commit."""
+        incoming = self.begin(filename)
+        try:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                incoming.write(chunk)
+            return incoming.commit()
+        except BaseException:
+            incoming.abort()
+            raise
+
+    def _commit(self, incoming: "IncomingScore") -> tuple:
+        digest = incoming.hasher.hexdigest()
+        ext = os.path.splitext(incoming.filename)[1].lower() or ".musicxml"
+        with self._lock:
+            existing = self.find(digest, ext)
+            if existing is not None:
+                os.remove(incoming.tmp_path)
+                return existing, digest, True
+            name = canonical_name(incoming.filename, digest)
+            os.replace(incoming.tmp_path, os.path.join(self.root, name))
+            return name, digest, False
+
+    # ---------- migracja / GC ----------
+    def gc(self, prune: bool = False, dry_run: bool = False) -> dict:
+        groups: Dict[tuple, List[str]] = {}
+        for name in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, name)
+            if not os.path.isfile(path) or name.endswith(_SIDE_FILES) or name.startswith("."):
+                continue
+            ext = os.path.splitext(name)[1].lower()
+            groups.setdefault((content_hash(path), ext), []).append(name)
+
+        report = {"files": sum(len(v) for v in groups.values()), "unique": len(groups),
+                  "renamed": 0, "linked": 0, "removed": 0, "freed_bytes": 0, "side_removed": 0}
+        for (digest, ext), names in groups.items():
+            canonical = next((n for n in names if digest_of_name(n) == digest[:DIGEST_CHARS]), None)
+            source = canonical
+            if canonical is None:
+                # pierwszy legacy plik staje się kanonicznym (nazwa bez sufiksu uuid)
+                source = names[0]
+                legacy_stem = re.sub(r"_?[0-9a-f]{32}$", "", os.path.splitext(source)[0]) or "score"
+                canonical = canonical_name(legacy_stem + ext, digest)
+                report["renamed"] += 1
+                if not dry_run:
+                    os.link(os.path.join(self.root, source), os.path.join(self.root, canonical))
+            canon_path = os.path.join(self.root, canonical)
+            for name in names:
+                if name == canonical:
+                    continue
+                path = os.path.join(self.root, name)
+                already_linked = name == source or (os.path.exists(canon_path) and os.path.samefile(path, canon_path))
+                if already_linked:
+                    if prune:
+                        report["removed"] += 1
+                        if not dry_run:
+                            os.remove(path)
+                    continue
+                report["freed_bytes"] += os.path.getsize(path)
+                if prune:
+                    report["removed"] += 1
+                    if not dry_run:
+                        os.remove(path)
+                else:
+                    report["linked"] += 1
+                    if not dry_run:
+                        tmp = path + ".gc"
+                        os.link(canon_path, tmp)
+                        os.replace(tmp, path)
+
+        # tabele nut, których źródło zniknęło
+        for npz in glob.glob(os.path.join(self.root, "*.notes.npz")):
+            if not os.path.exists(npz[: -len(".notes.npz")]):
+                report["side_removed"] += 1
+                if not dry_run:
+                    os.remove(npz)
+        return report
+
+class IncomingScore:
+    """Upload w toku: plik tymczasowy w katalogu docelowym + hash liczony w locie."""
+    def __init__(self, store: ScoreStore, filename: str):
+        self.store = store
+        self.filename = filename
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        fd, self.tmp_path = tempfile.mkstemp(dir=store.root, prefix=".upload-")
+        self._f = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.store.max_bytes:
+            raise ScoreTooLargeError(f"plik większy niż {self.store.max_bytes / (1024 * 1024):g} MB")
+        self.hasher.update(chunk)
+        self._f.write(chunk)
+
+    def commit(self) -> tuple:
+        """Zwraca (nazwa_pliku, sha256, czy_duplikat)."""
+        self._f.close()
+        return self.store._commit(self)
+
+    def abort(self):
+        self._f.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+def main():
+    ap = argparse.ArgumentParser(description="Deduplikacja katalogu partytur")
+    ap.add_argument("command", choices=["gc"])
+    ap.add_argument("--root", default="backend/data/scores")
+    ap.add_argument("--prune", action="store_true", help="usuń duplikaty zamiast dowiązywać")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+    report = ScoreStore(args.root).gc(prune=args.prune, dry_run=args.dry_run)
+    for k, v in report.items():
+        print(f"{k:>14}: {v}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import math
+from bisect import bisect_left, insort
+from typing import List, Optional
+
+from .pitch import NOTE_NAMES
+
+# =============================
+# Segmentacja nut w locie: z wysokości kolejnych hopów robi zdarzenia
+# note_on / note_off (średnia wysokość, rozrzut w centach, czas trwania).
+#   - mediana krocząca z ostatnich `median_hops` hopów z wysokością,
+#   - histereza: zmiana nuty dopiero, gdy mediana odjedzie od bieżącej nuty
+#     o ponad pół tonu + `deadband_cents` przez `change_hops` kolejnych hopów,
+#   - fuzja z onsetem: onset czyści okno mediany i zatwierdza zmianę od razu
+#     (ta sama nuta po onsecie = nowe pociągnięcie smyczka -> off + on),
+#   - cisza/bramka przez `release_hops` hopów kończy nutę.
+# Praca na hop jest stała (mediana z kilku próbek, sumy bieżące).
+# =============================
+def midi_name(midi: int) -> str:
+    return f"{NOTE_NAMES[midi % 12]}{midi // 12 - 1}"
+
+class RunningMedian:
+    """Mediana z ostatnich `size` wartości (posortowana lista o stałej długości)."""
+    def __init__(self, size: int = 5):
+        self.size = max(1, int(size))
+        self._ring = [0.0] * self.size
+        self._sorted: List[float] = []
+        self._i = 0
+
+    def reset(self):
+        self._sorted.clear()
+        self._i = 0
+
+    def push(self, x: float) -> float:
+        pos = self._i % self.size
+        if len(self._sorted) == self.size:
+            del self._sorted[bisect_left(self._sorted, self._ring[pos])]
+        self._ring[pos] = x
+        self._i += 1
+        insort(self._sorted, x)
+        return self._sorted[len(self._sorted) // 2]
+
+class _Stats:
+    """Sumy bieżące odchyleń (w centach) od środka nuty."""
+    __slots__ = ("n", "s", "ss")
+
+    def __init__(self):
+        self.n, self.s, self.ss = 0, 0.0, 0.0
+
+    def clear(self):
+        self.n, self.s, self.ss = 0, 0.0, 0.0
+
+    def add(self, cents: float):
+        self.n += 1
+        self.s += cents
+        self.ss += cents * cents
+
+    def copy_from(self, other: "_Stats"):
+        self.n, self.s, self.ss = other.n, other.s, other.ss
+
+class NoteSegmenter:
+    def __init__(self, frame_s: float, median_hops: int = 5, change_hops: int = 3, attack_hops: int = 2,
+                 release_hops: int = 3, deadband_cents: float = 30.0, min_note_s: float = 0.08, a4: float = 440.0):
+        self.frame_s = float(frame_s)
+        self.change_hops = max(1, int(change_hops))
+        self.attack_hops = max(1, int(attack_hops))
+        self.release_hops = max(1, int(release_hops))
+        self.deadband = 0.5 + deadband_cents / 100.0
+        self.min_note_s = float(min_note_s)
+        self.a4 = float(a4)
+        self._median = RunningMedian(median_hops)
+        self._note_stats = _Stats()
+        self._cand_stats = _Stats()
+        self.reset()
+
+    def reset(self):
+        self._hop = 0
+        self._silent = 0
+        self._median.reset()
+        self._note: Optional[int] = None
+        self._note_t = 0.0
+        self._last_voiced_t = 0.0
+        self._note_stats.clear()
+        self._drop_candidate()
+
+    def _drop_candidate(self):
+        self._cand: Optional[int] = None
+        self._cand_t = 0.0
+        self._cand_count = 0
+        self._cand_onset = False
+        self._cand_stats.clear()
+
+    @property
+    def note(self) -> Optional[int]:
+        return self._note
+
+    # ---------- zdarzenia ----------
+    def _note_on(self, midi: int, t: float, onset: bool) -> dict:
+        self._note = midi
+        self._note_t = t
+        self._note_stats.copy_from(self._cand_stats)
+        self._drop_candidate()
+        return {"type": "note_on", "t": round(t, 4), "midi": midi, "note": midi_name(midi), "onset": onset}
+
+    def _note_off(self, end: float) -> dict:
+        midi, st = self._note, self._note_stats
+        mean = st.s / st.n if st.n else 0.0
+        std = math.sqrt(max(0.0, st.ss / st.n - mean * mean)) if st.n else 0.0
+        self._note = None
+        return {
+            "type": "note_off",
+            "t": round(end, 4),
+            "start": round(self._note_t, 4),
+            "duration": round(end - self._note_t, 4),
+            "midi": midi,
+            "note": midi_name(midi),
+            "mean_hz": round(self.a4 * 2.0 ** ((midi + mean / 100.0 - 69) / 12.0), 2),
+            "mean_cents": round(mean, 1),
+            "cents_std": round(std, 1),
+            "frames": st.n,
+        }
+
+    def _candidate(self, c: int, t: float, onset: bool, cents: float):
+        if c != self._cand:
+            self._drop_candidate()
+            self._cand, self._cand_t = c, t
+        self._cand_count += 1
+        self._cand_onset = self._cand_onset or onset
+        self._cand_stats.add(cents)
+
+    # ---------- hop ----------
+    def update(self, pitch_hz: float, onset: bool = False) -> Optional[List[dict]]:
+        """Jeden hop (pitch_hz = 0: cisza lub bramka). Zwraca listę zdarzeń albo None."""
+        t = self._hop * self.frame_s
+        self._hop += 1
+
+        if pitch_hz <= 0.0:
+            self._silent += 1
+            self._drop_candidate()
+            if self._silent == self.release_hops:
+                self._median.reset()
+                if self._note is not None:
+                    return [self._note_off(self._last_voiced_t + self.frame_s)]
+            return None
+
+        self._silent = 0
+        self._last_voiced_t = t
+        raw = 69.0 + 12.0 * math.log2(pitch_hz / self.a4)
+        if onset:
+            self._median.reset()  # nowe pociągnięcie: mediana nie ciągnie poprzedniej nuty
+        m = self._median.push(raw)
+        note = self._note
+
+        if note is None:
+            c = int(round(m))
+            self._candidate(c, t, onset, (raw - c) * 100.0)
+            if self._cand_count >= self.attack_hops:
+                return [self._note_on(c, self._cand_t, self._cand_onset)]
+            return None
+
+        c = int(round(m)) if abs(m - note) > self.deadband else note
+        if c == note:
+            self._drop_candidate()
+            if onset and t - self._note_t >= self.min_note_s:
+                off = self._note_off(t)
+                self._cand_stats.add((raw - note) * 100.0)
+                return [off, self._note_on(note, t, True)]
+            self._note_stats.add((raw - note) * 100.0)
+            return None
+
+        self._candidate(c, t, onset, (raw - c) * 100.0)
+        if onset or self._cand_count >= self.change_hops:
+            off = self._note_off(self._cand_t)
+            return [off, self._note_on(c, self._cand_t, self._cand_onset)]
+        return None
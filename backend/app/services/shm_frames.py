@@ -0,0 +1,240 @@
+import math
+import os
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+from .engine import note_fields
+from .frame_codec import WAVE_POINTS, hz_to_midi
+
+# =============================
+# Pierścień ramek analizy w pamięci współdzielonej
+#
+# Jeden zapisujący (proces silnika audio), dowolnie wielu czytających
+# (workery uvicorn). Układ bloku:
+#   nagłówek int64[8]: magic, wersja, pojemność, write_seq, samplerate, hop, pid właściciela, 0
+#   rekordy FRAME_DTYPE[pojemność]
+# Każdy rekord ma własny seq (seqlock): zapisujący ustawia -1, wypełnia pola,
+# a na końcu wpisuje numer ramki. Czytający sprawdza seq przed i po kopii.
+# =============================
+MAGIC = 0x56465231  # "VFR1"
+VERSION = 2
+HEADER_WORDS = 8
+_H_MAGIC, _H_VERSION, _H_CAPACITY, _H_WRITE_SEQ, _H_SR, _H_HOP, _H_OWNER = range(7)
+
+FLAG_ONSET = 0x01
+FLAG_GATED = 0x02
+
+FRAME_DTYPE = np.dtype([
+    ("seq", "<i8"),
+    ("t", "<f8"),
+    ("pitch_hz", "<f4"),
+    ("cents", "<f4"),
+    ("bpm", "<f4"),
+    ("rms", "<f4"),
+    ("db", "<f4"),
+    ("level", "<f4"),
+    ("gate_db", "<f4"),
+    ("midi", "<i2"),
+    ("flags", "u1"),
+    ("_pad", "u1"),
+    # pozycja w partyturze (score_idx = -1: brak zdarzenia w tym hopie)
+    ("score_idx", "<i4"),
+    ("score_measure", "<i4"),
+    ("score_beats", "<f4"),
+    ("score_time", "<f4"),
+    ("score_midi", "<i4"),
+    ("score_conf", "<f4"),
+    ("wave", "<f4", (WAVE_POINTS,)),
+])
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Podłącza istniejący blok bez rejestrowania go w resource_trackerze czytelnika."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+def _live_owner(shm: shared_memory.SharedMemory) -> Optional[int]:
+    """Pid żyjącego właściciela istniejącego bloku (None: pozostałość albo obcy format)."""
+    if shm.size < HEADER_WORDS * 8:
+        return None
+    header = np.ndarray((HEADER_WORDS,), dtype="<i8", buffer=shm.buf)
+    pid = int(header[_H_OWNER]) if int(header[_H_MAGIC]) == MAGIC else 0
+    del header   # bez widoku na bufor, żeby blok dało się zamknąć
+    if pid <= 0:
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        pass   # proces istnieje, ale należy do innego użytkownika
+    return pid
+
+class FrameRing:
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        self._header = np.ndarray((HEADER_WORDS,), dtype="<i8", buffer=shm.buf)
+        capacity = int(self._header[_H_CAPACITY])
+        self.records = np.ndarray((capacity,), dtype=FRAME_DTYPE, buffer=shm.buf, offset=HEADER_WORDS * 8)
+        self.capacity = capacity
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @classmethod
+    def create(cls, name: Optional[str], capacity: int = 256) -> "FrameRing":
+        size = HEADER_WORDS * 8 + capacity * FRAME_DTYPE.itemsize
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            old = _attach(name)
+            owner = _live_owner(old)
+            old.close()
+            if owner is not None:
+                raise FileExistsError(f"pierścień ramek {name} należy do działającego procesu {owner}")
+            # pozostałość po poprzednim (zakończonym) procesie silnika
+            shared_memory.SharedMemory(name=name).unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((HEADER_WORDS,), dtype="<i8", buffer=shm.buf)
+        header[:] = 0
+        header[_H_MAGIC] = MAGIC
+        header[_H_VERSION] = VERSION
+        header[_H_CAPACITY] = capacity
+        header[_H_OWNER] = os.getpid()
+        ring = cls(shm, owner=True)
+        ring.records["seq"] = -1
+        return ring
+
+    @classmethod
+    def attach(cls, name: str) -> "FrameRing":
+        shm = _attach(name)
+        header = np.ndarray((HEADER_WORDS,), dtype="<i8", buffer=shm.buf)
+        if int(header[_H_MAGIC]) != MAGIC or int(header[_H_VERSION]) != VERSION:
+            shm.close()
+            raise ValueError(f"nieznany format pierścienia ramek: {name}")
+        return cls(shm, owner=False)
+
+    # ---------- zapis (proces silnika) ----------
+    def set_stream_info(self, samplerate: int, hop: int):
+        self._header[_H_SR] = samplerate
+        self._header[_H_HOP] = hop
+
+    @property
+    def write_seq(self) -> int:
+        return int(self._header[_H_WRITE_SEQ])
+
+    def publish(self, payload: dict, samples: Optional[np.ndarray] = None):
+        seq = int(self._header[_H_WRITE_SEQ])
+        rec = self.records[seq % self.capacity]
+        rec["seq"] = -1
+        cents = payload.get("cents")
+        pitch_hz = float(payload.get("pitch_hz") or 0.0)
+        rec["t"] = time.time()
+        rec["pitch_hz"] = pitch_hz
+        rec["cents"] = float(cents) if cents is not None else math.nan
+        rec["bpm"] = float(payload.get("bpm") or 0.0)
+        rec["rms"] = float(payload.get("rms") or 0.0)
+        rec["db"] = float(payload.get("db") or 0.0)
+        rec["level"] = float(payload.get("level") or 0.0)
+        rec["gate_db"] = float(payload.get("gate_db") or 0.0)
+        rec["midi"] = hz_to_midi(pitch_hz)
+        rec["flags"] = (FLAG_ONSET if payload.get("onset") else 0) | (FLAG_GATED if payload.get("gated") else 0)
+        score = payload.get("score")
+        if score:
+            rec["score_idx"] = score["index"]
+            rec["score_measure"] = score["measure"]
+            rec["score_beats"] = score["beats"]
+            rec["score_time"] = score["time_s"]
+            rec["score_midi"] = score["midi"]
+            rec["score_conf"] = score["confidence"]
+        else:
+            rec["score_idx"] = -1
+        wave = rec["wave"]
+        if samples is not None and samples.size > 0:
+            step = max(1, samples.size // WAVE_POINTS)
+            src = samples[::step][:WAVE_POINTS]
+            wave[:src.size] = src
+            wave[src.size:] = 0.0
+        else:
+            wave[:] = 0.0
+        rec["seq"] = seq
+        self._header[_H_WRITE_SEQ] = seq + 1
+
+    # ---------- odczyt (workery web) ----------
+    def stream_info(self) -> Tuple[int, int]:
+        return int(self._header[_H_SR]), int(self._header[_H_HOP])
+
+    def read_since(self, cursor: int, out: np.ndarray) -> Tuple[int, int, int]:
+        """
+        Kopiuje do out ramki od cursor. Zwraca (ile_skopiowano, nowy_cursor, utracone).
+        Ramki nadpisane zanim czytelnik zdążył je pobrać są pomijane i liczone.
+        """
+        w = int(self._header[_H_WRITE_SEQ])
+        lost = 0
+        if w - cursor > self.capacity - 1:
+            new_cursor = w - (self.capacity - 1)
+            lost = new_cursor - cursor
+            cursor = new_cursor
+        n = min(w - cursor, out.shape[0])
+        got = 0
+        for seq in range(cursor, cursor + n):
+            rec = self.records[seq % self.capacity]
+            if int(rec["seq"]) != seq:
+                lost += 1
+                continue
+            out[got] = rec
+            if int(out[got]["seq"]) != seq or int(rec["seq"]) != seq:
+                lost += 1
+                continue
+            got += 1
+        return got, cursor + n, lost
+
+    def close(self):
+        self._header = None
+        self.records = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+def record_to_payload(rec) -> dict:
+    """Odtwarza ramkę w formacie JSON z rekordu pierścienia."""
+    pitch_hz = float(rec["pitch_hz"])
+    note, cents = note_fields(pitch_hz)
+    flags = int(rec["flags"])
+    score = None
+    if int(rec["score_idx"]) >= 0:
+        score = {
+            "index": int(rec["score_idx"]),
+            "measure": int(rec["score_measure"]),
+            "beats": float(rec["score_beats"]),
+            "time_s": float(rec["score_time"]),
+            "midi": int(rec["score_midi"]),
+            "confidence": round(float(rec["score_conf"]), 3),
+        }
+    return {
+        "pitch_hz": pitch_hz,
+        "note": note,
+        "cents": cents,
+        "onset": bool(flags & FLAG_ONSET),
+        "bpm": float(rec["bpm"]),
+        "rms": float(rec["rms"]),
+        "db": float(rec["db"]),
+        "level": float(rec["level"]),
+        "gated": bool(flags & FLAG_GATED),
+        "gate_db": float(rec["gate_db"]),
+        "score": score,
+    }
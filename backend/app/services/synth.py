@@ -0,0 +1,327 @@
+import math
+import os
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .metronome import wav_header
+from .score_cache import TIE_CONTINUE, TIE_START, TIE_STOP, ScoreTable
+
+# =============================
+# Synteza akompaniamentu z tabeli nut partytury (bez music21 – tylko kolumny NumPy).
+# Instrument = widmo addytywne (amplitudy harmonicznych) + obwiednia ADSR.
+# Dla każdej wysokości liczona jest raz tablica jednego okresu z harmonicznymi
+# poniżej Nyquista (bez aliasingu); nuta to odczyt tablicy z interpolacją liniową
+# razy obwiednia, a gotowe nuty (instrument, wysokość, długość) są pamiętane –
+# powtarzające się dźwięki kosztują jedno dodawanie do bufora.
+# Długie utwory dzielone są na kawałki liczone w puli procesów.
+# =============================
+SAMPLERATE = 44100
+TABLE_SIZE = 2048
+CHUNK_SECONDS = 20.0
+PARALLEL_MIN_CHUNKS = 3          # krótsze utwory liczone w bieżącym procesie
+RENDER_WORKERS = int(os.environ.get("VIOLIN_RENDER_WORKERS", "0")) or min(4, os.cpu_count() or 2)
+NOTE_CACHE_BYTES = 64 * 1024 * 1024
+NYQUIST_MARGIN = 0.45            # harmoniczne tylko poniżej 0.45·sr
+MASTER_GAIN = 0.7
+
+class Instrument:
+    __slots__ = ("name", "harmonics", "attack", "decay", "sustain", "release", "tau")
+
+    def __init__(self, name: str, harmonics: Sequence[float], attack: float, decay: float, sustain: float,
+                 release: float, tau: float = 0.0):
+        self.name = name
+        self.harmonics = np.asarray(harmonics, dtype=np.float64)
+        self.attack = attack
+        self.decay = decay
+        self.sustain = sustain
+        self.release = release
+        self.tau = tau  # > 0: wybrzmiewanie wykładnicze (fortepian, harfa)
+
+def _series(n: int, power: float, odd_only: bool = False, even_gain: float = 1.0) -> List[float]:
+    k = np.arange(1, n + 1, dtype=np.float64)
+    amps = 1.0 / k ** power
+    if odd_only:
+        amps[1::2] *= even_gain
+    return amps.tolist()
+
+INSTRUMENTS: Dict[str, Instrument] = {
+    "strings": Instrument("strings", _series(24, 1.0), 0.06, 0.10, 0.80, 0.15),
+    "piano": Instrument("piano", _series(14, 1.6), 0.004, 0.08, 0.60, 0.25, tau=1.5),
+    "plucked": Instrument("plucked", _series(10, 1.8), 0.003, 0.05, 0.50, 0.20, tau=0.6),
+    "flute": Instrument("flute", [1.0, 0.4, 0.15, 0.06, 0.03], 0.05, 0.05, 0.90, 0.10),
+    "reed": Instrument("reed", _series(15, 1.0, odd_only=True, even_gain=0.15), 0.03, 0.05, 0.85, 0.08),
+    "brass": Instrument("brass", _series(16, 0.8), 0.04, 0.08, 0.75, 0.10),
+    "organ": Instrument("organ", [1.0, 0.5, 0.0, 0.25, 0.0, 0.0, 0.0, 0.12], 0.01, 0.0, 1.0, 0.05),
+}
+INSTRUMENT_NAMES = tuple(INSTRUMENTS)
+DEFAULT_INSTRUMENT = "piano"
+
+# kolejność ma znaczenie: "bass clarinet" to stroik, "double bass" – smyczki
+_KEYWORDS = (
+    (("clarinet", "oboe", "bassoon", "sax", "klarnet", "obój", "fagot"), "reed"),
+    (("flute", "piccolo", "recorder", "flet"), "flute"),
+    (("trumpet", "horn", "trombone", "tuba", "euphonium", "cornet", "trąbka", "puzon", "róg"), "brass"),
+    (("organ", "organy"), "organ"),
+    (("guitar", "harp", "lute", "mandolin", "gitara", "harfa", "pizz"), "plucked"),
+    (("piano", "keyboard", "harpsichord", "fortepian", "pianino", "klawesyn"), "piano"),
+    (("violin", "viola", "cello", "bass", "contrabass", "string", "skrzyp", "altówka", "wiolonczela",
+      "kontrabas"), "strings"),
+)
+_SOLO_KEYWORDS = ("violin", "skrzyp")
+
+def instrument_for(part_name: str) -> str:
+    name = (part_name or "").lower()
+    for words, inst in _KEYWORDS:
+        if any(w in name for w in words):
+            return inst
+    return DEFAULT_INSTRUMENT
+
+def is_solo_part(part_name: str) -> bool:
+    """Partia skrzypiec (grana przez ucznia) – domyślnie pomijana w akompaniamencie."""
+    name = (part_name or "").lower()
+    return any(w in name for w in _SOLO_KEYWORDS)
+
+# =============================
+# Bank nut: tablice okresów i gotowe przebiegi
+# =============================
+class NoteBank:
+    def __init__(self, samplerate: int = SAMPLERATE, max_bytes: int = NOTE_CACHE_BYTES):
+        self.sr = int(samplerate)
+        self.max_bytes = max_bytes
+        self._tables: Dict[Tuple[str, int], np.ndarray] = {}
+        self._notes: "OrderedDict[Tuple[str, int, int], np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def table(self, inst: str, midi: int) -> np.ndarray:
+        """Jeden okres (TABLE_SIZE + 1 próbka strażnika), szczyt 1, harmoniczne < Nyquista."""
+        key = (inst, midi)
+        tab = self._tables.get(key)
+        if tab is None:
+            spec = INSTRUMENTS[inst]
+            f0 = 440.0 * 2.0 ** ((midi - 69) / 12.0)
+            n = max(1, min(spec.harmonics.size, int(NYQUIST_MARGIN * self.sr / f0)))
+            k = np.arange(1, n + 1, dtype=np.float64)
+            phase = 2.0 * np.pi * np.arange(TABLE_SIZE + 1, dtype=np.float64) / TABLE_SIZE
+            tab = spec.harmonics[:n] @ np.sin(np.outer(k, phase))
+            peak = float(np.max(np.abs(tab)))
+            tab = (tab / peak if peak > 0 else tab).astype(np.float32)
+            self._tables[key] = tab
+        return tab
+
+    def envelope(self, inst: str, n_on: int) -> np.ndarray:
+        """Obwiednia nuty trwającej n_on próbek plus wybrzmienie (release)."""
+        spec = INSTRUMENTS[inst]
+        sr = self.sr
+        n_rel = int(spec.release * sr)
+        t = np.arange(n_on + n_rel, dtype=np.float32) / np.float32(sr)
+        env = np.interp(t, (0.0, spec.attack, spec.attack + spec.decay), (0.0, 1.0, spec.sustain)).astype(np.float32)
+        if spec.tau > 0.0:
+            env *= np.exp(-t / np.float32(spec.tau))
+        if n_rel:
+            level = env[n_on - 1] if n_on else np.float32(0.0)
+            env[n_on:] = level * np.linspace(1.0, 0.0, n_rel, dtype=np.float32)
+        return env
+
+    def render(self, inst: str, midi: int, n_on: int) -> np.ndarray:
+        tab = self.table(inst, midi)
+        env = self.envelope(inst, n_on)
+        inc = 440.0 * 2.0 ** ((midi - 69) / 12.0) * TABLE_SIZE / self.sr
+        pos = np.arange(env.size, dtype=np.float64) * inc
+        np.mod(pos, TABLE_SIZE, out=pos)
+        idx = pos.astype(np.intp)
+        frac = (pos - idx).astype(np.float32)
+        lo = tab[idx]
+        wave = lo + frac * (tab[idx + 1] - lo)
+        wave *= env
+        return wave
+
+    def note(self, inst: str, midi: int, n_on: int) -> np.ndarray:
+        key = (inst, midi, n_on)
+        wave = self._notes.get(key)
+        if wave is not None:
+            self._notes.move_to_end(key)
+            self.hits += 1
+            return wave
+        self.misses += 1
+        wave = self.render(inst, midi, n_on)
+        self._notes[key] = wave
+        self._bytes += wave.nbytes
+        while self._bytes > self.max_bytes and len(self._notes) > 1:
+            _, old = self._notes.popitem(last=False)
+            self._bytes -= old.nbytes
+        return wave
+
+_banks: Dict[int, NoteBank] = {}
+
+def note_bank(samplerate: int) -> NoteBank:
+    """Bank nut procesu (w procesach puli – jeden na proces, żyje między zadaniami)."""
+    bank = _banks.get(samplerate)
+    if bank is None:
+        bank = _banks[samplerate] = NoteBank(samplerate)
+    return bank
+
+# =============================
+# Plan renderu: nuty wybranych partii jako kolumny (próbka startu, długość, MIDI, instrument)
+# =============================
+def release_tail(samplerate: int) -> int:
+    """Najdłuższe wybrzmienie instrumentów w próbkach."""
+    return int(max(s.release for s in INSTRUMENTS.values()) * samplerate) + 1
+
+def merge_ties(onset_s: np.ndarray, dur_s: np.ndarray, midi: np.ndarray,
+               tie: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Zwraca długości z doklejonymi nutami związanymi ligaturą i maskę nut do zagrania."""
+    dur = dur_s.astype(np.float64)
+    keep = np.ones(midi.size, dtype=bool)
+    tied = np.flatnonzero(tie != 0)
+    open_notes: Dict[int, int] = {}
+    for i in tied.tolist():
+        code, m = int(tie[i]), int(midi[i])
+        if code in (TIE_CONTINUE, TIE_STOP) and m in open_notes:
+            j = open_notes[m]
+            dur[j] = onset_s[i] + dur_s[i] - onset_s[j]
+            keep[i] = False
+            if code == TIE_STOP:
+                del open_notes[m]
+        elif code == TIE_START:
+            open_notes[m] = i
+    return dur, keep
+
+def accompaniment_parts(table: ScoreTable, parts: Optional[Sequence[int]] = None) -> List[int]:
+    """Wybrane partie albo (None) wszystkie poza skrzypcami; ValueError, gdy nie ma czego grać."""
+    if parts is None:
+        parts = [i for i, p in enumerate(table.parts) if not is_solo_part(p.name)]
+    if not parts:
+        raise ValueError("Brak partii akompaniamentu (wszystkie partie to skrzypce)")
+    for p in parts:
+        if not 0 <= int(p) < len(table.parts):
+            raise ValueError(f"Brak partii {p}")
+    return list(parts)
+
+def mix_gain(starts: np.ndarray, ends: np.ndarray) -> float:
+    """MASTER_GAIN / sqrt(największej polifonii); szczyty sumy łagodnie ogranicza potem tanh."""
+    poly = 1
+    if starts.size:
+        ev = np.concatenate([starts, ends])
+        step = np.concatenate([np.ones(starts.size, np.int32), -np.ones(starts.size, np.int32)])
+        poly = max(1, int(np.cumsum(step[np.lexsort((step, ev))]).max()))
+    return MASTER_GAIN / math.sqrt(poly)
+
+class RenderPlan:
+    def __init__(self, samplerate: int, starts: np.ndarray, lengths: np.ndarray, midi: np.ndarray,
+                 inst: np.ndarray, total: int, gain: float, parts: List[dict]):
+        self.samplerate = samplerate
+        self.starts = starts      # próbka początku nuty (posortowane)
+        self.lengths = lengths    # próbki do zwolnienia klawisza/smyczka
+        self.midi = midi
+        self.inst = inst          # indeks w INSTRUMENT_NAMES
+        self.total = total
+        self.gain = gain
+        self.parts = parts
+        self.tail = release_tail(samplerate)
+        self.max_span = int(lengths.max()) + self.tail if lengths.size else 0
+
+    @property
+    def duration_s(self) -> float:
+        return self.total / float(self.samplerate)
+
+    def chunk_notes(self, start: int, stop: int) -> Tuple[np.ndarray, ...]:
+        """Nuty, które brzmią w [start, stop) – łącznie z wybrzmieniem."""
+        lo = int(np.searchsorted(self.starts, start - self.max_span, side="left"))
+        hi = int(np.searchsorted(self.starts, stop, side="left"))
+        sel = slice(lo, hi)
+        ends = self.starts[sel] + self.lengths[sel] + self.tail
+        live = ends > start
+        return (self.starts[sel][live], self.lengths[sel][live], self.midi[sel][live], self.inst[sel][live])
+
+def plan_render(table: ScoreTable, parts: Optional[Sequence[int]] = None, tempo: Optional[float] = None,
+                transpose: int = 0, samplerate: int = SAMPLERATE) -> RenderPlan:
+    """
+    parts: indeksy partii (None – wszystkie poza skrzypcami).
+    tempo: bpm ćwierćnuty na początku utworu (None – jak w partyturze; zmiany tempa skalowane proporcjonalnie).
+    """
+    parts = accompaniment_parts(table, parts)
+    speed = 1.0 if tempo is None else float(tempo) / float(table.tempo_map[0, 1])
+
+    cols = {k: [] for k in ("start", "dur", "midi", "inst")}
+    info = []
+    for pi in parts:
+        part = table.part(int(pi))
+        inst = instrument_for(part.name)
+        onset_s = part["onset_s"].astype(np.float64)
+        dur, keep = merge_ties(onset_s, part["dur_s"], part["midi"], part["tie"])
+        cols["start"].append(onset_s[keep])
+        cols["dur"].append(dur[keep])
+        cols["midi"].append(part["midi"][keep].astype(np.int16))
+        cols["inst"].append(np.full(int(keep.sum()), INSTRUMENT_NAMES.index(inst), dtype=np.int8))
+        info.append({"index": int(pi), "name": part.name, "instrument": inst, "notes": int(keep.sum())})
+
+    start = np.concatenate(cols["start"]) / speed
+    dur = np.concatenate(cols["dur"]) / speed
+    midi = np.clip(np.concatenate(cols["midi"]) + int(transpose), 0, 127).astype(np.int16)
+    inst = np.concatenate(cols["inst"])
+    order = np.argsort(start, kind="stable")
+    starts = np.round(start[order] * samplerate).astype(np.int64)
+    lengths = np.maximum(1, np.round(dur[order] * samplerate)).astype(np.int64)
+    midi, inst = midi[order], inst[order]
+
+    # wzmocnienie stałe dla całego utworu (kawałki liczone niezależnie muszą się zgadzać)
+    total = int((starts + lengths).max()) + release_tail(samplerate) if starts.size else 0
+    return RenderPlan(samplerate, starts, lengths, midi, inst, total, mix_gain(starts, starts + lengths), info)
+
+# =============================
+# Render kawałkami (w procesie albo w puli procesów)
+# =============================
+def render_chunk(start: int, stop: int, samplerate: int, starts: np.ndarray, lengths: np.ndarray,
+                 midi: np.ndarray, inst: np.ndarray, gain: float) -> bytes:
+    """Kawałek [start, stop) jako PCM int16. Funkcja modułu – uruchamiana w procesach puli."""
+    bank = note_bank(samplerate)
+    n = stop - start
+    out = np.zeros(n, dtype=np.float32)
+    for s, length, m, i in zip(starts.tolist(), lengths.tolist(), midi.tolist(), inst.tolist()):
+        wave = bank.note(INSTRUMENT_NAMES[i], m, length)
+        a = s - start
+        lo, hi = max(a, 0), min(a + wave.size, n)
+        if lo < hi:
+            out[lo:hi] += wave[lo - a:hi - a]
+    out *= np.float32(gain)
+    np.tanh(out, out=out)
+    out *= np.float32(32767.0)
+    return out.astype(np.int16).tobytes()
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: fork procesu z wątkami audio/uvicorn bywa niebezpieczny
+        _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=get_context("spawn"))
+    return _pool
+
+def iter_pcm(plan: RenderPlan, chunk_seconds: float = CHUNK_SECONDS, parallel: bool = True) -> Iterator[bytes]:
+    step = max(1, int(chunk_seconds * plan.samplerate))
+    bounds = [(a, min(plan.total, a + step)) for a in range(0, plan.total, step)]
+    jobs = [(a, b, plan.samplerate, *plan.chunk_notes(a, b), plan.gain) for a, b in bounds]
+    if not (parallel and len(jobs) >= PARALLEL_MIN_CHUNKS):
+        for job in jobs:
+            yield render_chunk(*job)
+        return
+
+    global _pool
+    pool = _get_pool()
+    try:
+        futures = [pool.submit(render_chunk, *job) for job in jobs]
+        for f in futures:
+            yield f.result()
+    except BrokenProcessPool:
+        _pool = None  # następne żądanie utworzy pulę od nowa
+        raise
+
+def iter_wav(plan: RenderPlan, chunk_seconds: float = CHUNK_SECONDS, parallel: bool = True) -> Iterator[bytes]:
+    yield wav_header(plan.samplerate, plan.total)
+    yield from iter_pcm(plan, chunk_seconds, parallel)
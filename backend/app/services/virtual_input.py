@@ -0,0 +1,172 @@
+import threading
+import time
+import numpy as np
+from typing import Optional, Tuple
+
+from .ringbuffer import AudioRingBuffer
+
+# =============================
+# Wirtualne wejście audio: zamiennik AudioStream bez PortAudio.
+# Generuje powtarzalny (seed) program sygnałów: tony skrzypcowe, vibrato,
+# glissanda, szum tła i ciszę. Tryb realtime wpisuje bloki do bufora
+# kołowego w tempie zegara (jak callback karty), tryb fast oddaje
+# kolejne hopy bez czekania.
+# =============================
+SCENES = ("tone", "vibrato", "glissando", "noise", "silence")
+
+class SignalProgram:
+    """Ciągły sygnał testowy złożony ze scen po `scene_seconds` (faza ciągła między blokami)."""
+    def __init__(self, samplerate: int, seed: int = 0, scene_seconds: float = 2.0,
+                 scenes: Tuple[str, ...] = SCENES, harmonics: int = 8):
+        self.sr = samplerate
+        self.rng = np.random.default_rng(seed)
+        self.scene_len = max(1, int(scene_seconds * samplerate))
+        self.scenes = scenes
+        self.harmonics = harmonics
+        self._pos = 0          # próbka w bieżącej scenie
+        self._scene = -1
+        self._phase = 0.0
+        self._params: dict = {}
+        self._k = np.arange(1, harmonics + 1, dtype=np.float64)[:, None]
+        self._amp = (1.0 / self._k)
+        self._next_scene()
+
+    @property
+    def scene(self) -> str:
+        return self.scenes[self._scene]
+
+    def _next_scene(self):
+        self._scene = (self._scene + 1) % len(self.scenes)
+        self._pos = 0
+        rng = self.rng
+        m0 = float(rng.integers(55, 88))  # G3 .. E6
+        self._params = {
+            "m0": m0,
+            "m1": m0 + float(rng.choice([-7, -5, 5, 7, 12])),
+            "level": float(rng.uniform(0.1, 0.4)),
+            "noise": float(rng.uniform(0.001, 0.01)),
+        }
+
+    def _midi_track(self, t: np.ndarray) -> np.ndarray:
+        p = self._params
+        name = self.scene
+        if name == "vibrato":
+            depth = 0.25 * np.minimum(1.0, t / 0.3)
+            return p["m0"] + depth * np.sin(2 * np.pi * 5.5 * t)
+        if name == "glissando":
+            return p["m0"] + (p["m1"] - p["m0"]) * np.minimum(1.0, t / (self.scene_len / self.sr))
+        return np.full(t.shape, p["m0"])
+
+    def fill(self, out: np.ndarray):
+        """Wypełnia out kolejnymi próbkami (może przekraczać granicę sceny)."""
+        done = 0
+        n = out.shape[0]
+        while done < n:
+            take = min(n - done, self.scene_len - self._pos)
+            self._render(out[done:done + take])
+            done += take
+            self._pos += take
+            if self._pos >= self.scene_len:
+                self._next_scene()
+
+    def _render(self, out: np.ndarray):
+        n = out.shape[0]
+        p = self._params
+        name = self.scene
+        noise = self.rng.standard_normal(n) * p["noise"]
+        if name == "silence":
+            out[:] = noise * 0.05
+            return
+        if name == "noise":
+            out[:] = noise * 3.0
+            return
+        t = (self._pos + np.arange(n)) / self.sr
+        f = 440.0 * 2.0 ** ((self._midi_track(t) - 69.0) / 12.0)
+        phase = self._phase + 2 * np.pi * np.cumsum(f) / self.sr
+        self._phase = float(phase[-1] % (2 * np.pi))
+        # harmoniczne ~1/k powyżej Nyquista pomijane
+        amp = np.where(self._k * f.max() < self.sr * 0.45, self._amp, 0.0)
+        x = (amp * np.sin(self._k * phase[None, :])).sum(axis=0)
+        out[:] = p["level"] * x / self._amp.sum() + noise
+
+class VirtualStream:
+    """
+    Ten sam interfejs co AudioStream (start/read/active/stats/stop).
+    realtime=True: wątek „karty” wpisuje bloki do AudioRingBuffer co blocksize/sr s.
+    realtime=False: read() generuje hop od razu (maksymalna prędkość).
+    total_seconds ogranicza długość – potem strumień przestaje być aktywny.
+    channels > 1: każdy kanał ma własny program (seed + numer kanału), bloki (ramki × kanały).
+    """
+    def __init__(self, samplerate: int = 48000, blocksize: int = 1024, realtime: bool = False,
+                 total_seconds: Optional[float] = None, seed: int = 0, ring_seconds: float = 2.0,
+                 program: Optional[SignalProgram] = None, channels: int = 1):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.realtime = realtime
+        self.channels = max(1, int(channels))
+        self.program = program or SignalProgram(samplerate, seed)
+        self.programs = [self.program] + [SignalProgram(samplerate, seed + c) for c in range(1, self.channels)]
+        self.total_samples = int(total_seconds * samplerate) if total_seconds else None
+        self.ring = AudioRingBuffer(max(blocksize * 4, int(ring_seconds * samplerate)), samplerate,
+                                    channels=self.channels)
+        self.produced = 0
+        self._block = np.zeros(blocksize if self.channels == 1 else (blocksize, self.channels), dtype=np.float32)
+        self._active = False
+        self._thread: Optional[threading.Thread] = None
+
+    def _exhausted(self) -> bool:
+        return self.total_samples is not None and self.produced >= self.total_samples
+
+    def start(self):
+        self.ring.reset()
+        self.produced = 0
+        self._active = True
+        if self.realtime:
+            self._thread = threading.Thread(target=self._device_loop, name="virtual-input", daemon=True)
+            self._thread.start()
+
+    def _device_loop(self):
+        period = self.blocksize / float(self.samplerate)
+        next_t = time.perf_counter()
+        while self._active and not self._exhausted():
+            self._fill(self._block)
+            self.ring.write(self._block)
+            self.produced += self.blocksize
+            next_t += period
+            delay = next_t - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -period:
+                self.ring.input_overflows += 1  # „karta” nie zdążyła (przeciążony host)
+                next_t = time.perf_counter()
+        self._active = False
+
+    def read(self, out: np.ndarray, timeout: float = 1.0) -> bool:
+        if self.realtime:
+            return self.ring.read(out, timeout)
+        if not self._active or self._exhausted():
+            self._active = False
+            return False
+        self._fill(out)
+        self.produced += out.shape[0]
+        return True
+
+    def _fill(self, out: np.ndarray):
+        if out.ndim == 1:
+            self.program.fill(out)
+            return
+        for c, program in enumerate(self.programs):
+            program.fill(out[:, c])
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    def stats(self) -> dict:
+        return self.ring.stats()
+
+    def stop(self):
+        self._active = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
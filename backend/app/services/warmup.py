@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import devices
+
+# =============================
+# Rozgrzewka w tle po starcie serwera (VIOLIN_WARMUP=0 wyłącza).
+# Serwer odpowiada na /health od razu; wątek ładuje w tym czasie leniwe moduły
+# (scipy.signal, aubio, PortAudio) i środowisko music21, żeby pierwsze
+# /start czy /score/upload nie czekały na importy. Każdy krok jest niezależny –
+# błąd jednego (np. brak urządzeń audio) nie zatrzymuje pozostałych.
+# =============================
+WARMUP_ENABLED = os.environ.get("VIOLIN_WARMUP", "1") != "0"
+
+MINIMAL_MUSICXML = """<?xml version="1.0" encoding="UTF-8"?>
+<score-partwise version="3.1"><part-list><score-part id="P1"><part-name>V</part-name></score-part></part-list>
+<part id="P1"><measure number="1"><attributes><divisions>1</divisions></attributes>
+<note><pitch><step>A</step><octave>4</octave></pitch><duration>4</duration><type>whole</type></note>
+</measure></part></score-partwise>"""
+
+def _dsp():
+    from .dsp import FilterChain, PolyphaseDecimator, lowpass_sos, notch_sos
+    chain = FilterChain(np.concatenate([notch_sos(50.0, 30.0, 48000), lowpass_sos(8000.0, 48000)]), 1024)
+    chain.process(np.zeros(1024, dtype=np.float32))
+    PolyphaseDecimator(3, blocksize=384).process(np.zeros(384, dtype=np.float32))
+
+def _analysers():
+    from .pitch import AubioAnalyser
+    AubioAnalyser(48000, 1024).process(np.zeros(1024, dtype=np.float32))
+
+def _devices():
+    devices.query_devices()
+
+def _music21():
+    from music21 import converter
+    converter.parse(MINIMAL_MUSICXML, format="musicxml")
+
+STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("dsp", _dsp),
+    ("analysers", _analysers),
+    ("devices", _devices),
+    ("music21", _music21),
+]
+
+class WarmUp:
+    def __init__(self, steps: List[Tuple[str, Callable[[], None]]] = STEPS):
+        self.steps = steps
+        self.state = "idle"
+        self.results: Dict[str, dict] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "WarmUp":
+        if self._thread is None:
+            self.state = "running"
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def run(self):
+        for name, fn in self.steps:
+            t0 = time.perf_counter()
+            try:
+                fn()
+                self.results[name] = {"ok": True, "seconds": round(time.perf_counter() - t0, 3)}
+            except Exception as e:
+                self.results[name] = {"ok": False, "error": str(e)}
+        self.state = "done"
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def status(self) -> dict:
+        return {"state": self.state, "steps": dict(self.results)}
+
+warmup = WarmUp()
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from fastapi import WebSocket
+
+from .frame_codec import FrameEncoder
+from .metrics import LATENCY_BUCKETS, Histogram
+
+# =============================
+# Strumienie, które klient może subskrybować, i pola ramki, które do nich należą
+# =============================
+STREAM_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "pitch": ("pitch_hz", "note", "cents"),
+    "level": ("rms", "db", "level", "gated", "gate_db"),
+    "tempo": ("bpm",),
+    "onset": ("onset",),
+    "wave": ("wave",),
+    "score": ("score",),
+    "notes": ("notes",),
+    "channels": ("channels",),
+}
+
+# Domyślnie: wszystko na każdym hopie, podgląd wave ~12 Hz (jak dawne "co 4. hop")
+DEFAULT_SUBSCRIPTIONS: Dict[str, object] = {
+    "pitch": True, "level": True, "tempo": True, "onset": True, "wave": 12, "score": "events", "notes": "events",
+    "channels": True,
+}
+
+# Pola-zdarzenia: tryb "events" wysyła je tylko wtedy, gdy zdarzenie wystąpiło
+EVENT_FIELDS = {"onset": "onset", "score": "score", "notes": "notes"}
+# Strumienie bez miejsca w rekordzie binarnym – dla klientów binarnych idą osobną wiadomością JSON
+# ("channels": ramki wszystkich kanałów wejścia wielokanałowego; przy jednym kanale pola nie ma)
+TEXT_STREAMS = ("score", "notes", "channels")
+
+_MODE_OFF, _MODE_ALL, _MODE_RATE, _MODE_EVENTS = 0, 1, 2, 3
+
+def parse_subscriptions(spec) -> Dict[str, object]:
+    """
+    Akceptuje dict {"pitch": 20, "onset": "events", "wave": false}
+    albo tekst z query string "pitch:20,level:30,onset:events,wave".
+    "none" wyłącza wszystkie strumienie (także domyślne), np. "none,notes" – same zdarzenia nut.
+    Sama nazwa strumienia tekstowego (score, notes) oznacza tryb "events".
+    """
+    if spec is None:
+        return {}
+    if isinstance(spec, dict):
+        return {k: v for k, v in spec.items() if k in STREAM_FIELDS}
+    out: Dict[str, object] = {}
+    for part in str(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if part == "none":
+            out.update({name: False for name in STREAM_FIELDS})
+            continue
+        name, _, val = part.partition(":")
+        if name not in STREAM_FIELDS:
+            continue
+        if not val:
+            out[name] = "events" if name in TEXT_STREAMS else True
+        elif val in ("events", "all"):
+            out[name] = val
+        elif val in ("off", "0", "false"):
+            out[name] = False
+        else:
+            try:
+                out[name] = float(val)
+            except ValueError:
+                continue
+    return out
+
+class HubClient:
+    """
+    Jeden klient WS: subskrypcje z limitem częstotliwości + ograniczona kolejka wysyłki.
+    Wątek analizy tylko wkłada gotowe wiadomości do kolejki (najstarsze wypadają),
+    a wysyła je osobne zadanie na pętli zdarzeń – zablokowana karta przeglądarki
+    nie zwiększa pamięci ani nie spowalnia pozostałych klientów.
+    Elementy kolejki to (wiadomość, czas przechwycenia hopa wg perf_counter).
+    """
+    def __init__(self, ws: WebSocket, loop: asyncio.AbstractEventLoop,
+                 encoder: Optional[FrameEncoder] = None, queue_size: int = 32,
+                 subscriptions: Optional[Dict[str, object]] = None):
+        self.ws = ws
+        self.loop = loop
+        self.encoder = encoder
+        self.queue: deque = deque(maxlen=max(1, queue_size))
+        self.sent = 0
+        self.dropped = 0
+        self.max_lag = 0
+        self.closed = False
+        self.latency: Optional[Histogram] = None  # ustawiany przez WsHub.add
+        self._wake = asyncio.Event()
+        self._wake_pending = False
+        self._mode: Dict[str, int] = {}
+        self._interval: Dict[str, float] = {}
+        self._last: Dict[str, float] = {}
+        self.subscribe(dict(DEFAULT_SUBSCRIPTIONS, **(subscriptions or {})))
+
+    # ---------- subskrypcje ----------
+    def subscribe(self, subs: Dict[str, object]):
+        for name, val in subs.items():
+            if name not in STREAM_FIELDS:
+                continue
+            if val is True or val == "all":
+                mode, interval = _MODE_ALL, 0.0
+            elif val == "events":
+                mode, interval = (_MODE_EVENTS if name in EVENT_FIELDS else _MODE_ALL), 0.0
+            elif isinstance(val, (int, float)) and not isinstance(val, bool) and val > 0:
+                mode, interval = _MODE_RATE, 1.0 / float(val)
+            else:
+                mode, interval = _MODE_OFF, 0.0
+            self._mode[name] = mode
+            self._interval[name] = interval
+            self._last.setdefault(name, 0.0)
+
+    def subscriptions(self) -> Dict[str, object]:
+        out: Dict[str, object] = {}
+        for name, mode in self._mode.items():
+            if mode == _MODE_ALL:
+                out[name] = True
+            elif mode == _MODE_RATE:
+                out[name] = round(1.0 / self._interval[name], 3)
+            elif mode == _MODE_EVENTS:
+                out[name] = "events"
+            else:
+                out[name] = False
+        return out
+
+    def due_streams(self, payload: dict, now: float):
+        """Zwraca listę strumieni, które należy wysłać w tym hopie."""
+        due = []
+        for name, mode in self._mode.items():
+            if mode == _MODE_OFF:
+                continue
+            if mode == _MODE_EVENTS:
+                if payload.get(EVENT_FIELDS[name]):
+                    due.append(name)
+                continue
+            if mode == _MODE_RATE:
+                if now - self._last[name] < self._interval[name]:
+                    continue
+                self._last[name] = now
+            due.append(name)
+        return due
+
+    # ---------- strona producenta (wątek analizy) ----------
+    def offer(self, msg, captured: float = 0.0):
+        q = self.queue
+        if len(q) == q.maxlen:
+            self.dropped += 1
+        q.append((msg, captured))
+        lag = len(q)
+        if lag > self.max_lag:
+            self.max_lag = lag
+        if not self._wake_pending:
+            self._wake_pending = True
+            try:
+                self.loop.call_soon_threadsafe(self._on_wake)
+            except RuntimeError:
+                self.closed = True
+
+    def _on_wake(self):
+        self._wake_pending = False
+        self._wake.set()
+
+    # ---------- strona konsumenta (pętla zdarzeń) ----------
+    async def run(self):
+        try:
+            while not self.closed:
+                await self._wake.wait()
+                self._wake.clear()
+                while self.queue:
+                    msg, captured = self.queue.popleft()
+                    if isinstance(msg, bytes):
+                        await self.ws.send_bytes(msg)
+                    else:
+                        await self.ws.send_text(msg)
+                    self.sent += 1
+                    if captured and self.latency is not None:
+                        self.latency.observe(time.perf_counter() - captured)
+        except Exception:
+            self.closed = True
+
+    def stats(self) -> dict:
+        return {
+            "binary": self.encoder is not None,
+            "subscriptions": self.subscriptions(),
+            "queue_size": self.queue.maxlen,
+            "lag": len(self.queue),
+            "max_lag": self.max_lag,
+            "sent": self.sent,
+            "dropped": self.dropped,
+        }
+
+class WsHub:
+    """
+    Rozgłaszanie ramek analizy do klientów WS. Lista klientów jest krotką
+    podmienianą w całości (copy-on-write), więc publish() z wątku analizy
+    nie bierze żadnego zamka.
+    """
+    def __init__(self):
+        self._clients: Tuple[HubClient, ...] = ()
+        self._lock = threading.Lock()
+        # opóźnienie przechwycenie -> wysyłka (zapisuje tylko pętla zdarzeń)
+        self.latency = Histogram(LATENCY_BUCKETS)
+        # liczniki klientów już odłączonych (żeby sumy nie malały)
+        self._retired_sent = 0
+        self._retired_dropped = 0
+
+    @property
+    def clients(self) -> Tuple[HubClient, ...]:
+        return self._clients
+
+    def add(self, client: HubClient):
+        client.latency = self.latency
+        with self._lock:
+            self._clients = self._clients + (client,)
+
+    def remove(self, client: HubClient):
+        client.closed = True
+        with self._lock:
+            if client not in self._clients:
+                return
+            self._clients = tuple(c for c in self._clients if c is not client)
+            self._retired_sent += client.sent
+            self._retired_dropped += client.dropped
+
+    def publish(self, payload: dict, wave: Optional[np.ndarray] = None,
+                preview: Optional[Callable[[np.ndarray], list]] = None, captured: float = 0.0):
+        clients = self._clients
+        if not clients:
+            return
+        now = time.monotonic()
+        wave_list = None
+        for c in clients:
+            if c.closed:
+                self.remove(c)
+                continue
+            due = c.due_streams(payload, now)
+            if not due:
+                continue
+            send_wave = wave is not None and "wave" in due
+            if c.encoder is not None:
+                # pozycja w partyturze i zdarzenia nut -> osobna wiadomość tekstowa
+                side = {name: payload[name] for name in TEXT_STREAMS if name in due and payload.get(name)}
+                if side:
+                    c.offer(json.dumps(side), captured)
+                if all(name in TEXT_STREAMS for name in due):
+                    continue
+                msg = c.encoder.add(payload, wave if send_wave else None)
+                if msg is not None:
+                    c.offer(msg, captured)  # paczka hopów: czas przechwycenia ostatniego
+                continue
+            out = {}
+            for name in due:
+                if name == "wave":
+                    if send_wave:
+                        if wave_list is None:
+                            wave_list = preview(wave) if preview else wave.astype(float).tolist()
+                        out["wave"] = wave_list
+                    continue
+                for f in STREAM_FIELDS[name]:
+                    if f in payload:
+                        out[f] = payload[f]
+            if out:
+                c.offer(json.dumps(out), captured)
+
+    def stats(self) -> list:
+        return [c.stats() for c in self._clients]
+
+    def metrics(self) -> dict:
+        clients = self._clients
+        return {
+            "clients": len(clients),
+            "queue_depth": sum(len(c.queue) for c in clients),
+            "queue_max_depth": max((len(c.queue) for c in clients), default=0),
+            "sent": self._retired_sent + sum(c.sent for c in clients),
+            "dropped": self._retired_dropped + sum(c.dropped for c in clients),
+            "latency": self.latency.snapshot(),
+        }
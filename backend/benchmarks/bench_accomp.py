@@ -0,0 +1,140 @@
+"""
+Render akompaniamentu z partytury (app/services/synth.py) na syntetycznym utworze:
+partia fortepianu (akordy), basu i smyczków, M minut w 120 bpm. Mierzone:
+  - naiwna synteza addytywna (suma sinusów każdej harmonicznej dla każdej nuty) na wycinku,
+    ekstrapolowana do całego utworu,
+  - tablice okresów bez pamięci gotowych nut vs z bankiem nut (trafienia powtórzonych dźwięków),
+  - cały utwór w jednym procesie vs kawałki w puli procesów,
+  - ponowne żądanie z cache na dysku (DiskLRU).
+
+Uruchomienie (z katalogu backend/):
+    python -m benchmarks.bench_accomp --minutes 10
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+
+from app.services import synth
+from app.services.disk_cache import DiskLRU
+from app.services.score_cache import NOTE_COLUMNS, PartTable, ScoreTable
+
+def make_part(name: str, onset_beats: np.ndarray, dur_beats: np.ndarray, midi: np.ndarray) -> PartTable:
+    cols = {
+        "onset_beats": onset_beats.astype(np.float32),
+        "onset_s": (onset_beats * 0.5).astype(np.float32),
+        "dur_beats": dur_beats.astype(np.float32),
+        "dur_s": (dur_beats * 0.5).astype(np.float32),
+        "midi": midi.astype(np.uint8),
+        "measure": (onset_beats // 4).astype(np.int32),
+        "tie": np.zeros(midi.size, dtype=np.uint8),
+    }
+    assert set(cols) == set(NOTE_COLUMNS)
+    return PartTable(name, cols)
+
+def make_score(minutes: float, rng: np.random.Generator) -> ScoreTable:
+    beats = int(minutes * 60 * 2)                      # 120 bpm
+    # fortepian: akordy (3 dźwięki, losowe przewroty) o losowych wartościach rytmicznych,
+    # harmonia zmienia się co takt
+    roots = 48 + rng.integers(0, 12, size=beats // 4 + 1)
+    durs = rng.choice([0.5, 1.0, 1.0, 1.5, 2.0], size=beats * 2)
+    on1 = np.r_[0.0, np.cumsum(durs)[:-1]]
+    keep = on1 < beats
+    on1, durs = on1[keep], durs[keep]
+    voicing = np.array([[0, 4, 7], [4, 7, 12], [7, 12, 16]])[rng.integers(0, 3, size=on1.size)]
+    chord = (voicing + roots[(on1 // 4).astype(int)][:, None] + 12).ravel()
+    piano = make_part("Piano", np.repeat(on1, 3), np.repeat(durs, 3), chord)
+    # bas: półnuty na prymie
+    b_on = np.arange(0, beats, 2, dtype=np.float64)
+    bass = make_part("Double Bass", b_on, np.full(b_on.size, 2.0), roots[(b_on // 4).astype(int)] - 12)
+    # smyczki: długie nuty (cały takt) na kwincie
+    s_on = np.arange(0, beats, 4, dtype=np.float64)
+    strings = make_part("Viola", s_on, np.full(s_on.size, 4.0), roots[(s_on // 4).astype(int)] + 7)
+    violin = make_part("Violin", s_on, np.full(s_on.size, 4.0), roots[(s_on // 4).astype(int)] + 24)
+    meta = {"title": "bench", "duration_s": beats * 0.5}
+    return ScoreTable("bench" + "0" * 59, meta, [violin, piano, bass, strings], np.array([[0.0, 120.0]]))
+
+def naive_chunk(plan: synth.RenderPlan, seconds: float) -> float:
+    """Suma sinusów każdej harmonicznej dla każdej nuty pierwszych `seconds` sekund."""
+    sr = plan.samplerate
+    stop = int(seconds * sr)
+    out = np.zeros(stop + plan.max_span, dtype=np.float64)
+    starts, lengths, midi, inst = plan.chunk_notes(0, stop)
+    t0 = time.perf_counter()
+    bank = synth.NoteBank(sr)
+    for s, n, m, i in zip(starts.tolist(), lengths.tolist(), midi.tolist(), inst.tolist()):
+        name = synth.INSTRUMENT_NAMES[i]
+        spec = synth.INSTRUMENTS[name]
+        env = bank.envelope(name, n)
+        t = np.arange(env.size) / sr
+        f0 = 440.0 * 2.0 ** ((m - 69) / 12.0)
+        wave = np.zeros(env.size)
+        for k, a in enumerate(spec.harmonics, start=1):
+            if k * f0 < synth.NYQUIST_MARGIN * sr:
+                wave += a * np.sin(2 * np.pi * k * f0 * t)
+        out[s:s + env.size] += wave * env
+    return time.perf_counter() - t0
+
+def wavetable_only(plan: synth.RenderPlan) -> float:
+    """Tablice okresów, ale każda nuta liczona od nowa (bez pamięci gotowych przebiegów)."""
+    bank = synth.NoteBank(plan.samplerate)
+    out = np.zeros(plan.total + plan.max_span, dtype=np.float32)
+    t0 = time.perf_counter()
+    for s, n, m, i in zip(plan.starts.tolist(), plan.lengths.tolist(), plan.midi.tolist(), plan.inst.tolist()):
+        wave = bank.render(synth.INSTRUMENT_NAMES[i], m, n)
+        out[s:s + wave.size] += wave
+    return time.perf_counter() - t0
+
+def full_render(plan: synth.RenderPlan, parallel: bool) -> float:
+    synth._banks.clear()
+    t0 = time.perf_counter()
+    for _ in synth.iter_pcm(plan, parallel=parallel):
+        pass
+    return time.perf_counter() - t0
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--minutes", type=float, default=10.0)
+    ap.add_argument("--sr", type=int, default=44100)
+    ap.add_argument("--naive-seconds", type=float, default=20.0, help="wycinek dla naiwnej syntezy")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    table = make_score(args.minutes, np.random.default_rng(args.seed))
+    plan = synth.plan_render(table, samplerate=args.sr)
+    dur = plan.duration_s
+    print(f"utwór {dur / 60:.1f} min, {plan.starts.size} nut, partie: "
+          f"{', '.join(p['name'] + '→' + p['instrument'] for p in plan.parts)}, workers={synth.RENDER_WORKERS}")
+
+    naive = naive_chunk(plan, args.naive_seconds) * dur / args.naive_seconds
+    table_s = wavetable_only(plan)
+    serial = full_render(plan, parallel=False)
+    bank = synth.note_bank(args.sr)
+    hit_rate = bank.hits / max(1, bank.hits + bank.misses)
+    # uruchomienie procesów puli (spawn) poza pomiarem – bez rozgrzewania ich banków nut
+    list(synth._get_pool().map(abs, range(synth.RENDER_WORKERS)))
+    parallel = full_render(plan, parallel=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = DiskLRU(tmp, 1 << 30)
+        t0 = time.perf_counter()
+        cache.get_or_create("a.wav", lambda: synth.iter_wav(plan))
+        cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        _, hit = cache.get_or_create("a.wav", lambda: synth.iter_wav(plan))
+        warm = time.perf_counter() - t0
+        size = os.path.getsize(cache.path("a.wav"))
+
+    def row(label, s):
+        print(f"  {label:<38} {s:>8.2f} s  {dur / s:>8.0f}× czasu rzeczywistego")
+    row(f"naiwnie (ekstrapolacja z {args.naive_seconds:g} s)", naive)
+    row("tablice okresów, bez banku nut", table_s)
+    row(f"bank nut, 1 proces (trafienia {100 * hit_rate:.0f}%)", serial)
+    row("bank nut, kawałki w puli procesów", parallel)
+    row("żądanie bez cache (render + zapis WAV)", cold)
+    print(f"  {'ponowne żądanie (cache na dysku)':<38} {warm * 1e3:>8.2f} ms  (trafienie={hit}, "
+          f"{size / 1e6:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Dopasowanie offline nagrania do partytury (app/services/align.py) na syntetycznym wykonaniu:
+losowa melodia M nut, wykonanie z innym tempem i rubato, vibrato, szumem detekcji, pauzami
+(cisza/bramka), błędami oktawy i zgubionymi/fałszywymi onsetami. Mierzone:
+  - czas i pamięć (komórki pasa) wieloskalowego DTW w pasie vs pełna macierz N·M,
+  - błąd początku nut (mediana, p95) i trafność odchylenia w centach względem prawdy,
+  - dla porównania: naiwne DTW w czystym Pythonie na wycinku, ekstrapolowane do N·M.
+
+Uruchomienie (z katalogu backend/):
+    python -m benchmarks.bench_align --minutes 20 --notes 3000
+"""
+import argparse
+import time
+import numpy as np
+
+from app.services.align import BandedDTW, multiscale_dtw, note_report
+
+def make_performance(n_notes: int, minutes: float, frame_s: float, rng: np.random.Generator):
+    beats = rng.choice([0.5, 1.0, 1.0, 1.5, 2.0], size=n_notes)
+    midi = np.empty(n_notes)
+    cur = 67
+    for k, step in enumerate(rng.choice([-3, -2, -1, 0, 1, 2, 3], size=n_notes)):
+        cur = cur + step if 55 <= cur + step <= 93 else cur - step   # odbicie od granic skali
+        midi[k] = cur
+    onset_beats = np.r_[0.0, np.cumsum(beats)[:-1]]
+    score_s = onset_beats * 0.5                       # partytura: 120 bpm
+    # wykonanie: tempo dobrane do długości nagrania, rubato ±15% i pauza na początku
+    total = minutes * 60.0
+    local = np.exp(0.15 * np.sin(np.arange(n_notes) / 17.0) + 0.05 * rng.standard_normal(n_notes))
+    dur = beats * local
+    dur *= (total - 2.0) / dur.sum()
+    starts = 1.0 + np.r_[0.0, np.cumsum(dur)[:-1]]
+    ends = starts + dur
+    intonation = rng.normal(0.0, 12.0, n_notes)      # odchylenie każdej nuty w centach
+
+    n = int(total / frame_s)
+    t = np.arange(n) * frame_s
+    idx = np.searchsorted(starts, t, side="right") - 1
+    inside = (idx >= 0) & (t < ends[np.clip(idx, 0, None)] - 0.03)   # krótka przerwa na końcu nuty
+    track = np.full(n, np.nan)
+    j = idx[inside]
+    track[inside] = midi[j] + intonation[j] / 100.0 + 0.15 * np.sin(2 * np.pi * 5.5 * t[inside])
+    track[inside] += rng.normal(0.0, 0.05, inside.sum())
+    octave = rng.random(n) < 0.02
+    track[octave & inside] += 12.0
+    track[rng.random(n) < 0.03] = np.nan                 # dziury w detekcji
+    onset = np.zeros(n, dtype=bool)
+    hit = rng.random(n_notes) < 0.85
+    onset[np.minimum((starts[hit] / frame_s).astype(int) + 1, n - 1)] = True
+    onset[rng.random(n) < 0.005] = True                   # fałszywe onsety
+    events = {"midi": midi, "onset_beats": onset_beats, "onset_s": score_s,
+              "measure": (onset_beats // 4).astype(np.int64)}
+    return track, onset, events, starts, intonation
+
+def naive_dtw(cost: np.ndarray) -> float:
+    n, m = cost.shape
+    D = [[float("inf")] * m for _ in range(n)]
+    for i in range(n):
+        for j in range(m):
+            best = 0.0 if i == j == 0 else min(
+                D[i - 1][j] if i else float("inf"),
+                D[i - 1][j - 1] + 0.3 if i and j else float("inf"),
+                D[i][j - 1] + 2.0 if j else float("inf"))
+            D[i][j] = best + cost[i, j]
+    return D[-1][-1]
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--minutes", type=float, default=20.0)
+    ap.add_argument("--notes", type=int, default=3000)
+    ap.add_argument("--hop", type=int, default=1024)
+    ap.add_argument("--sr", type=int, default=44100)
+    ap.add_argument("--radius", type=int, default=2)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    frame_s = args.hop / args.sr
+    track, onset, events, starts, intonation = make_performance(args.notes, args.minutes, frame_s, rng)
+    n, m = track.size, args.notes
+
+    t0 = time.perf_counter()
+    path, cost, info = multiscale_dtw(track, onset, events["midi"], radius=args.radius)
+    t_dtw = time.perf_counter() - t0
+    notes, summary = note_report(path, track, onset, frame_s, events)
+    t_all = time.perf_counter() - t0
+
+    est = np.array([np.nan if x["start"] is None else x["start"] for x in notes])
+    err = np.abs(est - starts) * 1e3
+    cents = np.array([np.nan if x["cents"] is None else x["cents"] for x in notes])
+    cerr = np.abs(cents - intonation)
+    cells = sum(lv["cells"] for lv in info["levels"])
+    print(f"{args.minutes:.0f} min nagrania = {n} hopów, {m} nut; pełna macierz {n * m / 1e6:.0f} mln komórek "
+          f"({n * m * 5 / 2**20:.0f} MB float32 + kroki)")
+    for lv in info["levels"]:
+        print(f"  poziom ×{lv['factor']:<3} hopy {lv['hops']:>6}  pas {lv['width']:>5}  komórki {lv['cells'] / 1e6:7.2f} mln")
+    print(f"DTW {t_dtw:.2f} s, z raportem {t_all:.2f} s; komórki łącznie {cells / 1e6:.1f} mln "
+          f"({100.0 * cells / (n * m):.2f}% pełnej macierzy)")
+    print(f"początek nuty: mediana |błąd| {np.nanmedian(err):.0f} ms, p95 {np.nanpercentile(err, 95):.0f} ms, "
+          f"> 100 ms: {np.mean(err > 100):.1%}")
+    print(f"centy: mediana |błąd| {np.nanmedian(cerr):.1f} c; pominięte {summary['missed']}, "
+          f"tempo ×{summary['tempo_ratio']}")
+
+    # naiwne DTW w Pythonie na wycinku -> ekstrapolacja na N·M
+    sub = BandedDTW().local_cost(track[:400, None], events["midi"][None, :100])
+    t0 = time.perf_counter()
+    naive_dtw(sub)
+    per_cell = (time.perf_counter() - t0) / sub.size
+    print(f"naiwne DTW (Python): {per_cell * 1e9:.0f} ns/komórkę -> ~{per_cell * n * m / 60:.0f} min dla całości")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Import biblioteki partytur do katalogu (app/services/score_catalog.py) na syntetycznej
+bibliotece: N plików, połowa MusicXML (1–2 partie, losowa tonacja/metrum/skala), połowa MIDI.
+Mierzone:
+  - MIDI: music21 vs mido na tych samych plikach (czas na plik),
+  - import w jednym procesie vs w puli procesów (VIOLIN_IMPORT_WORKERS),
+  - ponowny import tej samej biblioteki (treści już w katalogu – bez parsowania),
+  - wyszukiwanie w indeksie powielonym do --entries wpisów (słowa, filtry, sortowanie).
+
+Uruchomienie (z katalogu backend/):
+    python -m benchmarks.bench_catalog --files 200
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+
+from app.services import score_catalog
+from app.services.score_catalog import ImportJob, ScoreCatalog, directory_files, ingest_files
+from app.services.score_store import ScoreStore
+
+_ALTER = {1: 1, 3: 1, 6: 1, 8: 1, 10: 1}          # klasa wysokości -> podwyższenie (zapis krzyżykami)
+_PC_STEP = {0: "C", 1: "C", 2: "D", 3: "D", 4: "E", 5: "F", 6: "F", 7: "G", 8: "G", 9: "A", 10: "A", 11: "B"}
+TITLES = ["Etude", "Minuet", "Gavotte", "Sonatina", "Air", "Bourree", "Gigue", "Romance", "Waltz", "Study"]
+COMPOSERS = ["Wohlfahrt", "Kayser", "Suzuki", "Bach", "Handel", "Seitz", "Kreutzer", None]
+
+def melody(rng: np.random.Generator, notes: int, lo: int, hi: int) -> np.ndarray:
+    steps = rng.choice([-2, -1, 1, 2, 3, -3, 5, -5, 0], size=notes)
+    return np.clip(lo + (hi - lo) // 2 + np.cumsum(steps), lo, hi)
+
+def musicxml(rng: np.random.Generator, title: str, composer, parts: int, notes: int) -> str:
+    fifths = int(rng.integers(-3, 5))
+    beats = int(rng.choice([2, 3, 4]))
+    out = ['<?xml version="1.0" encoding="UTF-8"?>', '<score-partwise version="3.1">',
+           f"<work><work-title>{title}</work-title></work>"]
+    if composer:
+        out.append(f'<identification><creator type="composer">{composer}</creator></identification>')
+    out.append("<part-list>")
+    names = ["Violin", "Piano"][:parts]
+    for i, name in enumerate(names):
+        out.append(f'<score-part id="P{i + 1}"><part-name>{name}</part-name></score-part>')
+    out.append("</part-list>")
+    for i, name in enumerate(names):
+        hi = int(rng.integers(76, 92)) if i == 0 else 72
+        pitches = melody(rng, notes, 55 if i == 0 else 40, hi)
+        out.append(f'<part id="P{i + 1}">')
+        for m in range(0, notes, beats):
+            out.append(f'<measure number="{m // beats + 1}">')
+            if m == 0:
+                out.append(f"<attributes><divisions>1</divisions><key><fifths>{fifths}</fifths></key>"
+                           f"<time><beats>{beats}</beats><beat-type>4</beat-type></time></attributes>")
+            for p in pitches[m:m + beats].tolist():
+                alter = _ALTER.get(p % 12, 0)
+                out.append(f"<note><pitch><step>{_PC_STEP[p % 12]}</step>"
+                           + (f"<alter>{alter}</alter>" if alter else "")
+                           + f"<octave>{p // 12 - 1}</octave></pitch><duration>1</duration><type>quarter</type></note>")
+            out.append("</measure>")
+        out.append("</part>")
+    out.append("</score-partwise>")
+    return "\n".join(out)
+
+def midi_file(rng: np.random.Generator, path: str, title: str, notes: int):
+    import mido
+
+    mid = mido.MidiFile(ticks_per_beat=480)
+    meta = mido.MidiTrack([mido.MetaMessage("track_name", name=title),
+                           mido.MetaMessage("set_tempo", tempo=mido.bpm2tempo(float(rng.integers(60, 150)))),
+                           mido.MetaMessage("time_signature", numerator=int(rng.choice([2, 3, 4])), denominator=4)])
+    track = mido.MidiTrack([mido.MetaMessage("track_name", name="Violin")])
+    durs = rng.choice([240, 480, 480, 960], size=notes)
+    for p, d in zip(melody(rng, notes, 55, int(rng.integers(76, 92))).tolist(), durs.tolist()):
+        track.append(mido.Message("note_on", note=p, velocity=80, time=0))
+        track.append(mido.Message("note_off", note=p, velocity=0, time=d))
+    mid.tracks.extend([meta, track])
+    mid.save(path)
+
+def make_library(root: str, files: int, notes: int, rng: np.random.Generator):
+    for i in range(files):
+        title = f"{TITLES[i % len(TITLES)]} No. {i + 1}"
+        composer = COMPOSERS[i % len(COMPOSERS)]
+        if i % 2 == 0:
+            with open(os.path.join(root, f"piece_{i:04d}.musicxml"), "w") as f:
+                f.write(musicxml(rng, title, composer, 1 + (i % 4 == 0), notes))
+        else:
+            midi_file(rng, os.path.join(root, f"piece_{i:04d}.mid"), title, notes)
+
+def run_import(lib: str, work: str, workers: int, reuse: str = None) -> tuple:
+    root = reuse or tempfile.mkdtemp(prefix="catalog-", dir=work)
+    catalog = ScoreCatalog(ScoreStore(root))
+    job = ImportJob(lib)
+    t0 = time.perf_counter()
+    catalog.run_import(job, ingest_files(catalog.store, directory_files(lib)), workers=workers)
+    return time.perf_counter() - t0, job, catalog, root
+
+def midi_parsers(lib: str, limit: int = 20):
+    from music21 import converter
+
+    paths = sorted(os.path.join(lib, f) for f in os.listdir(lib) if f.endswith(".mid"))[:limit]
+    t0 = time.perf_counter()
+    for p in paths:
+        converter.parse(p)
+    m21 = (time.perf_counter() - t0) / len(paths)
+    t0 = time.perf_counter()
+    for p in paths:
+        score_catalog._midi_entry(p)
+    mido_s = (time.perf_counter() - t0) / len(paths)
+    print(f"MIDI na plik: music21 {m21 * 1e3:.1f} ms, mido {mido_s * 1e3:.2f} ms ({m21 / mido_s:.0f}×)")
+
+def search_bench(catalog: ScoreCatalog, entries: int, repeat: int):
+    base = list(catalog._entries.values())
+    for i in range(entries - len(base)):
+        e = dict(base[i % len(base)], hash=f"{i:064x}", title=f"{base[i % len(base)]['title']} #{i}")
+        catalog.put(e)
+    queries = [
+        ("wszystko, sort title", {}),
+        ("q='minuet'", {"q": "minuet"}),
+        ("q='suzuki gavotte'", {"q": "suzuki gavotte"}),
+        ("tonacja + metrum", {"key": "G major", "time_signature": "3/4"}),
+        ("poziom ≤2, max_pitch 83", {"max_level": 2, "max_pitch": 83}),
+        ("sort level, limit 20", {"sort": "level", "limit": 20}),
+    ]
+    print(f"wyszukiwanie w {len(catalog)} wpisach")
+    for label, kw in queries:
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            res = catalog.search(**kw)
+        dt = (time.perf_counter() - t0) / repeat
+        print(f"  {label:<26} {dt * 1e3:>7.2f} ms  ({res['total']} trafień)")
+    t0 = time.perf_counter()
+    catalog.save()
+    save = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    ScoreCatalog(catalog.store)
+    load = time.perf_counter() - t0
+    print(f"  zapis indeksu {save * 1e3:.0f} ms, wczytanie przy starcie {load * 1e3:.0f} ms "
+          f"({os.path.getsize(catalog.path) / 1e6:.1f} MB)")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--notes", type=int, default=400, help="nut na partię")
+    ap.add_argument("--entries", type=int, default=10000, help="wielkość indeksu dla wyszukiwania")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as lib, tempfile.TemporaryDirectory() as work:
+        make_library(lib, args.files, args.notes, np.random.default_rng(args.seed))
+        midi_parsers(lib)
+        serial, job, _, _ = run_import(lib, work, workers=0)
+        print(f"{job.files} plików: 1 proces {serial:.1f} s ({serial / job.files * 1e3:.0f} ms/plik), "
+              f"błędy {job.failed}")
+        parallel, job, catalog, root = run_import(lib, work, workers=score_catalog.IMPORT_WORKERS)
+        print(f"  pula procesów ({score_catalog.IMPORT_WORKERS}): {parallel:.1f} s ({serial / parallel:.1f}×)")
+        again, job, catalog, _ = run_import(lib, work, workers=score_catalog.IMPORT_WORKERS, reuse=root)
+        print(f"  ponowny import: {again:.2f} s (pominięte {job.skipped}, sparsowane {job.parsed})")
+        search_bench(catalog, args.entries, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Wejście wielokanałowe: koszt hopa AudioEngine dla N kanałów (ChannelBank).
+Dla każdej liczby kanałów:
+  - przód wektorowy (filtry + poziomy + bramka na bloku kanały × hop) vs N osobnych
+    łańcuchów FilterChain z pętlą po kanałach,
+  - cały hop: analiza kanałów po kolei vs w puli wątków (workers = N),
+  - % czasu rzeczywistego (czas hopa / długość hopa audio).
+Sygnał: wirtualne wejście (VirtualStream) z osobnym programem na każdy kanał.
+
+Uruchomienie (z katalogu backend/):
+    python -m benchmarks.bench_channels --channels 1,2,4,8 --pitch aubio
+"""
+import argparse
+import math
+import time
+import numpy as np
+
+from app.models.schemas import NoiseConfig
+from app.services.dsp import FilterChain
+from app.services.engine import AudioEngine
+from app.services.virtual_input import VirtualStream
+
+def make_blocks(channels: int, sr: int, hop: int, n: int, seed: int) -> np.ndarray:
+    stream = VirtualStream(sr, hop, seed=seed, channels=channels)
+    stream.start()
+    blocks = np.zeros((n, hop, channels), dtype=np.float32)
+    for i in range(n):
+        stream.read(blocks[i])
+    return blocks.transpose(0, 2, 1)   # (n, kanały, hop) – widoki jak w pętli _run
+
+def front_end_loop(blocks: np.ndarray, sr: int, hop: int) -> float:
+    """Przód jak dla N sesji mono: osobny łańcuch i poziom na kanał."""
+    cfg = NoiseConfig(notch_enabled=True)
+    chains = [FilterChain.from_noise_config(cfg, sr, hop) for _ in range(blocks.shape[1])]
+    t0 = time.perf_counter()
+    for block in blocks:
+        for c, chain in enumerate(chains):
+            y = chain.process(block[c])
+            db = 20.0 * math.log10(float(np.sqrt(np.mean(y ** 2) + 1e-12)) + 1e-12)
+            _ = db < -50.0
+    return (time.perf_counter() - t0) / blocks.shape[0]
+
+def front_end_vector(eng: AudioEngine, blocks: np.ndarray) -> float:
+    t0 = time.perf_counter()
+    for block in blocks:
+        eng._apply_noise_processing_channels(block)
+    return (time.perf_counter() - t0) / blocks.shape[0]
+
+def full_hop(eng: AudioEngine, blocks: np.ndarray) -> float:
+    t0 = time.perf_counter()
+    for block in blocks:
+        eng.process(block if block.shape[0] > 1 else block[0])
+    return (time.perf_counter() - t0) / blocks.shape[0]
+
+def make_engine(channels: int, sr: int, hop: int, pitch: str, workers: int) -> AudioEngine:
+    eng = AudioEngine("bench-channels", NoiseConfig(notch_enabled=True), pitch_engine=pitch)
+    eng.prepare(sr, hop, channels=channels)
+    if eng._bank is not None and workers != eng._bank.workers:
+        from app.services.channels import ChannelBank
+        eng._bank.close()
+        eng._bank = ChannelBank(channels, sr, eng.hop, eng.analysis_samplerate, eng.analysis_hop,
+                                pitch_engine=pitch, pitch_buf=eng.pitch_window, workers=workers)
+    return eng
+
+def _us(seconds, width: int) -> str:
+    return f"{'-':>{width}}" if seconds is None else f"{seconds * 1e6:>{width - 2}.0f}µs"
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sr", type=int, default=48000)
+    ap.add_argument("--hop", type=int, default=1024)
+    ap.add_argument("--channels", default="1,2,4,8")
+    ap.add_argument("--pitch", default="aubio", help="silnik wysokości (aubio/yin/mpm)")
+    ap.add_argument("--hops", type=int, default=400)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    budget = args.hop / args.sr
+    print(f"sr={args.sr} hop={args.hop} ({budget * 1e3:.1f} ms) silnik={args.pitch}, {args.hops} hopów")
+    print(f"{'kanały':>6} {'przód pętla':>12} {'przód wekt.':>12} {'hop po kolei':>13} {'hop w puli':>11} "
+          f"{'% RT':>6}")
+    for c in (int(x) for x in args.channels.split(",")):
+        blocks = make_blocks(c, args.sr, args.hop, args.hops, args.seed)
+        loop = front_end_loop(blocks, args.sr, args.hop)
+        seq_eng = make_engine(c, args.sr, args.hop, args.pitch, 0)
+        # jeden kanał nie ma ścieżki wektorowej ani puli – w tych kolumnach "-"
+        vec = front_end_vector(seq_eng, blocks) if c > 1 else None
+        seq = full_hop(seq_eng, blocks)
+        pooled = None
+        if c > 1:
+            pool_eng = make_engine(c, args.sr, args.hop, args.pitch, c)
+            pooled = full_hop(pool_eng, blocks)
+            pool_eng._bank.close()
+        best = seq if pooled is None else min(seq, pooled)
+        print(f"{c:>6} {loop * 1e6:>10.0f}µs {_us(vec, 12)} {seq * 1e6:>11.0f}µs {_us(pooled, 11)} "
+              f"{100.0 * best / budget:>6.1f}")
+
+if __name__ == "__main__":
+    main()
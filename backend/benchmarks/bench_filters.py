@@ -0,0 +1,81 @@
+"""
+Mikro-benchmark: koszt filtrowania jednego hopa.
+Porównuje dawną pętlę HPF (próbka po próbce w Pythonie) z FilterChain.
+
+Uruchomienie (z katalogu backend/):
+    python -m benchmarks.bench_filters --sr 48000 --hops 128 256 512 1024 2048
+"""
+import argparse
+import math
+import time
+import numpy as np
+
+from app.services.dsp import FilterChain, one_pole_highpass_sos, notch_sos, lowpass_sos, preemphasis_sos
+
+class LegacyHPF:
+    """Kopia pętli _hpf_process sprzed wprowadzenia FilterChain (punkt odniesienia)."""
+    def __init__(self, cut_hz: float, samplerate: int):
+        rc = 1.0 / (2.0 * math.pi * max(1.0, cut_hz))
+        dt = 1.0 / float(samplerate)
+        self.alpha = rc / (rc + dt)
+        self.x1 = 0.0
+        self.y1 = 0.0
+
+    def process(self, frame: np.ndarray) -> np.ndarray:
+        out = np.empty_like(frame)
+        x1, y1, a = self.x1, self.y1, self.alpha
+        for i in range(frame.size):
+            x = float(frame[i])
+            y = a * (y1 + x - x1)
+            out[i] = y
+            x1 = x
+            y1 = y
+        self.x1, self.y1 = x1, y1
+        return out
+
+def _time_per_hop(fn, blocks: np.ndarray, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for b in blocks:
+            fn(b)
+        best = min(best, (time.perf_counter() - t0) / len(blocks))
+    return best
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sr", type=int, default=48000)
+    ap.add_argument("--hops", type=int, nargs="+", default=[128, 256, 512, 1024, 2048])
+    ap.add_argument("--blocks", type=int, default=200)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"sr={args.sr}  (czas na hop, najlepszy z {args.repeat})")
+    print(f"{'hop':>6} {'budżet':>9} {'pętla':>10} {'HPF':>9} {'pełny':>9} {'przysp.':>8} {'max|Δ|':>9}")
+    for hop in args.hops:
+        blocks = (0.1 * rng.standard_normal((args.blocks, hop))).astype(np.float32)
+        budget = hop / args.sr
+
+        legacy = LegacyHPF(70.0, args.sr)
+        hpf = FilterChain(one_pole_highpass_sos(70.0, args.sr), hop)
+        full = FilterChain(np.vstack([
+            one_pole_highpass_sos(70.0, args.sr),
+            notch_sos(50.0, 30.0, args.sr),
+            lowpass_sos(8000.0, args.sr),
+            preemphasis_sos(0.97),
+        ]), hop)
+
+        # zgodność numeryczna z pętlą (na świeżym stanie)
+        ref = LegacyHPF(70.0, args.sr)
+        chk = FilterChain(one_pole_highpass_sos(70.0, args.sr), hop)
+        err = max(float(np.max(np.abs(ref.process(b) - chk.process(b)))) for b in blocks[:20])
+
+        t_loop = _time_per_hop(legacy.process, blocks, args.repeat)
+        t_hpf = _time_per_hop(hpf.process, blocks, args.repeat)
+        t_full = _time_per_hop(full.process, blocks, args.repeat)
+        print(f"{hop:>6} {budget * 1e3:>7.2f}ms {t_loop * 1e6:>8.1f}µs {t_hpf * 1e6:>7.1f}µs "
+              f"{t_full * 1e6:>7.1f}µs {t_loop / t_hpf:>7.1f}x {err:>9.2e}")
+
+if __name__ == "__main__":
+    main()
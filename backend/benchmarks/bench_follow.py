@@ -0,0 +1,81 @@
+"""
+Benchmark śledzenia partytury: koszt jednego hopa OnlineDTWFollower
+w zależności od długości utworu + trafność pozycji na syntetycznym wykonaniu
+(szum wysokości, błędy oktawy, przerwy, pominięte i powtórzone nuty).
+
+Uruchomienie (z katalogu backend/):
+    python -m benchmarks.bench_follow --notes 50 200 2000 10000
+"""
+import argparse
+import time
+import numpy as np
+
+from app.services.score_follow import OnlineDTWFollower
+
+def synth_score(n: int, rng: np.random.Generator) -> np.ndarray:
+    """Melodia w zakresie skrzypiec: małe kroki, czasem skoki i powtórzone dźwięki."""
+    steps = rng.choice([-4, -2, -1, 0, 1, 2, 3, 5, -7, 7], size=n, p=[.08, .2, .15, .08, .15, .2, .06, .04, .02, .02])
+    midi = 67 + np.cumsum(steps)
+    # odbicie od granic zakresu G3..E7
+    midi = 55 + np.abs((midi - 55) % 96 - 48)
+    return midi.astype(np.float32)
+
+def synth_performance(score: np.ndarray, rng: np.random.Generator, hops_per_note=(4, 12),
+                      skip_p: float = 0.02, repeat_p: float = 0.02):
+    """Zwraca (midi na hop, onset na hop, prawdziwy indeks nuty na hop)."""
+    midi, onset, truth = [], [], []
+    i = 0
+    n = score.size
+    while i < n:
+        if rng.random() < skip_p and i + 1 < n:
+            i += 1  # pominięta nuta
+        k = int(rng.integers(*hops_per_note))
+        for h in range(k):
+            m = score[i] + rng.normal(0, 0.15)
+            r = rng.random()
+            if r < 0.05:
+                m = 0.0            # przerwa / bramka
+            elif r < 0.07:
+                m += 12.0          # błąd oktawy detektora
+            midi.append(m)
+            onset.append(h == 0)
+            truth.append(i)
+        if rng.random() < repeat_p and i >= 2:
+            i -= 1  # powtórzenie poprzedniej nuty
+        else:
+            i += 1
+    return np.array(midi, dtype=np.float32), np.array(onset), np.array(truth)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--notes", type=int, nargs="+", default=[50, 200, 2000, 10000])
+    ap.add_argument("--window", type=int, default=32)
+    ap.add_argument("--sr", type=int, default=48000)
+    ap.add_argument("--hop", type=int, default=1024)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    budget_us = args.hop / args.sr * 1e6
+    print(f"okno={args.window}  budżet hopa={budget_us / 1e3:.2f} ms")
+    print(f"{'nuty':>7} {'hopy':>8} {'p50':>8} {'p99':>8} {'max':>8} {'trafne':>7} {'±1':>7}")
+    for n in args.notes:
+        rng = np.random.default_rng(args.seed)
+        score = synth_score(n, rng)
+        midi, onset, truth = synth_performance(score, rng)
+        f = OnlineDTWFollower(score, window=args.window)
+
+        lat = np.empty(midi.size, dtype=np.float64)
+        pos = np.empty(midi.size, dtype=np.int64)
+        for i in range(midi.size):
+            t0 = time.perf_counter()
+            f.update(float(midi[i]), bool(onset[i]))
+            lat[i] = time.perf_counter() - t0
+            pos[i] = f.position
+
+        err = np.abs(pos - truth)
+        p50, p99, pmax = np.percentile(lat, 50) * 1e6, np.percentile(lat, 99) * 1e6, lat.max() * 1e6
+        print(f"{n:>7} {midi.size:>8} {p50:>6.1f}µs {p99:>6.1f}µs {pmax:>6.0f}µs "
+              f"{(err == 0).mean():>7.1%} {(err <= 1).mean():>7.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Historia ćwiczeń: zapis i zapytania agregujące na syntetycznych danych.
+Generuje części w katalogu tymczasowym (dni × sesje, ramki jak z analizy
+przy hop 512 / 48 kHz), potem mierzy:
+  - rozmiar na dysku (B/ramkę) i przepustowość dopisywania,
+  - czas zapytań intonation (bez grup / by=note / by=day) i tempo,
+    w milionach ramek na sekundę.
+
+Uruchomienie (z katalogu backend/):
+    python -m benchmarks.bench_history --frames 10000000 --days 30
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from app.services.history import COLUMNS, FLAG_GATED, FLAG_ONSET, HistoryPart, HistoryStore
+
+def synth_columns(n: int, rng: np.random.Generator, student: int, piece: int, frame_s: float) -> dict:
+    midi = rng.integers(55, 96, n).astype(np.uint8)
+    gated = rng.random(n) < 0.2
+    midi[gated] = 0
+    cents = rng.normal(0.0, 12.0, n).clip(-50, 50).astype(np.float16)
+    cents[midi == 0] = np.nan
+    flags = (gated * FLAG_GATED) | ((rng.random(n) < 0.05) * FLAG_ONSET)
+    return {
+        "t_ms": np.arange(n) * frame_s * 1000.0 + 8 * 3600e3,
+        "cents": cents,
+        "midi": midi,
+        "db": rng.normal(-30.0, 6.0, n).astype(np.float16),
+        "bpm": rng.normal(96.0, 3.0, n).astype(np.float16),
+        "flags": flags.astype(np.uint8),
+        "student": np.full(n, student, dtype=np.uint16),
+        "piece": np.full(n, piece, dtype=np.uint16),
+    }
+
+def build(store: HistoryStore, frames: int, days: int, sessions: int, rng: np.random.Generator) -> float:
+    frame_s = 512 / 48000.0
+    per_part = frames // (days * sessions)
+    students = [store.dictionary.code("student", f"uczeń {i}") for i in range(4)]
+    pieces = [store.dictionary.code("piece", f"utwór {i}") for i in range(8)]
+    elapsed = 0.0
+    for d in range(days):
+        day = str(np.datetime64("2026-01-01") + d)
+        for s in range(sessions):
+            cols = synth_columns(per_part, rng, students[(d + s) % 4], pieces[(d * 3 + s) % 8], frame_s)
+            t0 = time.perf_counter()
+            part = HistoryPart(store.root, day, f"s{s}", "000000-bench", {"samplerate": 48000, "hop": 512,
+                                                                         "frame_s": frame_s})
+            part.append(cols)
+            part.close()
+            elapsed += time.perf_counter() - t0
+    return elapsed
+
+def timed(fn, repeat: int):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--frames", type=int, default=10_000_000)
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--sessions", type=int, default=2, help="sesji na dzień")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    root = tempfile.mkdtemp(prefix="history-bench-")
+    try:
+        store = HistoryStore(root)
+        write_s = build(store, args.frames, args.days, args.sessions, np.random.default_rng(args.seed))
+        n = sum(p["rows"] for p in store.partitions())
+        size = sum(os.path.getsize(os.path.join(dp, f)) for dp, _, fs in os.walk(root) for f in fs if f.endswith(".bin"))
+        hours = n * 512 / 48000.0 / 3600
+        print(f"{n} ramek ({hours:.0f} h gry), {args.days} dni × {args.sessions} sesje; "
+              f"{size / n:.1f} B/ramkę ({sum(np.dtype(dt).itemsize for _, dt in COLUMNS)} B kolumn), "
+              f"{size / 2**20:.0f} MiB; zapis {n / write_s / 1e6:.1f} M ramek/s")
+
+        queries = [
+            ("intonation", lambda: store.intonation()),
+            ("intonation by=note", lambda: store.intonation(by="note")),
+            ("intonation by=day", lambda: store.intonation(by="day")),
+            ("intonation uczeń 1", lambda: store.intonation(student="uczeń 1")),
+            ("intonation 7 dni", lambda: store.intonation(since="2026-01-10", until="2026-01-16")),
+            ("tempo by=piece", lambda: store.tempo(by="piece")),
+        ]
+        print(f"{'zapytanie':>22} {'czas':>9} {'M ramek/s':>10}  wynik")
+        for label, fn in queries:
+            best, out = timed(fn, args.repeat)
+            rows = out.get("rows", n)
+            summary = (f"w stroju {out['in_tune_ratio']:.1%}" if "in_tune_ratio" in out
+                       else f"bpm {out['mean_bpm']} cv {out['cv']}")
+            print(f"{label:>22} {best * 1e3:>7.1f}ms {rows / best / 1e6:>10.1f}  {summary}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Akompaniament na żywo (app/services/live_accomp.py) na syntetycznym utworze z bench_accomp:
+  - blocks  – czas generowania bloku (p50/p99/max) przy 8/16/32 brzmiących głosach
+              dla bloków 20 i 40 ms, w odniesieniu do budżetu (długości bloku),
+  - tempo   – uczeń gra ze zmiennym tempem (±20% wokół partytury); rozjazd
+              akompaniamentu sterowanego (tempo z zaszumionego trackera + pozycje
+              śledzenia co ćwierćnutę z opóźnieniem analizy) vs stałe tempo partytury,
+  - stream  – stream_blocks w czasie rzeczywistym z blokadami pętli zdarzeń
+              (np. 80 ms co sekundę): liczba underrunów dla różnych zapasów (lookahead).
+
+Uruchomienie (z katalogu backend/):
+    python -m benchmarks.bench_live_accomp [--only blocks|tempo|stream]
+"""
+import argparse
+import asyncio
+import time
+import numpy as np
+
+from app.services import live_accomp
+from app.services.live_accomp import LiveAccompanist, LiveControl, LiveMetrics, stream_blocks
+from benchmarks.bench_accomp import make_score
+
+def block_costs(table, sr: int, blocks: int):
+    print(f"{'blok':>6} {'głosy':>6} {'p50':>9} {'p99':>9} {'max':>9} {'budżet':>9} {'p99/budżet':>11}")
+    for block_ms in (20, 40):
+        n = sr * block_ms // 1000
+        budget = block_ms * 1e3
+        for voices in (8, 16, live_accomp.MAX_VOICES):
+            acc = LiveAccompanist(table, samplerate=sr, block=n, wait=False)
+            for j in range(voices):
+                acc._trigger(j, j % n, 120.0)
+            acc._off[:voices] = 1e9          # nuty trzymane przez cały pomiar
+            for _ in range(20):
+                acc._render()
+            lat = np.empty(blocks)
+            for b in range(blocks):
+                t0 = time.perf_counter()
+                acc._render()
+                lat[b] = time.perf_counter() - t0
+            lat *= 1e6
+            p50, p99 = np.percentile(lat, 50), np.percentile(lat, 99)
+            print(f"{block_ms:>4}ms {voices:>6} {p50:>7.0f}µs {p99:>7.0f}µs {lat.max():>7.0f}µs "
+                  f"{budget:>7.0f}µs {100 * p99 / budget:>10.1f}%")
+
+def student_clock(seconds: float, nominal: float, rng: np.random.Generator, dt: float):
+    """Pozycja ucznia (ćwierćnuty) na siatce dt: tempo płynie wolno ±20% wokół partytury."""
+    t = np.arange(0.0, seconds, dt)
+    phase = rng.uniform(0, 2 * np.pi)
+    bpm = nominal * (1.0 + 0.2 * np.sin(2 * np.pi * t / 20.0 + phase))
+    beats = np.r_[0.0, np.cumsum(bpm[:-1] * dt / 60.0)]
+    return t, bpm, beats
+
+def tempo_tracking(table, sr: int, seconds: float, latency: float, rng: np.random.Generator):
+    n = sr * live_accomp.BLOCK_MS // 1000
+    dt = n / float(sr)
+    nominal = float(table.tempo_map[0, 1])
+    t, bpm, beats = student_clock(seconds, nominal, rng, dt)
+    results = {}
+    for label, steered in (("stałe tempo partytury", False), ("sterowany (tempo + pozycja)", True)):
+        control = LiveControl(latency)
+        acc = LiveAccompanist(table, samplerate=sr, block=n, control=control, wait=False)
+        next_anchor = 1.0
+        tracked = 0.0
+        err = np.empty(t.size)
+        for i, play_t in enumerate(t):
+            if steered:
+                # tracker tempa: szum ±5%, wygładzanie jak w LiveControl
+                raw = bpm[i] * (1.0 + 0.05 * rng.standard_normal())
+                tracked = raw if tracked <= 0.0 else tracked + live_accomp.TEMPO_SMOOTHING * (raw - tracked)
+                control.bpm = tracked
+                # śledzenie partytury: początek każdej ćwierćnuty, zgłoszony po `latency`
+                j = int(np.searchsorted(beats, next_anchor))
+                if j < t.size and t[j] + latency <= play_t:
+                    control.anchor = (float(beats[j]), float(t[j]))
+                    next_anchor += 1.0
+            acc.next_block(play_t)
+            k = min(i + 1, t.size - 1)
+            err[i] = (acc.beat - beats[k]) * 60.0 / bpm[k]   # [s] na końcu bloku
+        err = np.abs(err[t.size // 10:]) * 1e3               # bez pierwszych 10% (rozbieg)
+        results[label] = err
+        print(f"  {label:<30} mediana {np.median(err):>7.1f} ms  p95 {np.percentile(err, 95):>7.1f} ms  "
+              f"max {err.max():>7.1f} ms")
+    return results
+
+async def paced_stream(table, sr: int, seconds: float, lookahead_ms: int, stall_ms: float, every_s: float):
+    n = sr * live_accomp.BLOCK_MS // 1000
+    acc = LiveAccompanist(table, samplerate=sr, block=n, wait=False)
+    metrics = LiveMetrics()
+    stop = time.monotonic() + seconds
+
+    async def send_bytes(data: bytes):
+        if time.monotonic() > stop:
+            acc._next = acc.onset.size       # koniec pomiaru: nowych nut już nie ma
+            acc._nv = 0
+
+    async def send_text(text: str):
+        pass
+
+    async def staller():
+        while True:
+            await asyncio.sleep(every_s)
+            time.sleep(stall_ms / 1e3)       # blokada pętli (np. ciężkie żądanie w tym samym procesie)
+
+    task = asyncio.create_task(staller())
+    try:
+        await stream_blocks(acc, send_bytes, send_text, metrics,
+                            max(1, int(round(lookahead_ms / live_accomp.BLOCK_MS))))
+    finally:
+        task.cancel()
+    return metrics
+
+def stream_pacing(table, sr: int, seconds: float, stall_ms: float, every_s: float):
+    print(f"  blokada pętli {stall_ms:g} ms co {every_s:g} s, {seconds:g} s strumienia, blok {live_accomp.BLOCK_MS} ms")
+    for lookahead_ms in (40, 80, 120, 200):
+        m = asyncio.run(paced_stream(table, sr, seconds, lookahead_ms, stall_ms, every_s))
+        snap = m.snapshot()
+        print(f"  lookahead {lookahead_ms:>4} ms: bloki {snap['blocks']:>5}  underruny {snap['underruns']:>4}  "
+              f"ponad budżet {snap['over_budget']:>3}")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--only", choices=["blocks", "tempo", "stream"])
+    ap.add_argument("--sr", type=int, default=44100)
+    ap.add_argument("--blocks", type=int, default=2000, help="pomiary czasu bloku na konfigurację")
+    ap.add_argument("--tempo-seconds", type=float, default=120.0)
+    ap.add_argument("--latency-ms", type=float, default=60.0, help="opóźnienie analizy pozycji ucznia")
+    ap.add_argument("--stream-seconds", type=float, default=8.0)
+    ap.add_argument("--stall-ms", type=float, default=80.0)
+    ap.add_argument("--stall-every", type=float, default=1.0)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    table = make_score(max(args.tempo_seconds, args.stream_seconds) / 60.0 + 0.5, rng)
+    if args.only in (None, "blocks"):
+        print("czas generowania bloku")
+        block_costs(table, args.sr, args.blocks)
+    if args.only in (None, "tempo"):
+        print(f"rozjazd z uczniem ({args.tempo_seconds:g} s, opóźnienie analizy {args.latency_ms:g} ms)")
+        tempo_tracking(table, args.sr, args.tempo_seconds, args.latency_ms / 1e3, rng)
+    if args.only in (None, "stream"):
+        print("tempo wysyłki")
+        stream_pacing(table, args.sr, args.stream_seconds, args.stall_ms, args.stall_every)
+
+if __name__ == "__main__":
+    main()
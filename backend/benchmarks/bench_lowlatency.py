@@ -0,0 +1,110 @@
+"""
+Tryb analizy o niskim opóźnieniu: pełne pasmo vs decymacja (PolyphaseDecimator)
+z mniejszym oknem i krótszym hopem. Dla każdej konfiguracji:
+  - trafność na tonach skrzypiec z vibrato (błędy grube > 50 c, średni |Δ| w centach),
+  - opóźnienie algorytmiczne (hop + pół okna + opóźnienie filtru decymacji),
+  - opóźnienie zmierzone: od skoku wysokości do pierwszego hopa z poprawną nutą
+    (mediana po parach tonów),
+  - CPU: czas decymacji + detekcji na hop i jako % czasu rzeczywistego.
+
+Uruchomienie (z katalogu backend/):
+    python -m benchmarks.bench_lowlatency --sr 48000 --engine aubio
+"""
+import argparse
+import time
+import numpy as np
+
+from app.services.dsp import PolyphaseDecimator, decimation_factor
+from app.services.pitch import make_pitch_engine
+from benchmarks.bench_pitch import violin_tone
+
+# (etykieta, docelowa częstotliwość analizy lub None, hop wejścia, okno w próbkach analizy)
+CONFIGS = [
+    ("pełne 2048/1024", None, 1024, 2048),
+    ("pełne 1024/512", None, 512, 1024),
+    ("16k 1024/256", 16000, 768, 1024),
+    ("16k 512/128", 16000, 384, 512),
+    ("16k 512/64", 16000, 192, 512),
+    ("16k 384/64", 16000, 192, 384),
+]
+
+def run_config(signal: np.ndarray, sr: int, decimate, hop: int, window: int, engine: str):
+    factor = decimation_factor(sr, decimate) if decimate else 1
+    hop = -(-hop // factor) * factor
+    a_sr, a_hop = int(round(sr / factor)), hop // factor
+    dec = PolyphaseDecimator(factor, blocksize=hop) if factor > 1 else None
+    eng = make_pitch_engine(engine, a_sr, a_hop, buf=window)
+    n = signal.size // hop
+    est = np.zeros(n)
+    t0 = time.perf_counter()
+    for i in range(n):
+        frame = signal[i * hop:(i + 1) * hop]
+        if dec is not None:
+            frame = dec.process(frame)
+        est[i] = eng.process(frame)[0]
+    cpu = time.perf_counter() - t0
+    delay = dec.delay if dec is not None else 0.0
+    latency = hop / sr + window / 2.0 / a_sr + delay / sr
+    return est, hop, cpu / n, delay, latency
+
+def evaluate(args, label, decimate, hop, window, pairs):
+    factor = decimation_factor(args.sr, decimate) if decimate else 1
+    win_in = window * factor  # okno w próbkach wejścia
+    gross, cents, measured = [], [], []
+    for sig, truth, jump, f_next in pairs:
+        est, hop_used, cpu_hop, delay, latency = run_config(sig, args.sr, decimate, hop, window, args.engine)
+        ends = (np.arange(est.size) + 1) * hop_used
+        voiced = est > 0
+        # trafność: wysokość w środku okna (cofniętym o opóźnienie filtru), poza stanami przejściowymi
+        ref = truth[np.clip((ends - win_in / 2.0 - delay).astype(int), 0, truth.size - 1)]
+        steady = (ends > 2 * win_in) & (np.abs(ends - jump) > win_in + 0.05 * args.sr)
+        c = np.full(est.shape, np.inf)
+        c[voiced] = 1200 * np.abs(np.log2(est[voiced] / ref[voiced]))
+        good = c[steady] <= 50
+        gross.append(1.0 - good.mean())
+        if good.any():
+            cents.append(float(np.mean(c[steady][good])))
+        # opóźnienie: pierwszy hop po skoku z wysokością drugiego tonu (±50 c, vibrato ±20 c)
+        off = np.full(est.shape, np.inf)
+        off[voiced] = 1200 * np.abs(np.log2(est[voiced] / f_next))
+        hit = np.nonzero((ends >= jump) & (off <= 50))[0]
+        if hit.size:
+            measured.append((ends[hit[0]] - jump) / args.sr)
+    budget = hop_used / args.sr
+    return {
+        "label": label,
+        "hop": hop_used,
+        "gross": float(np.mean(gross)),
+        "cents": float(np.mean(cents)) if cents else float("nan"),
+        "latency_ms": latency * 1e3,
+        "measured_ms": float(np.median(measured)) * 1e3 if measured else float("nan"),
+        "cpu_hop_us": cpu_hop * 1e6,
+        "cpu_pct": 100.0 * cpu_hop / budget,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sr", type=int, default=48000)
+    ap.add_argument("--engine", default="aubio", help="silnik wysokości (aubio/yin/mpm)")
+    ap.add_argument("--seconds", type=float, default=0.8, help="długość każdego z dwóch tonów pary")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    notes = list(range(55, 97, 4))  # G3 .. C7
+    pairs = []
+    for a, b in zip(notes, notes[1:] + notes[:1]):
+        xa, fa = violin_tone(a, args.seconds, args.sr, rng)
+        xb, fb = violin_tone(b, args.seconds, args.sr, rng)
+        pairs.append((np.concatenate([xa, xb]), np.concatenate([fa, fb]), xa.size, 440.0 * 2 ** ((b - 69) / 12)))
+
+    print(f"sr={args.sr} silnik={args.engine}  pary tonów G3..C7 ({len(pairs)}), vibrato ±20c")
+    print(f"{'konfiguracja':>16} {'hop':>5} {'grube':>7} {'|Δ| c':>6} {'opóźn.':>8} {'zmierz.':>8} "
+          f"{'CPU/hop':>9} {'CPU %':>6}")
+    for label, decimate, hop, window in CONFIGS:
+        r = evaluate(args, label, decimate, hop, window, pairs)
+        print(f"{r['label']:>16} {r['hop']:>5} {r['gross']:>7.1%} {r['cents']:>6.2f} {r['latency_ms']:>6.1f}ms "
+              f"{r['measured_ms']:>6.1f}ms {r['cpu_hop_us']:>7.1f}µs {r['cpu_pct']:>6.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Benchmark całej ścieżki analizy (AudioEngine._run) na wirtualnym wejściu:
+tony skrzypcowe, vibrato, glissanda, szum tła i cisza (VirtualStream, stały seed).
+
+  fast      – jedna sesja, hopy bez czekania: p50/p99 na etap
+              (hpf, gate, pitch, onset, tempo, follow, broadcast), koszt CPU hopa,
+              szacowana liczba sesji na rdzeń
+  realtime  – N sesji naraz w tempie zegara: overruny, zgubione próbki, p99
+  memory    – długi przebieg fast: RSS na starcie/końcu i przyrost na minutę audio
+
+Wynik w JSON (stdout albo --out) do porównywania między commitami, tabela na stderr.
+
+Uruchomienie (z katalogu backend/):
+    python -m benchmarks.bench_pipeline --seconds 60 --clients 4 --out bench.json
+    python -m benchmarks.bench_pipeline --modes realtime --sessions 4 --seconds 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+from app.services.engine import AudioEngine
+from app.services.metrics import STAGES, StageClock
+from app.services.virtual_input import VirtualStream
+from app.services.ws_hub import HubClient
+
+# =============================
+# Pomocnicze: klienci WS bez sieci, zapis czasów etapów, RSS
+# =============================
+class NullWebSocket:
+    async def send_text(self, msg):
+        pass
+
+    async def send_bytes(self, msg):
+        pass
+
+class LoopThread:
+    """Pętla zdarzeń w tle – tu działają zadania wysyłki HubClient."""
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.clients: List[HubClient] = []
+        self._futures = []
+
+    def add_clients(self, eng: AudioEngine, n: int):
+        for _ in range(n):
+            client = HubClient(NullWebSocket(), self.loop)
+            eng.hub.add(client)
+            self.clients.append(client)
+            self._futures.append(asyncio.run_coroutine_threadsafe(client.run(), self.loop))
+
+    def client_stats(self) -> dict:
+        return {"clients": len(self.clients),
+                "sent": sum(c.sent for c in self.clients),
+                "dropped": sum(c.dropped for c in self.clients),
+                "max_lag": max((c.max_lag for c in self.clients), default=0)}
+
+    def close(self):
+        for fut in self._futures:
+            fut.cancel()
+        time.sleep(0.05)  # anulowanie zadań musi przejść przez pętlę
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=1.0)
+
+class StageRecorder:
+    """Czasy etapów kolejnych hopów w prealokowanej tablicy (hopy x etapy)."""
+    def __init__(self, max_hops: int):
+        self.data = np.zeros((max_hops, len(STAGES)), dtype=np.float64)
+        self.n = 0
+        self.hook = None  # opcjonalnie: wołane z liczbą hopów (np. próbkowanie RSS)
+
+    def __call__(self, durations: List[float]):
+        if self.n < self.data.shape[0]:
+            self.data[self.n] = durations
+        self.n += 1
+        if self.hook is not None:
+            self.hook(self.n)
+
+    def summary(self, budget_s: float) -> dict:
+        d = self.data[:min(self.n, self.data.shape[0])] * 1e6
+        total = d.sum(axis=1)
+        stages = {
+            name: {"p50_us": round(float(np.percentile(d[:, i], 50)), 2),
+                   "p99_us": round(float(np.percentile(d[:, i], 99)), 2),
+                   "mean_us": round(float(d[:, i].mean()), 2)}
+            for i, name in enumerate(STAGES)
+        }
+        return {
+            "hops": int(d.shape[0]),
+            "stages": stages,
+            "total": {"p50_us": round(float(np.percentile(total, 50)), 2),
+                      "p99_us": round(float(np.percentile(total, 99)), 2),
+                      "max_us": round(float(total.max()), 2),
+                      "mean_us": round(float(total.mean()), 2)},
+            "budget_us": round(budget_s * 1e6, 1),
+            "over_budget_hops": int((total > budget_s * 1e6).sum()),
+        }
+
+def rss_kb() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def make_engine(name: str, sr: int, hop: int, seconds: float, realtime: bool, seed: int,
+                pitch: Optional[str]) -> AudioEngine:
+    eng = AudioEngine(name, pitch_engine=pitch)
+    eng.stream_factory = lambda device, samplerate, blocksize, channels=1: VirtualStream(
+        samplerate, blocksize, realtime=realtime, total_seconds=seconds, seed=seed, channels=channels)
+    if eng.clock is None:  # VIOLIN_METRICS=0
+        eng.clock = StageClock()
+    return eng
+
+def run_sessions(engines: List[AudioEngine], sr: int, hop: int):
+    pool = ThreadPoolExecutor(max_workers=len(engines), thread_name_prefix="bench-session")
+    t0 = time.perf_counter()
+    c0 = time.process_time()
+    for eng in engines:
+        eng.start(pool, None, sr, hop)
+    while any(e.running for e in engines):
+        time.sleep(0.01)
+    wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+    pool.shutdown(wait=True)
+    return wall, cpu
+
+# =============================
+# Tryby
+# =============================
+def bench_fast(args) -> dict:
+    loop = LoopThread()
+    eng = make_engine("bench-fast", args.sr, args.hop, args.seconds, False, args.seed, args.pitch)
+    loop.add_clients(eng, args.clients)
+    rec = StageRecorder(int(args.seconds * args.sr / args.hop) + 8)
+    eng.clock.observers.append(rec)
+    wall, cpu = run_sessions([eng], args.sr, args.hop)
+    time.sleep(0.05)  # kolejki klientów dochodzą do końca
+    loop.close()
+
+    budget = args.hop / args.sr
+    out = rec.summary(budget)
+    out["ws"] = loop.client_stats()
+    cpu_per_hop = cpu / max(1, rec.n)
+    out.update({
+        "audio_seconds": args.seconds,
+        "wall_s": round(wall, 3),
+        "realtime_factor": round(args.seconds / wall, 1) if wall > 0 else None,
+        "cpu_per_hop_us": round(cpu_per_hop * 1e6, 2),
+        # wątek analizy + wątek wysyłki; GIL -> sesje rosną liniowo z CPU jednego rdzenia
+        "sessions_per_core": int(budget / cpu_per_hop) if cpu_per_hop > 0 else None,
+        "sessions_per_core_p99": int(budget / (out["total"]["p99_us"] / 1e6)) if out["total"]["p99_us"] > 0 else None,
+    })
+    return out
+
+def bench_realtime(args) -> dict:
+    loop = LoopThread()
+    engines, recs = [], []
+    for i in range(args.sessions):
+        eng = make_engine(f"bench-rt-{i}", args.sr, args.hop, args.seconds, True, args.seed + i, args.pitch)
+        loop.add_clients(eng, args.clients)
+        rec = StageRecorder(int(args.seconds * args.sr / args.hop) + 64)
+        eng.clock.observers.append(rec)
+        engines.append(eng)
+        recs.append(rec)
+    wall, cpu = run_sessions(engines, args.sr, args.hop)
+    time.sleep(0.05)
+    loop.close()
+
+    budget = args.hop / args.sr
+    sessions = []
+    for eng, rec in zip(engines, recs):
+        st = eng._stream.stats() if eng._stream is not None else {}
+        s = rec.summary(budget)
+        sessions.append({
+            "hops": s["hops"],
+            "total_p99_us": s["total"]["p99_us"],
+            "over_budget_hops": s["over_budget_hops"],
+            **st,
+        })
+    return {
+        "sessions": args.sessions,
+        "audio_seconds": args.seconds,
+        "wall_s": round(wall, 3),
+        "cpu_load": round(cpu / wall, 3) if wall > 0 else None,  # rdzenie zajęte średnio
+        "overruns": sum(s.get("overruns", 0) for s in sessions),
+        "dropped_frames": sum(s.get("dropped_frames", 0) for s in sessions),
+        "input_overflows": sum(s.get("input_overflows", 0) for s in sessions),
+        "ws": loop.client_stats(),
+        "per_session": sessions,
+    }
+
+def bench_memory(args) -> dict:
+    loop = LoopThread()
+    eng = make_engine("bench-mem", args.sr, args.hop, args.memory_seconds, False, args.seed, args.pitch)
+    loop.add_clients(eng, args.clients)
+    rec = StageRecorder(1)  # czasy niepotrzebne, tylko licznik hopów
+    every = max(1, int(10.0 * args.sr / args.hop))  # co 10 s audio
+    samples: List[tuple] = []
+    rec.hook = lambda n: samples.append((n * args.hop / args.sr, rss_kb())) if n % every == 0 else None
+    eng.clock.observers.append(rec)
+    start = rss_kb()
+    run_sessions([eng], args.sr, args.hop)
+    loop.close()
+
+    t = np.array([s[0] for s in samples])
+    r = np.array([s[1] for s in samples], dtype=np.float64)
+    half = t.size // 2
+    slope = float(np.polyfit(t[half:], r[half:], 1)[0]) * 60.0 if t.size - half >= 2 else 0.0
+    return {
+        "audio_seconds": args.memory_seconds,
+        "rss_start_kb": start,
+        "rss_end_kb": int(r[-1]) if r.size else start,
+        "rss_peak_kb": int(r.max()) if r.size else start,
+        "growth_kb_per_audio_min": round(slope, 1),  # dopasowanie liniowe, druga połowa przebiegu
+        "samples": [[round(a, 1), int(b)] for a, b in samples],
+    }
+
+def print_table(result: dict):
+    err = sys.stderr
+    fast = result.get("fast")
+    if fast:
+        print(f"fast: {fast['hops']} hopów, {fast['realtime_factor']}x czasu rzeczywistego, "
+              f"budżet {fast['budget_us'] / 1e3:.2f} ms", file=err)
+        print(f"{'etap':>10} {'p50':>9} {'p99':>9}", file=err)
+        for name, st in fast["stages"].items():
+            print(f"{name:>10} {st['p50_us']:>7.1f}µs {st['p99_us']:>7.1f}µs", file=err)
+        print(f"{'razem':>10} {fast['total']['p50_us']:>7.1f}µs {fast['total']['p99_us']:>7.1f}µs", file=err)
+        print(f"CPU/hop {fast['cpu_per_hop_us']:.1f}µs -> ~{fast['sessions_per_core']} sesji/rdzeń "
+              f"(wg p99: {fast['sessions_per_core_p99']})", file=err)
+    rt = result.get("realtime")
+    if rt:
+        print(f"realtime: {rt['sessions']} sesji, obciążenie CPU {rt['cpu_load']}, overruny {rt['overruns']}, "
+              f"zgubione próbki {rt['dropped_frames']}, przepełnienia {rt['input_overflows']}, "
+              f"WS wysłane/zgubione {rt['ws']['sent']}/{rt['ws']['dropped']}", file=err)
+    mem = result.get("memory")
+    if mem:
+        print(f"pamięć: RSS {mem['rss_start_kb']} -> {mem['rss_end_kb']} kB, "
+              f"przyrost {mem['growth_kb_per_audio_min']} kB/min audio", file=err)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--modes", nargs="+", default=["fast", "realtime", "memory"],
+                    choices=["fast", "realtime", "memory"])
+    ap.add_argument("--sr", type=int, default=48000)
+    ap.add_argument("--hop", type=int, default=1024)
+    ap.add_argument("--seconds", type=float, default=30.0, help="długość audio (fast/realtime)")
+    ap.add_argument("--memory-seconds", type=float, default=600.0)
+    ap.add_argument("--sessions", type=int, default=2, help="liczba sesji w trybie realtime")
+    ap.add_argument("--clients", type=int, default=2, help="klienci WS na sesję")
+    ap.add_argument("--pitch", default=None, help="silnik wysokości (aubio/yin/mpm)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="plik JSON (domyślnie stdout)")
+    args = ap.parse_args()
+
+    result = {
+        "meta": {
+            "git": git_revision(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        }
+    }
+    if "fast" in args.modes:
+        result["fast"] = bench_fast(args)
+    if "realtime" in args.modes:
+        result["realtime"] = bench_realtime(args)
+    if "memory" in args.modes:
+        result["memory"] = bench_memory(args)
+
+    print_table(result)
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
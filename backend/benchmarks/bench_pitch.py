@@ -0,0 +1,93 @@
+"""
+Porównanie silników wysokości (aubio / NumPy YIN / NumPy MPM) na syntetycznych
+tonach skrzypiec: szereg harmonicznych ~1/k z formantami korpusu, vibrato,
+szum smyczka. Mierzy trafność (błąd > 50 centów = błąd gruby), średni błąd
+w centach oraz czas na hop: strumieniowo i wsadowo (process_batch).
+
+Uruchomienie (z katalogu backend/):
+    python -m benchmarks.bench_pitch --sr 48000 --hop 1024 --seconds 1.0
+"""
+import argparse
+import time
+import numpy as np
+
+from app.services.pitch import frame_windows, make_pitch_engine, PITCH_BUF
+
+def violin_tone(midi: float, seconds: float, sr: int, rng: np.random.Generator):
+    """Zwraca (sygnał, chwilowa f0 na próbkę)."""
+    n = int(seconds * sr)
+    t = np.arange(n) / sr
+    f0 = 440.0 * 2 ** ((midi - 69) / 12)
+    # vibrato 5.5 Hz, ±20 centów, z rozbiegiem
+    depth = 0.2 * np.minimum(1.0, t / 0.3)
+    inst = f0 * 2 ** (depth * np.sin(2 * np.pi * 5.5 * t) / 12)
+    phase = 2 * np.pi * np.cumsum(inst) / sr
+    x = np.zeros(n)
+    for k in range(1, 16):
+        if f0 * k > sr / 2 * 0.9:
+            break
+        # rezonanse korpusu ~ 300 Hz, 1 kHz, 3 kHz
+        fk = f0 * k
+        body = 1.0 + 1.5 * np.exp(-((fk - 300) / 120) ** 2) + np.exp(-((fk - 1000) / 300) ** 2) \
+            + 0.7 * np.exp(-((fk - 3000) / 800) ** 2)
+        x += body / k * np.sin(k * phase + rng.uniform(0, 2 * np.pi))
+    x *= 0.3 / np.max(np.abs(x))
+    x += 0.01 * rng.standard_normal(n)  # szum smyczka
+    return x.astype(np.float32), inst.astype(np.float32)
+
+def evaluate(name: str, signal: np.ndarray, truth_hz: np.ndarray, sr: int, hop: int, skip: int):
+    eng = make_pitch_engine(name, sr, hop)
+    n = signal.size // hop
+    t0 = time.perf_counter()
+    stream = np.array([eng.process(signal[i * hop:(i + 1) * hop])[0] for i in range(n)])
+    t_stream = (time.perf_counter() - t0) / n
+
+    eng = make_pitch_engine(name, sr, hop)
+    windows = frame_windows(signal, hop, PITCH_BUF)
+    t0 = time.perf_counter()
+    batch, _ = eng.process_batch(windows)
+    t_batch = (time.perf_counter() - t0) / n
+
+    # prawda w środku okna analizy
+    centre = np.clip(np.arange(n) * hop + hop - PITCH_BUF // 2, 0, truth_hz.size - 1)
+    ref = truth_hz[centre][skip:]
+    est = stream[skip:]
+    cents = np.full(est.shape, np.inf)
+    voiced = est > 0
+    cents[voiced] = 1200 * np.abs(np.log2(est[voiced] / ref[voiced]))
+    good = cents <= 50
+    return {
+        "gross": 1.0 - good.mean(),
+        "cents": float(np.mean(cents[good])) if good.any() else float("nan"),
+        "t_stream": t_stream,
+        "t_batch": t_batch,
+        "batch_vs_stream": float(np.median(np.abs(batch[skip:] - est) / np.maximum(est, 1))),
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sr", type=int, default=48000)
+    ap.add_argument("--hop", type=int, default=1024)
+    ap.add_argument("--seconds", type=float, default=1.0, help="długość każdego tonu")
+    ap.add_argument("--engines", nargs="+", default=["aubio", "yin", "mpm"])
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    notes = list(range(55, 101, 3))  # G3 .. E7
+    tones = [violin_tone(m, args.seconds, args.sr, rng) for m in notes]
+    skip = PITCH_BUF // args.hop + 1  # rozbieg okna
+
+    print(f"sr={args.sr} hop={args.hop}  tony G3..E7 ({len(notes)}), vibrato ±20c")
+    print(f"{'silnik':>7} {'grube':>7} {'|Δ| c':>7} {'strumień':>10} {'wsad':>10} {'wsad≠str':>9}")
+    for name in args.engines:
+        res = [evaluate(name, x, f, args.sr, args.hop, skip) for x, f in tones]
+        gross = np.mean([r["gross"] for r in res])
+        cents = np.nanmean([r["cents"] for r in res])
+        ts = np.mean([r["t_stream"] for r in res]) * 1e6
+        tb = np.mean([r["t_batch"] for r in res]) * 1e6
+        diff = np.median([r["batch_vs_stream"] for r in res])
+        print(f"{name:>7} {gross:>7.1%} {cents:>7.2f} {ts:>8.1f}µs {tb:>8.1f}µs {diff:>9.1e}")
+
+if __name__ == "__main__":
+    main()
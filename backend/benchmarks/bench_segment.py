@@ -0,0 +1,134 @@
+"""
+Segmentacja nut (NoteSegmenter) na syntetycznej frazie skrzypcowej.
+Fraza: losowa linia melodyczna z legato (zmiana wysokości bez przerwy), zmianami
+smyczka na tej samej nucie (krótki spadek głośności) i pauzami. Mierzone:
+  - precyzja / czułość / F1 nut (ta sama nuta MIDI, początek w ±tolerancji),
+    mediana przesunięcia początku i błędy długości,
+  - koszt etapu "segment" na hop,
+  - ruch WS dla klienta JSON: domyślne subskrypcje vs same zdarzenia nut ("none,notes").
+
+Uruchomienie (z katalogu backend/):
+    python -m benchmarks.bench_segment --notes 200 --hop 512
+"""
+import argparse
+import json
+import time
+import numpy as np
+
+from app.services.engine import AudioEngine
+from app.services.metrics import BROADCAST, SEGMENT, StageClock
+from app.services.ws_hub import HubClient, parse_subscriptions
+from benchmarks.bench_pitch import violin_tone
+
+class CountingClient(HubClient):
+    """Klient bez sieci: zlicza wiadomości i bajty zamiast je kolejkować."""
+    def __init__(self, subscriptions):
+        super().__init__(None, None, subscriptions=subscriptions)
+        self.messages = 0
+        self.bytes = 0
+
+    def offer(self, msg, captured: float = 0.0):
+        self.messages += 1
+        self.bytes += len(msg)
+
+def make_phrase(n_notes: int, sr: int, rng: np.random.Generator):
+    """Zwraca (sygnał, lista nut (midi, start_s, koniec_s))."""
+    parts, truth = [], []
+    t = 0.0
+    midi = 67
+    for _ in range(n_notes):
+        kind = rng.choice(["legato", "bow", "rest"], p=[0.5, 0.3, 0.2])
+        if kind == "rest":
+            gap = rng.uniform(0.15, 0.4)
+            parts.append((0.003 * rng.standard_normal(int(gap * sr))).astype(np.float32))
+            t += gap
+        step = 0 if kind == "bow" else int(rng.choice([-4, -3, -2, -1, 1, 2, 3, 5]))
+        midi = int(np.clip(midi + step, 55, 88))
+        dur = rng.uniform(0.15, 0.6)
+        x, _ = violin_tone(midi, dur, sr, rng)
+        n = x.size
+        env = np.ones(n, dtype=np.float32)
+        a = int(0.015 * sr)
+        env[:a] = np.linspace(0.1 if kind != "rest" else 0.0, 1.0, a)
+        if kind == "bow":
+            # zmiana smyczka: krótki spadek głośności na początku nuty
+            env[:a] = np.linspace(0.05, 1.0, a)
+        parts.append(x * env)
+        truth.append((midi, t, t + dur))
+        t += dur
+    return np.concatenate(parts), truth
+
+def match(events, truth, tol: float):
+    notes = [(e["midi"], e["start"], e["t"]) for e in events if e["type"] == "note_off"]
+    used = set()
+    hits, offsets, dur_err = 0, [], []
+    for midi, start, end in truth:
+        best = None
+        for j, (m, s, e) in enumerate(notes):
+            if j in used or m != midi or abs(s - start) > tol:
+                continue
+            if best is None or abs(s - start) < abs(notes[best][1] - start):
+                best = j
+        if best is not None:
+            used.add(best)
+            hits += 1
+            offsets.append(notes[best][1] - start)
+            dur_err.append((notes[best][2] - notes[best][1]) - (end - start))
+    precision = hits / len(notes) if notes else 0.0
+    recall = hits / len(truth) if truth else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"detected": len(notes), "truth": len(truth), "precision": precision, "recall": recall, "f1": f1,
+            "onset_offset_ms": float(np.median(offsets)) * 1e3 if offsets else float("nan"),
+            "duration_err_ms": float(np.median(np.abs(dur_err))) * 1e3 if dur_err else float("nan")}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sr", type=int, default=48000)
+    ap.add_argument("--hop", type=int, default=512)
+    ap.add_argument("--notes", type=int, default=200)
+    ap.add_argument("--tolerance", type=float, default=0.1, help="tolerancja początku nuty [s]")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    signal, truth = make_phrase(args.notes, args.sr, rng)
+    eng = AudioEngine("bench-segment")
+    eng.prepare(args.sr, args.hop)
+    clock = eng.clock or StageClock()
+    eng.clock = clock
+    seg_times = []
+    clock.observers.append(lambda d: seg_times.append(d[SEGMENT]))
+    clients = {
+        "domyślne": CountingClient(None),
+        "none,notes": CountingClient(parse_subscriptions("none,notes")),
+    }
+    for c in clients.values():
+        eng.hub.add(c)
+
+    events = []
+    n = signal.size // args.hop
+    t0 = time.perf_counter()
+    for i in range(n):
+        payload = eng.process(signal[i * args.hop:(i + 1) * args.hop])
+        eng.hub.publish(payload)
+        clock.lap(BROADCAST)
+        clock.finish()
+        if payload["notes"]:
+            events.extend(payload["notes"])
+    wall = time.perf_counter() - t0
+    seconds = signal.size / args.sr
+
+    r = match(events, truth, args.tolerance)
+    seg = np.array(seg_times) * 1e6
+    print(f"{seconds:.0f} s audio, {n} hopów (hop {args.hop} @ {args.sr} Hz), {wall / n * 1e6:.0f} µs/hop całości")
+    print(f"nuty: wykryte {r['detected']} / prawdziwe {r['truth']}  precyzja {r['precision']:.1%}  "
+          f"czułość {r['recall']:.1%}  F1 {r['f1']:.3f}")
+    print(f"przesunięcie początku (mediana) {r['onset_offset_ms']:.0f} ms, |błąd długości| {r['duration_err_ms']:.0f} ms")
+    print(f"etap segment: p50 {np.percentile(seg, 50):.1f} µs, p99 {np.percentile(seg, 99):.1f} µs")
+    print(f"{'subskrypcje':>12} {'wiad./s':>9} {'B/s':>9}")
+    for name, c in clients.items():
+        print(f"{name:>12} {c.messages / seconds:>9.1f} {c.bytes / seconds:>9.0f}")
+    print(json.dumps(events[:2], ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Czas startu serwera: import app.main i opóźnienia pierwszych żądań.
+Każdy scenariusz działa w świeżym interpreterze (zimne importy):
+  - modules: koszt samego importu ciężkich modułów (to, co teraz ładuje się leniwie),
+  - cold:    VIOLIN_WARMUP=0 – pierwsze żądania płacą za importy i enumerację urządzeń,
+  - warm:    rozgrzewka w tle; żądania po jej zakończeniu (czas rozgrzewki osobno).
+Mierzone: import app.main, pierwsze /health, /api/audio/status, /api/audio/devices,
+/api/audio/start (strumień + analizatory) i pierwsze parsowanie partytury (music21).
+
+Uruchomienie (z katalogu backend/):
+    python -m benchmarks.bench_startup --repeat 3 --out startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+HEAVY_MODULES = ("scipy.signal", "aubio", "sounddevice", "music21")
+
+MODULE_PROBE = """
+import sys, time
+t0 = time.perf_counter()
+import {name}
+print(time.perf_counter() - t0)
+"""
+
+APP_PROBE = """
+import json, os, tempfile, time
+t0 = time.perf_counter()
+from app.main import app
+out = {"import_s": time.perf_counter() - t0}
+from fastapi.testclient import TestClient
+from app.services.warmup import MINIMAL_MUSICXML, warmup
+
+def timed(fn):
+    t = time.perf_counter()
+    r = fn()
+    return time.perf_counter() - t, getattr(r, "status_code", None)
+
+with TestClient(app) as c:
+    out["health_s"], _ = timed(lambda: c.get("/health"))
+    if warmup.state != "idle":
+        t = time.perf_counter()
+        warmup.join()
+        out["warmup_wait_s"] = time.perf_counter() - t
+        out["warmup_steps"] = warmup.status()["steps"]
+    for name, method, path in (("status", "GET", "/api/audio/status"), ("devices", "GET", "/api/audio/devices"),
+                               ("start", "POST", "/api/audio/start?hop=1024")):
+        out[name + "_s"], out[name + "_code"] = timed(lambda: c.request(method, path))
+    c.post("/api/audio/stop")
+
+from app.services.score_cache import compile_score
+with tempfile.NamedTemporaryFile("w", suffix=".musicxml", delete=False) as f:
+    f.write(MINIMAL_MUSICXML)
+out["score_parse_s"], _ = timed(lambda: compile_score(f.name))
+os.unlink(f.name)
+print(json.dumps(out))
+"""
+
+def run_child(code: str, env: Optional[dict] = None) -> str:
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                          env=dict(os.environ, **(env or {})), timeout=300)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "błąd procesu")
+    return proc.stdout.strip().splitlines()[-1]
+
+def median_runs(runs: List[dict]) -> dict:
+    out = {}
+    for key, value in runs[0].items():
+        if key.endswith("_s"):
+            vals = sorted(r[key] for r in runs)
+            out[key] = vals[len(vals) // 2]
+        else:
+            out[key] = value
+    return out
+
+def bench_modules(repeat: int) -> dict:
+    return {name: sorted(float(run_child(MODULE_PROBE.format(name=name))) for _ in range(repeat))[repeat // 2]
+            for name in HEAVY_MODULES}
+
+def bench_app(repeat: int, warm: bool) -> dict:
+    env = {"VIOLIN_WARMUP": "1" if warm else "0"}
+    return median_runs([json.loads(run_child(APP_PROBE, env)) for _ in range(repeat)])
+
+def print_table(result: dict):
+    mods = result.get("modules") or {}
+    if mods:
+        print("import ciężkich modułów (osobno, zimny interpreter):")
+        for name, s in mods.items():
+            print(f"  {name:>14} {s * 1e3:8.1f} ms")
+    rows = [("import app.main", "import_s"), ("pierwsze /health", "health_s"), ("rozgrzewka (czekanie)", "warmup_wait_s"),
+            ("GET /status", "status_s"), ("GET /devices", "devices_s"), ("POST /start", "start_s"),
+            ("parsowanie partytury", "score_parse_s")]
+    scen = [k for k in ("cold", "warm") if k in result]
+    print(f"{'':>22}" + "".join(f"{k:>12}" for k in scen))
+    for label, key in rows:
+        cells = "".join(f"{result[k][key] * 1e3:10.1f}ms" if key in result[k] else f"{'-':>12}" for k in scen)
+        print(f"{label:>22}{cells}")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=3, help="uruchomień na scenariusz (mediana)")
+    ap.add_argument("--modes", nargs="+", default=["modules", "cold", "warm"], choices=["modules", "cold", "warm"])
+    ap.add_argument("--out", default=None, help="zapisz wynik JSON do pliku")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    result = {"meta": {"python": sys.version.split()[0], "args": vars(args)}}
+    if "modules" in args.modes:
+        result["modules"] = bench_modules(args.repeat)
+    if "cold" in args.modes:
+        result["cold"] = bench_app(args.repeat, warm=False)
+    if "warm" in args.modes:
+        result["warm"] = bench_app(args.repeat, warm=True)
+    result["meta"]["wall_s"] = time.perf_counter() - t0
+
+    print_table(result)
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
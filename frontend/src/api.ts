@@ -1,3 +1,5 @@
+import type { CatalogEntry, ImportJob } from "./types";
+
 const BASE = "http://localhost:8000";
 
 export async function getDevices() {
@@ -21,11 +23,127 @@ export async function stopAudio() {
   return res.json();
 }
 
-export function wsUrlAnalyze() {
-  return `ws://localhost:8000/api/audio/ws/analyze`;
+// Sesje audio: bez sessionId – sesja "default" (stare endpointy)
+function audioPath(sessionId?: string) {
+  return sessionId ? `/api/audio/sessions/${encodeURIComponent(sessionId)}` : "/api/audio";
+}
+
+// decimate (np. 16000) + window: analiza o niskim opóźnieniu na strumieniu zdecymowanym
+export async function startSession(sessionId: string, params: {
+  device_id?: number; samplerate?: number; hop?: number; decimate?: number; window?: number; channels?: number;
+} = {}) {
+  const qs = new URLSearchParams(Object.entries(params).map(([k, v]) => [k, String(v)])).toString();
+  const res = await fetch(`${BASE}${audioPath(sessionId)}/start${qs ? "?" + qs : ""}`, { method: "POST" });
+  return res.json();
+}
+
+export async function stopSession(sessionId: string) {
+  const res = await fetch(`${BASE}${audioPath(sessionId)}/stop`, { method: "POST" });
+  return res.json();
+}
+
+// Nagrywanie sesji: audio + ślad stroika (odczyt fragmentów po czasie)
+export async function startRecording(format: "flac" | "wav" = "flac", sessionId?: string) {
+  const res = await fetch(`${BASE}${audioPath(sessionId)}/record?format=${format}`, { method: "POST" });
+  if (!res.ok) {
+    throw new Error(`Recording failed: ${res.status}`);
+  }
+  return res.json();
+}
+
+export async function stopRecording(sessionId?: string) {
+  const res = await fetch(`${BASE}${audioPath(sessionId)}/record`, { method: "DELETE" });
+  return res.json();
+}
+
+export async function listRecordings() {
+  const res = await fetch(`${BASE}/api/recordings`);
+  return res.json();
+}
+
+export async function getRecordingFrames(id: string, start = 0, end?: number) {
+  const qs = new URLSearchParams({ start: String(start) });
+  if (end !== undefined) qs.set("end", String(end));
+  const res = await fetch(`${BASE}/api/recordings/${encodeURIComponent(id)}/frames?${qs}`);
+  if (!res.ok) {
+    throw new Error(`Recording frames failed: ${res.status}`);
+  }
+  return res.json();
+}
+
+export function recordingAudioUrl(id: string, start = 0, end?: number) {
+  const qs = new URLSearchParams({ start: String(start) });
+  if (end !== undefined) qs.set("end", String(end));
+  return `${BASE}/api/recordings/${encodeURIComponent(id)}/audio?${qs}`;
+}
+
+// Historia ćwiczeń: zasilanie z sesji i agregaty (intonacja, tempo)
+export async function startHistory(params: { student?: string; piece?: string } = {}, sessionId?: string) {
+  const qs = new URLSearchParams(Object.entries(params).filter(([, v]) => v) as [string, string][]);
+  const res = await fetch(`${BASE}${audioPath(sessionId)}/history?${qs}`, { method: "POST" });
+  if (!res.ok) {
+    throw new Error(`History feed failed: ${res.status}`);
+  }
+  return res.json();
+}
+
+export async function stopHistory(sessionId?: string) {
+  const res = await fetch(`${BASE}${audioPath(sessionId)}/history`, { method: "DELETE" });
+  return res.json();
+}
+
+export type HistoryQuery = {
+  since?: string;
+  until?: string;
+  session?: string;
+  student?: string;
+  piece?: string;
+  by?: "note" | "piece" | "student" | "day" | "session";
+};
+
+export async function getHistory(kind: "intonation" | "tempo", query: HistoryQuery = {}) {
+  const qs = new URLSearchParams(Object.entries(query).filter(([, v]) => v) as [string, string][]);
+  const res = await fetch(`${BASE}/api/history/${kind}?${qs}`);
+  if (!res.ok) {
+    throw new Error(`History query failed: ${res.status}`);
+  }
+  return res.json();
+}
+
+export async function listSessions() {
+  const res = await fetch(`${BASE}/api/audio/sessions`);
+  return res.json();
+}
+
+// Śledzenie partytury w sesji: pozycje przychodzą w strumieniu "score" WS analizy
+export async function followScore(url: string, params: { part?: number; position?: number; channel?: number } = {}, sessionId?: string) {
+  const qs = new URLSearchParams({ url, ...Object.fromEntries(Object.entries(params).map(([k, v]) => [k, String(v)])) });
+  const res = await fetch(`${BASE}${audioPath(sessionId)}/score_follow?${qs}`, { method: "POST" });
+  if (!res.ok) {
+    throw new Error(`Score follow failed: ${res.status}`);
+  }
+  return res.json();
+}
+
+export async function stopFollowing(sessionId?: string, channel?: number) {
+  const qs = channel === undefined ? "" : `?channel=${channel}`;
+  const res = await fetch(`${BASE}${audioPath(sessionId)}/score_follow${qs}`, { method: "DELETE" });
+  return res.json();
 }
 
-export async function uploadScore(file: File): Promise<{ url: string }> {
+export function wsUrlAnalyze(params?: Record<string, string | number>, sessionId?: string) {
+  const qs = params ? new URLSearchParams(
+    Object.entries(params).map(([k, v]) => [k, String(v)])
+  ).toString() : "";
+  return `ws://localhost:8000${audioPath(sessionId)}/ws/analyze${qs ? "?" + qs : ""}`;
+}
+
+export function wsUrlAccompaniment(params: Record<string, string | number | boolean>, sessionId?: string) {
+  const qs = new URLSearchParams(Object.entries(params).map(([k, v]) => [k, String(v)])).toString();
+  return `ws://localhost:8000${audioPath(sessionId)}/ws/accompaniment?${qs}`;
+}
+
+export async function uploadScore(file: File): Promise<{ url: string; hash?: string; duplicate?: boolean; cached?: boolean }> {
   const fd = new FormData();
   fd.append("file", file, file.name);
   const res = await fetch(`${BASE}/api/score/upload`, {
@@ -38,10 +156,101 @@ export async function uploadScore(file: File): Promise<{ url: string }> {
   return res.json();
 }
 
+// Katalog biblioteki: import hurtowy (zip albo katalog na serwerze) i wyszukiwanie po indeksie
+export async function importLibrary(source: File | { directory: string }, reindex = false): Promise<ImportJob> {
+  const qs = new URLSearchParams();
+  if (reindex) qs.set("reindex", "true");
+  let body: FormData | undefined;
+  if (source instanceof File) {
+    body = new FormData();
+    body.append("file", source, source.name);
+  } else {
+    qs.set("directory", source.directory);
+  }
+  const res = await fetch(`${BASE}/api/score/import?${qs}`, { method: "POST", body });
+  if (!res.ok) {
+    throw new Error(`Import failed: ${res.status}`);
+  }
+  return res.json();
+}
+
+export async function getImportJob(id: string): Promise<ImportJob> {
+  const res = await fetch(`${BASE}/api/score/import/${id}`);
+  if (!res.ok) {
+    throw new Error(`Import status failed: ${res.status}`);
+  }
+  return res.json();
+}
+
+export async function searchCatalog(params: {
+  q?: string; composer?: string; key?: string; time?: string; kind?: "musicxml" | "midi";
+  minLevel?: number; maxLevel?: number; minPitch?: number; maxPitch?: number; maxDuration?: number;
+  sort?: "title" | "composer" | "duration" | "level" | "imported"; limit?: number; offset?: number;
+} = {}): Promise<{ total: number; offset: number; items: CatalogEntry[] }> {
+  const names: Record<string, string> = {
+    minLevel: "min_level", maxLevel: "max_level", minPitch: "min_pitch", maxPitch: "max_pitch",
+    maxDuration: "max_duration",
+  };
+  const qs = new URLSearchParams();
+  for (const [k, v] of Object.entries(params)) {
+    if (v !== undefined && v !== "") qs.set(names[k] ?? k, String(v));
+  }
+  const res = await fetch(`${BASE}/api/score/catalog?${qs}`);
+  if (!res.ok) {
+    throw new Error(`Catalog search failed: ${res.status}`);
+  }
+  return res.json();
+}
+
+// Tabela nut partytury (kompilowana raz na treść pliku, potem z cache)
+export async function getScoreTimeline(url: string, timeline = true) {
+  const qs = new URLSearchParams({ url, timeline: String(timeline) }).toString();
+  const res = await fetch(`${BASE}/api/score/timeline?${qs}`);
+  if (!res.ok) {
+    throw new Error(`Timeline failed: ${res.status}`);
+  }
+  return res.json();
+}
+
+// Dopasowanie nagrania (id z /api/recordings albo track_file z analizy) do partytury – raport per nuta
+export async function alignRecording(url: string, source: { recording?: string; track?: string }, part = 0) {
+  const qs = new URLSearchParams({ url, part: String(part) });
+  if (source.recording) qs.set("recording", source.recording);
+  if (source.track) qs.set("track", source.track);
+  const res = await fetch(`${BASE}/api/analysis/align?${qs}`, { method: "POST" });
+  if (!res.ok) {
+    throw new Error(`Alignment failed: ${res.status}`);
+  }
+  return res.json();
+}
+
 export async function makeMetronome(tempo: number, bars: number, beats: number) {
   const url = `${BASE}/api/accompaniment/metronome?tempo=${tempo}&bars=${bars}&beats_per_bar=${beats}`;
   const res = await fetch(url);
   return res.json();
 }
 
+// WAV generowany w locie (np. do <audio src>); bez bars – klikanie bez końca
+export function metronomeStreamUrl(tempo: number, beats: number, bars?: number) {
+  const qs = new URLSearchParams({ tempo: String(tempo), beats_per_bar: String(beats) });
+  if (bars) qs.set("bars", String(bars));
+  return `${BASE}/api/accompaniment/metronome/stream?${qs}`;
+}
+
+// Podkład z partii akompaniamentu partytury (WAV w cache na dysku; te same parametry -> ten sam plik)
+export async function renderAccompaniment(url: string, params: {
+  parts?: number[]; tempo?: number; transpose?: number; sr?: number;
+} = {}) {
+  const qs = new URLSearchParams({ url });
+  if (params.parts?.length) qs.set("parts", params.parts.join(","));
+  if (params.tempo) qs.set("tempo", String(params.tempo));
+  if (params.transpose) qs.set("transpose", String(params.transpose));
+  if (params.sr) qs.set("sr", String(params.sr));
+  const res = await fetch(`${BASE}/api/accompaniment/render?${qs}`);
+  if (!res.ok) {
+    throw new Error(`Accompaniment render failed: ${res.status}`);
+  }
+  return res.json();
+}
+
 export const MEDIA_BASE = `${BASE}/media`;
@@ -1,7 +1,11 @@
 import { useEffect, useState } from "react";
 
 type Device = { id: number; name: string; default_samplerate?: number; max_input_channels?: number };
-type Status = { running: boolean; device_id: number | null; device_name: string | null; samplerate: number | null; hop: number | null };
+type Status = {
+  running: boolean; device_id: number | null; device_name: string | null; samplerate: number | null; hop: number | null;
+  analysis_samplerate?: number | null; analysis_hop?: number | null; pitch_window?: number | null; latency_ms?: number | null;
+  overruns?: number; underruns?: number; dropped_frames?: number; input_overflows?: number; backlog_frames?: number;
+};
 
 const BASE = "http://localhost:8000";
 
@@ -57,6 +61,9 @@ export default function AudioSourceSelector() {
   const currentInfo = status?.running
     ? `ON: ${status.device_name ?? "domyślne"} @ ${status.samplerate ?? "-"} Hz (hop ${status.hop ?? "-"})`
     : "OFF";
+  const dropInfo = status?.running && ((status.overruns ?? 0) > 0 || (status.input_overflows ?? 0) > 0)
+    ? `utracone: ${status.dropped_frames ?? 0} próbek (overrun ${status.overruns ?? 0}, overflow ${status.input_overflows ?? 0})`
+    : null;
 
   return (
     <div className="card">
@@ -64,6 +71,7 @@ export default function AudioSourceSelector() {
         <h3>Wejście audio</h3>
         <span className="badge">{currentInfo}</span>
       </div>
+      {dropInfo && <div className="mono" style={{ fontSize: 12, marginBottom: 6 }}>{dropInfo}</div>}
 
       <div className="vstack" style={{ gap: 8 }}>
         <div className="hstack" style={{ gap: 8, flexWrap: "wrap" }}>
@@ -5,9 +5,19 @@ type NoiseConfig = {
   gate_db: number;
   hp_enabled: boolean;
   hp_cut_hz: number;
+  notch_enabled: boolean;
+  notch_hz: number;
+  notch_q: number;
+  lp_enabled: boolean;
+  lp_cut_hz: number;
+  preemph_enabled: boolean;
+  preemph_coef: number;
   margin_db: number;
   adaptive: boolean;
   noise_floor_db: number;
+  spectral_enabled: boolean;
+  spectral_reduction: number;
+  spectral_floor_db: number;
 };
 
 const BASE = "http://localhost:8000";
@@ -76,6 +86,67 @@ export default function NoiseControls() {
           />
         </div>
 
+        <div className="hstack">
+          <label>
+            <input
+              type="checkbox"
+              checked={cfg.notch_enabled}
+              onChange={e => save({ notch_enabled: e.target.checked })}
+            /> notch (przydźwięk sieci)
+          </label>
+          <select
+            value={cfg.notch_hz}
+            onChange={e => save({ notch_hz: Number(e.target.value) })}
+          >
+            <option value={50}>50 Hz</option>
+            <option value={60}>60 Hz</option>
+          </select>
+        </div>
+
+        <div className="hstack">
+          <label>
+            <input
+              type="checkbox"
+              checked={cfg.lp_enabled}
+              onChange={e => save({ lp_enabled: e.target.checked })}
+            /> LPF (Hz)
+          </label>
+          <input
+            type="number" min={1000} max={20000} step={500}
+            value={cfg.lp_cut_hz}
+            onChange={e => save({ lp_cut_hz: Number(e.target.value) })}
+            style={{ width: 90 }}
+          />
+        </div>
+
+        <div className="hstack">
+          <label>
+            <input
+              type="checkbox"
+              checked={cfg.spectral_enabled}
+              onChange={e => save({ spectral_enabled: e.target.checked })}
+            /> odejmowanie widmowe
+          </label>
+          {cfg.spectral_enabled && (
+            <>
+              <label>siła</label>
+              <input
+                type="number" min={0.5} max={4} step={0.1}
+                value={cfg.spectral_reduction}
+                onChange={e => save({ spectral_reduction: Number(e.target.value) })}
+                style={{ width: 60 }}
+              />
+              <label>min. (dB)</label>
+              <input
+                type="number" min={-60} max={0} step={1}
+                value={cfg.spectral_floor_db}
+                onChange={e => save({ spectral_floor_db: Number(e.target.value) })}
+                style={{ width: 60 }}
+              />
+            </>
+          )}
+        </div>
+
         <label>
           <input
             type="checkbox"
@@ -113,6 +184,11 @@ export default function NoiseControls() {
             </button>
           </>
         )}
+        {!cfg.adaptive && cfg.spectral_enabled && (
+          <button onClick={calibrate} disabled={loading}>
+            Kalibruj profil szumu (~1s)
+          </button>
+        )}
         {loading && <span className="badge">zapisywanie…</span>}
       </div>
     </div>
@@ -4,6 +4,7 @@ import Tuner from "./Tuner";
 import Metronome from "./Metronome";
 import MicMonitor from "./MicMonitor";
 import NoiseControls from "./NoiseControls";
+import type { NoteEvent } from "../types";
 
 type NoteType = "whole" | "half" | "quarter" | "eighth";
 type Step = "A"|"B"|"C"|"D"|"E"|"F"|"G";       // nazwa stopnia
@@ -40,19 +41,6 @@ function spelledFromMidi(midi: number, preferSharps = true): {step: Step; alter:
   return { step, alter, octave };
 }
 
-// parsuje string z backendu (np. "C#4" albo "Bb5") do MIDI
-function midiFromBackendName(s: string | null | undefined): number | null {
-  if (!s || s.length < 2) return null;
-  const step = s[0]!.toUpperCase() as Step;
-  let i = 1;
-  let alter: Alter = 0;
-  if (s[i] === "#") { alter = 1; i++; }
-  else if (s[i] === "b" || s[i] === "♭") { alter = -1; i++; }
-  const octave = parseInt(s.slice(i), 10);
-  if (Number.isNaN(octave)) return null;
-  return midiFromStepAlterOct(step, alter, octave);
-}
-
 function prettyName(step: Step, alter: Alter, octave: number) {
   return `${step}${alter === 1 ? "#" : alter === -1 ? "b" : ""}${octave}`;
 }
@@ -237,10 +225,12 @@ export default function PracticeTab() {
       if (!running) return;
       if (data.gated) return;
 
-      if (data.onset && seq.length > 0 && idx < seq.length) {
+      // nuta zagrana = zdarzenie note_on z segmentacji (stabilna wysokość, nie pojedynczy hop z onsetem)
+      const noteOn = (data.notes ?? []).find((e: NoteEvent) => e.type === "note_on");
+      if (noteOn && seq.length > 0 && idx < seq.length) {
         const expected = seq[idx];
         const expectedMidi = midiFromStepAlterOct(expected.step, expected.alter, expected.octave);
-        const playedMidi = midiFromBackendName(data.note);
+        const playedMidi: number | null = noteOn.midi;
 
         const next = seq.slice();
         if (playedMidi !== null && playedMidi === expectedMidi) {
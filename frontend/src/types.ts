@@ -6,8 +6,62 @@ export type PitchFrame = {
   cents: number;
   onset: boolean;
   bpm: number;
+  rms?: number;
+  db?: number;
+  level?: number;
+  gated?: boolean;
+  gate_db?: number;
+  midi?: number;
+  wave?: number[];
+  score?: ScorePosition | null;
+  notes?: NoteEvent[] | null;
+  channels?: ChannelFrame[];
+};
+// Ramka jednego kanału wejścia wielokanałowego (part: partia partytury śledzona na tym kanale)
+export type ChannelFrame = {
+  channel: number; part: string | null; pitch_hz: number; note: string; cents: number; onset: boolean; bpm: number;
+  rms: number; db: number; level: number; gated: boolean; gate_db: number;
+  score: ScorePosition | null; notes: NoteEvent[] | null;
+};
+// Akompaniament na żywo (WS /ws/accompaniment): nagłówek, potem bloki PCM s16le
+export type AccompanimentHeader = {
+  format: "s16le"; channels: number; samplerate: number; block: number; lookahead_blocks: number;
+  parts: { index: number; name: string; instrument: string; notes: number }[]; start_beat: number;
+};
+export type AccompanimentStatus = {
+  beat: number; bpm: number; paused: boolean; voices: number; next_note: number; notes: number;
+};
+// Zdarzenia segmentacji nut (wysyłane tylko, gdy wystąpiły)
+export type NoteOn = { type: "note_on"; t: number; midi: number; note: string; onset: boolean };
+export type NoteOff = {
+  type: "note_off"; t: number; start: number; duration: number; midi: number; note: string;
+  mean_hz: number; mean_cents: number; cents_std: number; frames: number;
+};
+export type NoteEvent = NoteOn | NoteOff;
+// Pozycja w partyturze ze śledzenia (wysyłana tylko przy zmianie nuty)
+export type ScorePosition = {
+  index: number; measure: number; beats: number; time_s: number; midi: number; confidence: number;
 };
 export type UploadResponse = {
   filename: string; url: string; kind: "musicxml" | "midi";
   title: string; parts: number; measures: number;
 };
+// Katalog biblioteki partytur (GET /api/score/catalog)
+export type PitchRange = { lowest: number; highest: number; lowest_name: string; highest_name: string; span: number };
+export type CatalogEntry = {
+  hash: string; url: string; file: string; filename: string; kind: "musicxml" | "midi";
+  title: string; composer: string | null; key: string | null; key_source: "signature" | "estimated" | null;
+  time_signature: string | null; tempo_bpm: number; duration_s: number; duration_beats: number;
+  measures: number; notes: number; imported_at: number;
+  parts: ({ index: number; name: string; notes: number } & Partial<PitchRange>)[];
+  solo_part: number | null; range: PitchRange | null;
+  difficulty: {
+    level: number; notes_per_s: number; fast_ioi_s: number | null; max_leap: number; double_stops: number;
+    accidentals: number; above_first_position: number; below_violin_range: number;
+  };
+};
+export type ImportJob = {
+  id: string; source: string; state: "running" | "done" | "failed"; error: string | null;
+  files: number; duplicates: number; skipped: number; queued: number; parsed: number; failed: number;
+  errors: { file: string; error: string }[]; scanning: boolean; elapsed_s: number;
+};
@@ -1,8 +1,91 @@
-import type { PitchFrame } from "./types";
-import { wsUrlAnalyze } from "./api";
+import type { AccompanimentHeader, AccompanimentStatus, NoteEvent, PitchFrame } from "./types";
+import { wsUrlAccompaniment, wsUrlAnalyze } from "./api";
 
-export function connectAnalyze(onFrame: (f: PitchFrame) => void) {
-  const ws = new WebSocket(wsUrlAnalyze());
+// Binarny protokół ramek (backend: app/services/frame_codec.py)
+export const BIN_SUBPROTOCOL = "violin.bin.v1";
+const HEADER_SIZE = 12;   // <2sBBHHI
+const RECORD_SIZE = 32;   // <7fhBx
+const HDR_WAVE_F32 = 0x01;
+const FRAME_ONSET = 0x01;
+const FRAME_GATED = 0x02;
+const FRAME_HAS_WAVE = 0x04;
+const NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"];
+
+// Subskrypcja strumienia: true = każdy hop, liczba = max Hz, "events" = tylko zdarzenia, false = wyłączony
+export type StreamName = "pitch" | "level" | "tempo" | "onset" | "wave" | "score" | "notes" | "channels";
+export type Subscriptions = Partial<Record<StreamName, boolean | number | "events">>;
+
+export type AnalyzeOptions = {
+  binary?: boolean;              // domyślnie JSON
+  batch?: number;                // ile hopów w jednej wiadomości (tylko binarnie)
+  wave?: "int16" | "float32";
+  subscribe?: Subscriptions;
+  only?: boolean;                // tylko strumienie z `subscribe` (bez domyślnych)
+  queue?: number;                // długość kolejki wysyłki po stronie serwera
+  session?: string;              // sesja audio (domyślnie "default")
+};
+
+function subscriptionsParam(subs: Subscriptions, only = false) {
+  return (only ? ["none"] : []).concat(Object.entries(subs)
+    .map(([k, v]) => (v === true ? k : `${k}:${v === false ? "off" : v}`)))
+    .join(",");
+}
+
+export function setSubscriptions(ws: WebSocket, subs: Subscriptions) {
+  if (ws.readyState === 1) ws.send(JSON.stringify({ subscribe: subs }));
+}
+
+export function decodeFrames(buf: ArrayBuffer): PitchFrame[] {
+  const dv = new DataView(buf);
+  if (dv.getUint8(0) !== 0x56 || dv.getUint8(1) !== 0x46) return [];  // "VF"
+  const flags = dv.getUint8(3);
+  const n = dv.getUint16(4, true);
+  const points = dv.getUint16(6, true);
+  const f32 = (flags & HDR_WAVE_F32) !== 0;
+  let waveOff = HEADER_SIZE + n * RECORD_SIZE;
+  const out: PitchFrame[] = [];
+  for (let i = 0; i < n; i++) {
+    const o = HEADER_SIZE + i * RECORD_SIZE;
+    const midi = dv.getInt16(o + 28, true);
+    const bits = dv.getUint8(o + 30);
+    const cents = dv.getFloat32(o + 4, true);
+    const frame: PitchFrame = {
+      t: 0,
+      pitch_hz: dv.getFloat32(o, true),
+      cents: Number.isNaN(cents) ? (null as any) : Math.round(cents),
+      bpm: dv.getFloat32(o + 8, true),
+      rms: dv.getFloat32(o + 12, true),
+      db: dv.getFloat32(o + 16, true),
+      level: dv.getFloat32(o + 20, true),
+      gate_db: dv.getFloat32(o + 24, true),
+      midi,
+      note: midi >= 0 ? `${NAMES[midi % 12]}${Math.floor(midi / 12) - 1}` : (null as any),
+      onset: (bits & FRAME_ONSET) !== 0,
+      gated: (bits & FRAME_GATED) !== 0,
+    };
+    if (bits & FRAME_HAS_WAVE) {
+      const wave = new Array<number>(points);
+      for (let k = 0; k < points; k++) {
+        wave[k] = f32 ? dv.getFloat32(waveOff + k * 4, true) : dv.getInt16(waveOff + k * 2, true) / 32767;
+      }
+      waveOff += points * (f32 ? 4 : 2);
+      frame.wave = wave;
+    }
+    out.push(frame);
+  }
+  return out;
+}
+
+export function connectAnalyze(onFrame: (f: PitchFrame) => void, opts: AnalyzeOptions = {}) {
+  const params: Record<string, string | number> = {};
+  if (opts.binary && opts.batch) params.batch = opts.batch;
+  if (opts.binary && opts.wave) params.wave = opts.wave;
+  if (opts.subscribe) params.subscribe = subscriptionsParam(opts.subscribe, opts.only);
+  if (opts.queue) params.queue = opts.queue;
+  const ws = opts.binary
+    ? new WebSocket(wsUrlAnalyze(params, opts.session), [BIN_SUBPROTOCOL])
+    : new WebSocket(wsUrlAnalyze(params, opts.session));
+  ws.binaryType = "arraybuffer";
   ws.onopen = () => {
     // utrzymuj połączenie: wysyłaj keepalive co 5s
     const int = setInterval(() => { if (ws.readyState === 1) ws.send("ping"); }, 5000);
@@ -10,6 +93,10 @@ export function connectAnalyze(onFrame: (f: PitchFrame) => void) {
   };
   ws.onmessage = (ev) => {
     try {
+      if (ev.data instanceof ArrayBuffer) {
+        for (const f of decodeFrames(ev.data)) onFrame(f);
+        return;
+      }
       const data = JSON.parse(ev.data);
       onFrame(data as PitchFrame);
     } catch {}
@@ -20,3 +107,62 @@ export function connectAnalyze(onFrame: (f: PitchFrame) => void) {
   };
   return ws;
 }
+
+// Same zdarzenia nut (note_on / note_off) – kilka wiadomości na sekundę zamiast ramki co hop
+export function connectNotes(onEvent: (e: NoteEvent) => void, opts: { session?: string } = {}) {
+  return connectAnalyze((f) => {
+    for (const e of f.notes ?? []) onEvent(e);
+  }, { subscribe: { notes: "events" }, only: true, session: opts.session });
+}
+
+// Akompaniament na żywo: bloki PCM odtwarzane jeden za drugim w AudioContext
+export type AccompanimentOptions = {
+  parts?: number[]; transpose?: number; sr?: number; blockMs?: number; lookaheadMs?: number;
+  start?: number;                // ćwierćnuta startu
+  wait?: boolean;                // czekaj na ucznia (domyślnie tak)
+  session?: string;
+  onHeader?: (h: AccompanimentHeader) => void;
+  onStatus?: (s: AccompanimentStatus, underruns: number) => void;
+  onError?: (message: string) => void;
+};
+
+export function connectAccompaniment(ctx: AudioContext, url: string, opts: AccompanimentOptions = {}) {
+  const params: Record<string, string | number | boolean> = { url };
+  if (opts.parts?.length) params.parts = opts.parts.join(",");
+  if (opts.transpose) params.transpose = opts.transpose;
+  params.sr = opts.sr ?? ctx.sampleRate;
+  if (opts.blockMs) params.block_ms = opts.blockMs;
+  if (opts.lookaheadMs) params.lookahead_ms = opts.lookaheadMs;
+  if (opts.start) params.start = opts.start;
+  if (opts.wait === false) params.wait = false;
+  const ws = new WebSocket(wsUrlAccompaniment(params, opts.session));
+  ws.binaryType = "arraybuffer";
+  let samplerate = Number(params.sr);
+  let next = 0;
+  ws.onmessage = (ev) => {
+    if (ev.data instanceof ArrayBuffer) {
+      const pcm = new Int16Array(ev.data);
+      const buf = ctx.createBuffer(1, pcm.length, samplerate);
+      const ch = buf.getChannelData(0);
+      for (let i = 0; i < pcm.length; i++) ch[i] = pcm[i] / 32768;
+      const src = ctx.createBufferSource();
+      src.buffer = buf;
+      src.connect(ctx.destination);
+      next = Math.max(next, ctx.currentTime);   // po przerwie – od teraz
+      src.start(next);
+      next += buf.duration;
+      return;
+    }
+    try {
+      const data = JSON.parse(ev.data);
+      if (data.error) opts.onError?.(data.error);
+      else if (data.format) { samplerate = data.samplerate; opts.onHeader?.(data); }
+      else if (data.status) opts.onStatus?.(data.status, data.underruns ?? 0);
+    } catch {}
+  };
+  return ws;
+}
+
+export function seekAccompaniment(ws: WebSocket, beat: number) {
+  if (ws.readyState === 1) ws.send(JSON.stringify({ seek: beat }));
+}